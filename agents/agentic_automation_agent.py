@@ -2,17 +2,72 @@
 Agentic Automation Agent implementation for modular-2 framework.
 Advanced autonomous agent capable of multi-step task execution.
 """
+import asyncio
 import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import List, Dict, Any, Optional
 import json
 import re
 
+from core.plan_cache import PlanCache
+from core.prompt_budget import BudgetedPromptBuilder
+from core.prompt_template import build_agent_template
+from agents.run_context import ExecutionHistory, RunContext
+from llm_providers.conversation import ConversationSession, supports_continuation
+from tools.dispatch import DispatchIndex
+from tools.executor import get_default_executor
+
 logger = logging.getLogger(__name__)
 
+# Keywords of "auto" tool steps, matched against tools whose class name contains the category
+AUTO_TOOL_KEYWORDS = {
+    "math": ["calcola", "math", "+", "-", "*", "/"],
+    "search": ["cerca", "search", "trova"],
+    "file": ["file", "documento", "leggi"],
+}
+
+# Body of the planning prompt; the tool catalog is in the template prefix
+_PLANNING_BODY = """Sei un agente autonomo che deve creare un piano dettagliato per completare il seguente task.
+
+Task: {task}
+
+Crea un piano step-by-step in formato JSON con questa struttura, usando come "tool" i nomi dei tool disponibili:
+[
+  {{
+    "step": 1,
+    "action": "analyze|tool|reasoning",
+    "description": "Descrizione dello step",
+    "tool": "nome_tool_se_necessario",
+    "expected_output": "cosa ci aspettiamo",
+    "depends_on": [numeri degli step di cui serve il risultato]
+  }}
+]
+
+Gli step senza dipendenze tra loro (depends_on: []) vengono eseguiti in parallelo.
+
+Rispondi SOLO con il JSON del piano:"""
+
+# Body of the observe-act prompt of react mode
+_REACT_BODY = """Sei un agente autonomo che risolve il seguente task alternando azioni e osservazioni.
+
+Task: {task}
+
+Osservazioni finora:
+{context}
+
+Rispondi SOLO con un oggetto JSON, scegliendo una delle due azioni:
+- {{"action": "final", "answer": "risposta completa al task"}} appena puoi rispondere;
+- {{"action": "tool", "tool": "NomeTool", "input": {{"prompt": "input per il tool"}}}} per usare uno dei tool disponibili e osservarne il risultato; "input" può contenere anche gli argomenti specifici del tool (es. "expression").
+
+Iterazione {iteration} di {max_iterations}:"""
+
 class AgenticAutomationAgent:
     """
     Advanced autonomous agent that can break down complex tasks into steps
     and execute them using available tools and reasoning.
+    
+    Each run keeps its plan, history and conversation in a RunContext, so a
+    single instance can serve concurrent runs.
     """
     
     def __init__(self, name: str, llm, tools: Optional[List] = None, 
@@ -38,9 +93,49 @@ class AgenticAutomationAgent:
         # Create tool mapping
         self.tool_map = {tool.__class__.__name__.lower(): tool for tool in self.tools}
         
-        # Task execution state
-        self.execution_history = []
-        self.current_context = {}
+        # Tool keywords compiled once for "auto" tool steps
+        self.dispatch_index = DispatchIndex(self.tools, category_keywords=AUTO_TOOL_KEYWORDS, use_should_use=False,
+                                            declared_rules="ignore", match_names=False)
+        
+        # State of the most recently started run, for inspection only
+        self.last_run: Optional[RunContext] = None
+        
+        # Conversation reused across the steps of a run (config: context_reuse)
+        self.context_reuse = self.config.get("context_reuse", False)
+        
+        # Plan steps with explicit depends_on edges run concurrently up to this limit
+        self.max_parallel_steps = max(1, int(self.config.get("max_parallel_steps", 4)))
+        
+        # "plan" (plan, execute every step, summarize) or "react" (observe-act loop with early exit)
+        self.execution_mode = self.config.get("execution_mode", "plan")
+        if self.execution_mode not in ("plan", "react"):
+            logger.warning(f"⚠️ execution_mode '{self.execution_mode}' non valido per '{self.name}', uso 'plan'")
+            self.execution_mode = "plan"
+        
+        # Reused and pinned plans (config: plan_cache, plan_templates)
+        self.plan_cache = PlanCache.from_config(self.config, llm)
+        
+        # Runs tool steps with their timeout (replaced by AgentManager's shared executor)
+        self.tool_executor = get_default_executor()
+        
+        # System prompt and tool catalog rendered once as the prefix of every step prompt
+        self.prompt_template = build_agent_template(self.name, self.system_prompt, self.tools, {
+            "planning": _PLANNING_BODY,
+            "analysis": "Analizza il seguente task nel contesto del piano di esecuzione:\n\n"
+                        "Task originale: {task}\nStep corrente: {description}\n\n"
+                        "Contesto precedente:\n{context}\n\n"
+                        "Fornisci un'analisi dettagliata e identifica i prossimi passi necessari:",
+            "reasoning": "Ragiona sulla migliore strategia per completare il task:\n\n"
+                         "Task: {task}\nStep: {description}\n\n"
+                         "Contesto ed esecuzione precedente:\n{context}\n\n"
+                         "Fornisci il tuo ragionamento e la strategia da seguire:",
+            "generic": "Esegui il seguente step del piano:\n\n{description}\n\n"
+                       "Contesto:\n{context}\n\nFornisci il risultato dell'esecuzione:",
+            "react": _REACT_BODY,
+        }, llm=llm)
+        
+        # Limits of the per-run step history and its summary (config: execution_history)
+        self.history_config = self.config.get("execution_history", {})
         
         logger.info(f"🤖 Agente autonomo '{self.name}' inizializzato con {len(self.tools)} tool(s)")
         logger.info(f"🎯 Max iterazioni: {self.max_iterations}")
@@ -58,72 +153,199 @@ class AgenticAutomationAgent:
         try:
             task = input_data.get("prompt", "")
             
-            # Reset execution state
-            self.execution_history = []
-            self.current_context = {"original_task": task}
+            # Fresh state for this run only
+            run = self._start_run(task, input_data)
             
             logger.info(f"🚀 Avvio task autonomo per '{self.name}': {task}")
             
-            # Create initial plan
-            plan = self._create_task_plan(task)
-            self.current_context["plan"] = plan
-            
-            # Execute the plan
-            result = self._execute_plan(plan)
-            
-            # Generate final summary
-            final_result = self._generate_final_summary(result)
+            if self.execution_mode == "react":
+                # Observe-act loop, stopping at the first final answer
+                final_result = self._execute_react(run, task)
+            else:
+                # Create initial plan
+                plan = self._create_task_plan(run, task)
+                run.current_context["plan"] = plan
+                
+                # Execute the plan
+                result = self._execute_plan(run, plan)
+                
+                # Generate final summary
+                final_result = self._generate_final_summary(run, result)
+            self._log_session_stats(run)
+            self._log_run_memory(run)
             
-            logger.info(f"✅ Task autonomo completato per '{self.name}'")
+            logger.info(f"✅ Task autonomo completato per '{self.name}' ({run.llm_calls} chiamate LLM)")
             return final_result
             
         except Exception as e:
             logger.error(f"❌ Errore nell'esecuzione autonoma per '{self.name}': {e}")
             return f"Errore nell'esecuzione autonoma: {str(e)}"
     
-    def _create_task_plan(self, task: str) -> List[Dict]:
-        """Create a step-by-step plan for the given task."""
-        planning_prompt = f"""
-{self.system_prompt}
-
-Sei un agente autonomo che deve creare un piano dettagliato per completare il seguente task.
-
-Task: {task}
-
-Tools disponibili: {', '.join([tool.__class__.__name__ for tool in self.tools])}
-
-Crea un piano step-by-step in formato JSON con questa struttura:
-[
-  {{
-    "step": 1,
-    "action": "analyze|tool|reasoning",
-    "description": "Descrizione dello step",
-    "tool": "nome_tool_se_necessario",
-    "expected_output": "cosa ci aspettiamo"
-  }}
-]
-
-Rispondi SOLO con il JSON del piano:"""
+    async def arun(self, input_data: Dict[str, Any]) -> str:
+        """
+        Execute autonomous task asynchronously with multi-step reasoning.
         
+        Args:
+            input_data: Input data containing task description
+            
+        Returns:
+            Final result after autonomous execution
+        """
         try:
-            response = self.llm.generate(planning_prompt)
+            task = input_data.get("prompt", "")
             
-            # Extract JSON from response
-            json_match = re.search(r'\[.*\]', response, re.DOTALL)
-            if json_match:
-                plan_json = json_match.group()
-                plan = json.loads(plan_json)
-                logger.info(f"📋 Piano creato con {len(plan)} step per '{self.name}'")
-                return plan
+            # Fresh state for this run only
+            run = self._start_run(task, input_data)
+            
+            logger.info(f"🚀 Avvio task autonomo async per '{self.name}': {task}")
+            
+            if self.execution_mode == "react":
+                final_result = await self._aexecute_react(run, task)
             else:
-                # Fallback to simple plan
-                logger.warning(f"⚠️ Impossibile parsare il piano JSON, uso piano semplice")
-                return self._create_simple_plan(task)
+                plan = await self._acreate_task_plan(run, task)
+                run.current_context["plan"] = plan
+                
+                result = await self._aexecute_plan(run, plan)
+                
+                final_result = await self._agenerate_final_summary(run, result)
+            self._log_session_stats(run)
+            self._log_run_memory(run)
+            
+            logger.info(f"✅ Task autonomo completato per '{self.name}' ({run.llm_calls} chiamate LLM)")
+            return final_result
+            
+        except Exception as e:
+            logger.error(f"❌ Errore nell'esecuzione autonoma per '{self.name}': {e}")
+            return f"Errore nell'esecuzione autonoma: {str(e)}"
+    
+    @property
+    def execution_history(self) -> List[Dict]:
+        """Step history of the most recently started run."""
+        return self.last_run.execution_history if self.last_run is not None else []
+    
+    @property
+    def current_context(self) -> Dict[str, Any]:
+        """Context of the most recently started run."""
+        return self.last_run.current_context if self.last_run is not None else {}
+    
+    def _start_run(self, task: str, input_data: Dict[str, Any]) -> RunContext:
+        """Create the state of a new run."""
+        run = RunContext(task, input_data, session=self._create_session(),
+                         history=ExecutionHistory.from_config(self.history_config))
+        self.last_run = run
+        return run
+    
+    def _create_session(self) -> Optional[ConversationSession]:
+        """Open a conversation for this run when context reuse is enabled and supported."""
+        if not self.context_reuse:
+            return None
+        if not supports_continuation(self.llm):
+            logger.warning(f"⚠️ context_reuse ignorato per '{self.name}': l'LLM non supporta la continuazione")
+            return None
+        # The static prefix becomes the conversation's system message
+        return ConversationSession(self.llm, self.prompt_template.system_text,
+                                   mode=self.config.get("conversation_mode", "chat"),
+                                   max_turns=self.config.get("conversation_max_turns"))
+    
+    def _log_session_stats(self, run: RunContext):
+        """Log the prompt-eval cost of the run's conversation."""
+        if run.session is None:
+            return
+        stats = run.session.get_stats()
+        logger.info(
+            f"📏 Sessione di '{self.name}': {stats['turns']} turni, "
+            f"{stats['prompt_eval_tokens']} token di prompt valutati"
+        )
+    
+    def _log_run_memory(self, run: RunContext):
+        """Log the memory held by the run's history and context."""
+        stats = run.get_memory_stats()
+        logger.info(
+            f"🧠 Memoria del run di '{self.name}': {stats['buffered']}/{stats['steps']} step in cronologia "
+            f"({stats['evicted']} scartati), {stats['context_keys']} chiavi di contesto, "
+            f"~{stats['approx_bytes']} byte, riassunto di {stats['summary_tokens']} token"
+        )
+    
+    def get_run_memory_stats(self) -> Dict[str, Any]:
+        """
+        Get the memory held by the most recently started run.
+        
+        Returns:
+            History and context counters, or {} before the first run
+        """
+        if self.last_run is None:
+            return {}
+        return self.last_run.get_memory_stats()
+    
+    def _generate(self, run: RunContext, prompt: str) -> str:
+        """Generate with the run's conversation if there is one, otherwise with a full prompt."""
+        run.count_llm_call()
+        if run.session is not None:
+            return run.session.send(prompt)
+        return self.llm.generate(prompt)
+    
+    def _reuse_plan(self, run: RunContext, task: str) -> Optional[List[Dict]]:
+        """Get a cached or pinned plan for the task, skipping the planning call."""
+        if self.plan_cache is None:
+            return None
+        plan = self.plan_cache.get(task, list(self.tool_map))
+        if plan is None:
+            return None
+        
+        logger.info(f"♻️ Piano riutilizzato con {len(plan)} step per '{self.name}', pianificazione LLM saltata")
+        if run.session is not None:
+            # Keep the conversation aware of the plan it did not produce
+            run.session.add_observation(f"Task: {task}\n\nPiano:\n{json.dumps(plan, ensure_ascii=False)}")
+        return plan
+    
+    def _create_task_plan(self, run: RunContext, task: str) -> List[Dict]:
+        """Create a step-by-step plan for the given task."""
+        plan = self._reuse_plan(run, task)
+        if plan is not None:
+            return plan
+        try:
+            response = self._generate(run, self._build_planning_prompt(run, task))
+            return self._parse_plan(response, task)
+                
+        except Exception as e:
+            logger.warning(f"⚠️ Errore nella creazione del piano: {e}, uso piano semplice")
+            return self._create_simple_plan(task)
+    
+    async def _acreate_task_plan(self, run: RunContext, task: str) -> List[Dict]:
+        """Create a step-by-step plan for the given task asynchronously."""
+        plan = self._reuse_plan(run, task)
+        if plan is not None:
+            return plan
+        try:
+            response = await self._agenerate(run, self._build_planning_prompt(run, task))
+            return self._parse_plan(response, task)
                 
         except Exception as e:
             logger.warning(f"⚠️ Errore nella creazione del piano: {e}, uso piano semplice")
             return self._create_simple_plan(task)
     
+    def _build_planning_prompt(self, run: RunContext, task: str) -> str:
+        """Build the prompt asking the LLM for a JSON plan."""
+        if run.session is not None:
+            # The conversation already carries the system prompt and tool catalog
+            return self.prompt_template.render_body("planning", task=task)
+        return self.prompt_template.render("planning", task=task)
+    
+    def _parse_plan(self, response: str, task: str) -> List[Dict]:
+        """Extract the JSON plan from the LLM response, falling back to a simple plan."""
+        json_match = re.search(r'\[.*\]', response, re.DOTALL)
+        if json_match:
+            plan_json = json_match.group()
+            plan = json.loads(plan_json)
+            logger.info(f"📋 Piano creato con {len(plan)} step per '{self.name}'")
+            if self.plan_cache is not None:
+                self.plan_cache.put(task, list(self.tool_map), plan)
+            return plan
+        else:
+            # Fallback to simple plan
+            logger.warning(f"⚠️ Impossibile parsare il piano JSON, uso piano semplice")
+            return self._create_simple_plan(task)
+    
     def _create_simple_plan(self, task: str) -> List[Dict]:
         """Create a simple fallback plan."""
         return [
@@ -150,32 +372,285 @@ Rispondi SOLO con il JSON del piano:"""
             }
         ]
     
-    def _execute_plan(self, plan: List[Dict]) -> str:
-        """Execute the created plan step by step."""
+    def _plan_dependencies(self, plan: List[Dict]) -> Optional[List[List[int]]]:
+        """
+        Get the dependencies of every plan step as indices into the plan.
+        
+        Steps without depends_on depend on the previous step. Returns None when
+        no step declares depends_on, i.e. the plan is a plain sequence.
+        """
+        if not any("depends_on" in step for step in plan if isinstance(step, dict)):
+            return None
+        
+        positions = {step.get("step", index + 1): index for index, step in enumerate(plan)}
+        dependencies = []
+        for index, step in enumerate(plan):
+            if "depends_on" not in step:
+                dependencies.append([index - 1] if index > 0 else [])
+                continue
+            declared = step.get("depends_on") or []
+            declared = declared if isinstance(declared, list) else [declared]
+            indices = []
+            for reference in declared:
+                position = positions.get(reference)
+                if position is None and isinstance(reference, str) and reference.isdigit():
+                    position = positions.get(int(reference))
+                if position is None or position == index:
+                    logger.warning(f"⚠️ Dipendenza '{reference}' dello step {step.get('step', index + 1)} ignorata")
+                    continue
+                indices.append(position)
+            dependencies.append(sorted(set(indices)))
+        return dependencies
+    
+    def _step_history(self, plan: List[Dict], results: Dict[int, str],
+                      dependencies: List[List[int]], index: int) -> List[Dict]:
+        """History seen by a step: its (transitive) dependencies, in plan order."""
+        ancestors = set()
+        stack = list(dependencies[index])
+        while stack:
+            current = stack.pop()
+            if current not in ancestors:
+                ancestors.add(current)
+                stack.extend(dependencies[current])
+        return [{"step": plan[i], "result": results[i]} for i in sorted(ancestors) if i in results]
+    
+    def _limit_plan(self, plan: List[Dict]) -> List[Dict]:
+        """Keep the first max_iterations steps of the plan."""
+        if len(plan) > self.max_iterations:
+            logger.warning(f"⚠️ Raggiunto limite iterazioni ({self.max_iterations}) per '{self.name}'")
+            return plan[:self.max_iterations]
+        return plan
+    
+    def _parallel_steps(self, run: RunContext, dependencies: Optional[List[List[int]]]) -> int:
+        """Number of steps that may run at once for a plan."""
+        if dependencies is None or self.max_parallel_steps <= 1:
+            return 1
+        if run.session is not None:
+            # A conversation is a single ordered thread of turns
+            logger.debug(f"ℹ️ Esecuzione sequenziale del piano di '{self.name}': context_reuse attivo")
+            return 1
+        return self.max_parallel_steps
+    
+    def _ready_steps(self, dependencies: List[List[int]], started: set, done: set) -> List[int]:
+        """Steps not started yet whose dependencies are all complete, in plan order."""
+        return [index for index in range(len(dependencies))
+                if index not in started and all(dep in done for dep in dependencies[index])]
+    
+    def _commit_results(self, run: RunContext, plan: List[Dict], results: Dict[int, str], committed: int) -> int:
+        """Record completed results in plan order, stopping at the first step still running."""
+        while committed < len(plan) and committed in results:
+            self._record_step_result(run, plan[committed], results[committed])
+            committed += 1
+        return committed
+    
+    def _execute_plan(self, run: RunContext, plan: List[Dict]) -> str:
+        """Execute the created plan, running independent steps concurrently."""
+        dependencies = self._plan_dependencies(plan)
+        parallel = self._parallel_steps(run, dependencies)
+        if parallel > 1:
+            return self._execute_plan_parallel(run, self._limit_plan(plan), parallel)
+        
         results = []
         
         for step_info in plan:
-            if len(self.execution_history) >= self.max_iterations:
+            if run.execution_history.total >= self.max_iterations:
                 logger.warning(f"⚠️ Raggiunto limite iterazioni ({self.max_iterations}) per '{self.name}'")
                 break
             
-            step_result = self._execute_step(step_info)
+            step_result = self._execute_step(run, step_info)
             results.append(step_result)
+            self._record_step_result(run, step_info, step_result)
+        
+        return "\n\n".join(results)
+    
+    def _execute_plan_parallel(self, run: RunContext, plan: List[Dict], parallel: int) -> str:
+        """
+        Execute a plan as a dependency graph with up to `parallel` steps in flight.
+        
+        Each step sees only the results of the steps it depends on, and results
+        are recorded in plan order, so the run does not depend on which step
+        finishes first.
+        """
+        dependencies = self._plan_dependencies(plan)
+        logger.info(f"⚡ Piano di '{self.name}' eseguito come grafo: {len(plan)} step, fino a {parallel} in parallelo")
+        results = {}
+        started = set()
+        running = {}
+        committed = 0
+        
+        with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix=f"plan-{self.name}") as executor:
+            while committed < len(plan):
+                ready = self._ready_steps(dependencies, started, set(results))
+                if not ready and not running:
+                    # Dependency cycle: release the first blocked step
+                    ready = [min(set(range(len(plan))) - started)]
+                    logger.warning(f"⚠️ Ciclo di dipendenze nel piano di '{self.name}', eseguo lo step {ready[0] + 1}")
+                for index in ready[:parallel - len(running)]:
+                    started.add(index)
+                    history = self._step_history(plan, results, dependencies, index)
+                    running[executor.submit(self._execute_step, run, plan[index], history)] = index
+                
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results[running.pop(future)] = future.result()
+                committed = self._commit_results(run, plan, results, committed)
+        
+        return "\n\n".join(results[index] for index in range(len(plan)))
+    
+    async def _aexecute_plan(self, run: RunContext, plan: List[Dict]) -> str:
+        """Execute the created plan asynchronously, running independent steps concurrently."""
+        dependencies = self._plan_dependencies(plan)
+        parallel = self._parallel_steps(run, dependencies)
+        if parallel > 1:
+            return await self._aexecute_plan_parallel(run, self._limit_plan(plan), parallel)
+        
+        results = []
+        
+        for step_info in plan:
+            if run.execution_history.total >= self.max_iterations:
+                logger.warning(f"⚠️ Raggiunto limite iterazioni ({self.max_iterations}) per '{self.name}'")
+                break
             
-            # Update context with step result
-            self.current_context[f"step_{step_info['step']}_result"] = step_result
-            
-            # Add to execution history
-            self.execution_history.append({
-                "step": step_info,
-                "result": step_result,
-                "timestamp": "now"  # In a real implementation, use actual timestamp
-            })
+            step_result = await self._aexecute_step(run, step_info)
+            results.append(step_result)
+            self._record_step_result(run, step_info, step_result)
         
         return "\n\n".join(results)
     
-    def _execute_step(self, step_info: Dict) -> str:
-        """Execute a single step of the plan."""
+    async def _aexecute_plan_parallel(self, run: RunContext, plan: List[Dict], parallel: int) -> str:
+        """Execute a plan as a dependency graph asynchronously (see _execute_plan_parallel)."""
+        dependencies = self._plan_dependencies(plan)
+        logger.info(f"⚡ Piano di '{self.name}' eseguito come grafo: {len(plan)} step, fino a {parallel} in parallelo")
+        results = {}
+        started = set()
+        running = {}
+        committed = 0
+        
+        while committed < len(plan):
+            ready = self._ready_steps(dependencies, started, set(results))
+            if not ready and not running:
+                ready = [min(set(range(len(plan))) - started)]
+                logger.warning(f"⚠️ Ciclo di dipendenze nel piano di '{self.name}', eseguo lo step {ready[0] + 1}")
+            for index in ready[:parallel - len(running)]:
+                started.add(index)
+                history = self._step_history(plan, results, dependencies, index)
+                running[asyncio.ensure_future(self._aexecute_step(run, plan[index], history))] = index
+            
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                results[running.pop(task)] = task.result()
+            committed = self._commit_results(run, plan, results, committed)
+        
+        return "\n\n".join(results[index] for index in range(len(plan)))
+    
+    def _execute_react(self, run: RunContext, task: str) -> str:
+        """
+        Run the task as an observe-act loop instead of a plan.
+        
+        Each response either gives the final answer, which ends the run at
+        once, or asks for a tool with structured arguments whose result the
+        next iteration observes. After max_iterations without an answer the
+        final summary is generated as in plan mode.
+        """
+        results = []
+        for iteration in range(1, self.max_iterations + 1):
+            response = self._generate(run, self._build_react_prompt(run, task, iteration))
+            action = self._parse_react_action(response)
+            if action["action"] == "final":
+                return self._finish_react(run, action["answer"], results, iteration)
+            
+            step_info = self._react_step_info(task, action, iteration)
+            step_result = self._execute_tool_step(run, step_info)
+            results.append(step_result)
+            self._record_step_result(run, step_info, step_result)
+        
+        logger.warning(f"⚠️ Raggiunto limite iterazioni ({self.max_iterations}) per '{self.name}' senza risposta finale")
+        return self._generate_final_summary(run, "\n\n".join(results))
+    
+    async def _aexecute_react(self, run: RunContext, task: str) -> str:
+        """Run the task as an observe-act loop asynchronously (see _execute_react)."""
+        results = []
+        for iteration in range(1, self.max_iterations + 1):
+            response = await self._agenerate(run, self._build_react_prompt(run, task, iteration))
+            action = self._parse_react_action(response)
+            if action["action"] == "final":
+                return self._finish_react(run, action["answer"], results, iteration)
+            
+            step_info = self._react_step_info(task, action, iteration)
+            # Tools are synchronous: run them in a worker thread
+            step_result = await asyncio.to_thread(self._execute_tool_step, run, step_info)
+            results.append(step_result)
+            self._record_step_result(run, step_info, step_result)
+        
+        logger.warning(f"⚠️ Raggiunto limite iterazioni ({self.max_iterations}) per '{self.name}' senza risposta finale")
+        return await self._agenerate_final_summary(run, "\n\n".join(results))
+    
+    def _build_react_prompt(self, run: RunContext, task: str, iteration: int) -> str:
+        """Build the prompt of one observe-act iteration."""
+        if run.session is not None:
+            # Tool results are already in the conversation as observations
+            return self.prompt_template.render_body("react", task=task, context="vedi le osservazioni precedenti",
+                                                    iteration=iteration, max_iterations=self.max_iterations)
+        return self.prompt_template.render("react", task=task, context=self._get_context_summary(run),
+                                           iteration=iteration, max_iterations=self.max_iterations)
+    
+    def _parse_react_action(self, response: str) -> Dict[str, Any]:
+        """
+        Parse the action declared by an observe-act response.
+        
+        Returns:
+            {"action": "tool", "tool": name, "input": arguments} or
+            {"action": "final", "answer": text}; a response that is not a valid
+            action is taken as the final answer
+        """
+        json_match = re.search(r'\{.*\}', response, re.DOTALL)
+        if json_match:
+            try:
+                action = json.loads(json_match.group())
+            except json.JSONDecodeError:
+                action = None
+            if isinstance(action, dict):
+                if action.get("action") == "tool" and action.get("tool"):
+                    arguments = action.get("input") or {}
+                    if not isinstance(arguments, dict):
+                        arguments = {"prompt": str(arguments)}
+                    return {"action": "tool", "tool": str(action["tool"]), "input": arguments}
+                if action.get("action") == "final" and "answer" in action:
+                    return {"action": "final", "answer": str(action["answer"])}
+        
+        # The model answered in plain text
+        return {"action": "final", "answer": response.strip()}
+    
+    def _react_step_info(self, task: str, action: Dict[str, Any], iteration: int) -> Dict[str, Any]:
+        """Turn a tool action into a tool step (its arguments are passed to the tool)."""
+        arguments = action["input"]
+        description = str(arguments.get("prompt", "")) or ", ".join(f"{key}={value}" for key, value in arguments.items())
+        return {
+            "step": iteration,
+            "action": "tool",
+            "tool": action["tool"],
+            "description": description or task,
+            "arguments": arguments,
+        }
+    
+    def _finish_react(self, run: RunContext, answer: str, results: List[str], iteration: int) -> str:
+        """Format the final answer of an observe-act loop."""
+        logger.info(
+            f"🏁 Risposta finale di '{self.name}' all'iterazione {iteration}/{self.max_iterations} "
+            f"dopo {len(results)} tool"
+        )
+        return self._format_final_result(run, answer, "\n\n".join(results) or "Nessun tool utilizzato")
+    
+    def _record_step_result(self, run: RunContext, step_info: Dict, step_result: str):
+        """Store a step result in the context and execution history."""
+        run.record(step_info, step_result)
+        
+        # LLM steps are already part of the conversation: only tool output must be added
+        if run.session is not None and step_info.get("action") == "tool" and step_info.get("tool"):
+            run.session.add_observation(f"Step {step_info.get('step', '')}: {step_result}")
+    
+    def _execute_step(self, run: RunContext, step_info: Dict, history: Optional[List[Dict]] = None) -> str:
+        """Execute a single step of the plan (history: results the step may see, default all)."""
         step_num = step_info.get("step", 0)
         action = step_info.get("action", "reasoning")
         description = step_info.get("description", "")
@@ -185,20 +660,51 @@ Rispondi SOLO con il JSON del piano:"""
         
         try:
             if action == "tool" and tool_name:
-                return self._execute_tool_step(step_info)
+                return self._execute_tool_step(run, step_info, history)
             elif action == "analyze":
-                return self._execute_analysis_step(step_info)
+                return self._execute_analysis_step(run, step_info, history)
             elif action == "reasoning":
-                return self._execute_reasoning_step(step_info)
+                return self._execute_reasoning_step(run, step_info, history)
             else:
-                return self._execute_generic_step(step_info)
+                return self._execute_generic_step(run, step_info, history)
                 
         except Exception as e:
             logger.error(f"❌ Errore nell'esecuzione step {step_num}: {e}")
             return f"Errore step {step_num}: {str(e)}"
     
-    def _execute_tool_step(self, step_info: Dict) -> str:
-        """Execute a step that involves using a tool."""
+    async def _aexecute_step(self, run: RunContext, step_info: Dict, history: Optional[List[Dict]] = None) -> str:
+        """Execute a single step of the plan asynchronously (history: results the step may see, default all)."""
+        step_num = step_info.get("step", 0)
+        action = step_info.get("action", "reasoning")
+        description = step_info.get("description", "")
+        tool_name = step_info.get("tool")
+        
+        logger.info(f"🔄 Esecuzione step {step_num} per '{self.name}': {description}")
+        
+        try:
+            if action == "tool" and tool_name:
+                # Tools are synchronous: run them in a worker thread
+                return await asyncio.to_thread(self._execute_tool_step, run, step_info, history)
+            
+            if action == "analyze":
+                prompt, label, error_label = self._build_analysis_prompt(run, step_info, history), "Analisi", "Errore nell'analisi"
+            elif action == "reasoning":
+                prompt, label, error_label = self._build_reasoning_prompt(run, step_info, history), "Ragionamento", "Errore nel ragionamento"
+            else:
+                prompt, label, error_label = self._build_generic_prompt(run, step_info, history), "Risultato", "Errore nell'esecuzione"
+            
+            try:
+                result = await self._agenerate(run, prompt)
+                return f"{label}: {result}"
+            except Exception as e:
+                return f"{error_label}: {str(e)}"
+                
+        except Exception as e:
+            logger.error(f"❌ Errore nell'esecuzione step {step_num}: {e}")
+            return f"Errore step {step_num}: {str(e)}"
+    
+    def _execute_tool_step(self, run: RunContext, step_info: Dict, history: Optional[List[Dict]] = None) -> str:
+        """Execute a step that involves using a tool (history: results the tool may see, default the recent steps)."""
         tool_name = step_info.get("tool", "").lower()
         description = step_info.get("description", "")
         
@@ -211,11 +717,14 @@ Rispondi SOLO con il JSON del piano:"""
         if selected_tool:
             try:
                 # Prepare tool input based on current context
-                tool_input = self._prepare_tool_input(selected_tool, step_info)
-                result = selected_tool.run(tool_input)
+                tool_input = self._prepare_tool_input(run, selected_tool, step_info, history)
+                call = self.tool_executor.run_tool(selected_tool, tool_input)
+                if not call.ok:
+                    logger.error(f"❌ Errore nell'esecuzione tool: {call.error}")
+                    return f"Errore tool: {call.error}"
                 
-                logger.info(f"🔧 Tool '{selected_tool.__class__.__name__}' eseguito con successo")
-                return f"Tool {selected_tool.__class__.__name__} result: {result}"
+                logger.info(f"🔧 Tool '{call.tool_name}' eseguito con successo")
+                return f"Tool {call.tool_name} result: {call.output}"
                 
             except Exception as e:
                 logger.error(f"❌ Errore nell'esecuzione tool: {e}")
@@ -223,142 +732,176 @@ Rispondi SOLO con il JSON del piano:"""
         else:
             return f"Tool '{tool_name}' non trovato, procedo con ragionamento"
     
-    def _execute_analysis_step(self, step_info: Dict) -> str:
+    def _execute_analysis_step(self, run: RunContext, step_info: Dict, history: Optional[List[Dict]] = None) -> str:
         """Execute an analysis step."""
-        description = step_info.get("description", "")
-        
-        analysis_prompt = f"""
-Analizza il seguente task nel contesto del piano di esecuzione:
-
-Task originale: {self.current_context.get('original_task', '')}
-Step corrente: {description}
-
-Contesto precedente:
-{self._get_context_summary()}
-
-Fornisci un'analisi dettagliata e identifica i prossimi passi necessari:"""
-        
         try:
-            result = self.llm.generate(analysis_prompt)
+            result = self._generate(run, self._build_analysis_prompt(run, step_info, history))
             return f"Analisi: {result}"
         except Exception as e:
             return f"Errore nell'analisi: {str(e)}"
     
-    def _execute_reasoning_step(self, step_info: Dict) -> str:
-        """Execute a reasoning step."""
+    def _build_analysis_prompt(self, run: RunContext, step_info: Dict, history: Optional[List[Dict]] = None) -> str:
+        """Build the prompt for an analysis step."""
         description = step_info.get("description", "")
         
-        reasoning_prompt = f"""
-Ragiona sulla migliore strategia per completare il task:
-
-Task: {self.current_context.get('original_task', '')}
-Step: {description}
-
-Contesto ed esecuzione precedente:
-{self._get_context_summary()}
-
-Fornisci il tuo ragionamento e la strategia da seguire:"""
+        if run.session is not None:
+            return f"Step {step_info.get('step', '')} - analisi: {description}\n\nFornisci un'analisi dettagliata e identifica i prossimi passi necessari:"
         
+        return self.prompt_template.render("analysis", task=run.current_context.get('original_task', ''),
+                                           description=description, context=self._get_context_summary(run, history))
+    
+    def _execute_reasoning_step(self, run: RunContext, step_info: Dict, history: Optional[List[Dict]] = None) -> str:
+        """Execute a reasoning step."""
         try:
-            result = self.llm.generate(reasoning_prompt)
+            result = self._generate(run, self._build_reasoning_prompt(run, step_info, history))
             return f"Ragionamento: {result}"
         except Exception as e:
             return f"Errore nel ragionamento: {str(e)}"
     
-    def _execute_generic_step(self, step_info: Dict) -> str:
-        """Execute a generic step."""
+    def _build_reasoning_prompt(self, run: RunContext, step_info: Dict, history: Optional[List[Dict]] = None) -> str:
+        """Build the prompt for a reasoning step."""
         description = step_info.get("description", "")
         
-        generic_prompt = f"""
-Esegui il seguente step del piano:
-
-{description}
-
-Contesto:
-{self._get_context_summary()}
-
-Fornisci il risultato dell'esecuzione:"""
+        if run.session is not None:
+            return f"Step {step_info.get('step', '')} - ragionamento: {description}\n\nFornisci il tuo ragionamento e la strategia da seguire:"
         
+        return self.prompt_template.render("reasoning", task=run.current_context.get('original_task', ''),
+                                           description=description, context=self._get_context_summary(run, history))
+    
+    def _execute_generic_step(self, run: RunContext, step_info: Dict, history: Optional[List[Dict]] = None) -> str:
+        """Execute a generic step."""
         try:
-            result = self.llm.generate(generic_prompt)
+            result = self._generate(run, self._build_generic_prompt(run, step_info, history))
             return f"Risultato: {result}"
         except Exception as e:
             return f"Errore nell'esecuzione: {str(e)}"
     
+    def _build_generic_prompt(self, run: RunContext, step_info: Dict, history: Optional[List[Dict]] = None) -> str:
+        """Build the prompt for a generic step."""
+        description = step_info.get("description", "")
+        
+        if run.session is not None:
+            return f"Step {step_info.get('step', '')}: {description}\n\nFornisci il risultato dell'esecuzione:"
+        
+        return self.prompt_template.render("generic", description=description,
+                                           context=self._get_context_summary(run, history))
+    
     def _auto_select_tool(self, description: str) -> Optional[Any]:
         """Automatically select the most appropriate tool."""
         if not self.tools:
             return None
         
         # Simple keyword-based selection
-        description_lower = description.lower()
-        
-        for tool in self.tools:
-            tool_name = tool.__class__.__name__.lower()
-            if "math" in tool_name and any(kw in description_lower for kw in ["calcola", "math", "+", "-", "*", "/"]):
-                return tool
-            elif "search" in tool_name and any(kw in description_lower for kw in ["cerca", "search", "trova"]):
-                return tool
-            elif "file" in tool_name and any(kw in description_lower for kw in ["file", "documento", "leggi"]):
-                return tool
+        selected = self.dispatch_index.first(description)
+        if selected is not None:
+            return selected
         
         # Return first tool as fallback
-        return self.tools[0] if self.tools else None
+        return self.tools[0]
     
-    def _prepare_tool_input(self, tool, step_info: Dict) -> Dict:
+    def _prepare_tool_input(self, run: RunContext, tool, step_info: Dict,
+                            history: Optional[List[Dict]] = None) -> Dict:
         """Prepare input for tool execution."""
+        # Copy of the task and the visible step results, not the whole run context
+        context = run.tool_view(history)
+        
         # Basic input preparation - can be enhanced based on tool requirements
-        return {
+        tool_input = {
             "prompt": step_info.get("description", ""),
-            "context": self.current_context,
+            "context": context,
             "step_info": step_info
         }
-    
-    def _get_context_summary(self) -> str:
-        """Get a summary of the current execution context."""
-        summary_parts = []
         
-        if self.execution_history:
-            summary_parts.append("Esecuzione precedente:")
-            for i, entry in enumerate(self.execution_history[-3:]):  # Last 3 steps
-                step_desc = entry["step"].get("description", "")
-                result = entry["result"][:100] + "..." if len(entry["result"]) > 100 else entry["result"]
-                summary_parts.append(f"  Step {entry['step'].get('step', i+1)}: {step_desc} -> {result}")
-        
-        return "\n".join(summary_parts) if summary_parts else "Nessun contesto precedente"
+        # Structured arguments requested by the model (react mode)
+        arguments = step_info.get("arguments") or {}
+        tool_input.update({key: value for key, value in arguments.items() if key not in ("context", "step_info")})
+        return tool_input
+    
+    def _get_context_summary(self, run: RunContext, history: Optional[List[Dict]] = None) -> str:
+        """Get a summary of the current execution context (or of the given step history)."""
+        if history is not None:
+            return run.execution_history.format_entries(history)
+        # Maintained incrementally as steps are recorded
+        with run.lock:
+            return run.execution_history.summary()
     
-    def _generate_final_summary(self, execution_result: str) -> str:
+    def _generate_final_summary(self, run: RunContext, execution_result: str) -> str:
         """Generate a final summary of the autonomous execution."""
-        summary_prompt = f"""
-Genera un riassunto finale dell'esecuzione autonoma del task:
-
-Task originale: {self.current_context.get('original_task', '')}
-
-Risultati dell'esecuzione:
-{execution_result}
-
-Cronologia completa:
-{self._get_context_summary()}
-
-Fornisci un riassunto conciso e il risultato finale:"""
-        
         try:
-            summary = self.llm.generate(summary_prompt)
+            summary = self._generate(run, self._build_summary_prompt(run, execution_result))
+            return self._format_final_result(run, summary, execution_result)
             
-            final_result = f"""
+        except Exception as e:
+            logger.error(f"❌ Errore nella generazione del riassunto finale: {e}")
+            return f"Task completato con errori nel riassunto: {execution_result}"
+    
+    async def _agenerate_final_summary(self, run: RunContext, execution_result: str) -> str:
+        """Generate a final summary of the autonomous execution asynchronously."""
+        try:
+            summary = await self._agenerate(run, self._build_summary_prompt(run, execution_result))
+            return self._format_final_result(run, summary, execution_result)
+            
+        except Exception as e:
+            logger.error(f"❌ Errore nella generazione del riassunto finale: {e}")
+            return f"Task completato con errori nel riassunto: {execution_result}"
+    
+    def _build_summary_prompt(self, run: RunContext, execution_result: str) -> str:
+        """Build the prompt for the final summary."""
+        if run.session is not None:
+            # Every step result is already in the conversation
+            return "Genera un riassunto finale dell'esecuzione autonoma del task.\n\nFornisci un riassunto conciso e il risultato finale:"
+        
+        # Long executions are trimmed to the context window: history first, then results.
+        # The static prefix goes in front untouched, so its tokens come out of the budget.
+        builder = BudgetedPromptBuilder(self.llm)
+        builder.budget -= self.prompt_template.prefix_tokens
+        builder.add("instructions", "Genera un riassunto finale dell'esecuzione autonoma del task:", required=True)
+        builder.add("task", run.current_context.get('original_task', ''), header="Task originale: ", required=True)
+        builder.add("results", execution_result, priority=1, header="Risultati dell'esecuzione:\n", keep="end")
+        builder.add("history", self._get_context_summary(run), priority=0, header="Cronologia completa:\n")
+        builder.add("request", "Fornisci un riassunto conciso e il risultato finale:", required=True)
+        return self.prompt_template.wrap("summary", builder.build())
+    
+    def _format_final_result(self, run: RunContext, summary: str, execution_result: str) -> str:
+        """Format the final report returned to the caller."""
+        return f"""
 === ESECUZIONE AUTONOMA COMPLETATA ===
 
-Task: {self.current_context.get('original_task', '')}
+Task: {run.current_context.get('original_task', '')}
 Agente: {self.name}
-Step eseguiti: {len(self.execution_history)}
+Step eseguiti: {run.execution_history.total}
 
 {summary}
 
 === DETTAGLI ESECUZIONE ===
 {execution_result}
 """
-            return final_result
-            
-        except Exception as e:
-            logger.error(f"❌ Errore nella generazione del riassunto finale: {e}")
-            return f"Task completato con errori nel riassunto: {execution_result}"
\ No newline at end of file
+    
+    def get_prompt_stats(self) -> Dict[str, Any]:
+        """
+        Get prompt template statistics.
+        
+        Returns:
+            Static prefix length and hash, renders per prompt kind and reusable prefix tokens
+        """
+        return self.prompt_template.get_stats()
+    
+    def get_plan_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get plan cache statistics.
+        
+        Returns:
+            Cache counters, or {"enabled": False} when no cache or template is configured
+        """
+        if self.plan_cache is None:
+            return {"enabled": False}
+        return self.plan_cache.get_stats()
+    
+    async def _agenerate(self, run: RunContext, prompt: str) -> str:
+        """Generate asynchronously, off-loading non-async providers to a thread."""
+        run.count_llm_call()
+        if run.session is not None:
+            return await asyncio.to_thread(run.session.send, prompt)
+        if hasattr(self.llm, 'agenerate'):
+            return await self.llm.agenerate(prompt)
+        return await asyncio.to_thread(self.llm.generate, prompt)
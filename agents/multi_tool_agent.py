@@ -2,10 +2,16 @@
 Multi-Tool Agent implementation for modular-2 framework.
 Advanced agent that can intelligently select and use multiple tools.
 """
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import re
 
+from core.prompt_template import build_agent_template, render_tool_catalog
+from tools.dispatch import CATEGORY_KEYWORDS, DispatchIndex
+from tools.executor import ToolCallResult, get_default_executor
+from tools.router import EmbeddingToolRouter
+
 logger = logging.getLogger(__name__)
 
 class MultiToolAgent:
@@ -23,7 +29,7 @@ class MultiToolAgent:
             llm: LLM provider instance
             tools: List of tool instances
             system_prompt: System prompt for the agent
-            dispatch_strategy: Strategy for tool selection ('keyword', 'llm', 'sequential')
+            dispatch_strategy: Strategy for tool selection ('keyword', 'llm', 'embedding', 'sequential')
             config: Additional configuration
         """
         self.name = name
@@ -36,6 +42,27 @@ class MultiToolAgent:
         # Create tool mapping for easy access
         self.tool_map = {tool.__class__.__name__.lower(): tool for tool in self.tools}
         
+        # Tool names and category keywords compiled once for keyword dispatch
+        self.dispatch_index = DispatchIndex(self.tools, category_keywords=CATEGORY_KEYWORDS, use_should_use=False,
+                                            declared_rules="ignore")
+        
+        # Tool descriptions embedded once for embedding dispatch (config: embedding_router)
+        self.tool_router = None
+        if self.dispatch_strategy == "embedding":
+            self.tool_router = EmbeddingToolRouter.from_config(self.tools, llm, self.config.get("embedding_router"))
+        
+        # System prompt and numbered tool catalog rendered once as the prefix of every prompt,
+        # so answer and LLM tool-selection prompts share it
+        self.prompt_template = build_agent_template(self.name, self.system_prompt, self.tools, {
+            "user": "User: {prompt}",
+            "selection": "Dato il seguente prompt dell'utente, seleziona i tool più appropriati da usare "
+                         "tra quelli elencati sopra.\nRispondi solo con i numeri dei tool separati da virgola "
+                         "(es: 0,2).\n\nPrompt utente: {prompt}\n\nTool selezionati:",
+        }, llm=llm, catalog=render_tool_catalog(self.tools, numbered=True))
+        
+        # Runs the selected tools concurrently (replaced by AgentManager's shared executor)
+        self.tool_executor = get_default_executor()
+        
         logger.info(f"🔧 Multi-tool agente '{self.name}' inizializzato con {len(self.tools)} tool(s)")
         logger.info(f"📋 Tools disponibili: {list(self.tool_map.keys())}")
     
@@ -67,16 +94,39 @@ class MultiToolAgent:
             logger.error(f"❌ Errore nell'esecuzione del multi-tool agente '{self.name}': {e}")
             return f"Errore: {str(e)}"
     
-    def _prepare_prompt(self, user_prompt: str) -> str:
-        """Prepare the full prompt with system prompt and tool information."""
-        tool_info = ""
-        if self.tools:
-            tool_names = [tool.__class__.__name__ for tool in self.tools]
-            tool_info = f"\n\nTools disponibili: {', '.join(tool_names)}"
+    async def arun(self, input_data: Dict[str, Any]) -> str:
+        """
+        Execute the agent asynchronously with intelligent tool selection.
         
-        if self.system_prompt:
-            return f"{self.system_prompt}{tool_info}\n\nUser: {user_prompt}"
-        return f"{tool_info}\n\nUser: {user_prompt}"
+        Args:
+            input_data: Input data containing prompt and other parameters
+            
+        Returns:
+            Agent response as string
+        """
+        try:
+            prompt = input_data.get("prompt", "")
+            full_prompt = self._prepare_prompt(prompt)
+            
+            if self.dispatch_strategy == "llm":
+                selected_tools = await self._aselect_tools_by_llm(prompt)
+            elif self.dispatch_strategy == "embedding":
+                selected_tools = await self._aselect_tools_by_embedding(prompt)
+            else:
+                selected_tools = self._select_tools(prompt)
+            
+            if selected_tools:
+                return await self._arun_with_selected_tools(full_prompt, input_data, selected_tools)
+            else:
+                return await self._arun_simple(full_prompt)
+                
+        except Exception as e:
+            logger.error(f"❌ Errore nell'esecuzione del multi-tool agente '{self.name}': {e}")
+            return f"Errore: {str(e)}"
+    
+    def _prepare_prompt(self, user_prompt: str) -> str:
+        """Prepare the full prompt with system prompt and tool information (the template's static prefix)."""
+        return self.prompt_template.render("user", prompt=user_prompt)
     
     def _select_tools(self, prompt: str) -> List:
         """Select appropriate tools based on the dispatch strategy."""
@@ -84,83 +134,144 @@ class MultiToolAgent:
             return self._select_tools_by_keyword(prompt)
         elif self.dispatch_strategy == "llm":
             return self._select_tools_by_llm(prompt)
+        elif self.dispatch_strategy == "embedding":
+            return self._select_tools_by_embedding(prompt)
         elif self.dispatch_strategy == "sequential":
             return self.tools  # Use all tools in sequence
         else:
             return []
     
     def _select_tools_by_keyword(self, prompt: str) -> List:
-        """Select tools based on keyword matching."""
-        selected = []
-        prompt_lower = prompt.lower()
-        
-        # Define keyword mappings for different tools
-        tool_keywords = {
-            "math": ["calcola", "calculate", "math", "matematica", "+", "-", "*", "/", "=", "numero", "number"],
-            "search": ["cerca", "search", "google", "web", "internet", "trova", "find"],
-            "file": ["file", "documento", "document", "leggi", "read", "carica", "load"],
-            "code": ["codice", "code", "programma", "program", "script", "python", "javascript"]
-        }
-        
-        for tool in self.tools:
-            tool_name = tool.__class__.__name__.lower()
-            
-            # Check direct tool name match
-            if tool_name in prompt_lower:
-                selected.append(tool)
-                continue
-            
-            # Check keyword matches
-            for category, keywords in tool_keywords.items():
-                if category in tool_name:
-                    if any(keyword in prompt_lower for keyword in keywords):
-                        selected.append(tool)
-                        break
+        """Select tools based on keyword matching (tool names and category keywords)."""
+        selected = self.dispatch_index.candidates(prompt)
         
         logger.info(f"🎯 Tools selezionati per '{self.name}': {[t.__class__.__name__ for t in selected]}")
         return selected
     
     def _select_tools_by_llm(self, prompt: str) -> List:
         """Use LLM to select appropriate tools."""
-        if not self.tools:
-            return []
+        return self._llm_selection(prompt)[0]
+    
+    async def _aselect_tools_by_llm(self, prompt: str) -> List:
+        """Use LLM to select appropriate tools asynchronously."""
+        return (await self._allm_selection(prompt))[0]
+    
+    def _llm_selection(self, prompt: str) -> Tuple[List, bool]:
+        """
+        Ask the LLM for the tools, falling back to keyword selection on errors.
         
-        tool_descriptions = []
-        for i, tool in enumerate(self.tools):
-            tool_name = tool.__class__.__name__
-            tool_desc = getattr(tool, 'description', f"Tool for {tool_name}")
-            tool_descriptions.append(f"{i}: {tool_name} - {tool_desc}")
+        Returns:
+            Selected tools, and whether they come from a parsed LLM reply
+        """
+        if not self.tools:
+            return [], False
         
-        selection_prompt = f"""
-Dato il seguente prompt dell'utente, seleziona i tool più appropriati da usare.
-Rispondi solo con i numeri dei tool separati da virgola (es: 0,2).
-
-Prompt utente: {prompt}
-
-Tool disponibili:
-{chr(10).join(tool_descriptions)}
-
-Tool selezionati:"""
+        try:
+            response = self.llm.generate(self._build_selection_prompt(prompt))
+        except Exception as e:
+            logger.warning(f"⚠️ Errore nella selezione LLM, fallback a keyword: {e}")
+            return self._select_tools_by_keyword(prompt), False
+        return self._selection_or_fallback(prompt, response)
+    
+    async def _allm_selection(self, prompt: str) -> Tuple[List, bool]:
+        """Ask the LLM for the tools asynchronously, falling back to keyword selection on errors."""
+        if not self.tools:
+            return [], False
         
         try:
-            response = self.llm.generate(selection_prompt)
-            # Parse the response to get tool indices
-            indices = re.findall(r'\d+', response)
-            selected = []
-            for idx in indices:
-                try:
-                    tool_idx = int(idx)
-                    if 0 <= tool_idx < len(self.tools):
-                        selected.append(self.tools[tool_idx])
-                except ValueError:
-                    continue
-            
-            logger.info(f"🤖 LLM ha selezionato tools per '{self.name}': {[t.__class__.__name__ for t in selected]}")
-            return selected
-            
+            response = await self._agenerate(self._build_selection_prompt(prompt))
         except Exception as e:
             logger.warning(f"⚠️ Errore nella selezione LLM, fallback a keyword: {e}")
-            return self._select_tools_by_keyword(prompt)
+            return self._select_tools_by_keyword(prompt), False
+        return self._selection_or_fallback(prompt, response)
+    
+    def _selection_or_fallback(self, prompt: str, response: str) -> Tuple[List, bool]:
+        """Parse an LLM selection reply; error replies and replies without tool indices fall back to keyword."""
+        selected = self._parse_tool_selection(response)
+        if selected is None:
+            logger.warning(f"⚠️ Risposta di selezione LLM non valida, fallback a keyword: {response[:80]!r}")
+            return self._select_tools_by_keyword(prompt), False
+        return selected, True
+    
+    def _select_tools_by_embedding(self, prompt: str) -> List:
+        """Route by embedding similarity, falling back to LLM selection below the confidence threshold."""
+        if self.tool_router is None:
+            return self._select_tools_by_llm(prompt)
+        
+        selected = self.tool_router.cached(prompt)
+        if selected is None:
+            selected = self._route_by_embedding(prompt)
+            reliable = selected is not None
+            if not reliable:
+                selected, reliable = self._llm_selection(prompt)
+            # Fallback selections (errors, unparsable replies) are not cached
+            if reliable:
+                self.tool_router.remember(prompt, selected)
+        return selected
+    
+    async def _aselect_tools_by_embedding(self, prompt: str) -> List:
+        """Route by embedding similarity asynchronously, falling back to LLM selection."""
+        if self.tool_router is None:
+            return await self._aselect_tools_by_llm(prompt)
+        
+        selected = self.tool_router.cached(prompt)
+        if selected is None:
+            selected = await asyncio.to_thread(self._route_by_embedding, prompt)
+            reliable = selected is not None
+            if not reliable:
+                selected, reliable = await self._allm_selection(prompt)
+            if reliable:
+                self.tool_router.remember(prompt, selected)
+        return selected
+    
+    def _route_by_embedding(self, prompt: str) -> Optional[List]:
+        """Ask the router, treating embedding errors as a low-confidence result."""
+        try:
+            return self.tool_router.route(prompt)
+        except Exception as e:
+            logger.warning(f"⚠️ Errore nel routing per embedding, fallback a LLM: {e}")
+            return None
+    
+    def get_dispatch_stats(self) -> Dict[str, Any]:
+        """
+        Get embedding router statistics.
+        
+        Returns:
+            Routing counters, or {"enabled": False} without an embedding router
+        """
+        if self.tool_router is None:
+            return {"enabled": False}
+        return self.tool_router.get_stats()
+    
+    def get_prompt_stats(self) -> Dict[str, Any]:
+        """
+        Get prompt template statistics.
+        
+        Returns:
+            Static prefix length and hash, renders per prompt kind and reusable prefix tokens
+        """
+        return self.prompt_template.get_stats()
+    
+    def _build_selection_prompt(self, prompt: str) -> str:
+        """Build the prompt asking the LLM to pick tool indices (the catalog is in the prefix)."""
+        return self.prompt_template.render("selection", prompt=prompt)
+    
+    def _parse_tool_selection(self, response: str) -> Optional[List]:
+        """Parse the tool indices chosen by the LLM (None for error replies and replies without indices)."""
+        indices = re.findall(r'\d+', response or "")
+        if not indices or response.lstrip().startswith("Errore"):
+            return None
+        selected = []
+        for idx in indices:
+            try:
+                tool_idx = int(idx)
+                if 0 <= tool_idx < len(self.tools):
+                    selected.append(self.tools[tool_idx])
+            except ValueError:
+                continue
+        
+        logger.info(f"🤖 LLM ha selezionato tools per '{self.name}': {[t.__class__.__name__ for t in selected]}")
+        return selected
     
     def _run_simple(self, prompt: str) -> str:
         """Run agent without tools."""
@@ -178,27 +289,60 @@ Tool selezionati:"""
             # Get initial LLM response
             llm_response = self.llm.generate(prompt)
             
-            # Execute selected tools
-            tool_results = []
-            for tool in selected_tools:
-                try:
-                    tool_result = tool.run(input_data)
-                    tool_name = tool.__class__.__name__
-                    tool_results.append(f"{tool_name}: {tool_result}")
-                    logger.info(f"🔧 Tool '{tool_name}' eseguito con successo")
-                except Exception as e:
-                    logger.warning(f"⚠️ Errore nell'esecuzione del tool {tool.__class__.__name__}: {e}")
-                    tool_results.append(f"{tool.__class__.__name__}: Errore - {str(e)}")
+            # Execute selected tools concurrently
+            calls = self.tool_executor.run_tools(selected_tools, input_data)
+            tool_results = [self._format_tool_result(call) for call in calls]
             
-            # Combine LLM response with tool results
-            if tool_results:
-                final_response = f"{llm_response}\n\n--- Tool Results ---\n" + "\n".join(tool_results)
-            else:
-                final_response = llm_response
+            return self._combine_tool_results(llm_response, tool_results)
+            
+        except Exception as e:
+            logger.error(f"❌ Errore nell'esecuzione multi-tool per '{self.name}': {e}")
+            return f"Errore multi-tool: {str(e)}"
+    
+    async def _arun_with_selected_tools(self, prompt: str, input_data: Dict, selected_tools: List) -> str:
+        """Run agent with selected tools asynchronously."""
+        try:
+            llm_response = await self._agenerate(prompt)
+            
+            calls = await self.tool_executor.arun_tools(selected_tools, input_data)
+            tool_results = [self._format_tool_result(call) for call in calls]
             
-            logger.info(f"🧠 Risposta multi-tool generata da '{self.name}'")
-            return final_response
+            return self._combine_tool_results(llm_response, tool_results)
             
         except Exception as e:
             logger.error(f"❌ Errore nell'esecuzione multi-tool per '{self.name}': {e}")
-            return f"Errore multi-tool: {str(e)}"
\ No newline at end of file
+            return f"Errore multi-tool: {str(e)}"
+    
+    def _format_tool_result(self, call: ToolCallResult) -> str:
+        """Format the result line of a tool run."""
+        if call.ok:
+            logger.info(f"🔧 Tool '{call.tool_name}' eseguito con successo")
+            return f"{call.tool_name}: {call.output}"
+        logger.warning(f"⚠️ Errore nell'esecuzione del tool {call.tool_name}: {call.error}")
+        return f"{call.tool_name}: Errore - {call.error}"
+    
+    def _combine_tool_results(self, llm_response: str, tool_results: List[str]) -> str:
+        """Combine LLM response with tool results."""
+        if tool_results:
+            final_response = f"{llm_response}\n\n--- Tool Results ---\n" + "\n".join(tool_results)
+        else:
+            final_response = llm_response
+        
+        logger.info(f"🧠 Risposta multi-tool generata da '{self.name}'")
+        return final_response
+    
+    async def _arun_simple(self, prompt: str) -> str:
+        """Run agent without tools asynchronously."""
+        try:
+            response = await self._agenerate(prompt)
+            logger.info(f"🧠 Risposta semplice generata da '{self.name}'")
+            return response
+        except Exception as e:
+            logger.error(f"❌ Errore LLM per agente '{self.name}': {e}")
+            return f"Errore LLM: {str(e)}"
+    
+    async def _agenerate(self, prompt: str) -> str:
+        """Generate asynchronously, off-loading non-async providers to a thread."""
+        if hasattr(self.llm, 'agenerate'):
+            return await self.llm.agenerate(prompt)
+        return await asyncio.to_thread(self.llm.generate, prompt)
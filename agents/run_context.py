@@ -0,0 +1,321 @@
+"""
+Per-run state for modular-2 agents.
+Everything a single agent invocation mutates lives here instead of on the
+agent, so one agent instance can serve concurrent runs.
+"""
+import logging
+import sys
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from llm_providers.tokens import TokenEstimator
+
+logger = logging.getLogger(__name__)
+
+# Marker appended to clipped results
+CLIP_MARKER = "..."
+
+
+def clip_tokens(text: str, max_tokens: int, count: Callable[[str], int]) -> str:
+    """
+    Shorten a text to an estimated token count.
+
+    Args:
+        text: Text to shorten
+        max_tokens: Token limit
+        count: Token estimator
+
+    Returns:
+        The text itself when it fits, otherwise its longest fitting start followed by CLIP_MARKER
+    """
+    if count(text) <= max_tokens:
+        return text
+    # Tokens are rarely longer than a few characters: bound the search instead of estimating the whole text
+    low, high = 0, min(len(text), max(max_tokens, 0) * 8)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low].rstrip() + CLIP_MARKER
+
+
+class ExecutionHistory:
+    """
+    Bounded step history of a run with an incrementally maintained summary.
+
+    Entries live in a ring buffer of `max_entries`, so memory does not grow
+    with the number of steps. Each step's summary line is formatted once,
+    when the step is recorded, with its result clipped to `result_tokens`.
+    The last `window` lines form the recent part of the summary; lines
+    leaving the window are reduced to the step description and kept in an
+    "earlier steps" part bounded by `summary_tokens`, oldest dropped first.
+    """
+
+    # Keys of the `execution_history` config block
+    CONFIG_KEYS = ("max_entries", "window", "result_tokens", "summary_tokens")
+
+    def __init__(self, max_entries: int = 20, window: int = 3, result_tokens: int = 25,
+                 summary_tokens: int = 120, count: Optional[Callable[[str], int]] = None):
+        """
+        Initialize the history.
+
+        Args:
+            max_entries: Steps kept in full (results included)
+            window: Most recent steps shown with their result in the summary
+            result_tokens: Token limit of a result (and description) in the summary
+            summary_tokens: Token limit of the earlier-steps part of the summary (0 disables it)
+            count: Token estimator (default: an uncalibrated estimator, so the same run
+                always produces the same summaries and prompts)
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.window = max(1, int(window))
+        self.result_tokens = result_tokens
+        self.summary_tokens = summary_tokens
+        self._count = count or TokenEstimator("history").estimate
+
+        self._entries = deque(maxlen=self.max_entries)
+        self._recent = deque()
+        self._earlier = deque()
+        self._earlier_tokens = 0
+        self._earlier_dropped = 0
+        self._summary: Optional[str] = None
+        self._result_chars = 0
+        self.total = 0
+        self.evicted = 0
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]] = None) -> "ExecutionHistory":
+        """
+        Build a history from an agent's `execution_history` config block.
+
+        Args:
+            config: max_entries, window, result_tokens, summary_tokens (other keys are ignored)
+
+        Returns:
+            Empty history
+        """
+        config = config or {}
+        unknown = sorted(str(key) for key in config if key not in cls.CONFIG_KEYS)
+        if unknown:
+            logger.warning(f"⚠️ Chiavi sconosciute in execution_history ignorate: {', '.join(unknown)}")
+        return cls(
+            max_entries=config.get("max_entries", 20),
+            window=config.get("window", 3),
+            result_tokens=config.get("result_tokens", 25),
+            summary_tokens=config.get("summary_tokens", 120),
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(list(self._entries))
+
+    def __getitem__(self, index):
+        return list(self._entries)[index]
+
+    def recent(self, count: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Most recent entries.
+
+        Args:
+            count: Number of entries (default `window`)
+
+        Returns:
+            Entries, oldest first
+        """
+        count = self.window if count is None else count
+        return list(self._entries)[-count:] if count > 0 else []
+
+    def append(self, step_info: Dict[str, Any], result: str) -> Optional[Dict[str, Any]]:
+        """
+        Record a step and update the summary.
+
+        Args:
+            step_info: Plan step
+            result: Step result
+
+        Returns:
+            The entry pushed out of the ring buffer, if any
+        """
+        evicted = self._entries[0] if len(self._entries) == self._entries.maxlen else None
+        entry = {"step": step_info, "result": result, "timestamp": "now"}
+        self._entries.append(entry)
+        self.total += 1
+        self._result_chars += len(result)
+        if evicted is not None:
+            self.evicted += 1
+            self._result_chars -= len(evicted["result"])
+
+        self._recent.append(self._format_line(entry, self.total))
+        if len(self._recent) > self.window:
+            self._recent.popleft()
+            self._push_earlier(self._entries[-self.window - 1] if len(self._entries) > self.window else None)
+        self._summary = None
+        return evicted
+
+    def _push_earlier(self, entry: Optional[Dict[str, Any]]):
+        """Move the step leaving the window to the earlier-steps part, within its token limit."""
+        if self.summary_tokens <= 0:
+            return
+        if entry is None:
+            # Already out of the ring buffer: only its position is known
+            self._earlier_dropped += 1
+            return
+        step = entry["step"]
+        description = clip_tokens(step.get("description", ""), self.result_tokens, self._count)
+        line = f"  Step {step.get('step', '')}: {description}"
+        tokens = self._count(line)
+        self._earlier.append((line, tokens))
+        self._earlier_tokens += tokens
+        while self._earlier and self._earlier_tokens > self.summary_tokens:
+            _, dropped = self._earlier.popleft()
+            self._earlier_tokens -= dropped
+            self._earlier_dropped += 1
+
+    def _format_line(self, entry: Dict[str, Any], position: int) -> str:
+        """Summary line of a step, with description and result clipped to `result_tokens`."""
+        step = entry["step"]
+        description = clip_tokens(step.get("description", ""), self.result_tokens, self._count)
+        result = clip_tokens(entry["result"], self.result_tokens, self._count)
+        return f"  Step {step.get('step', position)}: {description} -> {result}"
+
+    def summary(self) -> str:
+        """
+        Summary of the run so far, rebuilt only after a new step.
+
+        Returns:
+            Earlier steps (descriptions) and the recent window (with results),
+            or "Nessun contesto precedente" before the first step
+        """
+        if self._summary is None:
+            parts = []
+            if self._earlier or self._earlier_dropped:
+                parts.append("Step precedenti:")
+                if self._earlier_dropped:
+                    parts.append(f"  [{self._earlier_dropped} step più vecchi omessi]")
+                parts.extend(line for line, _ in self._earlier)
+            if self._recent:
+                parts.append("Esecuzione precedente:")
+                parts.extend(self._recent)
+            self._summary = "\n".join(parts) if parts else "Nessun contesto precedente"
+        return self._summary
+
+    def format_entries(self, entries: List[Dict[str, Any]]) -> str:
+        """
+        Summary of a given list of entries (e.g. the dependencies of a step).
+
+        Args:
+            entries: History entries
+
+        Returns:
+            The last `window` entries with clipped results, or "Nessun contesto precedente"
+        """
+        if not entries:
+            return "Nessun contesto precedente"
+        lines = [self._format_line(entry, i + 1) for i, entry in enumerate(entries[-self.window:])]
+        return "\n".join(["Esecuzione precedente:"] + lines)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get memory counters.
+
+        Returns:
+            Steps recorded, buffered and evicted, characters of buffered results
+            and estimated tokens of the current summary
+        """
+        return {
+            "steps": self.total,
+            "buffered": len(self._entries),
+            "evicted": self.evicted,
+            "result_chars": self._result_chars,
+            "summary_tokens": self._count(self.summary()),
+        }
+
+
+class RunContext:
+    """
+    State of one agent invocation, passed through the agent's call chain.
+    """
+
+    def __init__(self, task: str = "", input_data: Optional[Dict[str, Any]] = None, session: Any = None,
+                 history: Optional[ExecutionHistory] = None):
+        """
+        Initialize the run context.
+
+        Args:
+            task: Task or prompt of the run
+            input_data: Input the agent was called with
+            session: Conversation used for the run's LLM calls (None for stateless calls)
+            history: Step history (default: ExecutionHistory with default limits)
+        """
+        self.task = task
+        self.input_data = input_data or {}
+        self.session = session
+        self.execution_history = history if history is not None else ExecutionHistory()
+        self.current_context: Dict[str, Any] = {"original_task": task}
+        self.llm_calls = 0
+        # Guards the fields above when steps of the same run execute concurrently
+        self.lock = threading.Lock()
+
+    def count_llm_call(self):
+        """Count one LLM round trip of the run."""
+        with self.lock:
+            self.llm_calls += 1
+
+    def record(self, step_info: Dict[str, Any], result: str):
+        """
+        Record a step result in the history and the context.
+
+        Results of steps pushed out of the history are removed from the context too.
+
+        Args:
+            step_info: Plan step
+            result: Step result
+        """
+        with self.lock:
+            self.current_context[f"step_{step_info['step']}_result"] = result
+            evicted = self.execution_history.append(step_info, result)
+            if evicted is not None:
+                key = f"step_{evicted['step'].get('step')}_result"
+                if self.current_context.get(key) is evicted["result"]:
+                    del self.current_context[key]
+
+    def tool_view(self, history: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Context handed to a tool.
+
+        A fresh plain dict (picklable, for tools run in worker processes):
+        changes made by the tool never reach the run's context.
+
+        Args:
+            history: Entries the step may see (default: the most recent steps)
+
+        Returns:
+            Dict with the original task and the `step_N_result` of the visible steps
+        """
+        with self.lock:
+            entries = self.execution_history.recent() if history is None else history
+            view = {"original_task": self.task}
+            for entry in entries:
+                view[f"step_{entry['step'].get('step')}_result"] = entry["result"]
+        return view
+
+    def get_memory_stats(self) -> Dict[str, Any]:
+        """
+        Get the memory held by the run.
+
+        Returns:
+            History counters plus context keys and approximate bytes of the
+            context strings and buffered results
+        """
+        with self.lock:
+            stats = self.execution_history.get_stats()
+            strings = [value for value in self.current_context.values() if isinstance(value, str)]
+            strings.extend(entry["result"] for entry in self.execution_history)
+            stats["context_keys"] = len(self.current_context)
+            stats["approx_bytes"] = sum(sys.getsizeof(value) for value in strings)
+        return stats
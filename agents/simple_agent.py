@@ -2,11 +2,22 @@
 Simple Agent implementation for modular-2 framework.
 Handles basic LLM interactions with optional tools.
 """
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Iterator, Optional
+
+from core.prompt_budget import BudgetedPromptBuilder
+from llm_providers.conversation import ConversationSession, supports_continuation
+from tools.dispatch import DispatchIndex, compile_keywords
+from tools.executor import get_default_executor
 
 logger = logging.getLogger(__name__)
 
+# Prompt hints that the response may call for a tool
+_TOOL_HINTS = compile_keywords(["calcola", "calculate", "math", "matematica", "+", "-", "*", "/", "="])
+
 class SimpleAgent:
     """
     Simple agent that can interact with LLM and use tools.
@@ -29,6 +40,20 @@ class SimpleAgent:
         self.system_prompt = system_prompt
         self.config = config or {}
         
+        # Multi-turn sessions, keyed by the caller's session_id
+        self.conversation_mode = self.config.get("conversation_mode", "chat")
+        # Previous exchanges sent with a chat turn (None: trimmed only to the model's context)
+        self.conversation_max_turns = self.config.get("conversation_max_turns")
+        self.max_sessions = self.config.get("max_sessions", 32)
+        self._sessions = OrderedDict()
+        self._sessions_lock = threading.Lock()
+        
+        # Runs the selected tools concurrently (replaced by AgentManager's shared executor)
+        self.tool_executor = get_default_executor()
+        
+        # should_use() rules of the tools, compiled once
+        self.dispatch_index = DispatchIndex([tool for tool in self.tools if callable(getattr(tool, 'should_use', None))])
+        
         logger.info(f"🤖 Agente '{self.name}' inizializzato con {len(self.tools)} tool(s)")
     
     def run(self, input_data: Dict[str, Any]) -> str:
@@ -44,8 +69,13 @@ class SimpleAgent:
         try:
             prompt = input_data.get("prompt", "")
             
+            # Continue an existing conversation by sending only the new turn
+            session = self._get_session(input_data)
+            if session is not None:
+                return self._run_in_session(session, prompt, input_data)
+            
             # Prepare the full prompt with system prompt
-            full_prompt = self._prepare_prompt(prompt)
+            full_prompt = self._prepare_prompt(prompt, input_data)
             
             # Check if we need to use tools
             if self.tools and self._should_use_tools(prompt):
@@ -57,17 +87,166 @@ class SimpleAgent:
             logger.error(f"❌ Errore nell'esecuzione dell'agente '{self.name}': {e}")
             return f"Errore: {str(e)}"
     
-    def _prepare_prompt(self, user_prompt: str) -> str:
-        """Prepare the full prompt with system prompt."""
-        if self.system_prompt:
-            return f"{self.system_prompt}\n\nUser: {user_prompt}"
-        return user_prompt
+    async def arun(self, input_data: Dict[str, Any]) -> str:
+        """
+        Execute the agent asynchronously.
+        
+        Args:
+            input_data: Input data containing prompt and other parameters
+            
+        Returns:
+            Agent response as string
+        """
+        try:
+            prompt = input_data.get("prompt", "")
+            
+            session = self._get_session(input_data)
+            if session is not None:
+                return await asyncio.to_thread(self._run_in_session, session, prompt, input_data)
+            
+            full_prompt = self._prepare_prompt(prompt, input_data)
+            
+            if self.tools and self._should_use_tools(prompt):
+                return await self._arun_with_tools(full_prompt, input_data)
+            else:
+                return await self._arun_simple(full_prompt)
+                
+        except Exception as e:
+            logger.error(f"❌ Errore nell'esecuzione dell'agente '{self.name}': {e}")
+            return f"Errore: {str(e)}"
+    
+    def run_stream(self, input_data: Dict[str, Any]) -> Iterator[str]:
+        """
+        Execute the agent, yielding the response incrementally.
+        
+        Args:
+            input_data: Input data containing prompt and other parameters
+            
+        Yields:
+            Response fragments, in order
+        """
+        try:
+            prompt = input_data.get("prompt", "")
+            
+            session = self._get_session(input_data)
+            if session is not None:
+                yield from self._run_in_session_stream(session, prompt, input_data)
+                return
+            
+            # Prepare the full prompt with system prompt
+            full_prompt = self._prepare_prompt(prompt, input_data)
+            
+            # Check if we need to use tools
+            if self.tools and self._should_use_tools(prompt):
+                yield from self._run_with_tools_stream(full_prompt, input_data)
+            else:
+                yield from self._stream_llm(full_prompt)
+                logger.info(f"🧠 Risposta in streaming generata da '{self.name}'")
+                
+        except Exception as e:
+            logger.error(f"❌ Errore nell'esecuzione streaming dell'agente '{self.name}': {e}")
+            yield f"Errore: {str(e)}"
+    
+    def _prepare_prompt(self, user_prompt: str, input_data: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Prepare the full prompt with system prompt.
+        
+        Optional 'documents' and 'history' inputs are included too. Sections are
+        trimmed to fit the model's context window: history first, then documents,
+        and the user prompt only as a last resort.
+        """
+        input_data = input_data or {}
+        history = input_data.get("history", "")
+        if isinstance(history, list):
+            history = "\n".join(str(turn) for turn in history)
+        
+        builder = BudgetedPromptBuilder(self.llm)
+        builder.add("system", self.system_prompt, priority=3, required=True)
+        builder.add("history", history, priority=0, header="Conversazione precedente:\n", keep="end")
+        builder.add("documents", input_data.get("documents", ""), priority=1, header="Documenti:\n")
+        builder.add("user", user_prompt, priority=2, header="User: " if self.system_prompt else "")
+        return builder.build()
+    
+    def _get_session(self, input_data: Dict[str, Any]) -> Optional[ConversationSession]:
+        """
+        Get the conversation session for the input's session_id.
+        
+        Returns None when the input has no session_id or the LLM cannot continue
+        conversations, in which case the full prompt is sent as before.
+        """
+        session_id = input_data.get("session_id")
+        if session_id is None or not supports_continuation(self.llm):
+            return None
+        
+        with self._sessions_lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = ConversationSession(self.llm, self.system_prompt, mode=self.conversation_mode,
+                                              max_turns=self.conversation_max_turns)
+                self._sessions[session_id] = session
+                logger.debug(f"💬 Nuova sessione '{session_id}' per l'agente '{self.name}'")
+            self._sessions.move_to_end(session_id)
+            
+            # Drop the least recently used sessions
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+    
+    def end_session(self, session_id: str):
+        """
+        Forget a conversation session.
+        
+        Args:
+            session_id: Session identifier passed in input_data
+        """
+        with self._sessions_lock:
+            self._sessions.pop(session_id, None)
+    
+    def _run_in_session(self, session: ConversationSession, prompt: str, input_data: Dict) -> str:
+        """Run a conversation turn, feeding tool results back as observations."""
+        response = session.send(prompt)
+        
+        if self.tools and self._should_use_tools(prompt):
+            for tool_result in self._run_tools(self._select_tools(response), input_data):
+                session.add_observation(f"Tool result: {tool_result}")
+                response += f"\n\nTool result: {tool_result}"
+        
+        logger.info(f"🧠 Risposta di sessione generata da '{self.name}'")
+        return response
+    
+    def _run_in_session_stream(self, session: ConversationSession, prompt: str, input_data: Dict) -> Iterator[str]:
+        """Stream a conversation turn, then append tool results."""
+        chunks = []
+        for chunk in session.send_stream(prompt):
+            chunks.append(chunk)
+            yield chunk
+        response = "".join(chunks)
+        
+        if self.tools and self._should_use_tools(prompt):
+            for tool_result in self._run_tools(self._select_tools(response), input_data):
+                session.add_observation(f"Tool result: {tool_result}")
+                yield f"\n\nTool result: {tool_result}"
+        
+        logger.info(f"🧠 Risposta di sessione in streaming generata da '{self.name}'")
     
     def _should_use_tools(self, prompt: str) -> bool:
         """Determine if tools should be used based on the prompt."""
         # Simple heuristic - check for math operations, calculations, etc.
-        tool_keywords = ["calcola", "calculate", "math", "matematica", "+", "-", "*", "/", "="]
-        return any(keyword in prompt.lower() for keyword in tool_keywords)
+        return bool(_TOOL_HINTS.search(prompt.lower()))
+    
+    def _select_tools(self, response: str) -> List:
+        """Tools whose should_use() accepts the LLM response."""
+        return self.dispatch_index.candidates(response)
+    
+    def _run_tools(self, tools: List, input_data: Dict) -> List[str]:
+        """Run tools concurrently, returning one result text per tool (errors and timeouts included)."""
+        calls = self.tool_executor.run_tools(tools, input_data)
+        return [call.output if call.ok else f"Errore - {call.error}" for call in calls]
+    
+    async def _arun_tools(self, tools: List, input_data: Dict) -> List[str]:
+        """Run tools concurrently from async code."""
+        calls = await self.tool_executor.arun_tools(tools, input_data)
+        return [call.output if call.ok else f"Errore - {call.error}" for call in calls]
     
     def _run_simple(self, prompt: str) -> str:
         """Run agent without tools."""
@@ -85,15 +264,64 @@ class SimpleAgent:
             # First, get LLM response
             llm_response = self.llm.generate(prompt)
             
-            # Check if we need to use any tools
-            for tool in self.tools:
-                if hasattr(tool, 'should_use') and tool.should_use(llm_response):
-                    tool_result = tool.run(input_data)
-                    llm_response += f"\n\nTool result: {tool_result}"
+            # Run the tools the response calls for, concurrently
+            for tool_result in self._run_tools(self._select_tools(llm_response), input_data):
+                llm_response += f"\n\nTool result: {tool_result}"
+            
+            logger.info(f"🧠 Risposta con tools generata da '{self.name}'")
+            return llm_response
+            
+        except Exception as e:
+            logger.error(f"❌ Errore nell'esecuzione con tools per '{self.name}': {e}")
+            return f"Errore con tools: {str(e)}"
+    
+    async def _agenerate(self, prompt: str) -> str:
+        """Generate asynchronously, off-loading non-async providers to a thread."""
+        if hasattr(self.llm, 'agenerate'):
+            return await self.llm.agenerate(prompt)
+        return await asyncio.to_thread(self.llm.generate, prompt)
+    
+    async def _arun_simple(self, prompt: str) -> str:
+        """Run agent without tools asynchronously."""
+        try:
+            response = await self._agenerate(prompt)
+            logger.info(f"🧠 Risposta generata da '{self.name}'")
+            return response
+        except Exception as e:
+            logger.error(f"❌ Errore LLM per agente '{self.name}': {e}")
+            return f"Errore LLM: {str(e)}"
+    
+    async def _arun_with_tools(self, prompt: str, input_data: Dict) -> str:
+        """Run agent with tools available asynchronously."""
+        try:
+            llm_response = await self._agenerate(prompt)
+            
+            for tool_result in await self._arun_tools(self._select_tools(llm_response), input_data):
+                llm_response += f"\n\nTool result: {tool_result}"
             
             logger.info(f"🧠 Risposta con tools generata da '{self.name}'")
             return llm_response
             
         except Exception as e:
             logger.error(f"❌ Errore nell'esecuzione con tools per '{self.name}': {e}")
-            return f"Errore con tools: {str(e)}"
\ No newline at end of file
+            return f"Errore con tools: {str(e)}"
+    
+    def _stream_llm(self, prompt: str) -> Iterator[str]:
+        """Stream from the LLM, falling back to a single chunk for non-streaming providers."""
+        if hasattr(self.llm, 'generate_stream'):
+            yield from self.llm.generate_stream(prompt)
+        else:
+            yield self.llm.generate(prompt)
+    
+    def _run_with_tools_stream(self, prompt: str, input_data: Dict) -> Iterator[str]:
+        """Stream the LLM response, then append tool results."""
+        chunks = []
+        for chunk in self._stream_llm(prompt):
+            chunks.append(chunk)
+            yield chunk
+        llm_response = "".join(chunks)
+        
+        for tool_result in self._run_tools(self._select_tools(llm_response), input_data):
+            yield f"\n\nTool result: {tool_result}"
+        
+        logger.info(f"🧠 Risposta con tools in streaming generata da '{self.name}'")
@@ -2,11 +2,27 @@
 Tool Agent implementation for modular-2 framework.
 Agent specialized in using tools effectively.
 """
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional
+
+from core.prompt_template import build_agent_template, render_tool_catalog
+from tools.dispatch import DispatchIndex
+from tools.executor import ToolCallResult, get_default_executor
 
 logger = logging.getLogger(__name__)
 
+# Category keywords for tools without should_use() (only the first category in the tool name counts)
+TOOL_KEYWORDS = {
+    "math": ["calcola", "calculate", "math", "matematica", "+", "-", "*", "/", "="],
+    "search": ["cerca", "search", "google", "web", "internet"],
+    "file": ["file", "documento", "leggi", "carica"],
+    "code": ["codice", "programma", "script", "python"]
+}
+
 class ToolAgent:
     """
     Agent specialized in using tools to accomplish tasks.
@@ -33,6 +49,31 @@ class ToolAgent:
         # Create tool mapping for easy access
         self.tool_map = {tool.__class__.__name__.lower(): tool for tool in self.tools}
         
+        # Tool keywords and should_use() checks compiled once
+        self.dispatch_index = DispatchIndex(self.tools, category_keywords=TOOL_KEYWORDS, first_category_only=True)
+        
+        # System prompt and tool catalog rendered once as the prefix of every prompt
+        catalog = render_tool_catalog(self.tools)
+        if catalog:
+            catalog += "\n\nUsa i tool quando necessario per fornire risposte accurate."
+        self.prompt_template = build_agent_template(self.name, self.system_prompt, self.tools, {
+            "user": "User: {prompt}",
+            "final": "Prompt originale: {prompt}\n{reasoning_block}\nRisultati dei tool:\n{tool_results}\n\n"
+                     "Fornisci una risposta finale completa e utile basata sui risultati dei tool:",
+        }, llm=llm, default_system_prompt="Sei un assistente che può usare vari tool per aiutare l'utente.",
+            catalog=catalog)
+        
+        # Skip the reasoning call and answer from the tool results only (config: low_latency)
+        self.low_latency = self.config.get("low_latency", False)
+        
+        # Runs the selected tools concurrently (replaced by AgentManager's shared executor)
+        self.tool_executor = get_default_executor()
+        
+        # Reasoning calls overlapping the tool runs, on threads kept across requests (config: reasoning_workers)
+        self.reasoning_workers = max(1, int(self.config.get("reasoning_workers", 4)))
+        self._reasoning_pool = None
+        self._pool_lock = threading.Lock()
+        
         logger.info(f"🔧 Tool agente '{self.name}' inizializzato con {len(self.tools)} tool(s)")
     
     def run(self, input_data: Dict[str, Any]) -> str:
@@ -63,104 +104,82 @@ class ToolAgent:
             logger.error(f"❌ Errore nell'esecuzione del tool agente '{self.name}': {e}")
             return f"Errore: {str(e)}"
     
-    def _prepare_tool_prompt(self, user_prompt: str) -> str:
-        """Prepare prompt with detailed tool information."""
-        tool_descriptions = []
+    async def arun(self, input_data: Dict[str, Any]) -> str:
+        """
+        Execute the agent asynchronously with focus on tool usage.
         
-        for tool in self.tools:
-            tool_name = tool.__class__.__name__
-            tool_desc = getattr(tool, 'description', f"Tool: {tool_name}")
-            tool_descriptions.append(f"- {tool_name}: {tool_desc}")
+        Args:
+            input_data: Input data containing prompt and other parameters
+            
+        Returns:
+            Agent response as string
+        """
+        try:
+            prompt = input_data.get("prompt", "")
+            full_prompt = self._prepare_tool_prompt(prompt)
+            tools_to_use = self._analyze_tool_needs(prompt)
+            
+            if tools_to_use:
+                return await self._aexecute_with_tools(full_prompt, input_data, tools_to_use)
+            else:
+                return await self._aexecute_without_tools(full_prompt)
+                
+        except Exception as e:
+            logger.error(f"❌ Errore nell'esecuzione del tool agente '{self.name}': {e}")
+            return f"Errore: {str(e)}"
+    
+    def run_stream(self, input_data: Dict[str, Any]) -> Iterator[str]:
+        """
+        Execute the agent, streaming the final response incrementally.
         
-        tool_info = ""
-        if tool_descriptions:
-            tool_info = f"\n\nTool disponibili:\n" + "\n".join(tool_descriptions)
-            tool_info += "\n\nUsa i tool quando necessario per fornire risposte accurate."
+        Tool runs and the reasoning call complete before streaming starts;
+        only the final answer is streamed.
         
-        if self.system_prompt:
-            return f"{self.system_prompt}{tool_info}\n\nUser: {user_prompt}"
-        return f"Sei un assistente che può usare vari tool per aiutare l'utente.{tool_info}\n\nUser: {user_prompt}"
+        Args:
+            input_data: Input data containing prompt and other parameters
+            
+        Yields:
+            Response fragments, in order
+        """
+        try:
+            prompt = input_data.get("prompt", "")
+            full_prompt = self._prepare_tool_prompt(prompt)
+            tools_to_use = self._analyze_tool_needs(prompt)
+            
+            if tools_to_use:
+                yield from self._execute_with_tools_stream(full_prompt, input_data, tools_to_use)
+            else:
+                yield from self._stream_llm(full_prompt)
+                logger.info(f"🧠 Risposta senza tool in streaming generata da '{self.name}'")
+                
+        except Exception as e:
+            logger.error(f"❌ Errore nell'esecuzione streaming del tool agente '{self.name}': {e}")
+            yield f"Errore: {str(e)}"
+    
+    def _prepare_tool_prompt(self, user_prompt: str) -> str:
+        """Prepare prompt with detailed tool information (the template's static prefix)."""
+        return self.prompt_template.render("user", prompt=user_prompt)
     
     def _analyze_tool_needs(self, prompt: str) -> List:
         """Analyze which tools are needed for the given prompt."""
-        needed_tools = []
-        prompt_lower = prompt.lower()
-        
-        for tool in self.tools:
-            # Check if tool has a should_use method
-            if hasattr(tool, 'should_use') and callable(tool.should_use):
-                try:
-                    if tool.should_use(prompt):
-                        needed_tools.append(tool)
-                        logger.debug(f"🎯 Tool '{tool.__class__.__name__}' selezionato per il prompt")
-                except Exception as e:
-                    logger.warning(f"⚠️ Errore nel controllo should_use per {tool.__class__.__name__}: {e}")
-            else:
-                # Fallback to simple keyword matching
-                tool_name = tool.__class__.__name__.lower()
-                if tool_name in prompt_lower or self._has_tool_keywords(prompt_lower, tool_name):
-                    needed_tools.append(tool)
+        # Tools' own rules (should_use), else their name and category keywords
+        needed_tools = self.dispatch_index.candidates(prompt)
         
         logger.info(f"🔧 Tool necessari per '{self.name}': {[t.__class__.__name__ for t in needed_tools]}")
         return needed_tools
     
-    def _has_tool_keywords(self, prompt: str, tool_name: str) -> bool:
-        """Check if prompt contains keywords related to the tool."""
-        keyword_map = {
-            "math": ["calcola", "calculate", "math", "matematica", "+", "-", "*", "/", "="],
-            "search": ["cerca", "search", "google", "web", "internet"],
-            "file": ["file", "documento", "leggi", "carica"],
-            "code": ["codice", "programma", "script", "python"]
-        }
-        
-        for category, keywords in keyword_map.items():
-            if category in tool_name:
-                return any(keyword in prompt for keyword in keywords)
-        
-        return False
-    
     def _execute_with_tools(self, prompt: str, input_data: Dict, tools_to_use: List) -> str:
         """Execute agent with specific tools."""
         try:
-            # First get LLM reasoning about the task
-            reasoning_prompt = f"{prompt}\n\nAnalizza questo task e spiega come useresti i tool disponibili."
-            reasoning = self.llm.generate(reasoning_prompt)
-            
-            # Execute tools
-            tool_results = []
-            for tool in tools_to_use:
-                try:
-                    tool_result = tool.run(input_data)
-                    tool_name = tool.__class__.__name__
-                    tool_results.append(f"**{tool_name}**: {tool_result}")
-                    logger.info(f"✅ Tool '{tool_name}' eseguito con successo")
-                except Exception as e:
-                    logger.error(f"❌ Errore nell'esecuzione tool {tool.__class__.__name__}: {e}")
-                    tool_results.append(f"**{tool.__class__.__name__}**: Errore - {str(e)}")
-            
-            # Generate final response combining reasoning and tool results
-            final_prompt = f"""
-Prompt originale: {input_data.get('prompt', '')}
-
-Ragionamento iniziale: {reasoning}
-
-Risultati dei tool:
-{chr(10).join(tool_results)}
-
-Fornisci una risposta finale completa e utile basata sui risultati dei tool:"""
+            reasoning, tool_results = self._reason_and_run_tools(prompt, input_data, tools_to_use)
             
+            final_prompt = self._build_final_prompt(input_data, reasoning, tool_results)
             final_response = self.llm.generate(final_prompt)
             
             # Combine everything in a structured response
             structured_response = f"""
 {final_response}
-
---- Dettagli Esecuzione ---
-Ragionamento: {reasoning}
-
-Tool utilizzati:
-{chr(10).join(tool_results)}
-"""
+{self._format_execution_details(reasoning, tool_results)}"""
             
             logger.info(f"🧠 Risposta tool-based generata da '{self.name}'")
             return structured_response
@@ -169,6 +188,135 @@ Tool utilizzati:
             logger.error(f"❌ Errore nell'esecuzione con tool: {e}")
             return f"Errore nell'esecuzione con tool: {str(e)}"
     
+    def _execute_with_tools_stream(self, prompt: str, input_data: Dict, tools_to_use: List) -> Iterator[str]:
+        """Execute agent with specific tools, streaming the final response."""
+        try:
+            reasoning, tool_results = self._reason_and_run_tools(prompt, input_data, tools_to_use)
+            
+            final_prompt = self._build_final_prompt(input_data, reasoning, tool_results)
+            yield "\n"
+            yield from self._stream_llm(final_prompt)
+            yield "\n" + self._format_execution_details(reasoning, tool_results)
+            
+            logger.info(f"🧠 Risposta tool-based in streaming generata da '{self.name}'")
+            
+        except Exception as e:
+            logger.error(f"❌ Errore nell'esecuzione con tool: {e}")
+            yield f"Errore nell'esecuzione con tool: {str(e)}"
+    
+    async def _aexecute_with_tools(self, prompt: str, input_data: Dict, tools_to_use: List) -> str:
+        """Execute agent with specific tools asynchronously."""
+        try:
+            reasoning, tool_results = await self._areason_and_run_tools(prompt, input_data, tools_to_use)
+            
+            final_prompt = self._build_final_prompt(input_data, reasoning, tool_results)
+            final_response = await self._agenerate(final_prompt)
+            
+            structured_response = f"""
+{final_response}
+{self._format_execution_details(reasoning, tool_results)}"""
+            
+            logger.info(f"🧠 Risposta tool-based generata da '{self.name}'")
+            return structured_response
+            
+        except Exception as e:
+            logger.error(f"❌ Errore nell'esecuzione con tool: {e}")
+            return f"Errore nell'esecuzione con tool: {str(e)}"
+    
+    def _reason_and_run_tools(self, prompt: str, input_data: Dict, tools_to_use: List) -> tuple:
+        """
+        Get the LLM reasoning about the task and run the selected tools.
+        
+        The reasoning does not depend on the tool results, so the reasoning
+        call and every tool run concurrently; in low-latency mode the
+        reasoning call is skipped.
+        
+        Returns:
+            Tuple of reasoning ("" when skipped) and tool result lines in tool order
+        """
+        started = time.perf_counter()
+        if self.low_latency:
+            calls = self.tool_executor.run_tools(tools_to_use, input_data)
+            reasoning, reasoning_time = "", 0.0
+        else:
+            reasoning_future = self._get_reasoning_pool().submit(self._timed, self.llm.generate,
+                                                                 self._build_reasoning_prompt(prompt))
+            calls = self.tool_executor.run_tools(tools_to_use, input_data)
+            reasoning, reasoning_time = reasoning_future.result()
+        
+        self._log_overlap(reasoning_time, [call.elapsed for call in calls], time.perf_counter() - started)
+        return reasoning, [self._format_tool_result(call) for call in calls]
+    
+    async def _areason_and_run_tools(self, prompt: str, input_data: Dict, tools_to_use: List) -> tuple:
+        """Asynchronous version of _reason_and_run_tools."""
+        async def reason():
+            if self.low_latency:
+                return "", 0.0
+            reasoning_started = time.perf_counter()
+            reasoning = await self._agenerate(self._build_reasoning_prompt(prompt))
+            return reasoning, time.perf_counter() - reasoning_started
+        
+        started = time.perf_counter()
+        (reasoning, reasoning_time), calls = await asyncio.gather(
+            reason(),
+            self.tool_executor.arun_tools(tools_to_use, input_data)
+        )
+        
+        self._log_overlap(reasoning_time, [call.elapsed for call in calls], time.perf_counter() - started)
+        return reasoning, [self._format_tool_result(call) for call in calls]
+    
+    def _get_reasoning_pool(self) -> ThreadPoolExecutor:
+        """Thread pool of the reasoning calls, created on first use and shared by the agent's runs."""
+        with self._pool_lock:
+            if self._reasoning_pool is None:
+                self._reasoning_pool = ThreadPoolExecutor(max_workers=self.reasoning_workers,
+                                                          thread_name_prefix=f"reasoning-{self.name}")
+            return self._reasoning_pool
+    
+    @staticmethod
+    def _timed(func, *args) -> tuple:
+        """Call a function and return its result with the elapsed seconds."""
+        started = time.perf_counter()
+        result = func(*args)
+        return result, time.perf_counter() - started
+    
+    def _log_overlap(self, reasoning_time: float, tool_times: List[float], elapsed: float):
+        """Log the time saved by running reasoning and tools concurrently instead of one after another."""
+        serial = reasoning_time + sum(tool_times)
+        saved = max(0.0, serial - elapsed)
+        mode = " (modalità bassa latenza, ragionamento saltato)" if self.low_latency else ""
+        logger.info(
+            f"⏱️ Ragionamento e tool di '{self.name}' in {elapsed:.3f}s invece di {serial:.3f}s in serie: "
+            f"{saved:.3f}s risparmiati{mode}"
+        )
+    
+    def _build_reasoning_prompt(self, prompt: str) -> str:
+        """Build the prompt asking the LLM how it would use the tools."""
+        return f"{prompt}\n\nAnalizza questo task e spiega come useresti i tool disponibili."
+    
+    def _format_tool_result(self, call: ToolCallResult) -> str:
+        """Format the result line of a tool run."""
+        if call.ok:
+            logger.info(f"✅ Tool '{call.tool_name}' eseguito con successo")
+            return f"**{call.tool_name}**: {call.output}"
+        logger.error(f"❌ Errore nell'esecuzione tool {call.tool_name}: {call.error}")
+        return f"**{call.tool_name}**: Errore - {call.error}"
+    
+    def _build_final_prompt(self, input_data: Dict, reasoning: str, tool_results: List[str]) -> str:
+        """Build the prompt combining reasoning (if any) and tool results."""
+        reasoning_block = f"\nRagionamento iniziale: {reasoning}\n" if reasoning else ""
+        return self.prompt_template.render("final", prompt=input_data.get('prompt', ''),
+                                           reasoning_block=reasoning_block, tool_results="\n".join(tool_results))
+    
+    def _format_execution_details(self, reasoning: str, tool_results: List[str]) -> str:
+        """Format the execution details appended after the final response."""
+        reasoning_block = f"Ragionamento: {reasoning}\n\n" if reasoning else ""
+        return f"""
+--- Dettagli Esecuzione ---
+{reasoning_block}Tool utilizzati:
+{chr(10).join(tool_results)}
+"""
+    
     def _execute_without_tools(self, prompt: str) -> str:
         """Execute agent without tools."""
         try:
@@ -177,4 +325,36 @@ Tool utilizzati:
             return response
         except Exception as e:
             logger.error(f"❌ Errore LLM per agente '{self.name}': {e}")
-            return f"Errore LLM: {str(e)}"
\ No newline at end of file
+            return f"Errore LLM: {str(e)}"
+    
+    def _stream_llm(self, prompt: str) -> Iterator[str]:
+        """Stream from the LLM, falling back to a single chunk for non-streaming providers."""
+        if hasattr(self.llm, 'generate_stream'):
+            yield from self.llm.generate_stream(prompt)
+        else:
+            yield self.llm.generate(prompt)
+    
+    async def _aexecute_without_tools(self, prompt: str) -> str:
+        """Execute agent without tools asynchronously."""
+        try:
+            response = await self._agenerate(prompt)
+            logger.info(f"🧠 Risposta senza tool generata da '{self.name}'")
+            return response
+        except Exception as e:
+            logger.error(f"❌ Errore LLM per agente '{self.name}': {e}")
+            return f"Errore LLM: {str(e)}"
+    
+    async def _agenerate(self, prompt: str) -> str:
+        """Generate asynchronously, off-loading non-async providers to a thread."""
+        if hasattr(self.llm, 'agenerate'):
+            return await self.llm.agenerate(prompt)
+        return await asyncio.to_thread(self.llm.generate, prompt)
+    
+    def get_prompt_stats(self) -> Dict[str, Any]:
+        """
+        Get prompt template statistics.
+        
+        Returns:
+            Static prefix length and hash, renders per prompt kind and reusable prefix tokens
+        """
+        return self.prompt_template.get_stats()
@@ -0,0 +1,16 @@
+"""
+Benchmarks for modular-2: a mock Ollama server and a load-generation suite
+measuring the overhead of the framework's own layers.
+"""
+from benchmarks.dispatch import format_dispatch_report, run_dispatch_benchmark
+from benchmarks.mock_ollama import LatencyModel, MockOllamaServer
+from benchmarks.load import LoadResult, run_load
+from benchmarks.react import format_react_report, run_react_benchmark
+from benchmarks.suite import compare_to_baseline, format_report, run_pipeline, run_suite
+
+__all__ = [
+    "LatencyModel", "MockOllamaServer", "LoadResult", "run_load",
+    "compare_to_baseline", "format_report", "run_pipeline", "run_suite",
+    "format_dispatch_report", "run_dispatch_benchmark",
+    "format_react_report", "run_react_benchmark",
+]
@@ -0,0 +1,113 @@
+"""
+Command line entry point for the modular-2 benchmarks.
+
+    python -m benchmarks run --concurrency 1,4,16 --latency-mean 0.05 --tokens-per-sec 200
+    python -m benchmarks serve --port 11435
+    python -m benchmarks dispatch --tools 10,100,500
+    python -m benchmarks react --max-iterations 5
+"""
+import json
+import logging
+import sys
+
+import click
+
+from benchmarks.dispatch import format_dispatch_report, run_dispatch_benchmark
+from benchmarks.mock_ollama import LatencyModel, MockOllamaServer
+from benchmarks.react import format_react_report, run_react_benchmark
+from benchmarks.suite import SCENARIOS, compare_to_baseline, format_report, run_suite
+
+
+def _server_options(latency_distribution, latency_mean, latency_stddev, tokens_per_sec, tokens, failure_rate):
+    return {
+        "latency": LatencyModel(latency_distribution, mean=latency_mean, stddev=latency_stddev, seed=0),
+        "tokens_per_sec": tokens_per_sec,
+        "tokens_per_response": tokens,
+        "failure_rate": failure_rate,
+    }
+
+
+def _mock_options(command):
+    """Options shared by the commands configuring the mock server."""
+    options = [
+        click.option('--latency-distribution', type=click.Choice(LatencyModel.DISTRIBUTIONS), default='fixed',
+                     help='Distribuzione della latenza prima di ogni risposta'),
+        click.option('--latency-mean', type=float, default=0.0, help='Latenza media in secondi (mediana per lognormal)'),
+        click.option('--latency-stddev', type=float, default=0.0, help='Dispersione della latenza'),
+        click.option('--tokens-per-sec', type=float, default=None, help='Velocità di generazione (default: istantanea)'),
+        click.option('--tokens', type=int, default=32, help='Token per risposta'),
+        click.option('--failure-rate', type=float, default=0.0, help='Frazione di richieste che rispondono 500'),
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+
+@click.group()
+def cli():
+    """Benchmark del framework modular-2 con un server Ollama simulato."""
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+@cli.command()
+@click.option('--concurrency', default='1,4,16', help='Livelli di concorrenza separati da virgola')
+@click.option('--requests', 'request_count', type=int, default=64, help='Chiamate misurate per livello')
+@click.option('--scenario', 'scenarios', multiple=True, type=click.Choice(SCENARIOS), help='Scenari da eseguire (default: tutti)')
+@click.option('--output', type=click.Path(dir_okay=False), help='Salva i risultati in JSON')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='Confronta con un JSON salvato in precedenza')
+@click.option('--tolerance', type=float, default=0.15, help='Peggioramento relativo tollerato rispetto al baseline')
+@_mock_options
+def run(concurrency, request_count, scenarios, output, baseline, tolerance, **mock_options):
+    """Esegue la suite e stampa throughput e latenze p50/p95/p99."""
+    levels = [int(level) for level in concurrency.split(',') if level.strip()]
+    results = run_suite(levels, request_count, scenarios or SCENARIOS, _server_options(**mock_options))
+    click.echo(format_report(results))
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump([result.to_dict() for result in results], f, indent=2)
+        click.echo(f"💾 Risultati salvati in {output}")
+
+    if baseline:
+        with open(baseline, encoding='utf-8') as f:
+            regressions = compare_to_baseline(results, json.load(f), tolerance)
+        if regressions:
+            click.echo("❌ Regressioni rispetto al baseline:")
+            for regression in regressions:
+                click.echo(f"  • {regression}")
+            sys.exit(1)
+        click.echo("✅ Nessuna regressione rispetto al baseline")
+
+
+@cli.command()
+@click.option('--host', default='127.0.0.1', help='Indirizzo di ascolto')
+@click.option('--port', type=int, default=11435, help='Porta di ascolto')
+@_mock_options
+def serve(host, port, **mock_options):
+    """Avvia solo il server Ollama simulato."""
+    server = MockOllamaServer(host=host, port=port, **_server_options(**mock_options))
+    click.echo(f"🧪 Mock Ollama su http://{host}:{port} (Ctrl+C per terminare)")
+    server.serve_forever()
+
+
+@cli.command()
+@click.option('--tools', default='10,100,500', help='Numero di tool sintetici, separati da virgola')
+@click.option('--keywords', type=int, default=8, help='Keyword dichiarate da ogni tool')
+@click.option('--prompt-words', type=int, default=120, help='Parole per prompt')
+@click.option('--repeat', type=int, default=5, help='Passate sui prompt per ogni misura')
+def dispatch(tools, keywords, prompt_words, repeat):
+    """Confronta la selezione dei tool con l'indice compilato e con la scansione per keyword."""
+    counts = [int(count) for count in tools.split(',') if count.strip()]
+    rows = run_dispatch_benchmark(counts, keywords_per_tool=keywords, prompt_words=prompt_words, repeat=repeat)
+    click.echo(format_dispatch_report(rows))
+
+
+@cli.command()
+@click.option('--max-iterations', type=int, default=5, help="Limite di iterazioni dell'agente in entrambe le modalità")
+def react(max_iterations):
+    """Confronta le chiamate LLM della modalità plan e della modalità react su un set di task."""
+    click.echo(format_react_report(run_react_benchmark(max_iterations=max_iterations)))
+
+
+if __name__ == '__main__':
+    cli()
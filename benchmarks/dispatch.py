@@ -0,0 +1,141 @@
+"""
+Tool dispatch microbenchmark for modular-2.
+Compares the compiled DispatchIndex with per-call keyword scanning on
+synthetic tool sets of increasing size.
+"""
+import logging
+import random
+import time
+from typing import Any, Dict, Iterable, List
+
+from tools.dispatch import DispatchIndex
+
+logger = logging.getLogger(__name__)
+
+_SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "ta", "vi", "zo", "pe", "sa", "do", "fi", "gu", "be", "co")
+
+
+class SyntheticTool:
+    """Tool stand-in with declared dispatch keywords."""
+
+    def __init__(self, index: int, keywords: List[str]):
+        self.name = f"synthetic{index}"
+        self.dispatch_keywords = keywords
+        self.dispatch_patterns = None
+
+    def run(self, input_data: Dict[str, Any]) -> str:
+        return self.name
+
+
+def make_tools(count: int, keywords_per_tool: int = 8, seed: int = 0) -> List[SyntheticTool]:
+    """
+    Build synthetic tools with random keywords.
+
+    Args:
+        count: Number of tools
+        keywords_per_tool: Keywords declared by each tool
+        seed: Random seed
+
+    Returns:
+        Tools
+    """
+    generator = random.Random(seed)
+    word = lambda: "".join(generator.choice(_SYLLABLES) for _ in range(generator.randint(2, 4)))
+    return [SyntheticTool(index, [word() for _ in range(keywords_per_tool)]) for index in range(count)]
+
+
+def make_prompts(tools: List[SyntheticTool], count: int = 50, words: int = 120, seed: int = 1) -> List[str]:
+    """
+    Build prompts of random words, some of them tool keywords.
+
+    Args:
+        tools: Tools whose keywords may appear
+        count: Number of prompts
+        words: Words per prompt
+        seed: Random seed
+
+    Returns:
+        Prompts
+    """
+    generator = random.Random(seed)
+    keywords = [keyword for tool in tools for keyword in tool.dispatch_keywords]
+    prompts = []
+    for _ in range(count):
+        text = [generator.choice(keywords) if generator.random() < 0.03
+                else "".join(generator.choice(_SYLLABLES) for _ in range(generator.randint(1, 3)))
+                for _ in range(words)]
+        prompts.append(" ".join(text).capitalize())
+    return prompts
+
+
+def scan_select(tools: List[Any], prompt: str) -> List[Any]:
+    """Baseline: rebuild the keyword table and scan the prompt once per keyword per tool."""
+    tool_keywords = {tool.name: [keyword.lower() for keyword in tool.dispatch_keywords] for tool in tools}
+    prompt_lower = prompt.lower()
+    return [tool for tool in tools if any(keyword in prompt_lower for keyword in tool_keywords[tool.name])]
+
+
+def run_dispatch_benchmark(tool_counts: Iterable[int] = (10, 100, 500), keywords_per_tool: int = 8,
+                           prompts: int = 50, prompt_words: int = 120, repeat: int = 5) -> List[Dict[str, Any]]:
+    """
+    Time tool selection with and without the compiled index.
+
+    Args:
+        tool_counts: Tool set sizes
+        keywords_per_tool: Keywords declared by each tool
+        prompts: Prompts per size
+        prompt_words: Words per prompt
+        repeat: Passes over the prompts
+
+    Returns:
+        One row per size: build time, microseconds per selection for both
+        methods, speedup and whether both selected the same tools
+    """
+    rows = []
+    for count in tool_counts:
+        tools = make_tools(count, keywords_per_tool)
+        texts = make_prompts(tools, prompts, prompt_words)
+
+        started = time.perf_counter()
+        index = DispatchIndex(tools)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        selections = len(texts) * repeat
+        started = time.perf_counter()
+        for _ in range(repeat):
+            scanned = [scan_select(tools, text) for text in texts]
+        scan_us = (time.perf_counter() - started) / selections * 1e6
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            indexed = [index.candidates(text) for text in texts]
+        index_us = (time.perf_counter() - started) / selections * 1e6
+
+        rows.append({
+            "tools": count,
+            "keywords": index.keyword_count,
+            "build_ms": round(build_ms, 2),
+            "scan_us": round(scan_us, 1),
+            "index_us": round(index_us, 1),
+            "speedup": round(scan_us / index_us, 2) if index_us else 0.0,
+            "same_result": scanned == indexed,
+        })
+    return rows
+
+
+def format_dispatch_report(rows: List[Dict[str, Any]]) -> str:
+    """
+    Render dispatch benchmark rows as a text table.
+
+    Args:
+        rows: Output of run_dispatch_benchmark
+
+    Returns:
+        Table with one row per tool set size
+    """
+    header = f"{'tool':>6} {'keyword':>8} {'build ms':>9} {'scan µs':>9} {'indice µs':>10} {'speedup':>8} {'uguali':>7}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(f"{row['tools']:>6} {row['keywords']:>8} {row['build_ms']:>9.2f} {row['scan_us']:>9.1f} "
+                     f"{row['index_us']:>10.1f} {row['speedup']:>8.2f} {'sì' if row['same_result'] else 'NO':>7}")
+    return "\n".join(lines)
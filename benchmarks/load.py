@@ -0,0 +1,121 @@
+"""
+Load generation for modular-2 benchmarks.
+Runs a call at a fixed concurrency and summarizes throughput and latency.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from llm_providers.metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+
+class LoadResult:
+    """
+    Outcome of one load run.
+    """
+
+    def __init__(self, name: str, concurrency: int, latencies: List[float], errors: int,
+                 duration: float, extra: Dict[str, Any] = None):
+        """
+        Initialize the result.
+
+        Args:
+            name: Scenario name
+            concurrency: Calls kept in flight
+            latencies: Duration of every call in seconds
+            errors: Calls that raised or returned an error string
+            duration: Wall-clock time of the whole run
+            extra: Scenario-specific figures (e.g. LLM requests per call)
+        """
+        self.name = name
+        self.concurrency = concurrency
+        self.latencies = latencies
+        self.errors = errors
+        self.duration = duration
+        self.extra = extra or {}
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        """Completed calls per second."""
+        return self.requests / self.duration if self.duration > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Summarize the run.
+
+        Returns:
+            Throughput, error count and latency percentiles in milliseconds
+        """
+        summary = {
+            "scenario": self.name,
+            "concurrency": self.concurrency,
+            "requests": self.requests,
+            "errors": self.errors,
+            "duration_seconds": round(self.duration, 4),
+            "throughput": round(self.throughput, 2),
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(self.latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 2),
+        }
+        summary.update(self.extra)
+        return summary
+
+
+def is_error(result: Any) -> bool:
+    """Whether a framework result is an error string (the framework returns errors instead of raising)."""
+    return isinstance(result, str) and result.startswith(("Errore", "Agente '"))
+
+
+def run_load(name: str, call: Callable[[int], Any], requests: int, concurrency: int,
+             warmup: int = 0) -> LoadResult:
+    """
+    Run a call `requests` times with `concurrency` calls in flight.
+
+    Args:
+        name: Scenario name
+        call: Function receiving the request index
+        requests: Number of measured calls
+        concurrency: Calls kept in flight
+        warmup: Unmeasured calls made first
+
+    Returns:
+        Load result
+    """
+    for index in range(warmup):
+        call(-1 - index)
+
+    latencies = [0.0] * requests
+    errors = 0
+    errors_lock = threading.Lock()
+
+    def timed(index: int):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            failed = is_error(call(index))
+        except Exception as e:
+            logger.debug(f"⚠️ Chiamata {index} fallita nel benchmark '{name}': {e}")
+            failed = True
+        latencies[index] = time.perf_counter() - started
+        if failed:
+            with errors_lock:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix=f"bench-{name}") as executor:
+        list(executor.map(timed, range(requests)))
+    duration = time.perf_counter() - started
+
+    result = LoadResult(name, concurrency, latencies, errors, duration)
+    summary = result.to_dict()
+    logger.info(f"📊 {name} x{concurrency}: {summary['throughput']} req/s, p50 {summary['p50_ms']}ms, "
+                f"p95 {summary['p95_ms']}ms, p99 {summary['p99_ms']}ms, {errors} errori")
+    return result
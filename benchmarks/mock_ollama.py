@@ -0,0 +1,352 @@
+"""
+Mock Ollama server for modular-2 benchmarks.
+A local stand-in for the Ollama HTTP API with configurable latency,
+generation speed and failure rate, so framework overhead can be measured
+without a model or a GPU.
+"""
+import json
+import logging
+import math
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Words the generated responses are made of
+_FILLER_WORDS = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit")
+
+
+class LatencyModel:
+    """
+    Random delay applied before a response starts (prompt processing time).
+
+    Distributions:
+        fixed: always `mean`
+        uniform: between `low` and `high`
+        normal: mean `mean`, standard deviation `stddev`, clamped at zero
+        lognormal: median `mean`, log-space standard deviation `stddev` (long tail)
+    """
+
+    DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+    def __init__(self, distribution: str = "fixed", mean: float = 0.0, stddev: float = 0.0,
+                 low: Optional[float] = None, high: Optional[float] = None, seed: Optional[int] = None):
+        """
+        Initialize the latency model.
+
+        Args:
+            distribution: One of DISTRIBUTIONS
+            mean: Mean delay in seconds (median for lognormal)
+            stddev: Spread of the normal and lognormal distributions
+            low: Minimum delay of the uniform distribution (default 0)
+            high: Maximum delay of the uniform distribution (default 2 * mean)
+            seed: Seed for reproducible delays
+        """
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Distribuzione latenza non supportata: '{distribution}' "
+                             f"(disponibili: {', '.join(self.DISTRIBUTIONS)})")
+        self.distribution = distribution
+        self.mean = mean
+        self.stddev = stddev
+        self.low = 0.0 if low is None else low
+        self.high = 2 * mean if high is None else high
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Any) -> "LatencyModel":
+        """
+        Build a latency model from a number of seconds or a config dict.
+
+        Args:
+            config: Fixed delay in seconds, a dict of constructor arguments, or None
+
+        Returns:
+            Latency model
+        """
+        if isinstance(config, LatencyModel):
+            return config
+        if config is None:
+            return cls()
+        if isinstance(config, (int, float)):
+            return cls("fixed", mean=float(config))
+        return cls(**config)
+
+    def sample(self) -> float:
+        """Draw one delay in seconds."""
+        with self._lock:
+            if self.distribution == "uniform":
+                return self._random.uniform(self.low, self.high)
+            if self.distribution == "normal":
+                return max(0.0, self._random.gauss(self.mean, self.stddev))
+            if self.distribution == "lognormal":
+                if self.mean <= 0:
+                    return 0.0
+                return self._random.lognormvariate(math.log(self.mean), self.stddev)
+        return self.mean
+
+
+class _MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes: avoid delayed-ACK stalls
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_body(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, payload: Dict[str, Any], status: int = 200):
+        self._send_body(status, json.dumps(payload).encode("utf-8"))
+
+    def _start_ndjson(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, payload: Dict[str, Any]):
+        line = (json.dumps(payload) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+        self.wfile.flush()
+
+    def _end_ndjson(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        mock = self.server.mock
+        mock._count(self.path)
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": name, "model": name} for name in mock.models]})
+        elif self.path == "/api/version":
+            self._send_json({"version": "0.0.0-mock"})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        mock = self.server.mock
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            data = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json({"error": "invalid JSON"}, status=400)
+            return
+        mock._count(self.path)
+
+        if self.path == "/api/show":
+            self._send_json({"modelfile": f"FROM {data.get('name') or data.get('model')}",
+                             "details": {"family": "mock", "parameter_size": "0B"}})
+            return
+        if self.path not in ("/api/generate", "/api/chat", "/api/embed", "/api/embeddings"):
+            self._send_json({"error": "not found"}, status=404)
+            return
+
+        time.sleep(mock.latency.sample())
+        if mock._should_fail():
+            self._send_json({"error": "mock failure"}, status=500)
+            return
+
+        if self.path in ("/api/embed", "/api/embeddings"):
+            self._embed(data)
+        else:
+            self._generate(data)
+
+    def _embed(self, data: Dict[str, Any]):
+        mock = self.server.mock
+        if self.path == "/api/embeddings":
+            # Legacy endpoint: one prompt, one vector
+            self._send_json({"embedding": mock.embedding(data.get("prompt", ""))})
+            return
+        texts = data.get("input", [])
+        texts = texts if isinstance(texts, list) else [texts]
+        self._send_json({"model": data.get("model"), "embeddings": [mock.embedding(text) for text in texts]})
+
+    def _generate(self, data: Dict[str, Any]):
+        mock = self.server.mock
+        chat = self.path == "/api/chat"
+        if chat:
+            prompt = (data.get("messages") or [{}])[-1].get("content", "")
+        else:
+            prompt = data.get("prompt", "")
+        # Zero-token warm-up request
+        if not chat and not prompt:
+            self._send_json({"model": data.get("model"), "response": "", "done": True})
+            return
+
+        tokens = mock.response_tokens(prompt)
+        prompt_eval_count = len(prompt.split())
+        stream = data.get("stream", True)
+
+        def piece(text: str) -> Dict[str, Any]:
+            if chat:
+                return {"model": data.get("model"), "message": {"role": "assistant", "content": text}, "done": False}
+            return {"model": data.get("model"), "response": text, "done": False}
+
+        final = piece("")
+        final.update(done=True, prompt_eval_count=prompt_eval_count, eval_count=len(tokens))
+
+        started = time.perf_counter()
+        if stream:
+            self._start_ndjson()
+            for token in tokens:
+                mock._pace(1)
+                self._write_chunk(piece(token))
+            final["eval_duration"] = int((time.perf_counter() - started) * 1e9)
+            self._write_chunk(final)
+            self._end_ndjson()
+            return
+
+        mock._pace(len(tokens))
+        final["eval_duration"] = int((time.perf_counter() - started) * 1e9)
+        if chat:
+            final["message"]["content"] = "".join(tokens)
+        else:
+            final["response"] = "".join(tokens)
+            final["context"] = (data.get("context") or []) + [prompt_eval_count]
+        self._send_json(final)
+
+
+class MockOllamaServer:
+    """
+    Local HTTP server speaking enough of the Ollama API for the framework.
+
+    Implements /api/generate and /api/chat (streaming and not), /api/tags,
+    /api/show, /api/embed and the legacy /api/embeddings. Each generation
+    waits for a sampled latency, then produces `tokens_per_response` tokens at
+    `tokens_per_sec`; a `failure_rate` fraction of requests answers 500.
+
+    Responses are filler text unless a prompt contains one of the keys of
+    `responses`, in which case the mapped text is returned (e.g. a JSON plan
+    for planning prompts).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: Any = None,
+                 tokens_per_sec: Optional[float] = None, tokens_per_response: int = 32,
+                 failure_rate: float = 0.0, models: Optional[List[str]] = None,
+                 embedding_dim: int = 384, responses: Optional[Dict[str, str]] = None,
+                 seed: Optional[int] = None):
+        """
+        Initialize the server (call start() to serve).
+
+        Args:
+            host: Bind address
+            port: Bind port (0 picks a free one)
+            latency: Delay before each response: seconds, LatencyModel or its config dict
+            tokens_per_sec: Generation speed (None = instant)
+            tokens_per_response: Tokens in each filler response
+            failure_rate: Fraction of generation/embedding requests answering 500
+            models: Model names reported by /api/tags
+            embedding_dim: Length of the embedding vectors
+            responses: Prompt substring -> response text
+            seed: Seed for failures and latencies
+        """
+        self.host = host
+        self.port = port
+        self.latency = LatencyModel.from_config(latency)
+        self.tokens_per_sec = tokens_per_sec
+        self.tokens_per_response = tokens_per_response
+        self.failure_rate = failure_rate
+        self.models = models or ["mock-model:latest"]
+        self.embedding_dim = embedding_dim
+        self.responses = responses or {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._requests: Dict[str, int] = {}
+        self._failures = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def endpoint(self) -> str:
+        """Base URL of the running server."""
+        host, port = self._server.server_address[:2] if self._server else (self.host, self.port)
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockOllamaServer":
+        """Start serving in a daemon thread."""
+        self._server = ThreadingHTTPServer((self.host, self.port), _MockOllamaHandler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="mock-ollama")
+        self._thread.start()
+        logger.info(f"🧪 Mock Ollama in ascolto su {self.endpoint}")
+        return self
+
+    def stop(self):
+        """Stop the server."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "MockOllamaServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def serve_forever(self):
+        """Start and block until interrupted."""
+        self.start()
+        try:
+            self._thread.join()
+        except KeyboardInterrupt:
+            self.stop()
+
+    def _count(self, path: str):
+        with self._lock:
+            self._requests[path] = self._requests.get(path, 0) + 1
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            failed = self.failure_rate > 0 and self._random.random() < self.failure_rate
+            if failed:
+                self._failures += 1
+            return failed
+
+    def _pace(self, tokens: int):
+        """Sleep for the time needed to generate some tokens."""
+        if self.tokens_per_sec and tokens:
+            time.sleep(tokens / self.tokens_per_sec)
+
+    def response_tokens(self, prompt: str) -> List[str]:
+        """Tokens of the response to a prompt."""
+        words = [_FILLER_WORDS[i % len(_FILLER_WORDS)] for i in range(self.tokens_per_response)]
+        for key, text in self.responses.items():
+            if key in prompt:
+                words = text.split(" ") if text else []
+                break
+        return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+    def embedding(self, text: str) -> List[float]:
+        """Deterministic pseudo-random unit vector for a text."""
+        generator = random.Random(zlib.crc32(text.encode("utf-8")))
+        vector = [generator.uniform(-1.0, 1.0) for _ in range(self.embedding_dim)]
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get request counters.
+
+        Returns:
+            Requests per path and injected failures
+        """
+        with self._lock:
+            return {"requests": dict(self._requests), "failures": self._failures}
+
+    def reset_stats(self):
+        """Clear the request counters."""
+        with self._lock:
+            self._requests = {}
+            self._failures = 0
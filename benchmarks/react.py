@@ -0,0 +1,130 @@
+"""
+Execution mode benchmark for modular-2.
+Runs a fixed task set through AgenticAutomationAgent in plan mode and in
+react mode with a scripted LLM, counting the LLM round trips of each.
+"""
+import json
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from agents.agentic_automation_agent import AgenticAutomationAgent
+from tools.math_tool import MathTool
+
+logger = logging.getLogger(__name__)
+
+# Plan the LLM returns in plan mode, and tool calls it requests in react mode before answering
+REACT_BENCHMARK_TASKS: List[Dict[str, Any]] = [
+    {
+        "prompt": "Saluta l'utente",
+        "plan": [{"step": 1, "action": "reasoning", "description": "Scrivi un saluto cordiale"}],
+        "tool_calls": [],
+    },
+    {
+        "prompt": "Quanto fa 12 * 7?",
+        "plan": [{"step": 1, "action": "analyze", "description": "Identifica l'operazione"},
+                 {"step": 2, "action": "tool", "tool": "MathTool", "description": "12 * 7"}],
+        "tool_calls": [{"prompt": "12 * 7"}],
+    },
+    {
+        "prompt": "Riassumi in tre punti i vantaggi del lavoro da remoto",
+        "plan": [{"step": 1, "action": "analyze", "description": "Individua i vantaggi principali"},
+                 {"step": 2, "action": "reasoning", "description": "Scegli i tre più rilevanti"},
+                 {"step": 3, "action": "generic", "description": "Scrivi i tre punti"}],
+        "tool_calls": [],
+    },
+    {
+        "prompt": "Calcola (3 + 4) * 5 e poi dividi il risultato per 7",
+        "plan": [{"step": 1, "action": "tool", "tool": "MathTool", "description": "(3 + 4) * 5"},
+                 {"step": 2, "action": "tool", "tool": "MathTool", "description": "35 / 7"},
+                 {"step": 3, "action": "reasoning", "description": "Verifica il risultato"}],
+        "tool_calls": [{"expression": "(3 + 4) * 5"}, {"expression": "35 / 7"}],
+    },
+]
+
+_ITERATION_PATTERN = re.compile(r"Iterazione (\d+) di \d+")
+
+
+class ScriptedLLM:
+    """
+    Deterministic LLM for the benchmark tasks.
+
+    Planning prompts get the task's plan; react prompts get the task's tool
+    calls in order, then a final answer; every other prompt gets a short text.
+    """
+
+    def __init__(self, tasks: List[Dict[str, Any]]):
+        self.tasks = tasks
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        with self._lock:
+            self.calls += 1
+        task = next((task for task in self.tasks if task["prompt"] in prompt), None)
+        if task is None:
+            return "ok"
+        if "formato JSON" in prompt:
+            return json.dumps(task["plan"], ensure_ascii=False)
+        iteration = _ITERATION_PATTERN.search(prompt)
+        if iteration:
+            index = int(iteration.group(1)) - 1
+            if index < len(task["tool_calls"]):
+                return json.dumps({"action": "tool", "tool": "MathTool", "input": task["tool_calls"][index]})
+            return json.dumps({"action": "final", "answer": f"Risposta a: {task['prompt']}"})
+        return "ok"
+
+
+def run_react_benchmark(tasks: Optional[List[Dict[str, Any]]] = None, max_iterations: int = 5) -> List[Dict[str, Any]]:
+    """
+    Count the LLM calls of plan mode and react mode on a task set.
+
+    Args:
+        tasks: Tasks with "prompt", "plan" and "tool_calls" (default REACT_BENCHMARK_TASKS)
+        max_iterations: Agent iteration limit in both modes
+
+    Returns:
+        One row per task: LLM calls in plan mode and in react mode, and the calls saved
+    """
+    tasks = REACT_BENCHMARK_TASKS if tasks is None else tasks
+    rows = []
+    for task in tasks:
+        calls = {}
+        for mode in ("plan", "react"):
+            llm = ScriptedLLM(tasks)
+            agent = AgenticAutomationAgent(f"bench-{mode}", llm, tools=[MathTool()], max_iterations=max_iterations,
+                                           config={"execution_mode": mode})
+            agent.run({"prompt": task["prompt"]})
+            calls[mode] = llm.calls
+        rows.append({
+            "task": task["prompt"],
+            "plan_calls": calls["plan"],
+            "react_calls": calls["react"],
+            "saved": calls["plan"] - calls["react"],
+        })
+    return rows
+
+
+def format_react_report(rows: List[Dict[str, Any]]) -> str:
+    """
+    Render react benchmark rows as a text table with a total line.
+
+    Args:
+        rows: Output of run_react_benchmark
+
+    Returns:
+        Table with one row per task
+    """
+    width = max([len(row["task"]) for row in rows] + [len("totale")])
+    header = f"{'task':<{width}} {'plan':>5} {'react':>6} {'risparmiate':>12}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(f"{row['task']:<{width}} {row['plan_calls']:>5} {row['react_calls']:>6} {row['saved']:>12}")
+    plan_total = sum(row["plan_calls"] for row in rows)
+    saved_total = sum(row["saved"] for row in rows)
+    lines.append("-" * len(header))
+    lines.append(f"{'totale':<{width}} {plan_total:>5} {plan_total - saved_total:>6} {saved_total:>12}")
+    if plan_total:
+        lines.append(f"Chiamate LLM risparmiate: {saved_total}/{plan_total} ({saved_total / plan_total:.0%})")
+    return "\n".join(lines)
@@ -0,0 +1,221 @@
+"""
+Benchmark suite for modular-2.
+Drives AgentManager.run_agent and pipelines against the mock Ollama server
+at fixed concurrency levels to measure the overhead of the framework itself.
+"""
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from benchmarks.load import LoadResult, run_load
+from benchmarks.mock_ollama import MockOllamaServer
+from managers.agent_manager import AgentManager
+
+logger = logging.getLogger(__name__)
+
+MOCK_MODEL = "mock-model:latest"
+
+# Plan returned by the mock server to planning prompts
+BENCHMARK_PLAN = json.dumps([
+    {"step": 1, "action": "analyze", "description": "Analizza la richiesta", "tool": None,
+     "expected_output": "Comprensione"},
+    {"step": 2, "action": "tool", "description": "Calcola 2 + 2", "tool": "mathtool",
+     "expected_output": "Risultato"},
+    {"step": 3, "action": "reasoning", "description": "Formula la risposta", "tool": None,
+     "expected_output": "Risposta"},
+])
+
+# Mock responses keyed by a substring of the prompt
+BENCHMARK_RESPONSES = {"formato JSON": BENCHMARK_PLAN}
+
+# Two agent steps: the second one rewrites the output of the first
+BENCHMARK_PIPELINE = {
+    "name": "bench_pipeline",
+    "chains": [{
+        "name": "main_chain",
+        "steps": [
+            {"name": "draft", "type": "agent", "component": "chat",
+             "input": {"prompt": "{user_input}"}, "output": "draft"},
+            {"name": "calculate", "type": "tool", "component": "math",
+             "input": {"expression": "2 + 2"}, "output": "calculation",
+             "condition": "'Errore' not in draft"},
+            {"name": "review", "type": "agent", "component": "chat",
+             "input": {"prompt": "Rivedi la bozza per {user_input}: {draft}"}, "output": "answer"},
+        ],
+    }],
+}
+
+SCENARIOS = ("simple", "agentic", "tool", "pipeline")
+
+
+def build_config(endpoint: str, llm_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Build the framework configuration used by the suite.
+
+    Args:
+        endpoint: Mock Ollama URL
+        llm_config: Extra provider settings (the `config` block of the LLM)
+
+    Returns:
+        Configuration dictionary for AgentManager
+    """
+    return {
+        "llm": {"provider": "ollama", "model": MOCK_MODEL, "endpoint": endpoint, "config": llm_config or {}},
+        "tools": [{"name": "math", "class_path": "tools.math_tool.MathTool", "config": {}}],
+        "agents": [
+            {"name": "chat", "type": "simple", "llm": "ollama",
+             "system_prompt": "Sei un assistente usato nei benchmark."},
+            {"name": "planner", "type": "agentic_automation", "llm": "ollama", "tools": ["math"],
+             "system_prompt": "Sei un agente autonomo usato nei benchmark.", "max_iterations": 5},
+            {"name": "tool_user", "type": "tool", "llm": "ollama", "tools": ["math"],
+             "system_prompt": "Usa i tool quando servono."},
+        ],
+        "pipelines": [BENCHMARK_PIPELINE],
+    }
+
+
+def run_pipeline(manager: AgentManager, pipeline: Dict[str, Any], variables: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Execute the agent and tool steps of a pipeline definition.
+
+    Inputs are formatted with the variables produced so far, each step output
+    is stored under its `output` name and a false `condition` skips the step.
+    Other step types are skipped.
+
+    Args:
+        manager: Agent manager providing agents and tools
+        pipeline: Pipeline definition in the YAML format
+        variables: Initial variables (e.g. user_input)
+
+    Returns:
+        All variables after the run
+    """
+    variables = dict(variables)
+    for chain in pipeline.get("chains", []):
+        for step in chain.get("steps", []):
+            condition = step.get("condition")
+            if condition and not eval(condition, {"__builtins__": {}}, dict(variables)):
+                continue
+            inputs = {key: value.format(**variables) if isinstance(value, str) else value
+                      for key, value in (step.get("input") or {}).items()}
+            if step.get("type") == "agent":
+                result = manager.run_agent(step["component"], inputs)
+            elif step.get("type") == "tool":
+                result = manager.tools[step["component"]].run(inputs)
+            else:
+                logger.debug(f"ℹ️ Step '{step.get('name')}' di tipo '{step.get('type')}' ignorato nel benchmark")
+                continue
+            if step.get("output"):
+                variables[step["output"]] = result
+    return variables
+
+
+def _scenario_calls(manager: AgentManager) -> Dict[str, Callable[[int], Any]]:
+    """Build the call measured by each scenario."""
+    def agent_call(agent_name: str) -> Callable[[int], Any]:
+        agent = manager.get_agent(agent_name)
+        call = lambda index: manager.run_agent(agent_name, {"prompt": f"Richiesta {index}: quanto fa 2 + {index}?"})
+        if getattr(agent, 'reentrant', True):
+            return call
+        # Same rule as run_agent_batch: agents with per-run state on the instance run one at a time
+        lock = threading.Lock()
+
+        def serialized(index: int) -> Any:
+            with lock:
+                return call(index)
+        return serialized
+
+    pipeline = manager.config["pipelines"][0]
+    return {
+        "simple": agent_call("chat"),
+        "agentic": agent_call("planner"),
+        "tool": agent_call("tool_user"),
+        "pipeline": lambda index: run_pipeline(manager, pipeline, {"user_input": f"Richiesta {index}"})["answer"],
+    }
+
+
+def run_suite(concurrency_levels: Iterable[int] = (1, 4, 16), requests: int = 64,
+              scenarios: Iterable[str] = SCENARIOS, server_options: Optional[Dict[str, Any]] = None,
+              llm_config: Optional[Dict[str, Any]] = None, warmup: int = 2) -> List[LoadResult]:
+    """
+    Run every scenario at every concurrency level against a fresh mock server.
+
+    Args:
+        concurrency_levels: Calls kept in flight, one run per level
+        requests: Measured calls per run
+        scenarios: Scenario names (see SCENARIOS)
+        server_options: MockOllamaServer arguments (latency, tokens_per_sec, ...)
+        llm_config: Extra OllamaLLM settings
+        warmup: Unmeasured calls made before each scenario
+
+    Returns:
+        One LoadResult per scenario and level, with `llm_requests_per_call` in extra
+    """
+    options = {"responses": BENCHMARK_RESPONSES, "seed": 0}
+    options.update(server_options or {})
+    results = []
+    with MockOllamaServer(**options) as server:
+        manager = AgentManager(build_config(server.endpoint, llm_config))
+        calls = _scenario_calls(manager)
+        for scenario in scenarios:
+            if scenario not in calls:
+                raise ValueError(f"Scenario di benchmark sconosciuto: '{scenario}' (disponibili: {', '.join(SCENARIOS)})")
+            for index in range(warmup):
+                calls[scenario](-1 - index)
+            for concurrency in concurrency_levels:
+                server.reset_stats()
+                result = run_load(scenario, calls[scenario], requests, concurrency)
+                llm_requests = sum(count for path, count in server.get_stats()["requests"].items()
+                                   if path in ("/api/generate", "/api/chat"))
+                result.extra["llm_requests_per_call"] = round(llm_requests / max(requests, 1), 2)
+                results.append(result)
+    return results
+
+
+def compare_to_baseline(results: List[LoadResult], baseline: List[Dict[str, Any]],
+                        tolerance: float = 0.15) -> List[str]:
+    """
+    Find runs that got slower than a saved baseline.
+
+    Args:
+        results: Current results
+        baseline: Summaries from a previous run (LoadResult.to_dict())
+        tolerance: Allowed relative drop in throughput or rise in p95
+
+    Returns:
+        One message per regression, empty when none
+    """
+    previous = {(entry["scenario"], entry["concurrency"]): entry for entry in baseline}
+    regressions = []
+    for result in results:
+        current = result.to_dict()
+        before = previous.get((current["scenario"], current["concurrency"]))
+        if not before:
+            continue
+        label = f"{current['scenario']} x{current['concurrency']}"
+        if before["throughput"] and current["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(f"{label}: throughput {before['throughput']} -> {current['throughput']} req/s")
+        if before["p95_ms"] and current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {before['p95_ms']} -> {current['p95_ms']} ms")
+    return regressions
+
+
+def format_report(results: List[LoadResult]) -> str:
+    """
+    Render results as a text table.
+
+    Args:
+        results: Load results
+
+    Returns:
+        Table with one row per run
+    """
+    header = f"{'scenario':<10} {'conc':>4} {'req':>5} {'err':>4} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'llm/call':>8}"
+    lines = [header, "-" * len(header)]
+    for result in results:
+        row = result.to_dict()
+        lines.append(f"{row['scenario']:<10} {row['concurrency']:>4} {row['requests']:>5} {row['errors']:>4} "
+                     f"{row['throughput']:>9.2f} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} "
+                     f"{row.get('llm_requests_per_call', 0):>8}")
+    return "\n".join(lines)
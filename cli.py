@@ -6,6 +6,7 @@ import click
 import logging
 import sys
 import os
+import uuid
 from typing import Dict, Any
 from main import ModularFramework
 from config.yaml_parser import load_and_validate_config
@@ -13,6 +14,13 @@ from core.registry import registry
 
 logger = logging.getLogger(__name__)
 
+def _echo_stream(agent_name: str, chunks):
+    """Print response fragments as they arrive."""
+    click.echo(f"🤖 {agent_name}: ", nl=False)
+    for chunk in chunks:
+        click.echo(chunk, nl=False)
+    click.echo()
+
 @click.group()
 def cli():
     """modular-2 Framework CLI - Sistema modulare per AI agents."""
@@ -22,7 +30,8 @@ def cli():
 @click.option('--config', '-c', default='config.yaml', help='Path al file di configurazione')
 @click.option('--agent', '-a', help='Nome dell\'agente da usare')
 @click.option('--debug', is_flag=True, help='Abilita logging debug')
-def run(config, agent, debug):
+@click.option('--stream/--no-stream', default=True, help='Mostra la risposta man mano che viene generata')
+def run(config, agent, debug, stream):
     """Avvia la chat interattiva con gli agenti."""
     
     # Setup logging level
@@ -53,6 +62,7 @@ def run(config, agent, debug):
         
         click.echo(f"✅ Agente selezionato: {selected_agent}")
         click.echo("💬 Chat avviata. Digita 'quit' per uscire.\n")
+        session_id = uuid.uuid4().hex
         
         # Chat loop
         while True:
@@ -63,9 +73,13 @@ def run(config, agent, debug):
                     click.echo("👋 Arrivederci!")
                     break
                 
-                # Run agent
-                response = framework.run_agent(selected_agent, prompt)
-                click.echo(f"🤖 {selected_agent}: {response}\n")
+                # Run agent (same session: only the new turn is sent to the model)
+                if stream:
+                    _echo_stream(selected_agent, framework.run_agent_stream(selected_agent, prompt, session_id))
+                    click.echo()
+                else:
+                    response = framework.run_agent(selected_agent, prompt, session_id)
+                    click.echo(f"🤖 {selected_agent}: {response}\n")
                 
             except KeyboardInterrupt:
                 click.echo("\n👋 Arrivederci!")
@@ -171,6 +185,7 @@ ESEMPI:
   python cli.py run                    # Avvia chat interattiva
   python cli.py run --agent coder     # Usa agente specifico
   python cli.py run --debug           # Con logging debug
+  python cli.py run --no-stream       # Risposta completa invece che in streaming
   python cli.py list-agents           # Mostra agenti
   python cli.py config-check          # Valida config.yaml
 
@@ -190,7 +205,8 @@ DOCUMENTAZIONE:
 @click.argument('agent_name')
 @click.argument('prompt')
 @click.option('--config', '-c', default='config.yaml', help='Path al file di configurazione')
-def ask(agent_name, prompt, config):
+@click.option('--stream/--no-stream', default=True, help='Mostra la risposta man mano che viene generata')
+def ask(agent_name, prompt, config, stream):
     """Esegui un singolo prompt con un agente specifico."""
     try:
         framework = ModularFramework(config)
@@ -200,8 +216,11 @@ def ask(agent_name, prompt, config):
             click.echo(f"🤖 Agenti disponibili: {', '.join(framework.list_agents())}")
             return
         
-        response = framework.run_agent(agent_name, prompt)
-        click.echo(f"🤖 {agent_name}: {response}")
+        if stream:
+            _echo_stream(agent_name, framework.run_agent_stream(agent_name, prompt))
+        else:
+            response = framework.run_agent(agent_name, prompt)
+            click.echo(f"🤖 {agent_name}: {response}")
     
     except Exception as e:
         click.echo(f"❌ Errore: {e}")
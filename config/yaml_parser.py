@@ -88,6 +88,10 @@ def validate_config_structure(config: Dict[str, Any]) -> bool:
                 
                 if 'name' not in agent:
                     raise ValueError(f"Campo 'name' richiesto per agente {i}")
+                
+                history_config = (agent.get('config') or {}).get('execution_history')
+                if history_config is not None and not isinstance(history_config, dict):
+                    raise ValueError(f"Campo 'execution_history' dell'agente {i} deve essere un dizionario")
         
         # Validate tools configuration
         if 'tools' in config:
@@ -104,6 +108,9 @@ def validate_config_structure(config: Dict[str, Any]) -> bool:
                 
                 if 'class_path' not in tool:
                     raise ValueError(f"Campo 'class_path' richiesto per tool {i}")
+                
+                if tool.get('executor', 'thread') not in ('thread', 'process'):
+                    raise ValueError(f"Campo 'executor' del tool {i} deve essere 'thread' o 'process'")
         
         logger.debug("✅ Struttura configurazione validata")
         return True
@@ -0,0 +1,341 @@
+"""
+Plan cache for modular-2 agents.
+Reuses validated task plans for recurring task shapes so planning does not
+cost an LLM round trip every time, and serves hand-written plan templates.
+"""
+import copy
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency, only needed for similarity lookups
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Step actions the agents know how to execute (a step without one is a reasoning step)
+PLAN_ACTIONS = ("analyze", "tool", "reasoning", "generic")
+
+# Placeholder replaced with the current task in templates and cached plans
+TASK_PLACEHOLDER = "{task}"
+
+
+def normalize_task(task: str) -> str:
+    """
+    Build the signature of a task: lowercase words without punctuation.
+
+    Args:
+        task: Task text
+
+    Returns:
+        Normalized task
+    """
+    return " ".join(re.findall(r"\w+", (task or "").lower(), re.UNICODE))
+
+
+def validate_plan(plan: Any) -> bool:
+    """
+    Check that a plan can be executed and is worth caching.
+
+    Args:
+        plan: Parsed plan
+
+    Returns:
+        True for a non-empty list of steps with a description, a known action
+        (PLAN_ACTIONS) and, when present, dependencies pointing at steps of the same plan
+    """
+    if not isinstance(plan, list) or not plan:
+        return False
+    numbers = {str(step.get("step", index + 1)) for index, step in enumerate(plan) if isinstance(step, dict)}
+    for step in plan:
+        if not isinstance(step, dict) or not isinstance(step.get("description"), str):
+            return False
+        if step.get("action", "reasoning") not in PLAN_ACTIONS:
+            return False
+        dependencies = step.get("depends_on", [])
+        dependencies = dependencies if isinstance(dependencies, list) else [dependencies]
+        if any(str(dependency) not in numbers for dependency in dependencies):
+            return False
+    return True
+
+
+def _fill_task(value: Any, task: str) -> Any:
+    """Replace the task placeholder in every string of a plan."""
+    if isinstance(value, str):
+        return value.replace(TASK_PLACEHOLDER, task)
+    if isinstance(value, list):
+        return [_fill_task(item, task) for item in value]
+    if isinstance(value, dict):
+        return {key: _fill_task(item, task) for key, item in value.items()}
+    return value
+
+
+def _abstract_task(value: Any, task: str) -> Any:
+    """Replace literal copies of the task with the placeholder, so the plan fits similar tasks."""
+    if isinstance(value, str) and task:
+        return value.replace(task, TASK_PLACEHOLDER)
+    if isinstance(value, list):
+        return [_abstract_task(item, task) for item in value]
+    if isinstance(value, dict):
+        return {key: _abstract_task(item, task) for key, item in value.items()}
+    return value
+
+
+class PlanTemplate:
+    """
+    Hand-written plan used for every task it matches.
+    """
+
+    def __init__(self, plan: List[Dict], name: str = "", match: Any = None, pattern: Optional[str] = None,
+                 tools: Optional[Sequence[str]] = None):
+        """
+        Initialize the template.
+
+        Args:
+            plan: Plan steps; "{task}" in any string is replaced with the task
+            name: Name used in logs and statistics
+            match: Word or list of words that must all appear in the normalized task
+            pattern: Regular expression searched in the task (case-insensitive)
+            tools: Tool names the template is limited to (None for any tool set)
+        """
+        if not validate_plan(plan):
+            raise ValueError(f"Piano del template '{name}' non valido")
+        if match is None and pattern is None:
+            raise ValueError(f"Il template '{name}' richiede 'match' o 'pattern'")
+        self.plan = plan
+        self.name = name or (pattern or str(match))
+        self.words = [normalize_task(word) for word in ([match] if isinstance(match, str) else match or [])]
+        self.pattern = re.compile(pattern, re.IGNORECASE) if pattern else None
+        self.tools = sorted(tool.lower() for tool in tools) if tools else None
+
+    def matches(self, task: str, signature: str, tools: List[str]) -> bool:
+        """Whether the template applies to a task and tool set."""
+        if self.tools is not None and self.tools != tools:
+            return False
+        padded = f" {signature} "
+        if any(f" {word} " not in padded for word in self.words):
+            return False
+        return self.pattern is None or bool(self.pattern.search(task))
+
+
+class PlanCache:
+    """
+    LRU cache of validated plans keyed by task signature and tool set.
+
+    Lookups try, in order: pinned templates, the exact normalized task and,
+    when an embedding function and a similarity threshold are configured, the
+    most similar cached task with the same tools. Literal copies of the task
+    inside a cached plan are stored as "{task}" and filled in on reuse.
+    """
+
+    def __init__(self, max_entries: int = 256, similarity_threshold: Optional[float] = None,
+                 embed: Optional[Callable[[List[str]], Any]] = None,
+                 templates: Optional[List[PlanTemplate]] = None, enabled: bool = True):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum cached plans (templates do not count)
+            similarity_threshold: Minimum cosine similarity for reusing the plan of a
+                                  different task (None for exact matches only)
+            embed: Function returning one embedding row per text (e.g. llm.embed)
+            templates: Pinned plan templates, never evicted
+            enabled: Cache LLM plans (False serves templates only)
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.similarity_threshold = similarity_threshold if (embed is not None and np is not None) else None
+        self.embed = embed
+        self.templates = templates or []
+        self.enabled = enabled
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"template_hits": 0, "exact_hits": 0, "similar_hits": 0, "misses": 0,
+                       "stores": 0, "evictions": 0, "rejected": 0}
+
+        if similarity_threshold is not None and self.similarity_threshold is None:
+            logger.warning("⚠️ Ricerca per similarità dei piani disattivata: servono numpy e un LLM con embed()")
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], llm: Any = None) -> Optional["PlanCache"]:
+        """
+        Build a plan cache from an agent's config.
+
+        Args:
+            config: Agent config with the optional `plan_cache` block and `plan_templates`
+                    (a list of templates or the path of a YAML file containing one)
+            llm: Provider whose embed() is used for similarity lookups
+
+        Returns:
+            Plan cache, or None when neither the cache nor templates are configured
+        """
+        cache_config = config.get("plan_cache") or {}
+        enabled = cache_config.get("enabled", bool(cache_config))
+        templates = load_plan_templates(config.get("plan_templates"))
+        if not enabled and not templates:
+            return None
+
+        threshold = cache_config.get("similarity_threshold")
+        return cls(
+            max_entries=cache_config.get("max_entries", 256),
+            similarity_threshold=threshold,
+            embed=getattr(llm, 'embed', None) if threshold is not None else None,
+            templates=templates,
+            enabled=enabled,
+        )
+
+    @staticmethod
+    def _tool_key(tools: Sequence[str]) -> List[str]:
+        return sorted(tool.lower() for tool in tools)
+
+    def _embed_task(self, signature: str):
+        """Unit-length embedding of a task signature (None when unavailable)."""
+        try:
+            vector = np.asarray(self.embed([signature]), dtype=np.float32)[0]
+        except Exception as e:
+            logger.warning(f"⚠️ Embedding del task non disponibile per la cache dei piani: {e}")
+            return None
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else None
+
+    def get(self, task: str, tools: Sequence[str]) -> Optional[List[Dict]]:
+        """
+        Find a plan for a task.
+
+        Args:
+            task: Task text
+            tools: Names of the tools available to the agent
+
+        Returns:
+            Copy of the plan with the task filled in, or None on miss
+        """
+        signature = normalize_task(task)
+        tool_key = self._tool_key(tools)
+
+        for template in self.templates:
+            if template.matches(task, signature, tool_key):
+                with self._lock:
+                    self._stats["template_hits"] += 1
+                logger.info(f"📌 Piano dal template '{template.name}'")
+                return _fill_task(copy.deepcopy(template.plan), task)
+
+        if not self.enabled:
+            return None
+
+        key = json.dumps([signature, tool_key], ensure_ascii=False)
+        with self._lock:
+            entry = self._plans.get(key)
+            if entry is not None:
+                self._plans.move_to_end(key)
+                entry["hits"] += 1
+                self._stats["exact_hits"] += 1
+                return _fill_task(copy.deepcopy(entry["plan"]), task)
+
+        if self.similarity_threshold is not None:
+            plan = self._get_similar(signature, tool_key, task)
+            if plan is not None:
+                return plan
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def _get_similar(self, signature: str, tool_key: List[str], task: str) -> Optional[List[Dict]]:
+        """Reuse the plan of the most similar cached task with the same tools."""
+        vector = self._embed_task(signature)
+        if vector is None:
+            return None
+        with self._lock:
+            best_key, best_score = None, self.similarity_threshold
+            for key, entry in self._plans.items():
+                if entry["tools"] != tool_key or entry["embedding"] is None:
+                    continue
+                score = float(np.dot(vector, entry["embedding"]))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            entry = self._plans[best_key]
+            self._plans.move_to_end(best_key)
+            entry["hits"] += 1
+            self._stats["similar_hits"] += 1
+        logger.info(f"♻️ Piano riutilizzato da un task simile (similarità {best_score:.3f})")
+        return _fill_task(copy.deepcopy(entry["plan"]), task)
+
+    def put(self, task: str, tools: Sequence[str], plan: List[Dict]) -> bool:
+        """
+        Cache the plan produced for a task.
+
+        Args:
+            task: Task text
+            tools: Names of the tools available to the agent
+            plan: Plan parsed from the LLM response
+
+        Returns:
+            True if the plan was valid and stored
+        """
+        if not self.enabled:
+            return False
+        if not validate_plan(plan):
+            with self._lock:
+                self._stats["rejected"] += 1
+            logger.debug("ℹ️ Piano non valido, non salvato nella cache")
+            return False
+
+        signature = normalize_task(task)
+        tool_key = self._tool_key(tools)
+        embedding = self._embed_task(signature) if self.similarity_threshold is not None else None
+        key = json.dumps([signature, tool_key], ensure_ascii=False)
+        with self._lock:
+            self._plans[key] = {"plan": _abstract_task(copy.deepcopy(plan), task), "tools": tool_key,
+                                "embedding": embedding, "hits": 0}
+            self._plans.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+                self._stats["evictions"] += 1
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            Hit/miss counters by kind, hit rate, size and the most reused plans
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._plans)
+            stats["templates"] = len(self.templates)
+            top = sorted(self._plans.items(), key=lambda item: item[1]["hits"], reverse=True)[:5]
+            stats["top_plans"] = [{"task": json.loads(key)[0], "hits": entry["hits"]} for key, entry in top]
+        hits = stats["template_hits"] + stats["exact_hits"] + stats["similar_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def load_plan_templates(source: Any) -> List[PlanTemplate]:
+    """
+    Load plan templates from an agent config value.
+
+    Args:
+        source: List of template dicts (plan, name, match, pattern, tools), the path
+                of a YAML file holding such a list (or a mapping with `plan_templates`), or None
+
+    Returns:
+        Plan templates
+    """
+    if not source:
+        return []
+    if isinstance(source, str):
+        import yaml
+        with open(source, encoding="utf-8") as f:
+            source = yaml.safe_load(f) or []
+        if isinstance(source, dict):
+            source = source.get("plan_templates", [])
+    return [PlanTemplate(**template) for template in source]
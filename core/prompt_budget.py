@@ -0,0 +1,169 @@
+"""
+Budgeted prompt builder for modular-2 agents.
+Assembles prompts from prioritized sections and trims the least important
+ones so the result fits the model's context window.
+"""
+import logging
+from typing import Any, Dict, List, Optional
+
+from llm_providers.tokens import get_token_estimator
+
+logger = logging.getLogger(__name__)
+
+# Marker left where a section was shortened
+TRIM_MARKER = "[...]"
+
+
+class PromptSection:
+    """
+    One part of a prompt.
+    """
+
+    def __init__(self, name: str, text: str, priority: int = 0, header: str = "",
+                 keep: str = "start", required: bool = False):
+        """
+        Initialize the section.
+
+        Args:
+            name: Section name used in the token report
+            text: Section body
+            priority: Higher priorities are trimmed last
+            header: Text kept in front of the body even when it is trimmed
+            keep: Which part survives trimming: "start" (e.g. documents) or "end" (e.g. history)
+            required: Never trim this section
+        """
+        self.name = name
+        self.text = text or ""
+        self.priority = priority
+        self.header = header
+        self.keep = keep
+        self.required = required
+
+    def render(self, body: Optional[str] = None) -> str:
+        """Render the section with the given (possibly trimmed) body."""
+        return f"{self.header}{self.text if body is None else body}"
+
+
+class BudgetedPromptBuilder:
+    """
+    Builds a prompt that fits a token budget.
+
+    Sections are rendered in the order they were added. When the estimated
+    total exceeds the budget, sections are shortened starting from the lowest
+    priority; a section that cannot keep anything useful is dropped. The token
+    cost of every section is logged and kept in `last_report`.
+    """
+
+    def __init__(self, llm: Any = None, budget: Optional[int] = None, separator: str = "\n\n"):
+        """
+        Initialize the builder.
+
+        Args:
+            llm: Provider used for token estimates and the default budget
+                 (count_tokens/prompt_budget); a generic estimator is used otherwise
+            budget: Prompt token budget (defaults to llm.prompt_budget())
+            separator: Text placed between sections
+        """
+        self.llm = llm
+        if budget is None:
+            budget = llm.prompt_budget() if hasattr(llm, 'prompt_budget') else 1536
+        self.budget = budget
+        self.separator = separator
+        self.sections: List[PromptSection] = []
+        self.last_report: Dict[str, Any] = {}
+
+        if hasattr(llm, 'count_tokens'):
+            self._count = llm.count_tokens
+        else:
+            self._count = get_token_estimator(getattr(llm, 'model', 'default')).estimate
+
+    def add(self, name: str, text: str, priority: int = 0, header: str = "",
+            keep: str = "start", required: bool = False) -> "BudgetedPromptBuilder":
+        """
+        Add a section (empty sections are skipped).
+
+        Returns:
+            The builder, for chaining
+        """
+        if text:
+            self.sections.append(PromptSection(name, text, priority, header, keep, required))
+        return self
+
+    def _trim(self, section: PromptSection, max_tokens: int) -> Optional[str]:
+        """Longest body of the section fitting max_tokens (None if nothing useful fits)."""
+        overhead = self._count(section.header + TRIM_MARKER)
+        if max_tokens - overhead <= 0:
+            return None
+
+        text = section.text
+        low, high = 0, len(text)
+        # Binary search on characters against the token estimate
+        while low < high:
+            middle = (low + high + 1) // 2
+            part = text[:middle] if section.keep == "start" else text[len(text) - middle:]
+            if self._count(part) + overhead <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        if low == 0:
+            return None
+        if section.keep == "start":
+            return text[:low].rstrip() + f" {TRIM_MARKER}"
+        return f"{TRIM_MARKER} " + text[len(text) - low:].lstrip()
+
+    def build(self) -> str:
+        """
+        Render the prompt within the budget.
+
+        Returns:
+            Prompt text
+        """
+        costs = {id(s): self._count(s.render()) for s in self.sections}
+        bodies = {id(s): s.text for s in self.sections}
+        separator_cost = self._count(self.separator) * max(len(self.sections) - 1, 0)
+        total = sum(costs.values()) + separator_cost
+        trimmed = {}
+
+        # Shorten the least important sections first
+        for section in sorted(self.sections, key=lambda s: s.priority):
+            if total <= self.budget:
+                break
+            if section.required:
+                continue
+            available = costs[id(section)] - (total - self.budget)
+            body = self._trim(section, available)
+            original_cost = costs[id(section)]
+            if body is None:
+                bodies[id(section)] = None
+                costs[id(section)] = 0
+            else:
+                bodies[id(section)] = body
+                costs[id(section)] = self._count(section.render(body))
+            trimmed[section.name] = original_cost
+            total -= original_cost - costs[id(section)]
+
+        parts = [s.render(bodies[id(s)]) for s in self.sections if bodies[id(s)] is not None]
+        prompt = self.separator.join(parts)
+
+        self.last_report = {
+            "budget": self.budget,
+            "total_tokens": total,
+            "sections": {s.name: costs[id(s)] for s in self.sections},
+            "trimmed": {s.name: {"from": trimmed[s.name], "to": costs[id(s)]}
+                        for s in self.sections if s.name in trimmed},
+        }
+        self._log_report()
+        return prompt
+
+    def _log_report(self):
+        """Log the token cost of each section."""
+        report = self.last_report
+        details = ", ".join(
+            f"{name}={cost}" + (f" (da {report['trimmed'][name]['from']})" if name in report["trimmed"] else "")
+            for name, cost in report["sections"].items()
+        )
+        message = f"📐 Prompt di circa {report['total_tokens']}/{report['budget']} token: {details}"
+        if report["trimmed"]:
+            logger.info(f"{message} - sezioni ridotte: {', '.join(report['trimmed'])}")
+        else:
+            logger.debug(message)
@@ -0,0 +1,213 @@
+"""
+Compiled prompt templates for modular-2 agents.
+Keeps the static part of an agent's prompts (system prompt, tool catalog)
+as one immutable prefix rendered once at construction, so every prompt of
+the agent starts with the same bytes and a server-side prompt cache (e.g.
+Ollama's KV prefix reuse) can skip re-evaluating it.
+"""
+import hashlib
+import logging
+import threading
+from string import Formatter
+from typing import Any, Dict, List, Optional, Sequence
+
+from llm_providers.tokens import get_token_estimator
+
+logger = logging.getLogger(__name__)
+
+
+def render_tool_catalog(tools: Sequence[Any], header: str = "Tool disponibili:", numbered: bool = False) -> str:
+    """
+    Render the tool catalog shown to the model.
+
+    Args:
+        tools: Tool instances, in agent order
+        header: First line of the catalog
+        numbered: Prefix each tool with its index ("0: Name - description")
+            instead of a bullet ("- Name: description")
+
+    Returns:
+        Catalog text, or "" without tools
+    """
+    if not tools:
+        return ""
+    lines = [header]
+    for index, tool in enumerate(tools):
+        tool_name = tool.__class__.__name__
+        tool_desc = getattr(tool, 'description', None) or f"Tool: {tool_name}"
+        lines.append(f"{index}: {tool_name} - {tool_desc}" if numbered else f"- {tool_name}: {tool_desc}")
+    return "\n".join(lines)
+
+
+class PromptTemplate:
+    """
+    Static prefix plus named bodies with dynamic slots.
+
+    The prefix is built once from the static parts and never re-rendered;
+    bodies are compiled into literal/slot pairs, so rendering only joins the
+    literals with the slot values. Every rendered prompt therefore starts
+    with the byte-identical prefix. Renders are counted per body together
+    with the estimated prefix tokens a prefix cache could reuse.
+    """
+
+    def __init__(self, static_parts: Sequence[str], bodies: Dict[str, str], llm: Any = None,
+                 name: str = "", separator: str = "\n\n"):
+        """
+        Compile the template.
+
+        Args:
+            static_parts: Static texts (system prompt, tool catalog); empty parts are skipped
+            bodies: Body name -> format string whose {fields} are the dynamic slots
+            llm: Provider used for token estimates (count_tokens); a generic estimator is used otherwise
+            name: Template name used in logs
+            separator: Text between static parts and after the prefix
+
+        Raises:
+            ValueError: If a body uses format specs, conversions or positional fields
+        """
+        self.name = name
+        parts = [part.strip() for part in static_parts if part and part.strip()]
+        # Static text on its own (e.g. a conversation's system message)
+        self.system_text = separator.join(parts)
+        self.prefix = f"{self.system_text}{separator}" if parts else ""
+        self.prefix_chars = len(self.prefix)
+        self.prefix_bytes = len(self.prefix.encode("utf-8"))
+        self.prefix_hash = hashlib.sha1(self.prefix.encode("utf-8")).hexdigest()[:12]
+
+        if hasattr(llm, 'count_tokens'):
+            self._count = llm.count_tokens
+        else:
+            self._count = get_token_estimator(getattr(llm, 'model', 'default')).estimate
+        self.prefix_tokens = self._count(self.prefix) if self.prefix else 0
+
+        self._bodies = {body_name: self._compile(body_name, body) for body_name, body in bodies.items()}
+        self._lock = threading.Lock()
+        self._renders = {body_name: 0 for body_name in self._bodies}
+        self._dynamic_tokens = 0
+
+        logger.info(f"🧩 Template prompt '{self.name}': prefisso statico di {self.prefix_tokens} token "
+                    f"({self.prefix_chars} caratteri, {len(self._bodies)} corpi)")
+
+    @staticmethod
+    def _compile(body_name: str, body: str) -> List[tuple]:
+        """Split a body into (literal, slot) pairs; slot is None after the last literal."""
+        compiled = []
+        for literal, field, spec, conversion in Formatter().parse(body):
+            if field is not None and (not field or field.isdigit() or spec or conversion):
+                raise ValueError(f"Slot non supportato '{{{field}}}' nel corpo '{body_name}'")
+            compiled.append((literal, field))
+        return compiled
+
+    def slots(self, body_name: str) -> List[str]:
+        """
+        Dynamic slots of a body.
+
+        Args:
+            body_name: Body name
+
+        Returns:
+            Slot names, in order
+        """
+        return [field for _, field in self._bodies[body_name] if field is not None]
+
+    def render_body(self, body_name: str, **slots: Any) -> str:
+        """
+        Render a body without the prefix (e.g. for a conversation that already carries it).
+
+        Args:
+            body_name: Body name
+            **slots: Slot values
+
+        Returns:
+            Dynamic part of the prompt
+
+        Raises:
+            KeyError: If the body or one of its slots is missing
+        """
+        pieces = []
+        for literal, field in self._bodies[body_name]:
+            pieces.append(literal)
+            if field is not None:
+                pieces.append(str(slots[field]))
+        return "".join(pieces)
+
+    def render(self, body_name: str, **slots: Any) -> str:
+        """
+        Render a full prompt: the static prefix followed by a body.
+
+        Args:
+            body_name: Body name
+            **slots: Slot values
+
+        Returns:
+            Prompt text starting with `prefix`
+        """
+        return self.wrap(body_name, self.render_body(body_name, **slots))
+
+    def wrap(self, body_name: str, dynamic: str) -> str:
+        """
+        Put the prefix in front of a dynamic part rendered elsewhere (e.g. a budgeted section list).
+
+        Args:
+            body_name: Name the render is counted under
+            dynamic: Dynamic part of the prompt
+
+        Returns:
+            Prompt text starting with `prefix`
+        """
+        dynamic_tokens = self._count(dynamic)
+        with self._lock:
+            self._renders[body_name] = self._renders.get(body_name, 0) + 1
+            self._dynamic_tokens += dynamic_tokens
+        logger.debug(f"🧩 Prompt '{self.name}/{body_name}': {self.prefix_tokens} token di prefisso + "
+                     f"{dynamic_tokens} dinamici")
+        return f"{self.prefix}{dynamic}"
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get prefix size and render counters.
+
+        Returns:
+            Prefix length (chars, bytes, estimated tokens) and hash, renders per
+            body, the prefix tokens reusable by a prefix cache (every render
+            after the first) and the prefix share of the rendered tokens
+        """
+        with self._lock:
+            renders = dict(self._renders)
+            dynamic_tokens = self._dynamic_tokens
+        total_renders = sum(renders.values())
+        prefix_total = self.prefix_tokens * total_renders
+        rendered_tokens = prefix_total + dynamic_tokens
+        return {
+            "prefix_chars": self.prefix_chars,
+            "prefix_bytes": self.prefix_bytes,
+            "prefix_tokens": self.prefix_tokens,
+            "prefix_hash": self.prefix_hash,
+            "renders": renders,
+            "dynamic_tokens": dynamic_tokens,
+            "reusable_prefix_tokens": self.prefix_tokens * max(total_renders - 1, 0),
+            "prefix_share": round(prefix_total / rendered_tokens, 3) if rendered_tokens else 0.0,
+        }
+
+
+def build_agent_template(name: str, system_prompt: str, tools: Sequence[Any], bodies: Dict[str, str],
+                         llm: Any = None, default_system_prompt: str = "",
+                         catalog: Optional[str] = None) -> PromptTemplate:
+    """
+    Compile an agent's template with the system prompt and tool catalog as prefix.
+
+    Args:
+        name: Agent name
+        system_prompt: Agent system prompt
+        tools: Agent tools
+        bodies: Body name -> format string
+        llm: Provider used for token estimates
+        default_system_prompt: Used when system_prompt is empty
+        catalog: Pre-rendered tool catalog (default render_tool_catalog(tools))
+
+    Returns:
+        Compiled template
+    """
+    if catalog is None:
+        catalog = render_tool_catalog(tools)
+    return PromptTemplate([system_prompt or default_system_prompt, catalog], bodies, llm=llm, name=name)
@@ -0,0 +1,487 @@
+"""
+Record-and-replay cassettes for modular-2 LLM providers.
+Records real LLM traffic to an append-only file and serves it back offline,
+so whole agent runs and pipelines can be re-executed deterministically.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CassetteMissError(KeyError):
+    """Raised when a replayed request was never recorded."""
+
+
+class RecordedError(RuntimeError):
+    """Replays an error the provider raised while recording."""
+
+
+def _recordable(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Call parameters without callables, whose repr would put a memory address in the key."""
+    return {name: value for name, value in params.items() if not callable(value)}
+
+
+def _generate_many(generate_raw, prompts: List[str], max_concurrency: int, kwargs: Dict[str, Any]) -> List[Any]:
+    """Run a batch as one generate call per prompt, so it is recorded and replayed like single calls."""
+    from llm_providers.ollama_llm import GenerationResult
+
+    def run_one(index: int, prompt: str) -> GenerationResult:
+        started = time.perf_counter()
+        try:
+            text = generate_raw(prompt, **kwargs)
+            return GenerationResult(index, prompt, text=text, latency=time.perf_counter() - started)
+        except Exception as e:
+            return GenerationResult(index, prompt, error=e, latency=time.perf_counter() - started)
+
+    if not prompts:
+        return []
+    workers = max(1, min(max_concurrency, len(prompts)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cassette-batch") as executor:
+        return list(executor.map(run_one, range(len(prompts)), prompts))
+
+
+class Cassette:
+    """
+    Append-only JSON Lines file of LLM calls.
+
+    Each line is one call with short keys: "k" request key, "m" method,
+    "p" prompt (or chat messages), "o" call parameters, "r" response (a list
+    of fragments for streams), "d" final chunk of streams (what on_done
+    received), "x" error message, "l" latency and "f" time to first fragment
+    in seconds, "md" model. Lines are flushed as they are
+    written, so a crashed run keeps everything recorded so far.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the cassette.
+
+        Args:
+            path: Cassette file (created on first write)
+        """
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._file = None
+
+    @staticmethod
+    def make_key(method: str, prompt: Any, params: Dict[str, Any]) -> str:
+        """
+        Build the key identifying a request.
+
+        Args:
+            method: Provider method ("generate", "stream", "chat", "chat_stream", "continuation")
+            prompt: Prompt text or chat messages
+            params: Call parameters as passed by the caller (callbacks such as on_done are left out)
+
+        Returns:
+            Short hex digest
+        """
+        payload = json.dumps([method, prompt, _recordable(params)], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+    def append(self, entry: Dict[str, Any]):
+        """
+        Append one call to the file.
+
+        Args:
+            entry: Recorded call
+        """
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str)
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def load(self) -> Dict[str, deque]:
+        """
+        Read every recorded call.
+
+        Returns:
+            Request key -> recorded calls, in recording order
+        """
+        entries: Dict[str, deque] = {}
+        if not self.path.exists():
+            return entries
+        with open(self.path, encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A run killed mid-write leaves a truncated last line
+                    logger.warning(f"⚠️ Riga {number} della cassetta {self.path} non valida, ignorata")
+                    continue
+                entries.setdefault(entry["k"], deque()).append(entry)
+        return entries
+
+    def close(self):
+        """Close the file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class RecordingLLM:
+    """
+    Provider wrapper recording every call into a Cassette.
+
+    Prompts, call parameters, responses (or errors) and latencies of generate,
+    agenerate, generate_stream, chat_stream, chat_raw and generate_continuation
+    are recorded, with the final chunk of streams; generate_many is recorded
+    as one generate call per prompt. Every attribute not defined here is
+    delegated to the wrapped provider.
+    """
+
+    def __init__(self, llm, cassette: Cassette):
+        """
+        Initialize the wrapper.
+
+        Args:
+            llm: Provider instance to record
+            cassette: Cassette receiving the calls
+        """
+        self.llm = llm
+        self.cassette = cassette
+        self.recorded = 0
+        logger.info(f"📼 Registrazione chiamate LLM in {cassette.path}")
+
+    def __getattr__(self, name: str):
+        return getattr(self.llm, name)
+
+    def _record(self, method: str, prompt: Any, params: Dict[str, Any], started: float,
+                response: Any = None, error: Optional[Exception] = None, first_at: Optional[float] = None,
+                final: Optional[Dict[str, Any]] = None):
+        entry = {"k": Cassette.make_key(method, prompt, params), "m": method, "p": prompt, "o": _recordable(params),
+                 "l": round(time.perf_counter() - started, 6), "md": getattr(self.llm, 'model', None)}
+        if error is not None:
+            entry["x"] = str(error)
+        else:
+            entry["r"] = response
+        if first_at is not None:
+            entry["f"] = round(first_at - started, 6)
+        if final:
+            entry["d"] = final
+        self.cassette.append(entry)
+        self.recorded += 1
+
+    def _format_error(self, error: Exception) -> str:
+        if hasattr(self.llm, 'format_error'):
+            return self.llm.format_error(error)
+        logger.error(f"❌ Errore LLM: {error}")
+        return f"Errore: {str(error)}"
+
+    def _call(self, method: str, prompt: Any, params: Dict[str, Any], call) -> Any:
+        started = time.perf_counter()
+        try:
+            response = call()
+        except Exception as e:
+            self._record(method, prompt, params, started, error=e)
+            raise
+        self._record(method, prompt, params, started, response=response)
+        return response
+
+    def generate_raw(self, prompt: str, **kwargs) -> str:
+        """Generate a response and record it, raising on failure."""
+        generate = self.llm.generate_raw if hasattr(self.llm, 'generate_raw') else self.llm.generate
+        return self._call("generate", prompt, kwargs, lambda: generate(prompt, **kwargs))
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        """Generate a response and record it, returning an error string on failure."""
+        try:
+            return self.generate_raw(prompt, **kwargs)
+        except Exception as e:
+            return self._format_error(e)
+
+    async def agenerate_raw(self, prompt: str, **kwargs) -> str:
+        """Generate a response asynchronously and record it, raising on failure."""
+        started = time.perf_counter()
+        try:
+            response = await self.llm.agenerate_raw(prompt, **kwargs)
+        except Exception as e:
+            self._record("generate", prompt, kwargs, started, error=e)
+            raise
+        self._record("generate", prompt, kwargs, started, response=response)
+        return response
+
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        """Generate a response asynchronously and record it, returning an error string on failure."""
+        try:
+            return await self.agenerate_raw(prompt, **kwargs)
+        except Exception as e:
+            return self._format_error(e)
+
+    def _stream(self, method: str, prompt: Any, kwargs: Dict[str, Any], stream) -> Iterator[str]:
+        """Yield a stream, then record its fragments and the final chunk passed to on_done."""
+        on_done = kwargs.pop("on_done", None)
+        final = {}
+
+        def done(result: Dict[str, Any]):
+            final.update(result)
+            if on_done is not None:
+                on_done(result)
+
+        started = time.perf_counter()
+        first_at = None
+        fragments = []
+        for fragment in stream(dict(kwargs, on_done=done)):
+            if first_at is None:
+                first_at = time.perf_counter()
+            fragments.append(fragment)
+            yield fragment
+        self._record(method, prompt, kwargs, started, response=fragments, first_at=first_at, final=final)
+
+    def generate_stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """Stream a response and record its fragments once it completes."""
+        return self._stream("stream", prompt, kwargs, lambda params: self.llm.generate_stream(prompt, **params))
+
+    def chat_stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """Stream a chat reply and record its fragments once it completes."""
+        return self._stream("chat_stream", messages, kwargs, lambda params: self.llm.chat_stream(messages, **params))
+
+    def chat_raw(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """Send a chat conversation and record the reply."""
+        return self._call("chat", messages, kwargs, lambda: self.llm.chat_raw(messages, **kwargs))
+
+    def generate_continuation(self, prompt: str, context: Optional[List[int]] = None, **kwargs) -> Dict[str, Any]:
+        """Continue a conversation and record the reply."""
+        params = dict(kwargs, context=context)
+        return self._call("continuation", prompt, params,
+                          lambda: self.llm.generate_continuation(prompt, context=context, **kwargs))
+
+    def generate_many(self, prompts: List[str], max_concurrency: int = 4, **kwargs) -> List[Any]:
+        """Generate many prompts, recording each one as a generate call."""
+        return _generate_many(self.generate_raw, prompts, max_concurrency, kwargs)
+
+    def get_cassette_stats(self) -> Dict[str, Any]:
+        """Get the number of recorded calls."""
+        return {"mode": "record", "path": str(self.cassette.path), "recorded": self.recorded}
+
+    def __str__(self) -> str:
+        return f"RecordingLLM({self.llm})"
+
+
+class ReplayLLM:
+    """
+    Provider serving the calls of a Cassette instead of a model.
+
+    Identical requests are answered in recording order; once their recordings
+    run out the last one is repeated. Each answer waits for its recorded
+    latency times `timing_scale` (1.0 = original timing, 0 = instant).
+    Unrecorded requests raise CassetteMissError, or go to `fallback` when one
+    is given. Without a fallback, token estimates and the prompt budget come
+    from `source` (so prompts are built as when recording) and the metric
+    getters report nothing.
+    """
+
+    # Local helpers of the recorded provider that never send a request
+    SOURCE_ATTRIBUTES = frozenset({"count_tokens", "prompt_budget", "token_estimator", "generation_options",
+                                   "num_ctx", "max_tokens", "temperature"})
+
+    def __init__(self, cassette: Cassette, timing_scale: float = 1.0, fallback=None, model: Optional[str] = None,
+                 source=None):
+        """
+        Initialize the replay provider.
+
+        Args:
+            cassette: Recorded calls
+            timing_scale: Multiplier applied to recorded latencies
+            fallback: Provider answering unrecorded requests (None raises instead)
+            model: Model name reported by the provider
+            source: Provider the cassette was recorded with, used only for SOURCE_ATTRIBUTES
+        """
+        self.cassette = cassette
+        self.timing_scale = timing_scale
+        self.fallback = fallback
+        self.source = source
+        self.model = model or getattr(fallback, 'model', None)
+        self._entries = cassette.load()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "replayed_seconds": 0.0}
+        count = sum(len(calls) for calls in self._entries.values())
+        logger.info(f"📼 Cassetta {cassette.path}: {count} chiamate registrate, riproduzione x{timing_scale}")
+
+    @classmethod
+    def from_config(cls, llm, cassette_config: Dict[str, Any]) -> Any:
+        """
+        Wrap a provider using the `cassette` YAML block of an LLM.
+
+        Args:
+            llm: Real provider instance
+            cassette_config: mode ("record" or "replay"), path, timing_scale, on_miss
+
+        Returns:
+            Recording or replaying provider
+        """
+        cassette = Cassette(cassette_config["path"])
+        if cassette_config.get("mode", "replay") == "record":
+            return RecordingLLM(llm, cassette)
+        fallback = llm if cassette_config.get("on_miss", "error") == "passthrough" else None
+        return cls(cassette, timing_scale=cassette_config.get("timing_scale", 1.0),
+                   fallback=fallback, model=getattr(llm, 'model', None), source=llm)
+
+    def __getattr__(self, name: str):
+        fallback = self.__dict__.get("fallback")
+        if fallback is not None:
+            return getattr(fallback, name)
+        source = self.__dict__.get("source")
+        if source is not None and name in self.SOURCE_ATTRIBUTES:
+            return getattr(source, name)
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}' (riproduzione senza fallback)")
+
+    def _lookup(self, method: str, prompt: Any, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Get the next recording of a request (None on miss)."""
+        key = Cassette.make_key(method, prompt, params)
+        with self._lock:
+            calls = self._entries.get(key)
+            if not calls:
+                self._stats["misses"] += 1
+                return None
+            entry = calls.popleft() if len(calls) > 1 else calls[0]
+            self._stats["hits"] += 1
+            self._stats["replayed_seconds"] += entry.get("l", 0.0)
+            return entry
+
+    def _miss(self, method: str, prompt: Any) -> CassetteMissError:
+        preview = str(prompt)[:80]
+        logger.warning(f"⚠️ Chiamata '{method}' non presente nella cassetta: {preview}")
+        return CassetteMissError(f"Chiamata '{method}' non registrata nella cassetta {self.cassette.path}")
+
+    def _delay(self, entry: Dict[str, Any]) -> float:
+        return entry.get("l", 0.0) * self.timing_scale
+
+    @staticmethod
+    def _result(entry: Dict[str, Any]) -> Any:
+        if "x" in entry:
+            raise RecordedError(entry["x"])
+        return entry.get("r")
+
+    def _replay(self, method: str, prompt: Any, params: Dict[str, Any], fallback_call) -> Any:
+        entry = self._lookup(method, prompt, params)
+        if entry is None:
+            if self.fallback is None:
+                raise self._miss(method, prompt)
+            return fallback_call()
+        if self._delay(entry) > 0:
+            time.sleep(self._delay(entry))
+        return self._result(entry)
+
+    def format_error(self, error: Exception) -> str:
+        """Log a replay error and convert it to the provider's error string."""
+        logger.error(f"❌ Errore LLM (replay): {error}")
+        return f"Errore: {str(error)}"
+
+    def generate_raw(self, prompt: str, **kwargs) -> str:
+        """Replay a recorded response, raising on miss or recorded failure."""
+        return self._replay("generate", prompt, kwargs, lambda: self.fallback.generate_raw(prompt, **kwargs))
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        """Replay a recorded response, returning an error string on failure."""
+        try:
+            return self.generate_raw(prompt, **kwargs)
+        except Exception as e:
+            return self.format_error(e)
+
+    async def agenerate_raw(self, prompt: str, **kwargs) -> str:
+        """Replay a recorded response asynchronously, raising on miss or recorded failure."""
+        entry = self._lookup("generate", prompt, kwargs)
+        if entry is None:
+            if self.fallback is None:
+                raise self._miss("generate", prompt)
+            return await self.fallback.agenerate_raw(prompt, **kwargs)
+        if self._delay(entry) > 0:
+            await asyncio.sleep(self._delay(entry))
+        return self._result(entry)
+
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        """Replay a recorded response asynchronously, returning an error string on failure."""
+        try:
+            return await self.agenerate_raw(prompt, **kwargs)
+        except Exception as e:
+            return self.format_error(e)
+
+    def _replay_stream(self, method: str, prompt: Any, kwargs: Dict[str, Any], fallback_stream) -> Iterator[str]:
+        """
+        Replay a recorded stream fragment by fragment, with its original pacing scaled.
+
+        on_done receives the recorded final chunk, so conversations continue as
+        they did when recording.
+        """
+        on_done = kwargs.get("on_done")
+        entry = self._lookup(method, prompt, kwargs)
+        if entry is None:
+            if self.fallback is not None:
+                yield from fallback_stream()
+            else:
+                yield self.format_error(self._miss(method, prompt))
+            return
+
+        fragments = entry.get("r") or []
+        first = entry.get("f", 0.0) * self.timing_scale
+        gap = (self._delay(entry) - first) / len(fragments) if fragments else 0.0
+        for index, fragment in enumerate(fragments):
+            pause = first if index == 0 else gap
+            if pause > 0:
+                time.sleep(pause)
+            yield fragment
+        if on_done is not None and entry.get("d"):
+            on_done(entry["d"])
+
+    def generate_stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """Replay a recorded stream, with its original pacing scaled."""
+        return self._replay_stream("stream", prompt, kwargs, lambda: self.fallback.generate_stream(prompt, **kwargs))
+
+    def chat_stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """Replay a recorded chat stream, with its original pacing scaled."""
+        return self._replay_stream("chat_stream", messages, kwargs,
+                                   lambda: self.fallback.chat_stream(messages, **kwargs))
+
+    def chat_raw(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """Replay a recorded chat reply."""
+        return self._replay("chat", messages, kwargs, lambda: self.fallback.chat_raw(messages, **kwargs))
+
+    def generate_continuation(self, prompt: str, context: Optional[List[int]] = None, **kwargs) -> Dict[str, Any]:
+        """Replay a recorded conversation continuation."""
+        params = dict(kwargs, context=context)
+        return self._replay("continuation", prompt, params,
+                            lambda: self.fallback.generate_continuation(prompt, context=context, **kwargs))
+
+    def generate_many(self, prompts: List[str], max_concurrency: int = 4, **kwargs) -> List[Any]:
+        """Replay many prompts, each one as a recorded generate call."""
+        return _generate_many(self.generate_raw, prompts, max_concurrency, kwargs)
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Get the fallback provider's metrics (none without a fallback: replayed calls reach no model)."""
+        return self.fallback.get_metrics() if hasattr(self.fallback, 'get_metrics') else {}
+
+    def get_stream_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Get the fallback provider's streaming metrics (none without a fallback)."""
+        return self.fallback.get_stream_metrics() if hasattr(self.fallback, 'get_stream_metrics') else {}
+
+    def get_cassette_stats(self) -> Dict[str, Any]:
+        """
+        Get replay counters.
+
+        Returns:
+            Hits, misses and the model time the replayed calls took when recorded
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["replayed_seconds"] = round(stats["replayed_seconds"], 4)
+        stats.update(mode="replay", path=str(self.cassette.path), timing_scale=self.timing_scale)
+        return stats
+
+    def __str__(self) -> str:
+        return f"ReplayLLM({self.cassette.path})"
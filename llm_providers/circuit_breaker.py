@@ -0,0 +1,157 @@
+"""
+Per-endpoint circuit breaker for modular-2 LLM providers.
+Fails fast while an endpoint keeps erroring instead of waiting for each timeout.
+"""
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of sending a request while the endpoint's circuit is open."""
+
+
+def is_endpoint_fault(error: Exception) -> bool:
+    """
+    Tell whether an error says the endpoint itself is unreachable, slow or failing.
+
+    Timeouts, connection errors and server errors (5xx) are endpoint faults;
+    client errors (4xx, e.g. an unknown model or an oversized prompt) are
+    faults of the request and say nothing about the endpoint.
+
+    Args:
+        error: Exception a request failed with
+
+    Returns:
+        True for timeouts, connection errors and 5xx responses
+    """
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError):
+        status = getattr(error.response, "status_code", None)
+        if status is None:
+            # The async transport puts the status at the start of the message
+            match = re.match(r"\s*(\d{3})\b", str(error))
+            status = int(match.group(1)) if match else None
+        return status is None or status >= 500
+    return False
+
+
+class CircuitBreaker:
+    """
+    Classic three-state circuit breaker.
+
+    - closed: requests flow; consecutive failures are counted
+    - open: after `failure_threshold` consecutive failures requests are rejected
+      immediately for `reset_timeout` seconds
+    - half-open: one trial request is let through; success closes the circuit,
+      failure opens it again
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Initialize the breaker.
+
+        Args:
+            name: Name used in logs (usually the endpoint)
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a trial request
+        """
+        self.name = name
+        self.failure_threshold = int(failure_threshold)
+        self.reset_timeout = float(reset_timeout)
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+
+        self.opened = 0
+        self.rejected = 0
+        self.failures = 0
+        self.successes = 0
+
+    def before_request(self):
+        """
+        Check that a request may be sent.
+
+        Raises:
+            CircuitOpenError: If the circuit is open (or a half-open trial is already running)
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+                logger.info(f"🔌 Circuito {self.name} semi-aperto: invio una richiesta di prova")
+
+            if self.state == self.CLOSED:
+                return
+            # A trial that never reported back (e.g. cancelled) does not block the circuit forever
+            if self.state == self.HALF_OPEN and (not self._trial_in_flight
+                                                 or now - self._trial_started >= self.reset_timeout):
+                self._trial_in_flight = True
+                self._trial_started = now
+                return
+
+            self.rejected += 1
+        raise CircuitOpenError(f"Circuito aperto per {self.name}: richiesta rifiutata")
+
+    def record_success(self):
+        """Record a successful request, closing the circuit."""
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            if self.state != self.CLOSED:
+                logger.info(f"✅ Circuito {self.name} chiuso")
+            self.state = self.CLOSED
+            self._trial_in_flight = False
+
+    def record_ignored(self):
+        """Record a request whose error says nothing about the endpoint, freeing a half-open trial."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """Record a failed request, opening the circuit when the threshold is reached."""
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                    logger.warning(
+                        f"⚠️ Circuito {self.name} aperto dopo {self.consecutive_failures} errori consecutivi "
+                        f"(nuovo tentativo tra {self.reset_timeout}s)"
+                    )
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get breaker state and counters.
+
+        Returns:
+            State, consecutive failures, times opened and requests rejected
+        """
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "failures": self.failures,
+                "successes": self.successes,
+            }
@@ -0,0 +1,271 @@
+"""
+Multi-turn conversation sessions for modular-2 LLM providers.
+Keeps the model-side state of a conversation so each turn only sends its delta.
+"""
+import contextvars
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from llm_providers.tokens import get_token_estimator
+
+logger = logging.getLogger(__name__)
+
+# Session whose turn is being sent, read by routed providers to keep it on one endpoint
+_CURRENT_SESSION: contextvars.ContextVar = contextvars.ContextVar("conversation_session", default=None)
+
+
+def current_session() -> Optional["ConversationSession"]:
+    """
+    Get the conversation session whose turn is being sent in the current context.
+
+    Returns:
+        The session, or None outside a session turn
+    """
+    return _CURRENT_SESSION.get()
+
+
+def supports_continuation(llm: Any) -> bool:
+    """
+    Check whether a provider can continue conversations without resending them.
+
+    Args:
+        llm: LLM provider instance (possibly wrapped)
+
+    Returns:
+        True if the provider exposes chat and context continuation
+    """
+    return all(callable(getattr(llm, name, None)) for name in ("chat_raw", "generate_continuation"))
+
+
+class ConversationSession:
+    """
+    A conversation with an LLM that reuses the model's KV cache across turns.
+
+    Two modes are supported:
+    - "chat": messages are kept locally and sent to /api/chat; Ollama reuses the
+      KV cache for the unchanged message prefix.
+    - "context": only the new turn's text is sent to /api/generate together with
+      the 'context' array returned by the previous turn.
+
+    Prompt-eval tokens and seconds are recorded per turn, so the cost of each
+    turn can be compared with resending the full prompt. A routed provider
+    records in `endpoint` the host serving each turn and sends the next turn
+    there, where the KV cache of the conversation is.
+
+    In chat mode the oldest exchanges are dropped before a turn that would not
+    fit the prompt budget (or exceed `max_turns`). Trimming goes down to three
+    quarters of the budget, so the kept prefix, and Ollama's cache of it, stays
+    the same for the following turns.
+    """
+
+    MODES = ("chat", "context")
+
+    # Share of the budget the history is trimmed down to
+    TRIM_TARGET = 0.75
+
+    def __init__(self, llm: Any, system_prompt: str = "", mode: str = "chat",
+                 max_turns: Optional[int] = None, budget: Optional[int] = None):
+        """
+        Initialize the session.
+
+        Args:
+            llm: Provider exposing chat_raw/generate_continuation (see supports_continuation)
+            system_prompt: System prompt sent once, with the first turn
+            mode: "chat" or "context"
+            max_turns: Chat mode: previous exchanges sent with a turn (None = no limit)
+            budget: Chat mode: prompt token budget (defaults to llm.prompt_budget(), if available)
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Modalità conversazione non valida: {mode} (valori ammessi: {', '.join(self.MODES)})")
+
+        self.llm = llm
+        self.system_prompt = system_prompt
+        self.mode = mode
+        self.messages: List[Dict[str, str]] = []
+        self.context: Optional[List[int]] = None
+        self.pending_observations: List[str] = []
+        self.turns: List[Dict[str, Any]] = []
+        self.max_turns = max_turns
+        if budget is None and callable(getattr(llm, "prompt_budget", None)):
+            budget = llm.prompt_budget()
+        self.budget = budget
+        self.trimmed_turns = 0
+        # Endpoint that served the last turn (set by routed providers)
+        self.endpoint: Optional[str] = None
+        if callable(getattr(llm, "count_tokens", None)):
+            self._count = llm.count_tokens
+        else:
+            self._count = get_token_estimator(getattr(llm, "model", "default")).estimate
+        self._lock = threading.Lock()
+
+        if system_prompt and mode == "chat":
+            self.messages.append({"role": "system", "content": system_prompt})
+
+    def add_observation(self, text: str):
+        """
+        Add information (e.g. a tool result) to the conversation without a model call.
+
+        The observation is sent together with the next turn.
+
+        Args:
+            text: Observation text
+        """
+        with self._lock:
+            self.pending_observations.append(text)
+
+    def _turn_text(self, text: str) -> str:
+        """Build the delta sent for a turn: pending observations, then the new text."""
+        parts = self.pending_observations + [text]
+        if self.mode == "context" and self.context is None and self.system_prompt:
+            parts.insert(0, self.system_prompt)
+        return "\n\n".join(part for part in parts if part)
+
+    def _chat_messages(self, delta: str) -> List[Dict[str, str]]:
+        """
+        Messages sent for a chat turn: system message, the latest exchanges that fit, then the new turn.
+
+        self.messages is only replaced once the turn succeeds.
+        """
+        head = self.messages[:1] if self.messages and self.messages[0]["role"] == "system" else []
+        exchanges = self.messages[len(head):]
+        pairs = len(exchanges) // 2
+        drop = 0
+        if self.max_turns is not None:
+            drop = max(pairs - max(self.max_turns, 0), 0)
+
+        if self.budget is not None and pairs > drop:
+            costs = [self._count(message["content"]) for message in exchanges]
+            fixed = sum(self._count(message["content"]) for message in head) + self._count(delta)
+            total = fixed + sum(costs[2 * drop:])
+            if total > self.budget:
+                target = self.budget * self.TRIM_TARGET
+                while drop < pairs and total > target:
+                    total -= costs[2 * drop] + costs[2 * drop + 1]
+                    drop += 1
+
+        if drop:
+            logger.info(f"✂️ Conversazione: {drop} turni più vecchi rimossi per restare nel contesto del modello")
+        return head + exchanges[2 * drop:] + [{"role": "user", "content": delta}]
+
+    def _record_turn(self, delta: str, result: Dict[str, Any], messages: Optional[List[Dict[str, str]]] = None,
+                     reply: str = "", observations: int = 0):
+        """Store the model state returned by a successful turn and log its prompt-eval cost."""
+        # Observations are consumed only by a turn that reached the model (later ones wait for the next turn)
+        del self.pending_observations[:observations]
+        if messages is not None:
+            self.trimmed_turns += (len(self.messages) + 1 - len(messages)) // 2
+            self.messages = messages + [{"role": "assistant", "content": reply}]
+        if self.mode == "context":
+            self.context = result.get("context") or self.context
+        turn = {
+            "turn": len(self.turns) + 1,
+            "delta_chars": len(delta),
+            "prompt_eval_tokens": result.get("prompt_eval_count"),
+            "prompt_eval_seconds": (result.get("prompt_eval_duration") or 0) / 1e9,
+        }
+        self.turns.append(turn)
+        logger.info(
+            f"📏 Turno {turn['turn']} ({self.mode}): {turn['delta_chars']} caratteri inviati, "
+            f"prompt eval {turn['prompt_eval_tokens']} token in {turn['prompt_eval_seconds']:.3f}s"
+        )
+
+    def send(self, text: str, **kwargs) -> str:
+        """
+        Send a new turn and return the model reply.
+
+        Args:
+            text: New user turn (delta only)
+            **kwargs: Additional generation parameters
+
+        Returns:
+            Model reply, or an error string (the conversation state, pending
+            observations included, is left unchanged)
+        """
+        with self._lock:
+            delta = self._turn_text(text)
+            messages = None
+            token = _CURRENT_SESSION.set(self)
+            try:
+                if self.mode == "chat":
+                    messages = self._chat_messages(delta)
+                    result = self.llm.chat_raw(messages, **kwargs)
+                    reply = (result.get("message") or {}).get("content", "")
+                else:
+                    result = self.llm.generate_continuation(delta, context=self.context, **kwargs)
+                    reply = result.get("response", "")
+            except Exception as e:
+                return self._format_error(e)
+            finally:
+                _CURRENT_SESSION.reset(token)
+
+            self._record_turn(delta, result, messages, reply, len(self.pending_observations))
+            return reply
+
+    def _format_error(self, error: Exception) -> str:
+        """Error string of a failed turn, for providers with or without format_error."""
+        format_error = getattr(self.llm, 'format_error', None)
+        if callable(format_error):
+            return format_error(error)
+        logger.error(f"❌ Errore LLM: {error}")
+        return f"Errore: {str(error)}"
+
+    def send_stream(self, text: str, **kwargs) -> Iterator[str]:
+        """
+        Send a new turn, yielding the reply as it is generated.
+
+        Args:
+            text: New user turn (delta only)
+            **kwargs: Additional generation parameters
+
+        Yields:
+            Reply fragments, in order
+        """
+        # The lock is not held while the stream is consumed: an abandoned generator must not block the session
+        with self._lock:
+            delta = self._turn_text(text)
+            observations = len(self.pending_observations)
+            messages = self._chat_messages(delta) if self.mode == "chat" else None
+            context = self.context
+        final = {}
+        fragments = []
+
+        if messages is not None:
+            stream = self.llm.chat_stream(messages, on_done=final.update, **kwargs)
+        else:
+            stream = self.llm.generate_stream(delta, context=context, on_done=final.update, **kwargs)
+
+        # The provider runs on each next(): mark it as this session's turn only meanwhile
+        iterator = iter(stream)
+        while True:
+            token = _CURRENT_SESSION.set(self)
+            try:
+                fragment = next(iterator, None)
+            finally:
+                _CURRENT_SESSION.reset(token)
+            if fragment is None:
+                break
+            fragments.append(fragment)
+            yield fragment
+
+        # on_done only fires when the stream completed without errors
+        if not final:
+            return
+        with self._lock:
+            self._record_turn(delta, final, messages, "".join(fragments), observations)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get per-turn prompt-eval statistics.
+
+        Returns:
+            Mode, number of turns, exchanges trimmed from the chat history and the per-turn records
+        """
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "turns": len(self.turns),
+                "trimmed_turns": self.trimmed_turns,
+                "prompt_eval_tokens": sum(t["prompt_eval_tokens"] or 0 for t in self.turns),
+                "history": list(self.turns),
+            }
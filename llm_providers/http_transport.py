@@ -0,0 +1,357 @@
+"""
+HTTP transport for modular-2 LLM providers.
+Provides a pooled, thread-safe keep-alive session with connection reuse statistics,
+and an optional aiohttp-based transport for the asyncio API.
+"""
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Dict, Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+try:
+    import aiohttp
+except ImportError:  # Optional dependency, only needed by the async API
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    """
+    Thread-safe counters for connection pool usage.
+    """
+
+    def __init__(self):
+        """Initialize the counters."""
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.checkouts = 0
+        self.new_connections = 0
+
+    def record_request(self):
+        """Count an outgoing HTTP request."""
+        with self._lock:
+            self.requests += 1
+
+    def record_checkout(self):
+        """Count a connection taken from the pool."""
+        with self._lock:
+            self.checkouts += 1
+
+    def record_new_connection(self):
+        """Count a connection opened because none was idle in the pool."""
+        with self._lock:
+            self.new_connections += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get a consistent copy of the counters.
+
+        Returns:
+            Dictionary with requests, hits, misses and hit rate
+        """
+        with self._lock:
+            hits = max(self.checkouts - self.new_connections, 0)
+            misses = self.new_connections
+            total = hits + misses
+            return {
+                "requests": self.requests,
+                "pool_hits": hits,
+                "pool_misses": misses,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+            }
+
+
+def _counting_pool_class(base_class, stats: PoolStats):
+    """Create a connection pool class that reports checkouts and new connections to stats."""
+
+    class CountingConnectionPool(base_class):
+        def _get_conn(self, timeout=None):
+            stats.record_checkout()
+            return super()._get_conn(timeout=timeout)
+
+        def _new_conn(self):
+            stats.record_new_connection()
+            return super()._new_conn()
+
+    CountingConnectionPool.__name__ = f"Counting{base_class.__name__}"
+    return CountingConnectionPool
+
+
+class _CountingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pool manager uses counting connection pools."""
+
+    def __init__(self, stats: PoolStats, **kwargs):
+        self._stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool_class(HTTPConnectionPool, self._stats),
+            "https": _counting_pool_class(HTTPSConnectionPool, self._stats),
+        }
+
+
+class PooledHTTPTransport:
+    """
+    Pooled keep-alive HTTP transport shared by all calls of a provider instance.
+
+    A single requests.Session is used: its urllib3 pools are thread-safe, so the
+    same transport can serve every agent that shares the provider.
+    """
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 10,
+                 max_connections_per_host: Optional[int] = None, keep_alive: bool = True):
+        """
+        Initialize the transport.
+
+        Args:
+            pool_connections: Number of per-host pools kept in the session
+            pool_maxsize: Idle connections kept alive for each host
+            max_connections_per_host: Hard cap on concurrent connections per host
+                (callers wait for a free connection instead of opening new ones)
+            keep_alive: Reuse connections between requests
+        """
+        self.pool_connections = int(pool_connections)
+        self.pool_maxsize = int(max_connections_per_host or pool_maxsize)
+        self.pool_block = max_connections_per_host is not None
+        self.keep_alive = bool(keep_alive)
+        self.stats = PoolStats()
+
+        self.session = requests.Session()
+        adapter = _CountingHTTPAdapter(
+            self.stats,
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Connection": "keep-alive" if self.keep_alive else "close"})
+
+        logger.debug(
+            f"🔌 Transport HTTP inizializzato (pool={self.pool_connections}, "
+            f"per host={self.pool_maxsize}, block={self.pool_block}, keep-alive={self.keep_alive})"
+        )
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "PooledHTTPTransport":
+        """
+        Create a transport from the provider configuration block.
+
+        Args:
+            config: Provider configuration (the `llm.config` YAML block)
+
+        Returns:
+            Configured transport
+        """
+        return cls(
+            pool_connections=config.get("pool_connections", 4),
+            pool_maxsize=config.get("pool_maxsize", 10),
+            max_connections_per_host=config.get("max_connections_per_host"),
+            keep_alive=config.get("http_keep_alive", True),
+        )
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a request through the pooled session.
+
+        Args:
+            method: HTTP method
+            url: Target URL
+            **kwargs: Arguments forwarded to requests.Session.request
+
+        Returns:
+            HTTP response
+        """
+        self.stats.record_request()
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Send a GET request through the pooled session."""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """Send a POST request through the pooled session."""
+        return self.request("POST", url, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get connection pool statistics.
+
+        Returns:
+            Dictionary with request count, pool hits/misses and pool settings
+        """
+        stats = self.stats.snapshot()
+        stats.update({
+            "pool_connections": self.pool_connections,
+            "pool_maxsize": self.pool_maxsize,
+            "pool_block": self.pool_block,
+            "keep_alive": self.keep_alive,
+        })
+        return stats
+
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
+        logger.debug("🔌 Transport HTTP chiuso")
+
+
+# Per-endpoint concurrency limits, shared by every provider instance in the process.
+# asyncio primitives belong to one event loop, so semaphores are kept per loop.
+_endpoint_semaphores = weakref.WeakKeyDictionary()
+_endpoint_semaphores_lock = threading.Lock()
+
+
+def endpoint_semaphore(endpoint: str, limit: int) -> asyncio.Semaphore:
+    """
+    Get the semaphore capping concurrent async requests to an endpoint.
+
+    Args:
+        endpoint: Endpoint base URL
+        limit: Maximum concurrent requests (the first caller for an endpoint sets it)
+
+    Returns:
+        Semaphore bound to the running event loop
+    """
+    loop = asyncio.get_running_loop()
+    with _endpoint_semaphores_lock:
+        per_loop = _endpoint_semaphores.setdefault(loop, {})
+        if endpoint not in per_loop:
+            per_loop[endpoint] = asyncio.Semaphore(limit)
+        return per_loop[endpoint]
+
+
+class AsyncHTTPTransport:
+    """
+    Pooled asyncio HTTP transport backed by aiohttp.
+
+    One ClientSession is kept per event loop. Client errors are re-raised as the
+    equivalent requests exceptions so providers handle sync and async failures alike.
+    """
+
+    def __init__(self, pool_maxsize: int = 100, max_connections_per_host: Optional[int] = None,
+                 keep_alive: bool = True):
+        """
+        Initialize the transport.
+
+        Args:
+            pool_maxsize: Maximum open connections across all hosts
+            max_connections_per_host: Maximum open connections per host (None for no limit)
+            keep_alive: Reuse connections between requests
+        """
+        self.pool_maxsize = int(pool_maxsize)
+        self.max_connections_per_host = max_connections_per_host
+        self.keep_alive = bool(keep_alive)
+        self._sessions = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "AsyncHTTPTransport":
+        """
+        Create a transport from the provider configuration block.
+
+        Args:
+            config: Provider configuration (the `llm.config` YAML block)
+
+        Returns:
+            Configured transport
+        """
+        return cls(
+            pool_maxsize=config.get("async_pool_size", 100),
+            max_connections_per_host=config.get("max_connections_per_host"),
+            keep_alive=config.get("http_keep_alive", True),
+        )
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        """Get (or lazily create) the session for the running event loop."""
+        if aiohttp is None:
+            raise ImportError("aiohttp non installato: esegui 'pip install aiohttp' per usare l'API async")
+
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_maxsize,
+                limit_per_host=self.max_connections_per_host or 0,
+                force_close=not self.keep_alive,
+            )
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[loop] = session
+            logger.debug(f"🔌 Sessione HTTP async creata (limit={self.pool_maxsize})")
+        return session
+
+    def _track(self, delta: int):
+        """Update in-flight counters."""
+        with self._lock:
+            if delta > 0:
+                self.requests += 1
+            self.in_flight += delta
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    async def request_json(self, method: str, url: str, json: Any = None,
+                           timeout: Optional[float] = None) -> Any:
+        """
+        Send a request and decode the JSON response.
+
+        Args:
+            method: HTTP method
+            url: Target URL
+            json: JSON request body
+            timeout: Total request timeout in seconds
+
+        Returns:
+            Decoded JSON response
+
+        Raises:
+            requests.exceptions.Timeout: If the request times out
+            requests.exceptions.ConnectionError: If the server is unreachable
+            requests.exceptions.HTTPError: For HTTP error statuses
+        """
+        session = self._get_session()
+        client_timeout = aiohttp.ClientTimeout(total=timeout)
+
+        self._track(1)
+        try:
+            async with session.request(method, url, json=json, timeout=client_timeout) as response:
+                if response.status >= 400:
+                    raise requests.exceptions.HTTPError(f"{response.status} {response.reason} per url: {url}")
+                return await response.json(content_type=None)
+        except asyncio.TimeoutError as e:
+            raise requests.exceptions.Timeout(str(e)) from e
+        except aiohttp.ClientConnectionError as e:
+            raise requests.exceptions.ConnectionError(str(e)) from e
+        finally:
+            self._track(-1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get async transport statistics.
+
+        Returns:
+            Dictionary with request count and in-flight concurrency
+        """
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "pool_maxsize": self.pool_maxsize,
+            }
+
+    async def aclose(self):
+        """Close the session bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.pop(loop, None)
+        if session is not None and not session.closed:
+            await session.close()
+            logger.debug("🔌 Sessione HTTP async chiusa")
@@ -0,0 +1,123 @@
+"""
+Metrics helpers for modular-2 LLM providers.
+Keeps bounded windows of per-call measurements and summarizes them.
+"""
+import threading
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Compute a percentile with linear interpolation.
+
+    Args:
+        values: Measurements (need not be sorted)
+        pct: Percentile between 0 and 100
+
+    Returns:
+        Percentile value, 0.0 for an empty list
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return float(ordered[0])
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return float(ordered[low] + (ordered[high] - ordered[low]) * (rank - low))
+
+
+class MetricsRecorder:
+    """
+    Thread-safe recorder of named measurements over a sliding window.
+    """
+
+    def __init__(self, window: int = 1000):
+        """
+        Initialize the recorder.
+
+        Args:
+            window: Number of most recent values kept per metric
+        """
+        self.window = window
+        self._values = {}
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, value: float):
+        """
+        Record one measurement.
+
+        Args:
+            name: Metric name
+            value: Measured value
+        """
+        with self._lock:
+            if name not in self._values:
+                self._values[name] = deque(maxlen=self.window)
+                self._totals[name] = 0
+            self._values[name].append(float(value))
+            self._totals[name] += 1
+
+    def values(self, name: str) -> List[float]:
+        """Get a copy of the values in the window for a metric."""
+        with self._lock:
+            return list(self._values.get(name, ()))
+
+    def last(self, name: str) -> Optional[float]:
+        """Get the most recent value for a metric."""
+        with self._lock:
+            values = self._values.get(name)
+            return values[-1] if values else None
+
+    def summary(self, name: str) -> Dict[str, Any]:
+        """
+        Summarize one metric.
+
+        Args:
+            name: Metric name
+
+        Returns:
+            Dictionary with count, mean, p50, p95, p99 and max over the window
+        """
+        with self._lock:
+            values = list(self._values.get(name, ()))
+            total = self._totals.get(name, 0)
+        if not values:
+            return {"count": total, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+        return {
+            "count": total,
+            "mean": round(sum(values) / len(values), 4),
+            "p50": round(percentile(values, 50), 4),
+            "p95": round(percentile(values, 95), 4),
+            "p99": round(percentile(values, 99), 4),
+            "max": round(max(values), 4),
+        }
+
+    @classmethod
+    def merged(cls, recorders: List["MetricsRecorder"]) -> "MetricsRecorder":
+        """
+        Combine several recorders, e.g. those of the endpoints behind one provider.
+
+        Args:
+            recorders: Recorders to combine
+
+        Returns:
+            New recorder holding every recorder's window and total count
+        """
+        merged = cls(window=sum(recorder.window for recorder in recorders) or 1)
+        for recorder in recorders:
+            with recorder._lock:
+                items = [(name, list(values), recorder._totals[name]) for name, values in recorder._values.items()]
+            for name, values, total in items:
+                merged._values.setdefault(name, deque(maxlen=merged.window)).extend(values)
+                merged._totals[name] = merged._totals.get(name, 0) + total
+        return merged
+
+    def summaries(self) -> Dict[str, Dict[str, Any]]:
+        """Summarize every recorded metric."""
+        with self._lock:
+            names = list(self._values.keys())
+        return {name: self.summary(name) for name in names}
@@ -2,13 +2,84 @@
 Ollama LLM Provider for modular-2 framework.
 Handles communication with Ollama API.
 """
+import asyncio
 import logging
 import requests
 import json
-from typing import Dict, Any, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Iterator, List, Optional, Sequence, Union
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency, only needed by embed()
+    np = None
+
+from llm_providers.http_transport import PooledHTTPTransport, AsyncHTTPTransport, endpoint_semaphore
+from llm_providers.metrics import MetricsRecorder
+from llm_providers.single_flight import SingleFlight
+from llm_providers.circuit_breaker import CircuitBreaker, CircuitOpenError, is_endpoint_fault
+from llm_providers.tokens import get_token_estimator
 
 logger = logging.getLogger(__name__)
 
+# Config keys consumed by the client itself and never forwarded as Ollama options
+CLIENT_CONFIG_KEYS = {
+    'temperature', 'max_tokens', 'timeout',
+    'pool_connections', 'pool_maxsize', 'max_connections_per_host', 'http_keep_alive',
+    'async_pool_size', 'max_concurrent_requests', 'coalesce_requests', 'keep_alive',
+    'context', 'circuit_failure_threshold', 'circuit_reset_timeout',
+    'embedding_model', 'embed_batch_size',
+}
+
+# Prompts sharing their first characters reuse the server's KV cache: the leading part hashed to detect cold prefixes
+COLD_PREFIX_CHARS = 512
+# Prompt prefixes remembered per provider instance
+COLD_PREFIX_ENTRIES = 1024
+# A prompt_eval_count at least this fraction of the estimate means the whole prompt was evaluated
+COLD_EVAL_RATIO = 0.8
+
+class OllamaResponseError(ValueError):
+    """Raised when Ollama answers with an unexpected payload."""
+
+
+class GenerationResult:
+    """
+    Outcome of one prompt in a batch: either the generated text or the error.
+    """
+    
+    def __init__(self, index: int, prompt: str, text: Optional[str] = None,
+                 error: Optional[Exception] = None, latency: float = 0.0, eval_count: int = 0):
+        """
+        Initialize the result.
+        
+        Args:
+            index: Position of the prompt in the batch
+            prompt: Input prompt
+            text: Generated text, None on failure
+            error: Exception raised for this prompt, None on success
+            latency: Request latency in seconds
+            eval_count: Tokens generated, as reported by Ollama
+        """
+        self.index = index
+        self.prompt = prompt
+        self.text = text
+        self.error = error
+        self.latency = latency
+        self.eval_count = eval_count or 0
+    
+    @property
+    def ok(self) -> bool:
+        """True if the prompt was generated successfully."""
+        return self.error is None
+    
+    def __repr__(self) -> str:
+        status = "ok" if self.ok else f"error={self.error!r}"
+        return f"GenerationResult(index={self.index}, {status}, latency={self.latency:.3f}s)"
+
+
 class OllamaLLM:
     """
     LLM provider for Ollama API.
@@ -32,42 +103,227 @@ class OllamaLLM:
         self.max_tokens = kwargs.get('max_tokens', 512)
         self.timeout = kwargs.get('timeout', 30)
         
+        # Pooled keep-alive transport shared by every call on this instance
+        self.transport = PooledHTTPTransport.from_config(kwargs)
+        self.async_transport = AsyncHTTPTransport.from_config(kwargs)
+        
+        # Cap on concurrent async requests to this endpoint (shared across instances)
+        self.max_concurrent_requests = kwargs.get('max_concurrent_requests', 16)
+        
+        # Share one HTTP call between identical concurrent requests
+        self.coalesce_requests = kwargs.get('coalesce_requests', True)
+        self.single_flight = SingleFlight()
+        
+        # Per-call latency measurements
+        self.metrics = MetricsRecorder()
+        
+        # How long Ollama keeps the model loaded after each request (e.g. "30m", -1 = forever)
+        self.keep_alive = kwargs.get('keep_alive')
+        self._keep_alive_stop = None
+        
+        # Embeddings: model (defaults to the generation model) and texts per request
+        self.embedding_model = kwargs.get('embedding_model', model)
+        self.embed_batch_size = kwargs.get('embed_batch_size', 64)
+        
+        # Context window and the per-model token estimator used to size prompts
+        self.num_ctx = kwargs.get('num_ctx', 2048)
+        self.token_estimator = get_token_estimator(self.model)
+        # Hashes of prompt prefixes already sent: later prompts with them are evaluated from the KV cache
+        self._seen_prefixes: "OrderedDict[int, None]" = OrderedDict()
+        self._prefix_lock = threading.Lock()
+        
+        # Optional circuit breaker: fail fast after repeated errors from this endpoint
+        failure_threshold = kwargs.get('circuit_failure_threshold')
+        self.circuit_breaker = None
+        if failure_threshold:
+            self.circuit_breaker = CircuitBreaker(
+                self.endpoint,
+                failure_threshold=failure_threshold,
+                reset_timeout=kwargs.get('circuit_reset_timeout', 30.0)
+            )
+        
         logger.info(f"📡 OllamaLLM inizializzato con modello: {self.model} - endpoint: {self.endpoint}")
     
-    def generate(self, prompt: str, **kwargs) -> str:
+    def generation_options(self, **kwargs) -> Dict[str, Any]:
         """
-        Generate response from Ollama model.
+        Get the Ollama options a request with these parameters would use.
+        
+        Args:
+            **kwargs: Generation parameters overriding the configured defaults
+            
+        Returns:
+            Options dictionary (temperature, num_predict and extra config options)
+        """
+        options = {
+            "temperature": kwargs.get('temperature', self.temperature),
+            "num_predict": kwargs.get('max_tokens', self.max_tokens),
+        }
+        
+        # Add any additional options from config
+        for key, value in self.config.items():
+            if key not in CLIENT_CONFIG_KEYS:
+                options[key] = value
+        
+        return options
+    
+    def _build_payload(self, prompt: str, stream: bool = False, **kwargs) -> Dict[str, Any]:
+        """
+        Build the /api/generate request body.
         
         Args:
             prompt: Input prompt
+            stream: Ask Ollama for NDJSON streaming output
             **kwargs: Additional generation parameters
             
         Returns:
-            Generated response as string
+            Request body dictionary
         """
-        try:
-            # Prepare request data
-            data = {
-                "model": self.model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": kwargs.get('temperature', self.temperature),
-                    "num_predict": kwargs.get('max_tokens', self.max_tokens),
-                }
-            }
-            
-            # Add any additional options from config
-            for key, value in self.config.items():
-                if key not in ['temperature', 'max_tokens', 'timeout']:
-                    data["options"][key] = value
-            
-            # Make API request
-            url = f"{self.endpoint}/api/generate"
-            
-            logger.debug(f"🔄 Invio richiesta a Ollama: {url}")
-            
-            response = requests.post(
+        data = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": self.generation_options(**kwargs),
+        }
+        if kwargs.get('context'):
+            # Continue a previous /api/generate conversation from its KV context
+            data["context"] = kwargs['context']
+        if self.keep_alive is not None:
+            data["keep_alive"] = self.keep_alive
+        
+        # Ollama silently drops the start of prompts that do not fit the context window
+        budget = self.prompt_budget(max_tokens=data["options"].get("num_predict"))
+        if len(prompt) > budget:
+            estimated = self.count_tokens(prompt)
+            if estimated > budget:
+                logger.warning(
+                    f"⚠️ Prompt di circa {estimated} token oltre il budget di {budget} "
+                    f"(num_ctx={self.num_ctx}): Ollama lo troncherà"
+                )
+        return data
+    
+    def count_tokens(self, text: str) -> int:
+        """
+        Estimate how many tokens a text costs for this model.
+        
+        Args:
+            text: Text to measure
+            
+        Returns:
+            Estimated token count
+        """
+        return self.token_estimator.estimate(text)
+    
+    def prompt_budget(self, max_tokens: Optional[int] = None) -> int:
+        """
+        Get the tokens available for the prompt: num_ctx minus the generation budget.
+        
+        Args:
+            max_tokens: Tokens reserved for the response (defaults to the configured max_tokens)
+            
+        Returns:
+            Prompt token budget
+        """
+        reserved = max_tokens if max_tokens is not None else self.max_tokens
+        return max(int(self.num_ctx) - int(reserved or 0), 0)
+    
+    def _build_chat_payload(self, messages: List[Dict[str, str]], stream: bool = False, **kwargs) -> Dict[str, Any]:
+        """
+        Build the /api/chat request body.
+        
+        Args:
+            messages: Conversation as a list of {'role', 'content'} messages
+            stream: Ask Ollama for NDJSON streaming output
+            **kwargs: Additional generation parameters
+            
+        Returns:
+            Request body dictionary
+        """
+        data = {
+            "model": self.model,
+            "messages": messages,
+            "stream": stream,
+            "options": self.generation_options(**kwargs),
+        }
+        if self.keep_alive is not None:
+            data["keep_alive"] = self.keep_alive
+        return data
+    
+    def format_error(self, error: Exception) -> str:
+        """
+        Log a request error and convert it to the provider's error string.
+        
+        Args:
+            error: Exception raised while talking to Ollama
+            
+        Returns:
+            Error message returned to the caller
+        """
+        if isinstance(error, CircuitOpenError):
+            logger.error(f"❌ {error}")
+            return "Errore: server Ollama temporaneamente escluso dopo errori ripetuti"
+        if isinstance(error, requests.exceptions.Timeout):
+            logger.error(f"❌ Timeout nella richiesta a Ollama ({self.timeout}s)")
+            return "Errore: timeout nella richiesta"
+        if isinstance(error, requests.exceptions.ConnectionError):
+            logger.error(f"❌ Impossibile connettersi a Ollama: {self.endpoint}")
+            return "Errore: impossibile connettersi al server Ollama"
+        if isinstance(error, requests.exceptions.HTTPError):
+            logger.error(f"❌ Errore HTTP da Ollama: {error}")
+            return f"Errore HTTP: {error}"
+        if isinstance(error, OllamaResponseError):
+            logger.error(f"❌ {error}")
+            return "Errore: formato risposta non valido"
+        if isinstance(error, json.JSONDecodeError):
+            logger.error(f"❌ Risposta Ollama non è JSON valido")
+            return "Errore: risposta non valida dal server"
+        logger.error(f"❌ Errore generico in OllamaLLM: {error}")
+        return f"Errore: {str(error)}"
+    
+    def _coalescing_key(self, data: Dict[str, Any]) -> str:
+        """Identity of a request body for single-flight coalescing."""
+        return json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    
+    def _request_generate(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        """
+        Call /api/generate and return the decoded response body.
+        
+        Identical concurrent requests share one HTTP call when coalescing is enabled.
+        
+        Raises:
+            requests.exceptions.RequestException: On transport or HTTP errors
+            OllamaResponseError: If the body has no 'response' field
+        """
+        # Prepare request data
+        data = self._build_payload(prompt, stream=False, **kwargs)
+        
+        if self.coalesce_requests:
+            return self.single_flight.do(self._coalescing_key(data), lambda: self._post_generate(data))
+        return self._post_generate(data)
+    
+    def _request_chat(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """
+        Call /api/chat and return the decoded response body.
+        
+        Raises:
+            requests.exceptions.RequestException: On transport or HTTP errors
+            OllamaResponseError: If the body has no 'message' field
+        """
+        data = self._build_chat_payload(messages, stream=False, **kwargs)
+        
+        if self.coalesce_requests:
+            key = "chat:" + self._coalescing_key(data)
+            return self.single_flight.do(key, lambda: self._post_generate(data, path="/api/chat"))
+        return self._post_generate(data, path="/api/chat")
+    
+    def _post_generate(self, data: Dict[str, Any], path: str = "/api/generate") -> Dict[str, Any]:
+        """Send a prepared /api/generate (or /api/chat) request body."""
+        # Make API request
+        url = f"{self.endpoint}{path}"
+        
+        logger.debug(f"🔄 Invio richiesta a Ollama: {url}")
+        
+        def send():
+            response = self.transport.post(
                 url,
                 json=data,
                 timeout=self.timeout,
@@ -75,37 +331,572 @@ class OllamaLLM:
             )
             
             response.raise_for_status()
+            return response
+        
+        # Parse response
+        result = self._guarded(send).json()
+        
+        expected_field = 'message' if path == "/api/chat" else 'response'
+        if expected_field not in result:
+            raise OllamaResponseError(f"Formato risposta Ollama non valido: {result}")
+        
+        logger.debug(f"✅ Risposta ricevuta da Ollama ({len(self._result_text(result))} caratteri)")
+        self._record_prompt_eval(result, data)
+        return result
+    
+    def _guarded(self, send: Callable[[], Any]) -> Any:
+        """Send a request through the circuit breaker, if one is configured."""
+        if self.circuit_breaker is None:
+            return send()
+        
+        self.circuit_breaker.before_request()
+        try:
+            result = send()
+        except Exception as e:
+            # Only the endpoint's own faults count: a bad request (4xx) must not open the circuit for everyone
+            if is_endpoint_fault(e):
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_ignored()
+            raise
+        self.circuit_breaker.record_success()
+        return result
+    
+    async def _aguarded(self, send: Callable[[], Any]) -> Any:
+        """Await a request through the circuit breaker, if one is configured."""
+        if self.circuit_breaker is None:
+            return await send()
+        
+        self.circuit_breaker.before_request()
+        try:
+            result = await send()
+        except Exception as e:
+            # Only the endpoint's own faults count: a bad request (4xx) must not open the circuit for everyone
+            if is_endpoint_fault(e):
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_ignored()
+            raise
+        self.circuit_breaker.record_success()
+        return result
+    
+    @staticmethod
+    def _result_text(result: Dict[str, Any]) -> str:
+        """Extract the generated text from a /api/generate or /api/chat body (or stream chunk)."""
+        if 'message' in result:
+            return (result.get('message') or {}).get('content', '')
+        return result.get('response', '')
+    
+    def _first_prefix_render(self, prompt: str) -> bool:
+        """Remember a prompt's prefix, returning True the first time it is sent from this instance."""
+        key = hash(prompt[:COLD_PREFIX_CHARS])
+        with self._prefix_lock:
+            if key in self._seen_prefixes:
+                self._seen_prefixes.move_to_end(key)
+                return False
+            self._seen_prefixes[key] = None
+            if len(self._seen_prefixes) > COLD_PREFIX_ENTRIES:
+                self._seen_prefixes.popitem(last=False)
+            return True
+    
+    def _is_cold_prompt(self, prompt: str, prompt_eval_count: int) -> bool:
+        """
+        Tell whether Ollama evaluated the whole prompt.
+        
+        With KV prefix reuse, prompt_eval_count only covers the part after the
+        cached prefix, so it calibrates the estimator only for cold prompts:
+        the first render of a prefix, or a count close to the estimate.
+        
+        Args:
+            prompt: Prompt that was sent
+            prompt_eval_count: Tokens Ollama reports as evaluated
+        
+        Returns:
+            True if the count measures the whole prompt
+        """
+        first_render = self._first_prefix_render(prompt)
+        return first_render or prompt_eval_count >= COLD_EVAL_RATIO * self.token_estimator.estimate(prompt)
+    
+    def _record_prompt_eval(self, result: Dict[str, Any], data: Optional[Dict[str, Any]] = None):
+        """Record how many prompt tokens Ollama evaluated and how long it took."""
+        prompt_eval_count = result.get('prompt_eval_count')
+        if prompt_eval_count is None:
+            return
+        # A full /api/generate prompt evaluated without cache reuse calibrates the token estimator
+        if data is not None and 'prompt' in data and not data.get('context'):
+            if self._is_cold_prompt(data['prompt'], prompt_eval_count):
+                self.token_estimator.calibrate(data['prompt'], prompt_eval_count)
+        prompt_eval_seconds = (result.get('prompt_eval_duration') or 0) / 1e9
+        self.metrics.record("prompt_eval_tokens", prompt_eval_count)
+        self.metrics.record("prompt_eval_seconds", prompt_eval_seconds)
+        logger.debug(f"📏 Prompt eval {self.model}: {prompt_eval_count} token in {prompt_eval_seconds:.3f}s")
+    
+    def generate_raw(self, prompt: str, **kwargs) -> str:
+        """
+        Generate response from Ollama model, raising on failure.
+        
+        Args:
+            prompt: Input prompt
+            **kwargs: Additional generation parameters
             
-            # Parse response
-            result = response.json()
+        Returns:
+            Generated response as string
             
-            if 'response' in result:
-                generated_text = result['response']
-                logger.debug(f"✅ Risposta ricevuta da Ollama ({len(generated_text)} caratteri)")
-                return generated_text
-            else:
-                logger.error(f"❌ Formato risposta Ollama non valido: {result}")
-                return "Errore: formato risposta non valido"
-                
-        except requests.exceptions.Timeout:
-            logger.error(f"❌ Timeout nella richiesta a Ollama ({self.timeout}s)")
-            return "Errore: timeout nella richiesta"
+        Raises:
+            requests.exceptions.RequestException: On transport or HTTP errors
+            OllamaResponseError: If Ollama returns an unexpected payload
+        """
+        return self._request_generate(prompt, **kwargs)['response']
+    
+    def generate(self, prompt: str, **kwargs) -> str:
+        """
+        Generate response from Ollama model.
         
-        except requests.exceptions.ConnectionError:
-            logger.error(f"❌ Impossibile connettersi a Ollama: {self.endpoint}")
-            return "Errore: impossibile connettersi al server Ollama"
+        Args:
+            prompt: Input prompt
+            **kwargs: Additional generation parameters
+            
+        Returns:
+            Generated response as string
+        """
+        try:
+            return self.generate_raw(prompt, **kwargs)
+        except Exception as e:
+            return self.format_error(e)
+    
+    def generate_continuation(self, prompt: str, context: Optional[List[int]] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Generate a conversation turn that continues from a previous KV context.
         
-        except requests.exceptions.HTTPError as e:
-            logger.error(f"❌ Errore HTTP da Ollama: {e}")
-            return f"Errore HTTP: {e}"
+        Only the new turn's text needs to be sent: Ollama restores the earlier
+        turns from `context` instead of re-evaluating them.
         
-        except json.JSONDecodeError:
-            logger.error(f"❌ Risposta Ollama non è JSON valido")
-            return "Errore: risposta non valida dal server"
+        Args:
+            prompt: New turn text (delta only)
+            context: 'context' array returned by the previous turn (None for the first turn)
+            **kwargs: Additional generation parameters
+            
+        Returns:
+            Full response body ('response', 'context', prompt_eval_count, ...)
+            
+        Raises:
+            requests.exceptions.RequestException: On transport or HTTP errors
+            OllamaResponseError: If Ollama returns an unexpected payload
+        """
+        return self._request_generate(prompt, context=context, **kwargs)
+    
+    def chat_raw(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """
+        Send a chat conversation to /api/chat, raising on failure.
+        
+        Ollama reuses the KV cache for the unchanged message prefix, so only
+        the newest messages are evaluated.
+        
+        Args:
+            messages: Conversation as a list of {'role', 'content'} messages
+            **kwargs: Additional generation parameters
+            
+        Returns:
+            Full response body ('message', prompt_eval_count, ...)
+        """
+        return self._request_chat(messages, **kwargs)
+    
+    def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """
+        Send a chat conversation to /api/chat.
+        
+        Args:
+            messages: Conversation as a list of {'role', 'content'} messages
+            **kwargs: Additional generation parameters
+            
+        Returns:
+            Assistant reply as string
+        """
+        try:
+            return self._result_text(self.chat_raw(messages, **kwargs))
+        except Exception as e:
+            return self.format_error(e)
+    
+    async def _arequest_generate(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        """
+        Call /api/generate asynchronously and return the decoded response body.
+        
+        Identical concurrent requests share one HTTP call when coalescing is enabled.
+        
+        Raises:
+            requests.exceptions.RequestException: On transport or HTTP errors
+            OllamaResponseError: If the body has no 'response' field
+        """
+        data = self._build_payload(prompt, stream=False, **kwargs)
+        
+        if self.coalesce_requests:
+            return await self.single_flight.ado(self._coalescing_key(data), lambda: self._apost_generate(data))
+        return await self._apost_generate(data)
+    
+    async def _apost_generate(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a prepared /api/generate request body asynchronously."""
+        url = f"{self.endpoint}/api/generate"
+        
+        async with endpoint_semaphore(self.endpoint, self.max_concurrent_requests):
+            logger.debug(f"🔄 Invio richiesta async a Ollama: {url}")
+            result = await self._aguarded(
+                lambda: self.async_transport.request_json("POST", url, json=data, timeout=self.timeout)
+            )
+        
+        if 'response' not in result:
+            raise OllamaResponseError(f"Formato risposta Ollama non valido: {result}")
+        
+        logger.debug(f"✅ Risposta async ricevuta da Ollama ({len(result['response'])} caratteri)")
+        self._record_prompt_eval(result, data)
+        return result
+    
+    async def agenerate_raw(self, prompt: str, **kwargs) -> str:
+        """
+        Generate response asynchronously, raising on failure.
+        
+        Args:
+            prompt: Input prompt
+            **kwargs: Additional generation parameters
+            
+        Returns:
+            Generated response as string
+        """
+        result = await self._arequest_generate(prompt, **kwargs)
+        return result['response']
+    
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        """
+        Generate response from Ollama model without blocking the event loop.
+        
+        Concurrent calls to the same endpoint are capped by the
+        `max_concurrent_requests` setting.
+        
+        Args:
+            prompt: Input prompt
+            **kwargs: Additional generation parameters
+            
+        Returns:
+            Generated response as string
+        """
+        try:
+            return await self.agenerate_raw(prompt, **kwargs)
+        except Exception as e:
+            return self.format_error(e)
+    
+    def generate_many(self, prompts: List[str], max_concurrency: int = 4, **kwargs) -> List[GenerationResult]:
+        """
+        Generate responses for many independent prompts concurrently.
+        
+        Requests are fanned out over the pooled transport by a thread pool.
+        Aggregate throughput is logged and recorded in the provider metrics.
+        
+        Args:
+            prompts: Input prompts
+            max_concurrency: Maximum requests in flight at once
+            **kwargs: Generation parameters applied to every prompt
+            
+        Returns:
+            One GenerationResult per prompt, in input order
+        """
+        if not prompts:
+            return []
+        
+        def run_one(index: int, prompt: str) -> GenerationResult:
+            started = time.perf_counter()
+            try:
+                result = self._request_generate(prompt, **kwargs)
+                return GenerationResult(index, prompt, text=result['response'],
+                                        latency=time.perf_counter() - started,
+                                        eval_count=result.get('eval_count', 0))
+            except Exception as e:
+                logger.warning(f"⚠️ Prompt {index} fallito nel batch: {e}")
+                return GenerationResult(index, prompt, error=e, latency=time.perf_counter() - started)
+        
+        started = time.perf_counter()
+        workers = max(1, min(max_concurrency, len(prompts)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ollama-batch") as executor:
+            results = list(executor.map(run_one, range(len(prompts)), prompts))
+        elapsed = time.perf_counter() - started
+        
+        self._record_batch_metrics(results, elapsed)
+        return results
+    
+    def _record_batch_metrics(self, results: List[GenerationResult], elapsed: float):
+        """Record and log aggregate throughput of a batch."""
+        succeeded = sum(1 for r in results if r.ok)
+        tokens = sum(r.eval_count for r in results)
+        prompts_per_sec = len(results) / elapsed if elapsed > 0 else 0.0
+        tokens_per_sec = tokens / elapsed if elapsed > 0 else 0.0
+        
+        self.metrics.record("batch_prompts_per_sec", prompts_per_sec)
+        self.metrics.record("batch_tokens_per_sec", tokens_per_sec)
+        
+        logger.info(
+            f"📦 Batch {self.model}: {succeeded}/{len(results)} prompt riusciti in {elapsed:.2f}s "
+            f"({prompts_per_sec:.2f} prompt/s, {tokens_per_sec:.1f} token/s)"
+        )
+    
+    def generate_stream(self, prompt: str, on_done: Optional[Callable[[Dict[str, Any]], None]] = None,
+                        **kwargs) -> Iterator[str]:
+        """
+        Generate response from Ollama model, yielding tokens as they arrive.
         
+        Time-to-first-token and tokens/sec are recorded for every call and
+        available through get_stream_metrics().
+        
+        Args:
+            prompt: Input prompt
+            on_done: Called with Ollama's final chunk (stats, context) when the stream completes
+            **kwargs: Additional generation parameters
+            
+        Yields:
+            Response fragments, in order
+        """
+        try:
+            data = self._build_payload(prompt, stream=True, **kwargs)
         except Exception as e:
-            logger.error(f"❌ Errore generico in OllamaLLM: {e}")
-            return f"Errore: {str(e)}"
+            yield self.format_error(e)
+            return
+        yield from self._stream_request("/api/generate", data, on_done)
+    
+    def chat_stream(self, messages: List[Dict[str, str]], on_done: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    **kwargs) -> Iterator[str]:
+        """
+        Continue a chat conversation, yielding tokens as they arrive.
+        
+        Args:
+            messages: Conversation as a list of {'role', 'content'} messages
+            on_done: Called with Ollama's final chunk when the stream completes
+            **kwargs: Additional generation parameters
+            
+        Yields:
+            Response fragments, in order
+        """
+        try:
+            data = self._build_chat_payload(messages, stream=True, **kwargs)
+        except Exception as e:
+            yield self.format_error(e)
+            return
+        yield from self._stream_request("/api/chat", data, on_done)
+    
+    def _stream_request(self, path: str, data: Dict[str, Any],
+                        on_done: Optional[Callable[[Dict[str, Any]], None]] = None) -> Iterator[str]:
+        """Send a streaming request and yield the tokens of its NDJSON chunks."""
+        url = f"{self.endpoint}{path}"
+        started = time.perf_counter()
+        first_token_at = None
+        chunk_count = 0
+        final_chunk = {}
+        
+        try:
+            logger.debug(f"🔄 Invio richiesta streaming a Ollama: {url}")
+            
+            # The breaker only guards opening the stream
+            response = self._guarded(lambda: self._open_stream(url, data))
+            with response:
+                
+                # Ollama streams one JSON object per line (NDJSON)
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    
+                    if 'error' in chunk:
+                        logger.error(f"❌ Errore nello streaming Ollama: {chunk['error']}")
+                        yield f"Errore: {chunk['error']}"
+                        return
+                    
+                    token = self._result_text(chunk)
+                    if token:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        chunk_count += 1
+                        yield token
+                    
+                    if chunk.get('done'):
+                        final_chunk = chunk
+                        break
+        
+        except Exception as e:
+            yield self.format_error(e)
+            return
+        
+        self._record_stream_metrics(started, first_token_at, chunk_count, final_chunk)
+        self._record_prompt_eval(final_chunk, data)
+        if on_done is not None:
+            on_done(final_chunk)
+    
+    def _open_stream(self, url: str, data: Dict[str, Any]) -> requests.Response:
+        """Send a streaming request and check its status before reading the body."""
+        response = self.transport.post(
+            url,
+            json=data,
+            timeout=self.timeout,
+            headers={'Content-Type': 'application/json'},
+            stream=True
+        )
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
+        return response
+    
+    def _record_stream_metrics(self, started: float, first_token_at: Optional[float],
+                               chunk_count: int, final_chunk: Dict[str, Any]):
+        """Record time-to-first-token and tokens/sec for a completed stream."""
+        finished = time.perf_counter()
+        
+        if first_token_at is None:
+            logger.debug("ℹ️ Stream Ollama terminato senza token")
+            return
+        
+        ttft = first_token_at - started
+        
+        # Prefer Ollama's own counters, fall back to wall clock and chunk count
+        eval_count = final_chunk.get('eval_count') or chunk_count
+        eval_duration_ns = final_chunk.get('eval_duration')
+        if eval_duration_ns:
+            tokens_per_sec = eval_count / (eval_duration_ns / 1e9)
+        else:
+            generation_time = finished - first_token_at
+            tokens_per_sec = eval_count / generation_time if generation_time > 0 else 0.0
+        
+        self.metrics.record("ttft_seconds", ttft)
+        self.metrics.record("tokens_per_sec", tokens_per_sec)
+        self.metrics.record("stream_seconds", finished - started)
+        
+        logger.info(f"⏱️ Streaming {self.model}: primo token in {ttft:.3f}s, {tokens_per_sec:.1f} token/s ({eval_count} token)")
+    
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get every latency and throughput metric recorded by this provider.
+        
+        Returns:
+            Summaries keyed by metric name
+        """
+        return self.metrics.summaries()
+    
+    def get_stream_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get streaming latency metrics.
+        
+        Returns:
+            Summaries for ttft_seconds, tokens_per_sec and stream_seconds
+        """
+        return {name: self.metrics.summary(name) for name in ("ttft_seconds", "tokens_per_sec", "stream_seconds")}
+    
+    def _embed_batches(self, texts: Union[str, Sequence[str]], batch_size: Optional[int]) -> List[List[str]]:
+        """Split the input texts into request-sized batches."""
+        if np is None:
+            raise ImportError("numpy non installato: esegui 'pip install numpy' per usare embed()")
+        if isinstance(texts, str):
+            texts = [texts]
+        batch_size = max(1, int(batch_size or self.embed_batch_size))
+        return [list(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+    
+    def _build_embed_payload(self, batch: List[str], model: Optional[str]) -> Dict[str, Any]:
+        """Build the /api/embed request body for one batch."""
+        data = {"model": model or self.embedding_model, "input": batch, "truncate": True}
+        if self.keep_alive is not None:
+            data["keep_alive"] = self.keep_alive
+        return data
+    
+    @staticmethod
+    def _check_embeddings(result: Dict[str, Any], batch: List[str]) -> List[List[float]]:
+        """Validate an /api/embed response against the batch it answers."""
+        embeddings = result.get('embeddings')
+        if not isinstance(embeddings, list) or len(embeddings) != len(batch):
+            raise OllamaResponseError(f"Formato risposta embeddings Ollama non valido: {str(result)[:200]}")
+        return embeddings
+    
+    def _embedding_matrix(self, blocks: List[List[List[float]]], count: int, started: float) -> "np.ndarray":
+        """Copy the per-batch embeddings into one contiguous float32 matrix."""
+        dimensions = len(blocks[0][0]) if blocks and blocks[0] else 0
+        matrix = np.empty((count, dimensions), dtype=np.float32)
+        row = 0
+        for block in blocks:
+            matrix[row:row + len(block)] = np.asarray(block, dtype=np.float32)
+            row += len(block)
+        
+        elapsed = time.perf_counter() - started
+        texts_per_sec = count / elapsed if elapsed > 0 else 0.0
+        self.metrics.record("embed_texts_per_sec", texts_per_sec)
+        logger.debug(f"🧮 {count} embeddings ({dimensions} dimensioni) in {elapsed:.3f}s ({texts_per_sec:.1f} testi/s)")
+        return matrix
+    
+    def _post_embed(self, batch: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """Send one /api/embed request and return its embeddings."""
+        url = f"{self.endpoint}/api/embed"
+        data = self._build_embed_payload(batch, model)
+        
+        def send():
+            response = self.transport.post(url, json=data, timeout=self.timeout)
+            response.raise_for_status()
+            return response
+        
+        return self._check_embeddings(self._guarded(send).json(), batch)
+    
+    async def _apost_embed(self, batch: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """Send one /api/embed request asynchronously and return its embeddings."""
+        url = f"{self.endpoint}/api/embed"
+        data = self._build_embed_payload(batch, model)
+        async with endpoint_semaphore(self.endpoint, self.max_concurrent_requests):
+            result = await self._aguarded(
+                lambda: self.async_transport.request_json("POST", url, json=data, timeout=self.timeout)
+            )
+        return self._check_embeddings(result, batch)
+    
+    def embed(self, texts: Union[str, Sequence[str]], batch_size: Optional[int] = None,
+              max_concurrency: int = 4, model: Optional[str] = None) -> "np.ndarray":
+        """
+        Compute embeddings for many texts.
+        
+        Texts are split into batches of `batch_size` sent to /api/embed
+        concurrently over the pooled transport; texts longer than the model's
+        context are truncated by Ollama.
+        
+        Args:
+            texts: Text or list of texts
+            batch_size: Texts per request (defaults to the embed_batch_size setting)
+            max_concurrency: Maximum requests in flight at once
+            model: Embedding model (defaults to the embedding_model setting)
+            
+        Returns:
+            float32 matrix with one row per text, in input order
+            
+        Raises:
+            requests.exceptions.RequestException: On transport or HTTP errors
+            OllamaResponseError: If Ollama returns an unexpected payload
+        """
+        batches = self._embed_batches(texts, batch_size)
+        count = sum(len(batch) for batch in batches)
+        started = time.perf_counter()
+        
+        if len(batches) <= 1:
+            blocks = [self._post_embed(batch, model) for batch in batches]
+        else:
+            workers = max(1, min(max_concurrency, len(batches)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ollama-embed") as executor:
+                blocks = list(executor.map(lambda batch: self._post_embed(batch, model), batches))
+        
+        return self._embedding_matrix(blocks, count, started)
+    
+    async def aembed(self, texts: Union[str, Sequence[str]], batch_size: Optional[int] = None,
+                     model: Optional[str] = None) -> "np.ndarray":
+        """
+        Compute embeddings asynchronously (see embed).
+        
+        Batches are sent concurrently, capped by `max_concurrent_requests`.
+        
+        Returns:
+            float32 matrix with one row per text, in input order
+        """
+        batches = self._embed_batches(texts, batch_size)
+        count = sum(len(batch) for batch in batches)
+        started = time.perf_counter()
+        blocks = await asyncio.gather(*(self._apost_embed(batch, model) for batch in batches))
+        return self._embedding_matrix(list(blocks), count, started)
     
     def is_available(self) -> bool:
         """
@@ -116,7 +907,7 @@ class OllamaLLM:
         """
         try:
             url = f"{self.endpoint}/api/tags"
-            response = requests.get(url, timeout=5)
+            response = self.transport.get(url, timeout=5)
             response.raise_for_status()
             
             logger.debug("✅ Ollama service disponibile")
@@ -135,7 +926,7 @@ class OllamaLLM:
         """
         try:
             url = f"{self.endpoint}/api/tags"
-            response = requests.get(url, timeout=10)
+            response = self.transport.get(url, timeout=10)
             response.raise_for_status()
             
             result = response.json()
@@ -164,7 +955,7 @@ class OllamaLLM:
             url = f"{self.endpoint}/api/show"
             data = {"name": self.model}
             
-            response = requests.post(url, json=data, timeout=10)
+            response = self.transport.post(url, json=data, timeout=10)
             response.raise_for_status()
             
             result = response.json()
@@ -175,6 +966,135 @@ class OllamaLLM:
             logger.error(f"❌ Errore nel recupero info modello: {e}")
             return {}
     
+    def get_coalescing_stats(self) -> Dict[str, Any]:
+        """
+        Get request coalescing statistics for this provider.
+        
+        Returns:
+            Calls received, HTTP requests actually sent and deduplicated calls
+        """
+        return self.single_flight.get_stats()
+    
+    def get_circuit_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Get circuit breaker statistics for this endpoint.
+        
+        Returns:
+            Breaker state and counters, or None if no breaker is configured
+        """
+        if self.circuit_breaker is None:
+            return None
+        return self.circuit_breaker.get_stats()
+    
+    def get_transport_stats(self) -> Dict[str, Any]:
+        """
+        Get connection pool statistics for this provider.
+        
+        Returns:
+            Pool hit/miss statistics and pool settings
+        """
+        return self.transport.get_stats()
+    
+    def get_async_transport_stats(self) -> Dict[str, Any]:
+        """
+        Get async transport statistics for this provider.
+        
+        Returns:
+            Request count and in-flight concurrency
+        """
+        return self.async_transport.get_stats()
+    
+    def warm_up(self, keep_alive: Any = None) -> Dict[str, Any]:
+        """
+        Preload the model with a zero-token generate request.
+        
+        The first request loads the model (cold start); a second one measures
+        the warm round trip. Both latencies are logged.
+        
+        Args:
+            keep_alive: How long Ollama keeps the model loaded (defaults to the configured keep_alive)
+            
+        Returns:
+            Dictionary with cold/warm latency and Ollama's load duration (seconds), or an error
+        """
+        data = {"model": self.model, "prompt": "", "stream": False}
+        keep_alive = keep_alive if keep_alive is not None else self.keep_alive
+        if keep_alive is not None:
+            data["keep_alive"] = keep_alive
+        url = f"{self.endpoint}/api/generate"
+        
+        try:
+            started = time.perf_counter()
+            response = self.transport.post(url, json=data, timeout=max(self.timeout, 300))
+            response.raise_for_status()
+            cold_seconds = time.perf_counter() - started
+            load_seconds = response.json().get('load_duration', 0) / 1e9
+            
+            started = time.perf_counter()
+            response = self.transport.post(url, json=data, timeout=self.timeout)
+            response.raise_for_status()
+            warm_seconds = time.perf_counter() - started
+            
+        except Exception as e:
+            logger.warning(f"⚠️ Warm-up del modello {self.model} fallito: {e}")
+            return {"model": self.model, "error": str(e)}
+        
+        self.metrics.record("cold_start_seconds", cold_seconds)
+        self.metrics.record("warm_start_seconds", warm_seconds)
+        logger.info(
+            f"🔥 Modello {self.model} pronto: avvio a freddo {cold_seconds:.2f}s "
+            f"(caricamento {load_seconds:.2f}s), a caldo {warm_seconds:.3f}s"
+        )
+        return {
+            "model": self.model,
+            "cold_seconds": round(cold_seconds, 4),
+            "warm_seconds": round(warm_seconds, 4),
+            "load_seconds": round(load_seconds, 4),
+        }
+    
+    def start_keep_alive(self, interval: float, keep_alive: Any = None):
+        """
+        Keep the model resident by re-sending a zero-token request periodically.
+        
+        The refresher runs in a daemon thread until close() is called.
+        
+        Args:
+            interval: Seconds between refresh requests
+            keep_alive: keep_alive value sent with each refresh
+        """
+        if self._keep_alive_stop is not None:
+            return
+        
+        stop = threading.Event()
+        self._keep_alive_stop = stop
+        data = {"model": self.model, "prompt": "", "stream": False}
+        keep_alive = keep_alive if keep_alive is not None else self.keep_alive
+        if keep_alive is not None:
+            data["keep_alive"] = keep_alive
+        url = f"{self.endpoint}/api/generate"
+        
+        def refresh():
+            while not stop.wait(interval):
+                try:
+                    self.transport.post(url, json=data, timeout=self.timeout).raise_for_status()
+                    logger.debug(f"🔥 Modello {self.model} mantenuto in memoria")
+                except Exception as e:
+                    logger.warning(f"⚠️ Refresh keep-alive del modello {self.model} fallito: {e}")
+        
+        threading.Thread(target=refresh, name=f"ollama-keepalive-{self.model}", daemon=True).start()
+        logger.info(f"🔥 Keep-alive attivo per {self.model} (ogni {interval}s)")
+    
+    def close(self):
+        """Release pooled HTTP connections and stop the keep-alive refresher."""
+        if self._keep_alive_stop is not None:
+            self._keep_alive_stop.set()
+            self._keep_alive_stop = None
+        self.transport.close()
+    
+    async def aclose(self):
+        """Release the async HTTP session of the running event loop."""
+        await self.async_transport.aclose()
+    
     def __str__(self) -> str:
         """String representation of the LLM provider."""
         return f"OllamaLLM(model={self.model}, endpoint={self.endpoint})"
@@ -0,0 +1,401 @@
+"""
+LLM response cache for modular-2 framework.
+Two-tier (in-memory LRU + on-disk SQLite) cache that can be put in front of any provider.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Response store with an in-memory LRU tier and an optional SQLite tier.
+
+    Entries expire after `ttl` seconds. Each tier has its own size cap; the
+    least recently used entries are evicted first.
+    """
+
+    def __init__(self, ttl: Optional[float] = 3600, max_entries: int = 1000,
+                 path: Optional[str] = None, max_disk_entries: int = 100000):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl: Entry lifetime in seconds (None for no expiry)
+            max_entries: Maximum entries kept in memory
+            path: SQLite file for the persistent tier (None for memory only)
+            max_disk_entries: Maximum entries kept on disk
+        """
+        self.ttl = ttl
+        self.max_entries = max(1, int(max_entries))
+        self.max_disk_entries = max(1, int(max_disk_entries))
+        self.path = path
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0,
+            "stores": 0, "evictions": 0, "expirations": 0, "bypasses": 0,
+        }
+
+        self._db = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+            self._db.commit()
+
+        logger.debug(f"🗄️ ResponseCache inizializzata (ttl={ttl}, memoria={self.max_entries}, disco={path})")
+
+    @staticmethod
+    def make_key(model: str, prompt: str, options: Dict[str, Any]) -> str:
+        """
+        Build the cache key for a request.
+
+        Args:
+            model: Model name
+            prompt: Full prompt
+            options: Generation options
+
+        Returns:
+            Hex digest identifying the request
+        """
+        payload = json.dumps({"model": model, "prompt": prompt, "options": options},
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def _count(self, name: str, amount: int = 1):
+        self._stats[name] += amount
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached response, or None on miss or expiry
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self._count("memory_hits")
+                    return value
+                del self._memory[key]
+                self._count("expirations")
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created_at = row
+                    if not self._expired(created_at, now):
+                        self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        self._put_memory(key, value, created_at)
+                        self._count("disk_hits")
+                        return value
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._count("expirations")
+
+            self._count("misses")
+            return None
+
+    def set(self, key: str, value: str):
+        """
+        Store a response in every tier.
+
+        Args:
+            key: Cache key
+            value: Response text
+        """
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, value, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                )
+                self._evict_disk()
+                self._db.commit()
+            self._count("stores")
+
+    def _put_memory(self, key: str, value: str, created_at: float):
+        """Insert into the memory tier, evicting the least recently used entries."""
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._count("evictions")
+
+    def _evict_disk(self):
+        """Trim the disk tier to its size cap, oldest access first."""
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)", (excess,)
+            )
+            self._count("evictions", excess)
+
+    def record_bypass(self):
+        """Count a request that skipped the cache."""
+        with self._lock:
+            self._count("bypasses")
+
+    def clear(self):
+        """Remove every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+        logger.info("🧹 Cache risposte LLM pulita")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            Hit/miss/eviction counters, hit rate and current sizes
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            if self._db is not None:
+                (stats["disk_entries"],) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        return stats
+
+    def close(self):
+        """Close the SQLite tier."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class CachedLLM:
+    """
+    Provider wrapper serving repeated requests from a ResponseCache.
+
+    Requests with temperature > 0 are not deterministic and bypass the cache
+    unless `cache_nondeterministic` is set; so do requests continuing a
+    conversation (`context`) or asking for the final metadata (`on_done`). Every attribute not defined here is
+    delegated to the wrapped provider.
+    """
+
+    def __init__(self, llm, cache: ResponseCache, cache_nondeterministic: bool = False):
+        """
+        Initialize the wrapper.
+
+        Args:
+            llm: Provider instance to wrap
+            cache: Response cache
+            cache_nondeterministic: Cache responses even when temperature > 0
+        """
+        self.llm = llm
+        self.cache = cache
+        self.cache_nondeterministic = cache_nondeterministic
+        logger.info(f"🗄️ Cache risposte attiva per {llm}")
+
+    @classmethod
+    def from_config(cls, llm, cache_config: Dict[str, Any]) -> "CachedLLM":
+        """
+        Wrap a provider using the `cache` YAML block of an LLM.
+
+        Args:
+            llm: Provider instance to wrap
+            cache_config: Cache configuration
+
+        Returns:
+            Cached provider
+        """
+        cache = ResponseCache(
+            ttl=cache_config.get("ttl", 3600),
+            max_entries=cache_config.get("max_entries", 1000),
+            path=cache_config.get("path"),
+            max_disk_entries=cache_config.get("max_disk_entries", 100000),
+        )
+        return cls(llm, cache, cache_nondeterministic=cache_config.get("cache_nondeterministic", False))
+
+    def __getattr__(self, name: str):
+        return getattr(self.llm, name)
+
+    def _options(self, **kwargs) -> Dict[str, Any]:
+        """Get the effective generation options of the wrapped provider."""
+        if hasattr(self.llm, 'generation_options'):
+            return self.llm.generation_options(**kwargs)
+        options = {"temperature": getattr(self.llm, 'temperature', None),
+                   "max_tokens": getattr(self.llm, 'max_tokens', None)}
+        options.update(kwargs)
+        return options
+
+    def _cache_key(self, prompt: str, **kwargs) -> Optional[str]:
+        """Get the cache key for a request, or None if it must bypass the cache."""
+        force = kwargs.pop('force_cache', False)
+        if kwargs.get('context') is not None or kwargs.get('on_done') is not None:
+            # The reply continues a conversation state the key does not capture,
+            # or the caller needs the final response metadata a cache hit cannot give
+            self.cache.record_bypass()
+            return None
+        options = self._options(**kwargs)
+        temperature = options.get('temperature') or 0
+        if temperature > 0 and not (force or self.cache_nondeterministic):
+            self.cache.record_bypass()
+            return None
+        return ResponseCache.make_key(getattr(self.llm, 'model', ''), prompt, options)
+
+    def _format_error(self, error: Exception) -> str:
+        if hasattr(self.llm, 'format_error'):
+            return self.llm.format_error(error)
+        logger.error(f"❌ Errore LLM: {error}")
+        return f"Errore: {str(error)}"
+
+    def generate_raw(self, prompt: str, **kwargs) -> str:
+        """
+        Generate a response, serving it from the cache when possible.
+
+        Args:
+            prompt: Input prompt
+            **kwargs: Generation parameters; force_cache=True caches even when temperature > 0
+
+        Returns:
+            Generated response as string
+
+        Raises:
+            Exception: Whatever the wrapped provider raises on failure
+        """
+        key = self._cache_key(prompt, **kwargs)
+        kwargs.pop('force_cache', None)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                logger.debug("🎯 Risposta LLM servita dalla cache")
+                return cached
+
+        if hasattr(self.llm, 'generate_raw'):
+            response = self.llm.generate_raw(prompt, **kwargs)
+        else:
+            response = self.llm.generate(prompt, **kwargs)
+            # generate() reports failures as an error string instead of raising: never cache those
+            if response.lstrip().startswith("Errore"):
+                return response
+
+        if key is not None:
+            self.cache.set(key, response)
+        return response
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        """Generate a response through the cache, returning an error string on failure."""
+        try:
+            return self.generate_raw(prompt, **kwargs)
+        except Exception as e:
+            return self._format_error(e)
+
+    async def agenerate_raw(self, prompt: str, **kwargs) -> str:
+        """Generate a response asynchronously through the cache, raising on failure."""
+        key = self._cache_key(prompt, **kwargs)
+        kwargs.pop('force_cache', None)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                logger.debug("🎯 Risposta LLM servita dalla cache")
+                return cached
+
+        response = await self.llm.agenerate_raw(prompt, **kwargs)
+
+        if key is not None:
+            self.cache.set(key, response)
+        return response
+
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        """Generate a response asynchronously through the cache, returning an error string on failure."""
+        try:
+            return await self.agenerate_raw(prompt, **kwargs)
+        except Exception as e:
+            return self._format_error(e)
+
+    def generate_stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """
+        Stream a response, serving cache hits as a single fragment.
+
+        Streamed misses are not stored: a partial or failed stream cannot be
+        told apart from a complete answer.
+        """
+        key = self._cache_key(prompt, **kwargs)
+        kwargs.pop('force_cache', None)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        yield from self.llm.generate_stream(prompt, **kwargs)
+
+    def generate_many(self, prompts: List[str], max_concurrency: int = 4, **kwargs) -> List[Any]:
+        """
+        Generate many prompts, sending only cache misses to the wrapped provider.
+
+        Returns:
+            One GenerationResult per prompt, in input order
+        """
+        from llm_providers.ollama_llm import GenerationResult
+
+        force = kwargs.pop('force_cache', False)
+        results = [None] * len(prompts)
+        keys = {}
+        for index, prompt in enumerate(prompts):
+            key = self._cache_key(prompt, force_cache=force, **kwargs)
+            cached = self.cache.get(key) if key is not None else None
+            if cached is not None:
+                results[index] = GenerationResult(index, prompt, text=cached)
+            else:
+                keys[index] = key
+
+        if keys:
+            pending = list(keys.keys())
+            generated = self.llm.generate_many([prompts[i] for i in pending], max_concurrency=max_concurrency, **kwargs)
+            for index, result in zip(pending, generated):
+                result.index = index
+                results[index] = result
+                if result.ok and keys[index] is not None:
+                    self.cache.set(keys[index], result.text)
+
+        return results
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get the response cache counters."""
+        return self.cache.get_stats()
+
+    def __str__(self) -> str:
+        return f"CachedLLM({self.llm})"
+
+    def __repr__(self) -> str:
+        return f"CachedLLM(llm={self.llm!r}, ttl={self.cache.ttl})"
@@ -0,0 +1,898 @@
+"""
+Multi-endpoint routing for modular-2 LLM providers.
+Spreads requests for one model over several Ollama hosts, skipping unhealthy ones.
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from contextlib import ExitStack
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import requests
+
+from llm_providers.ollama_llm import OllamaLLM, GenerationResult
+from llm_providers.circuit_breaker import is_endpoint_fault
+from llm_providers.conversation import current_session
+from llm_providers.metrics import MetricsRecorder, percentile
+from llm_providers.scheduler import SchedulerRejectedError, aendpoint_slot, endpoint_slot
+from llm_providers.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class StreamIncompleteError(RuntimeError):
+    """A routed stream ended without its final chunk (the endpoint failed mid-stream)."""
+
+
+class EndpointState:
+    """
+    Load and health bookkeeping for one routed endpoint.
+    """
+
+    def __init__(self, llm: OllamaLLM):
+        """
+        Initialize the state.
+
+        Args:
+            llm: Provider bound to the endpoint
+        """
+        self.llm = llm
+        self.endpoint = llm.endpoint
+        self.outstanding = 0
+        self.ewma_latency: Optional[float] = None
+        self.healthy = True
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        # Timeouts and server errors since the last success
+        self.failures = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get a copy of the counters.
+
+        Returns:
+            Dictionary with load, latency and health of the endpoint
+        """
+        return {
+            "endpoint": self.endpoint,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "ewma_latency": round(self.ewma_latency, 4) if self.ewma_latency is not None else None,
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+        }
+
+
+class RoutedOllamaLLM:
+    """
+    Ollama provider that routes each request to one of several endpoints serving the same model.
+
+    Strategies:
+    - "least_outstanding": the endpoint with the fewest in-flight requests (ties
+      broken by latency)
+    - "ewma": the endpoint with the lowest expected wait, i.e. EWMA latency
+      scaled by in-flight requests
+
+    Endpoints failing with connection errors are taken out of rotation and the
+    request is retried on another one. Timeouts and server errors (5xx) count
+    as slow answers in the EWMA, and `failure_threshold` of them in a row take
+    the endpoint out of rotation too. A background probe (is_available) puts
+    endpoints back once they recover. Streams are sampled by their time to the
+    first chunk, not their whole duration.
+
+    With hedging enabled, a generate request still unanswered after the
+    `hedge_percentile` latency is duplicated on another endpoint and the first
+    answer wins.
+
+    Under an LLMScheduler each request takes its slot on the endpoint it is
+    routed to, so every endpoint keeps its own concurrency limit.
+
+    Turns of a ConversationSession stay on the endpoint that served the
+    previous turn, which holds the conversation's KV cache, while it is
+    healthy and has fewer than `affinity_max_outstanding` requests in flight.
+    """
+
+    STRATEGIES = ("least_outstanding", "ewma")
+    # Request-building helpers and settings, identical on every endpoint, taken from the primary;
+    # statistics are aggregated over the endpoints by the getters below
+    PRIMARY_ATTRIBUTES = frozenset({
+        "format_error", "generation_options", "count_tokens", "prompt_budget", "token_estimator",
+        "num_ctx", "timeout", "keep_alive", "endpoint", "embedding_model", "embed_batch_size",
+        "_build_payload", "_result_text", "_embed_batches",
+    })
+    # ScheduledLLM leaves slot acquisition to the endpoint chosen here (see scheduler.endpoint_slot)
+    schedules_per_endpoint = True
+
+    def __init__(self, model: str, endpoints: List[str], strategy: str = "least_outstanding",
+                 health_check_interval: float = 10.0, ewma_alpha: float = 0.3,
+                 hedge_percentile: Optional[float] = None, hedge_delay: float = 1.0,
+                 hedge_min_samples: int = 20, failure_threshold: int = 3, failure_penalty: float = 2.0,
+                 affinity_max_outstanding: int = 4, **kwargs):
+        """
+        Initialize the routed provider.
+
+        Args:
+            model: Model name (must be available on every endpoint)
+            endpoints: Endpoint base URLs
+            strategy: Routing strategy ("least_outstanding" or "ewma")
+            health_check_interval: Seconds between probes of unhealthy endpoints (0 disables them)
+            ewma_alpha: Weight of the newest latency sample in the EWMA
+            hedge_percentile: Latency percentile after which a request is hedged (None disables hedging)
+            hedge_delay: Hedging deadline (seconds) used until enough latencies are recorded
+            hedge_min_samples: Latency samples needed before the percentile is used
+            failure_threshold: Consecutive timeouts or server errors that take an endpoint out of rotation
+            failure_penalty: On a timeout or server error the EWMA is fed at least this multiple of its
+                current value (or the elapsed time, if larger)
+            affinity_max_outstanding: In-flight requests above which a conversation turn leaves
+                the endpoint of its previous turn
+            **kwargs: Provider configuration, applied to every endpoint
+        """
+        if not endpoints:
+            raise ValueError("Almeno un endpoint è richiesto per il routing")
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Strategia di routing non valida: {strategy} (valori ammessi: {', '.join(self.STRATEGIES)})")
+
+        self.model = model
+        self.strategy = strategy
+        self.health_check_interval = health_check_interval
+        self.ewma_alpha = ewma_alpha
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.failure_penalty = failure_penalty
+        self.affinity_max_outstanding = affinity_max_outstanding
+        self.config = kwargs
+
+        self.states = [EndpointState(OllamaLLM(model=model, endpoint=endpoint, **kwargs)) for endpoint in endpoints]
+        self.primary = self.states[0].llm
+        self.temperature = self.primary.temperature
+        self.max_tokens = self.primary.max_tokens
+        self.coalesce_requests = self.primary.coalesce_requests
+        self.single_flight = SingleFlight()
+
+        # Hedging of slow generate requests
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.metrics = MetricsRecorder()
+        self.hedge_stats = {"requests": 0, "hedges": 0, "hedge_wins": 0}
+        self._hedge_executor = None
+        if hedge_percentile:
+            self._hedge_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="ollama-hedge")
+
+        self._lock = threading.Lock()
+        self._health_stop = None
+        if health_check_interval:
+            self._start_health_checks()
+
+        logger.info(f"🔀 Routing {model} su {len(self.states)} endpoint (strategia {strategy})")
+
+    @classmethod
+    def from_config(cls, model: str, endpoints: List[str], routing_config: Optional[Dict[str, Any]] = None,
+                    **kwargs) -> "RoutedOllamaLLM":
+        """
+        Create a routed provider from an LLM YAML block.
+
+        Args:
+            model: Model name
+            endpoints: The `endpoints` list
+            routing_config: The optional `routing` block
+            **kwargs: The `config` block, applied to every endpoint
+
+        Returns:
+            Routed provider
+        """
+        routing_config = routing_config or {}
+        return cls(
+            model=model,
+            endpoints=endpoints,
+            strategy=routing_config.get("strategy", "least_outstanding"),
+            health_check_interval=routing_config.get("health_check_interval", 10.0),
+            ewma_alpha=routing_config.get("ewma_alpha", 0.3),
+            hedge_percentile=routing_config.get("hedge_percentile"),
+            hedge_delay=routing_config.get("hedge_delay", 1.0),
+            hedge_min_samples=routing_config.get("hedge_min_samples", 20),
+            failure_threshold=routing_config.get("failure_threshold", 3),
+            failure_penalty=routing_config.get("failure_penalty", 2.0),
+            affinity_max_outstanding=routing_config.get("affinity_max_outstanding", 4),
+            **kwargs
+        )
+
+    def __getattr__(self, name: str):
+        if name in self.PRIMARY_ATTRIBUTES:
+            return getattr(self.primary, name)
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    # Batches and embeddings spread over the endpoints: their throughput is recorded by the router
+    _record_batch_metrics = OllamaLLM._record_batch_metrics
+    _embedding_matrix = OllamaLLM._embedding_matrix
+
+    def _score(self, state: EndpointState) -> tuple:
+        """Rank an endpoint for the configured strategy (lower is better)."""
+        # Endpoints without latency samples yet are tried first
+        latency = state.ewma_latency or 0.0
+        if self.strategy == "ewma":
+            return (latency * (state.outstanding + 1), state.outstanding)
+        return (state.outstanding, latency)
+
+    def _acquire(self, exclude: Optional[List[EndpointState]] = None) -> Optional[EndpointState]:
+        """
+        Pick the best endpoint and count the request as outstanding on it.
+
+        A conversation turn keeps the endpoint of its session's previous turn
+        while that endpoint is usable and not overloaded.
+
+        Args:
+            exclude: Endpoints to avoid; the chosen one is appended to it under the lock
+
+        Returns:
+            Endpoint state, or None if every endpoint is excluded
+        """
+        with self._lock:
+            exclude = exclude if exclude is not None else []
+            candidates = [s for s in self.states if s.healthy and s not in exclude]
+            if not candidates and not exclude:
+                # Nothing known to be healthy: try everything rather than fail outright
+                candidates = list(self.states)
+            if not candidates:
+                return None
+            session = current_session()
+            state = None
+            if session is not None and session.endpoint is not None:
+                state = next((s for s in candidates if s.endpoint == session.endpoint and s.healthy
+                              and s.outstanding < self.affinity_max_outstanding), None)
+            if state is None:
+                state = min(candidates, key=self._score)
+            if session is not None:
+                session.endpoint = state.endpoint
+            state.outstanding += 1
+            state.requests += 1
+            exclude.append(state)
+            return state
+
+    def _release(self, state: EndpointState, started: float, error: Optional[Exception] = None,
+                 sample: bool = True, latency: Optional[float] = None):
+        """
+        Update load, latency and health of an endpoint after a request.
+
+        Args:
+            state: Endpoint that served the request
+            started: perf_counter() value when the request was sent
+            error: Exception the request failed with, if any
+            sample: Whether the outcome says anything about the endpoint (False for cancelled requests)
+            latency: Latency to sample instead of the time since `started` (e.g. time to first chunk)
+        """
+        elapsed = time.perf_counter() - started if latency is None else latency
+        with self._lock:
+            state.outstanding -= 1
+            if not sample:
+                return
+            if error is None:
+                state.failures = 0
+                self._sample_latency(state, elapsed)
+                return
+            state.errors += 1
+            if isinstance(error, requests.exceptions.ConnectionError):
+                if state.healthy:
+                    state.healthy = False
+                    logger.warning(f"⚠️ Endpoint {state.endpoint} escluso dal routing: {error}")
+                return
+            if not self._is_endpoint_fault(error):
+                return
+            if isinstance(error, requests.exceptions.Timeout):
+                state.timeouts += 1
+            state.failures += 1
+            # A failed request took at least this long: keep the endpoint from looking fast
+            self._sample_latency(state, max(elapsed, self.failure_penalty * (state.ewma_latency or elapsed)))
+            if state.failures >= self.failure_threshold and state.healthy:
+                state.healthy = False
+                logger.warning(f"⚠️ Endpoint {state.endpoint} escluso dal routing dopo {state.failures} "
+                               f"errori consecutivi: {error}")
+
+    def _sample_latency(self, state: EndpointState, latency: float):
+        """Feed a latency sample into the endpoint's EWMA (caller holds the lock)."""
+        if state.ewma_latency is None:
+            state.ewma_latency = latency
+        else:
+            state.ewma_latency = self.ewma_alpha * latency + (1 - self.ewma_alpha) * state.ewma_latency
+
+    @staticmethod
+    def _is_endpoint_fault(error: Exception) -> bool:
+        """Whether an error says the endpoint is slow or failing: timeouts, 5xx, interrupted streams."""
+        return isinstance(error, StreamIncompleteError) or is_endpoint_fault(error)
+
+    def _route(self, call: Callable[[OllamaLLM], Any], tried: Optional[List[EndpointState]] = None,
+               state: Optional[EndpointState] = None) -> Any:
+        """
+        Run a call on the best endpoint, failing over on connection errors.
+
+        Args:
+            call: Request to run against the chosen endpoint's provider
+            tried: Endpoints to avoid; every endpoint used is appended to it
+            state: Endpoint already acquired for the first attempt (must be in `tried`)
+        """
+        tried = tried if tried is not None else []
+        last_error = requests.exceptions.ConnectionError("Nessun endpoint disponibile")
+        while True:
+            if state is None:
+                state = self._acquire(exclude=tried)
+                if state is None:
+                    raise last_error
+            started = time.perf_counter()
+            try:
+                with endpoint_slot(state.endpoint):
+                    started = time.perf_counter()
+                    result = call(state.llm)
+            except SchedulerRejectedError:
+                self._release(state, started, sample=False)
+                raise
+            except requests.exceptions.ConnectionError as e:
+                self._release(state, started, e)
+                last_error = e
+                logger.debug(f"🔀 Nuovo tentativo su un altro endpoint dopo errore su {state.endpoint}")
+                state = None
+                continue
+            except Exception as e:
+                self._release(state, started, e)
+                raise
+            self._release(state, started)
+            return result
+
+    async def _aroute(self, call: Callable[[OllamaLLM], Any], tried: Optional[List[EndpointState]] = None,
+                      state: Optional[EndpointState] = None) -> Any:
+        """Await a call on the best endpoint, failing over on connection errors."""
+        tried = tried if tried is not None else []
+        last_error = requests.exceptions.ConnectionError("Nessun endpoint disponibile")
+        while True:
+            if state is None:
+                state = self._acquire(exclude=tried)
+                if state is None:
+                    raise last_error
+            started = time.perf_counter()
+            try:
+                async with aendpoint_slot(state.endpoint):
+                    started = time.perf_counter()
+                    result = await call(state.llm)
+            except SchedulerRejectedError:
+                self._release(state, started, sample=False)
+                raise
+            except requests.exceptions.ConnectionError as e:
+                self._release(state, started, e)
+                last_error = e
+                state = None
+                continue
+            except asyncio.CancelledError:
+                # Losing hedge: free the slot without a latency sample
+                self._release(state, started, sample=False)
+                raise
+            except Exception as e:
+                self._release(state, started, e)
+                raise
+            self._release(state, started)
+            return result
+
+    def _hedge_delay(self) -> float:
+        """Current hedging deadline: the configured latency percentile, once enough samples exist."""
+        samples = self.metrics.values("latency_seconds")
+        if len(samples) < self.hedge_min_samples:
+            return self.hedge_delay
+        return percentile(samples, self.hedge_percentile)
+
+    def _hedge_exclude(self, tried: List[EndpointState]) -> Optional[List[EndpointState]]:
+        """
+        Endpoints a hedge must avoid: a snapshot of those used by the primary, taken under the lock.
+
+        Returns:
+            The snapshot, or None when no other healthy endpoint is left for a hedge
+        """
+        with self._lock:
+            exclude = list(tried)
+            if not any(s.healthy and s not in exclude for s in self.states):
+                return None
+            return exclude
+
+    def _reserve_primary(self) -> tuple:
+        """Acquire the primary endpoint of a hedged request on the calling thread."""
+        tried = []
+        state = self._acquire(exclude=tried)
+        if state is None:
+            raise requests.exceptions.ConnectionError("Nessun endpoint disponibile")
+        return tried, state
+
+    @staticmethod
+    def _submit(executor: ThreadPoolExecutor, fn: Callable, *args) -> Any:
+        """Submit a call to a worker thread in a copy of the caller's context (scheduler admission included)."""
+        return executor.submit(contextvars.copy_context().run, fn, *args)
+
+    def _count_hedge(self, name: str):
+        with self._lock:
+            self.hedge_stats[name] += 1
+
+    def _hedged(self, call: Callable[[OllamaLLM], Any]) -> Any:
+        """
+        Run a call, sending a duplicate to a second endpoint if it misses the hedging deadline.
+
+        The first successful response wins; the slower request is left to finish
+        in the background (a synchronous HTTP call cannot be aborted).
+        """
+        delay = self._hedge_delay()
+        self._count_hedge("requests")
+        # The primary's endpoint list is only written under self._lock (by _acquire on its thread)
+        tried, state = self._reserve_primary()
+        primary = self._submit(self._hedge_executor, self._route, call, tried, state)
+        try:
+            return primary.result(timeout=delay)
+        except FuturesTimeoutError:
+            pass
+
+        exclude = self._hedge_exclude(tried)
+        if exclude is None:
+            return primary.result()
+
+        self._count_hedge("hedges")
+        logger.debug(f"🛡️ Nessuna risposta entro {delay:.3f}s: invio richiesta di copertura")
+        hedge = self._submit(self._hedge_executor, self._route, call, exclude)
+
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count_hedge("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _ahedged(self, call: Callable[[OllamaLLM], Any]) -> Any:
+        """Await a call, hedging on a second endpoint; the losing request is cancelled."""
+        delay = self._hedge_delay()
+        self._count_hedge("requests")
+        tried, state = self._reserve_primary()
+        primary = asyncio.ensure_future(self._aroute(call, tried, state))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        exclude = None if done else self._hedge_exclude(tried)
+        if exclude is None:
+            return await primary
+
+        self._count_hedge("hedges")
+        logger.debug(f"🛡️ Nessuna risposta entro {delay:.3f}s: invio richiesta di copertura")
+        hedge = asyncio.ensure_future(self._aroute(call, exclude))
+
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count_hedge("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _timed(self, call: Callable[[OllamaLLM], Any]) -> Callable[[OllamaLLM], Any]:
+        """Wrap a call so successful latencies feed the hedging percentile."""
+        def timed(llm: OllamaLLM) -> Any:
+            started = time.perf_counter()
+            result = call(llm)
+            self.metrics.record("latency_seconds", time.perf_counter() - started)
+            return result
+        return timed
+
+    def _atimed(self, call: Callable[[OllamaLLM], Any]) -> Callable[[OllamaLLM], Any]:
+        """Async variant of _timed."""
+        async def timed(llm: OllamaLLM) -> Any:
+            started = time.perf_counter()
+            result = await call(llm)
+            self.metrics.record("latency_seconds", time.perf_counter() - started)
+            return result
+        return timed
+
+    def _coalescing_key(self, prompt: str, **kwargs) -> str:
+        """Identify a generate request independently of the endpoint serving it."""
+        return self.primary._coalescing_key(self.primary._build_payload(prompt, stream=False, **kwargs))
+
+    def _request_generate(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        """Call /api/generate on the best endpoint and return the decoded response body."""
+        send = self._timed(lambda llm: llm._post_generate(llm._build_payload(prompt, stream=False, **kwargs)))
+
+        def call():
+            if self.hedge_percentile:
+                return self._hedged(send)
+            return self._route(send)
+
+        if self.coalesce_requests:
+            return self.single_flight.do(self._coalescing_key(prompt, **kwargs), call)
+        return call()
+
+    def generate_raw(self, prompt: str, **kwargs) -> str:
+        """
+        Generate a response on the best endpoint, raising on failure.
+
+        Args:
+            prompt: Input prompt
+            **kwargs: Additional generation parameters
+
+        Returns:
+            Generated response as string
+        """
+        return self._request_generate(prompt, **kwargs)['response']
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        """
+        Generate a response on the best endpoint.
+
+        Args:
+            prompt: Input prompt
+            **kwargs: Additional generation parameters
+
+        Returns:
+            Generated response as string
+        """
+        try:
+            return self.generate_raw(prompt, **kwargs)
+        except Exception as e:
+            return self.format_error(e)
+
+    async def agenerate_raw(self, prompt: str, **kwargs) -> str:
+        """Generate a response asynchronously on the best endpoint, raising on failure."""
+        send = self._atimed(lambda llm: llm._apost_generate(llm._build_payload(prompt, stream=False, **kwargs)))
+
+        async def call():
+            if self.hedge_percentile:
+                return await self._ahedged(send)
+            return await self._aroute(send)
+
+        if self.coalesce_requests:
+            result = await self.single_flight.ado(self._coalescing_key(prompt, **kwargs), call)
+        else:
+            result = await call()
+        return result['response']
+
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        """Generate a response asynchronously on the best endpoint."""
+        try:
+            return await self.agenerate_raw(prompt, **kwargs)
+        except Exception as e:
+            return self.format_error(e)
+
+    def generate_continuation(self, prompt: str, context: Optional[List[int]] = None, **kwargs) -> Dict[str, Any]:
+        """Continue a conversation from a previous context on the best endpoint."""
+        return self._route(lambda llm: llm.generate_continuation(prompt, context=context, **kwargs))
+
+    def chat_raw(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """Send a chat conversation to the best endpoint, raising on failure."""
+        return self._route(lambda llm: llm.chat_raw(messages, **kwargs))
+
+    def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """Send a chat conversation to the best endpoint."""
+        try:
+            return self.primary._result_text(self.chat_raw(messages, **kwargs))
+        except Exception as e:
+            return self.format_error(e)
+
+    def _stream_routed(self, stream: Callable[[OllamaLLM, Callable[[Dict[str, Any]], None]], Iterator[str]],
+                       on_done: Optional[Callable[[Dict[str, Any]], None]] = None) -> Iterator[str]:
+        """
+        Yield a stream from the best endpoint, keeping it counted as outstanding meanwhile.
+
+        The endpoint's latency sample is the time to the first chunk: the whole
+        duration depends on the answer's length, not on the endpoint. Endpoint
+        streams report errors as text, so a stream that ends without its final
+        chunk (on_done never called) counts as a failure of the endpoint.
+        """
+        state = self._acquire()
+        slot = ExitStack()
+        try:
+            slot.enter_context(endpoint_slot(state.endpoint))
+        except SchedulerRejectedError as e:
+            self._release(state, time.perf_counter(), sample=False)
+            logger.warning(f"⚠️ {e}")
+            yield f"Errore: {str(e)}"
+            return
+        started = time.perf_counter()
+        first_at = None
+        final = {}
+
+        def done(result: Dict[str, Any]):
+            final.update(result)
+            if on_done is not None:
+                on_done(result)
+
+        error = None
+        completed = False
+        try:
+            for fragment in stream(state.llm, done):
+                if first_at is None:
+                    first_at = time.perf_counter()
+                yield fragment
+            completed = True
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            slot.close()
+            first_chunk = first_at - started if first_at is not None else None
+            if final:
+                self._release(state, started, latency=first_chunk)
+            elif error is not None or completed:
+                self._release(state, started, error or StreamIncompleteError("stream terminato senza chunk finale"))
+            else:
+                # Closed early by the consumer: only the time to the first chunk is known
+                self._release(state, started, sample=first_chunk is not None, latency=first_chunk)
+
+    def generate_stream(self, prompt: str, on_done: Optional[Callable[[Dict[str, Any]], None]] = None,
+                        **kwargs) -> Iterator[str]:
+        """Generate a response on the best endpoint, yielding tokens as they arrive."""
+        return self._stream_routed(lambda llm, done: llm.generate_stream(prompt, on_done=done, **kwargs), on_done)
+
+    def chat_stream(self, messages: List[Dict[str, str]], on_done: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    **kwargs) -> Iterator[str]:
+        """Continue a chat conversation on the best endpoint, yielding tokens as they arrive."""
+        return self._stream_routed(lambda llm, done: llm.chat_stream(messages, on_done=done, **kwargs), on_done)
+
+    def generate_many(self, prompts: List[str], max_concurrency: int = 4, **kwargs) -> List[GenerationResult]:
+        """
+        Generate responses for many independent prompts, spread over all endpoints.
+
+        Args:
+            prompts: Input prompts
+            max_concurrency: Maximum requests in flight at once (across endpoints)
+            **kwargs: Generation parameters applied to every prompt
+
+        Returns:
+            One GenerationResult per prompt, in input order
+        """
+        if not prompts:
+            return []
+
+        def run_one(index: int, prompt: str) -> GenerationResult:
+            started = time.perf_counter()
+            try:
+                result = self._request_generate(prompt, **kwargs)
+                return GenerationResult(index, prompt, text=result['response'],
+                                        latency=time.perf_counter() - started,
+                                        eval_count=result.get('eval_count', 0))
+            except Exception as e:
+                logger.warning(f"⚠️ Prompt {index} fallito nel batch: {e}")
+                return GenerationResult(index, prompt, error=e, latency=time.perf_counter() - started)
+
+        started = time.perf_counter()
+        workers = max(1, min(max_concurrency, len(prompts)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ollama-routed-batch") as executor:
+            futures = [self._submit(executor, run_one, index, prompt) for index, prompt in enumerate(prompts)]
+            results = [future.result() for future in futures]
+        self._record_batch_metrics(results, time.perf_counter() - started)
+        return results
+
+    def embed(self, texts, batch_size: Optional[int] = None, max_concurrency: int = 4,
+              model: Optional[str] = None):
+        """
+        Compute embeddings, spreading the batches over all endpoints.
+
+        Args:
+            texts: Text or list of texts
+            batch_size: Texts per request
+            max_concurrency: Maximum requests in flight at once (across endpoints)
+            model: Embedding model
+
+        Returns:
+            float32 matrix with one row per text, in input order
+        """
+        batches = self.primary._embed_batches(texts, batch_size)
+        count = sum(len(batch) for batch in batches)
+        started = time.perf_counter()
+
+        def run_one(batch: List[str]) -> List[List[float]]:
+            return self._route(lambda llm: llm._post_embed(batch, model))
+
+        workers = max(1, min(max_concurrency, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ollama-routed-embed") as executor:
+            futures = [self._submit(executor, run_one, batch) for batch in batches]
+            blocks = [future.result() for future in futures]
+        return self._embedding_matrix(blocks, count, started)
+
+    async def aembed(self, texts, batch_size: Optional[int] = None, model: Optional[str] = None):
+        """Compute embeddings asynchronously, spreading the batches over all endpoints."""
+        batches = self.primary._embed_batches(texts, batch_size)
+        count = sum(len(batch) for batch in batches)
+        started = time.perf_counter()
+
+        async def run_one(batch: List[str]) -> List[List[float]]:
+            return await self._aroute(lambda llm: llm._apost_embed(batch, model))
+
+        blocks = await asyncio.gather(*(run_one(batch) for batch in batches))
+        return self._embedding_matrix(list(blocks), count, started)
+
+    def check_health(self) -> Dict[str, bool]:
+        """
+        Probe every endpoint with is_available and update the routing table.
+
+        Returns:
+            Health of each endpoint
+        """
+        for state in self.states:
+            healthy = state.llm.is_available()
+            with self._lock:
+                if healthy != state.healthy:
+                    if healthy:
+                        state.failures = 0
+                        logger.info(f"✅ Endpoint {state.endpoint} di nuovo disponibile, riammesso nel routing")
+                    else:
+                        logger.warning(f"⚠️ Endpoint {state.endpoint} non disponibile, escluso dal routing")
+                state.healthy = healthy
+        return {state.endpoint: state.healthy for state in self.states}
+
+    def _start_health_checks(self):
+        """Probe the endpoints periodically in a daemon thread until close() is called."""
+        stop = threading.Event()
+        self._health_stop = stop
+
+        def probe():
+            while not stop.wait(self.health_check_interval):
+                try:
+                    self.check_health()
+                except Exception as e:
+                    logger.warning(f"⚠️ Controllo salute endpoint fallito: {e}")
+
+        threading.Thread(target=probe, name=f"ollama-health-{self.model}", daemon=True).start()
+
+    def is_available(self) -> bool:
+        """
+        Check if at least one endpoint is available.
+
+        Returns:
+            True if any endpoint answers
+        """
+        return any(self.check_health().values())
+
+    def get_routing_stats(self) -> List[Dict[str, Any]]:
+        """
+        Get per-endpoint routing statistics.
+
+        Returns:
+            Load, EWMA latency, health and error counts of each endpoint
+        """
+        with self._lock:
+            return [state.snapshot() for state in self.states]
+
+    def get_transport_stats(self) -> Dict[str, Any]:
+        """
+        Get connection pool statistics summed over all endpoints.
+
+        Returns:
+            Aggregated pool statistics, with per-endpoint routing stats under 'endpoints'
+        """
+        per_endpoint = [state.llm.get_transport_stats() for state in self.states]
+        hits = sum(s["pool_hits"] for s in per_endpoint)
+        misses = sum(s["pool_misses"] for s in per_endpoint)
+        return {
+            "requests": sum(s["requests"] for s in per_endpoint),
+            "pool_hits": hits,
+            "pool_misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "endpoints": self.get_routing_stats(),
+        }
+
+    def get_hedging_stats(self) -> Dict[str, Any]:
+        """
+        Get hedging statistics, to keep the extra load visible.
+
+        Returns:
+            Hedge-eligible requests, duplicates sent, duplicates that won, the
+            extra-load ratio and the current deadline
+        """
+        with self._lock:
+            stats = dict(self.hedge_stats)
+        stats["enabled"] = bool(self.hedge_percentile)
+        stats["hedge_rate"] = round(stats["hedges"] / stats["requests"], 4) if stats["requests"] else 0.0
+        stats["delay_seconds"] = round(self._hedge_delay(), 4) if self.hedge_percentile else None
+        stats["latency_seconds"] = self.metrics.summary("latency_seconds")
+        return stats
+
+    def get_circuit_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Get circuit breaker statistics of every endpoint.
+
+        Returns:
+            Breaker stats keyed by endpoint, or None if no breaker is configured
+        """
+        if self.primary.circuit_breaker is None:
+            return None
+        return {state.endpoint: state.llm.get_circuit_stats() for state in self.states}
+
+    def _merged_metrics(self) -> MetricsRecorder:
+        """The router's own measurements together with those of every endpoint."""
+        return MetricsRecorder.merged([self.metrics] + [state.llm.metrics for state in self.states])
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get every latency and throughput metric, over all endpoints.
+
+        Returns:
+            Summaries keyed by metric name
+        """
+        return self._merged_metrics().summaries()
+
+    def get_stream_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get streaming latency metrics, over all endpoints.
+
+        Returns:
+            Summaries for ttft_seconds, tokens_per_sec and stream_seconds
+        """
+        metrics = self._merged_metrics()
+        return {name: metrics.summary(name) for name in ("ttft_seconds", "tokens_per_sec", "stream_seconds")}
+
+    def get_async_transport_stats(self) -> Dict[str, Any]:
+        """
+        Get async transport statistics of every endpoint.
+
+        Returns:
+            Async transport stats keyed by endpoint
+        """
+        return {state.endpoint: state.llm.get_async_transport_stats() for state in self.states}
+
+    def list_models(self) -> list:
+        """List the models of the first healthy endpoint."""
+        return next((state.llm for state in self.states if state.healthy), self.primary).list_models()
+
+    def get_model_info(self) -> Dict[str, Any]:
+        """Get the model information from the first healthy endpoint."""
+        return next((state.llm for state in self.states if state.healthy), self.primary).get_model_info()
+
+    def get_coalescing_stats(self) -> Dict[str, Any]:
+        """Get request coalescing statistics of the router."""
+        return self.single_flight.get_stats()
+
+    def warm_up(self, keep_alive: Any = None) -> Dict[str, Any]:
+        """
+        Preload the model on every endpoint.
+
+        Args:
+            keep_alive: How long Ollama keeps the model loaded
+
+        Returns:
+            Warm-up result of each endpoint
+        """
+        return {"model": self.model,
+                "endpoints": {state.endpoint: state.llm.warm_up(keep_alive) for state in self.states}}
+
+    def start_keep_alive(self, interval: float, keep_alive: Any = None):
+        """Keep the model resident on every endpoint."""
+        for state in self.states:
+            state.llm.start_keep_alive(interval, keep_alive)
+
+    def close(self):
+        """Stop the health checks and release every endpoint's connections."""
+        if self._health_stop is not None:
+            self._health_stop.set()
+            self._health_stop = None
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
+        for state in self.states:
+            state.llm.close()
+
+    async def aclose(self):
+        """Release the async HTTP sessions of every endpoint."""
+        for state in self.states:
+            await state.llm.aclose()
+
+    def __str__(self) -> str:
+        """String representation of the LLM provider."""
+        return f"RoutedOllamaLLM(model={self.model}, endpoints={len(self.states)})"
+
+    def __repr__(self) -> str:
+        """Detailed string representation."""
+        endpoints = [state.endpoint for state in self.states]
+        return f"RoutedOllamaLLM(model='{self.model}', endpoints={endpoints}, strategy='{self.strategy}')"
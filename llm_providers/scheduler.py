@@ -0,0 +1,536 @@
+"""
+Central request scheduler for modular-2 LLM providers.
+Admits every provider call through per-endpoint concurrency limits, priority
+classes and weighted fair queuing between agents.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from llm_providers.metrics import MetricsRecorder
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, most urgent first
+PRIORITIES = ("interactive", "batch", "background")
+
+# (scheduler, agent, priority, weight) of the current call, set by ScheduledLLM for providers
+# that choose the endpoint themselves and take the slot once they have (see endpoint_slot)
+_ADMISSION: contextvars.ContextVar = contextvars.ContextVar("llm_admission", default=None)
+
+
+class SchedulerRejectedError(RuntimeError):
+    """Raised when a request is refused by admission control (queue full or wait too long)."""
+
+
+class _Waiter:
+    """A queued request, woken either through a threading.Event or an asyncio future."""
+
+    def __init__(self, agent: str, priority: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.agent = agent
+        self.priority = priority
+        self.enqueued_at = time.perf_counter()
+        self.granted = False
+        self.cancelled = False
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def grant(self):
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class _EndpointQueue:
+    """Slots and per-priority fair queues of one endpoint."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.virtual_time = 0.0
+        self.agent_finish: Dict[str, float] = {}
+        self.queues: Dict[str, List] = {priority: [] for priority in PRIORITIES}
+
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+
+class LLMScheduler:
+    """
+    Fair-share scheduler shared by every agent of an AgentManager.
+
+    Each endpoint has a number of concurrent slots. When none is free, requests
+    queue by priority class (interactive before batch before background);
+    within a class, agents share the endpoint in proportion to their weight
+    (weighted fair queuing on virtual finish times), so a chatty agent cannot
+    starve the others. Time spent queuing is recorded per class and per agent.
+    """
+
+    def __init__(self, max_concurrent: int = 4, endpoint_limits: Optional[Dict[str, int]] = None,
+                 max_queue: Optional[int] = None, max_wait: Optional[float] = None):
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_concurrent: Concurrent requests per endpoint
+            endpoint_limits: Per-endpoint overrides of max_concurrent
+            max_queue: Requests allowed to wait per endpoint; beyond that new ones are rejected
+            max_wait: Seconds a request may wait for a slot before being rejected
+        """
+        self.max_concurrent = int(max_concurrent)
+        self.endpoint_limits = endpoint_limits or {}
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self.metrics = MetricsRecorder()
+        self.counters = {"dispatched": 0, "rejected": 0, "timed_out": 0}
+        self.agent_counters: Dict[str, Dict[str, int]] = {}
+        self._endpoints: Dict[str, _EndpointQueue] = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, scheduler_config: Dict[str, Any]) -> "LLMScheduler":
+        """
+        Create a scheduler from the `scheduler` YAML block.
+
+        Args:
+            scheduler_config: Scheduler configuration
+
+        Returns:
+            Configured scheduler
+        """
+        return cls(
+            max_concurrent=scheduler_config.get("max_concurrent", 4),
+            endpoint_limits=scheduler_config.get("endpoints"),
+            max_queue=scheduler_config.get("max_queue"),
+            max_wait=scheduler_config.get("max_wait"),
+        )
+
+    def _queue_for(self, endpoint: str) -> _EndpointQueue:
+        """Get (or create) the queue of an endpoint. Must be called with the lock held."""
+        queue = self._endpoints.get(endpoint)
+        if queue is None:
+            queue = _EndpointQueue(int(self.endpoint_limits.get(endpoint, self.max_concurrent)))
+            self._endpoints[endpoint] = queue
+        return queue
+
+    def _count(self, agent: str, name: str):
+        """Increment a global and a per-agent counter. Must be called with the lock held."""
+        self.counters[name] += 1
+        per_agent = self.agent_counters.setdefault(agent, {"dispatched": 0, "rejected": 0, "timed_out": 0})
+        per_agent[name] += 1
+
+    def _enqueue(self, endpoint: str, agent: str, priority: str, weight: float,
+                 loop: Optional[asyncio.AbstractEventLoop] = None) -> _Waiter:
+        """Take a free slot or join the fair queue. Must be called with the lock held."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Priorità non valida: {priority} (valori ammessi: {', '.join(PRIORITIES)})")
+
+        queue = self._queue_for(endpoint)
+        waiter = _Waiter(agent, priority, loop)
+
+        if queue.in_flight < queue.limit and queue.queued() == 0:
+            queue.in_flight += 1
+            waiter.granted = True
+            return waiter
+
+        if self.max_queue is not None and queue.queued() >= self.max_queue:
+            self._count(agent, "rejected")
+            raise SchedulerRejectedError(
+                f"Coda piena per {endpoint} ({queue.queued()} richieste in attesa): richiesta di '{agent}' rifiutata"
+            )
+
+        # Weighted fair queuing: virtual finish time of this request for its agent
+        start = max(queue.virtual_time, queue.agent_finish.get(agent, 0.0))
+        finish = start + 1.0 / max(weight, 1e-6)
+        queue.agent_finish[agent] = finish
+        heapq.heappush(queue.queues[priority], (finish, next(self._sequence), start, waiter))
+        # Slots may be free behind abandoned waiters
+        self._dispatch(queue)
+        return waiter
+
+    def _dispatch(self, queue: _EndpointQueue):
+        """Grant free slots to the most urgent, fairest waiters. Must be called with the lock held."""
+        while queue.in_flight < queue.limit:
+            for priority in PRIORITIES:
+                heap = queue.queues[priority]
+                while heap and heap[0][3].cancelled:
+                    heapq.heappop(heap)
+                if heap:
+                    _, _, start, waiter = heapq.heappop(heap)
+                    queue.virtual_time = max(queue.virtual_time, start)
+                    queue.in_flight += 1
+                    waiter.grant()
+                    break
+            else:
+                return
+
+    def _granted(self, waiter: _Waiter):
+        """Record the queue wait of a request that got its slot."""
+        wait = time.perf_counter() - waiter.enqueued_at
+        self.metrics.record(f"queue_wait_seconds.{waiter.priority}", wait)
+        self.metrics.record(f"queue_wait_seconds.agent.{waiter.agent}", wait)
+        with self._lock:
+            self._count(waiter.agent, "dispatched")
+        if wait > 0.001:
+            logger.debug(f"⏳ Richiesta di '{waiter.agent}' ({waiter.priority}) in coda per {wait:.3f}s")
+
+    def _abandon(self, endpoint: str, waiter: _Waiter, timed_out: bool = True):
+        """Withdraw a waiter that gave up, returning its slot if it was granted meanwhile."""
+        with self._lock:
+            waiter.cancelled = True
+            if timed_out:
+                self._count(waiter.agent, "timed_out")
+            if waiter.granted:
+                queue = self._queue_for(endpoint)
+                queue.in_flight -= 1
+                self._dispatch(queue)
+
+    def acquire(self, endpoint: str, agent: str, priority: str = "interactive", weight: float = 1.0):
+        """
+        Wait for a slot on an endpoint.
+
+        Args:
+            endpoint: Endpoint the request will be sent to
+            agent: Agent issuing the request
+            priority: Priority class ("interactive", "batch" or "background")
+            weight: Share of the endpoint the agent gets relative to others in its class
+
+        Raises:
+            SchedulerRejectedError: If the queue is full or the wait exceeds max_wait
+        """
+        with self._lock:
+            waiter = self._enqueue(endpoint, agent, priority, weight)
+
+        if not waiter.granted and not waiter.event.wait(self.max_wait):
+            self._abandon(endpoint, waiter)
+            raise SchedulerRejectedError(
+                f"Nessuno slot libero su {endpoint} entro {self.max_wait}s per '{agent}'"
+            )
+        self._granted(waiter)
+
+    async def aacquire(self, endpoint: str, agent: str, priority: str = "interactive", weight: float = 1.0):
+        """Wait for a slot on an endpoint without blocking the event loop (see acquire)."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            waiter = self._enqueue(endpoint, agent, priority, weight, loop=loop)
+
+        if not waiter.granted:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait)
+            except asyncio.TimeoutError:
+                self._abandon(endpoint, waiter)
+                raise SchedulerRejectedError(
+                    f"Nessuno slot libero su {endpoint} entro {self.max_wait}s per '{agent}'"
+                )
+            except asyncio.CancelledError:
+                self._abandon(endpoint, waiter, timed_out=False)
+                raise
+        self._granted(waiter)
+
+    def release(self, endpoint: str):
+        """
+        Free a slot and hand it to the next waiter.
+
+        Args:
+            endpoint: Endpoint passed to acquire
+        """
+        with self._lock:
+            queue = self._queue_for(endpoint)
+            queue.in_flight -= 1
+            self._dispatch(queue)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get scheduler statistics.
+
+        Returns:
+            Slots and queue lengths per endpoint, counters, and queue-wait
+            summaries per priority class and per agent
+        """
+        with self._lock:
+            endpoints = {
+                endpoint: {
+                    "limit": queue.limit,
+                    "in_flight": queue.in_flight,
+                    "queued": {priority: len(heap) for priority, heap in queue.queues.items()},
+                }
+                for endpoint, queue in self._endpoints.items()
+            }
+            counters = dict(self.counters)
+            agents = {agent: dict(values) for agent, values in self.agent_counters.items()}
+
+        for agent in agents:
+            agents[agent]["queue_wait_seconds"] = self.metrics.summary(f"queue_wait_seconds.agent.{agent}")
+        return {
+            "endpoints": endpoints,
+            **counters,
+            "queue_wait_seconds": {priority: self.metrics.summary(f"queue_wait_seconds.{priority}")
+                                   for priority in PRIORITIES},
+            "agents": agents,
+        }
+
+
+@contextmanager
+def endpoint_slot(endpoint: str):
+    """
+    Hold a scheduler slot on an endpoint for the current call.
+
+    Used by providers routing over several endpoints: the agent's ScheduledLLM
+    only marks the call, and the slot is taken on the endpoint actually chosen.
+    Calls not made through a ScheduledLLM are not scheduled.
+
+    Args:
+        endpoint: Endpoint the request is sent to
+
+    Raises:
+        SchedulerRejectedError: If the queue is full or the wait exceeds max_wait
+    """
+    admission = _ADMISSION.get()
+    if admission is None:
+        yield
+        return
+    scheduler, agent, priority, weight = admission
+    scheduler.acquire(endpoint, agent, priority, weight)
+    try:
+        yield
+    finally:
+        scheduler.release(endpoint)
+
+
+@asynccontextmanager
+async def aendpoint_slot(endpoint: str):
+    """Async variant of endpoint_slot."""
+    admission = _ADMISSION.get()
+    if admission is None:
+        yield
+        return
+    scheduler, agent, priority, weight = admission
+    await scheduler.aacquire(endpoint, agent, priority, weight)
+    try:
+        yield
+    finally:
+        scheduler.release(endpoint)
+
+
+class ScheduledLLM:
+    """
+    Per-agent provider wrapper sending every call through an LLMScheduler.
+
+    Providers routing over several endpoints (`schedules_per_endpoint`) take
+    the slot themselves on the endpoint they choose; for them the wrapper only
+    marks its calls with the agent's identity. Every attribute not defined here
+    is delegated to the wrapped provider.
+    """
+
+    def __init__(self, llm, scheduler: LLMScheduler, agent: str, priority: str = "interactive",
+                 weight: float = 1.0):
+        """
+        Initialize the wrapper.
+
+        Args:
+            llm: Provider instance (shared between agents)
+            scheduler: Scheduler shared by all agents
+            agent: Name of the agent using this wrapper
+            priority: Priority class of the agent's requests
+            weight: Fair-share weight of the agent within its class
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Priorità non valida: {priority} (valori ammessi: {', '.join(PRIORITIES)})")
+        self.llm = llm
+        self.scheduler = scheduler
+        self.agent = agent
+        self.priority = priority
+        self.weight = weight
+        self.per_endpoint = bool(getattr(llm, 'schedules_per_endpoint', False))
+        self.scheduler_key = getattr(llm, 'endpoint', None) or str(llm)
+        self._admission = (scheduler, agent, priority, weight)
+
+    def __getattr__(self, name: str):
+        return getattr(self.llm, name)
+
+    def _call(self, method: str, *args, **kwargs) -> Any:
+        """Run a provider method once a slot is granted."""
+        if self.per_endpoint:
+            token = _ADMISSION.set(self._admission)
+            try:
+                return getattr(self.llm, method)(*args, **kwargs)
+            finally:
+                _ADMISSION.reset(token)
+
+        self.scheduler.acquire(self.scheduler_key, self.agent, self.priority, self.weight)
+        try:
+            return getattr(self.llm, method)(*args, **kwargs)
+        finally:
+            self.scheduler.release(self.scheduler_key)
+
+    async def _acall(self, method: str, *args, **kwargs) -> Any:
+        """Await a provider coroutine method once a slot is granted."""
+        if self.per_endpoint:
+            token = _ADMISSION.set(self._admission)
+            try:
+                return await getattr(self.llm, method)(*args, **kwargs)
+            finally:
+                _ADMISSION.reset(token)
+
+        await self.scheduler.aacquire(self.scheduler_key, self.agent, self.priority, self.weight)
+        try:
+            return await getattr(self.llm, method)(*args, **kwargs)
+        finally:
+            self.scheduler.release(self.scheduler_key)
+
+    def _stream(self, method: str, *args, **kwargs) -> Iterator[str]:
+        """Hold a slot for the whole duration of a stream."""
+        if self.per_endpoint:
+            yield from self._marked_stream(getattr(self.llm, method)(*args, **kwargs))
+            return
+
+        try:
+            self.scheduler.acquire(self.scheduler_key, self.agent, self.priority, self.weight)
+        except SchedulerRejectedError as e:
+            logger.warning(f"⚠️ {e}")
+            yield f"Errore: {str(e)}"
+            return
+        try:
+            yield from getattr(self.llm, method)(*args, **kwargs)
+        finally:
+            self.scheduler.release(self.scheduler_key)
+
+    def _marked_stream(self, stream: Iterator[str]) -> Iterator[str]:
+        """Advance a stream with the agent's identity set only while the provider runs, not between fragments."""
+        iterator = iter(stream)
+        try:
+            while True:
+                token = _ADMISSION.set(self._admission)
+                try:
+                    fragment = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    _ADMISSION.reset(token)
+                yield fragment
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    def _format_error(self, error: Exception) -> str:
+        if hasattr(self.llm, 'format_error'):
+            return self.llm.format_error(error)
+        logger.error(f"❌ Errore LLM: {error}")
+        return f"Errore: {str(error)}"
+
+    def generate_raw(self, prompt: str, **kwargs) -> str:
+        """Generate once the scheduler grants a slot, raising on failure."""
+        if hasattr(self.llm, 'generate_raw'):
+            return self._call('generate_raw', prompt, **kwargs)
+        return self._call('generate', prompt, **kwargs)
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        """Generate once the scheduler grants a slot, returning an error string on failure."""
+        try:
+            return self.generate_raw(prompt, **kwargs)
+        except Exception as e:
+            return self._format_error(e)
+
+    async def agenerate_raw(self, prompt: str, **kwargs) -> str:
+        """Generate asynchronously once the scheduler grants a slot, raising on failure."""
+        return await self._acall('agenerate_raw', prompt, **kwargs)
+
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        """Generate asynchronously once the scheduler grants a slot."""
+        try:
+            return await self.agenerate_raw(prompt, **kwargs)
+        except Exception as e:
+            return self._format_error(e)
+
+    def generate_stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """Stream a response, holding a scheduler slot until it completes."""
+        return self._stream('generate_stream', prompt, **kwargs)
+
+    def chat_stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """Stream a chat reply, holding a scheduler slot until it completes."""
+        return self._stream('chat_stream', messages, **kwargs)
+
+    def chat_raw(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """Send a chat conversation once the scheduler grants a slot."""
+        return self._call('chat_raw', messages, **kwargs)
+
+    def generate_continuation(self, prompt: str, context: Optional[List[int]] = None, **kwargs) -> Dict[str, Any]:
+        """Continue a conversation once the scheduler grants a slot."""
+        return self._call('generate_continuation', prompt, context=context, **kwargs)
+
+    def embed(self, texts, **kwargs) -> Any:
+        """Compute embeddings once the scheduler grants a slot."""
+        return self._call('embed', texts, **kwargs)
+
+    async def aembed(self, texts, **kwargs) -> Any:
+        """Compute embeddings asynchronously once the scheduler grants a slot."""
+        return await self._acall('aembed', texts, **kwargs)
+
+    def generate_many(self, prompts: List[str], max_concurrency: int = 4, **kwargs) -> List[Any]:
+        """
+        Generate responses for many prompts, each request admitted by the scheduler.
+
+        Providers scheduling per endpoint run the batch themselves, admitting
+        each request on the endpoint it is routed to. Aggregate throughput is
+        recorded in the wrapped provider's metrics either way.
+
+        Args:
+            prompts: Input prompts
+            max_concurrency: Maximum requests in flight at once
+            **kwargs: Generation parameters applied to every prompt
+
+        Returns:
+            One GenerationResult per prompt, in input order
+        """
+        from llm_providers.ollama_llm import GenerationResult
+
+        if self.per_endpoint and hasattr(self.llm, 'generate_many'):
+            return self._call('generate_many', prompts, max_concurrency=max_concurrency, **kwargs)
+
+        def run_one(index: int, prompt: str) -> GenerationResult:
+            started = time.perf_counter()
+            try:
+                if hasattr(self.llm, '_request_generate'):
+                    # Full response body: the batch report needs eval_count
+                    result = self._call('_request_generate', prompt, **kwargs)
+                    return GenerationResult(index, prompt, text=result['response'],
+                                            latency=time.perf_counter() - started,
+                                            eval_count=result.get('eval_count', 0))
+                text = self.generate_raw(prompt, **kwargs)
+                return GenerationResult(index, prompt, text=text, latency=time.perf_counter() - started)
+            except Exception as e:
+                logger.warning(f"⚠️ Prompt {index} fallito nel batch: {e}")
+                return GenerationResult(index, prompt, error=e, latency=time.perf_counter() - started)
+
+        if not prompts:
+            return []
+        started = time.perf_counter()
+        workers = max(1, min(max_concurrency, len(prompts)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"sched-{self.agent}") as executor:
+            results = list(executor.map(run_one, range(len(prompts)), prompts))
+        if hasattr(self.llm, '_record_batch_metrics'):
+            self.llm._record_batch_metrics(results, time.perf_counter() - started)
+        return results
+
+    def __str__(self) -> str:
+        return f"ScheduledLLM({self.llm}, agent={self.agent}, priority={self.priority})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
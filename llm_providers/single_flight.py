@@ -0,0 +1,157 @@
+"""
+Single-flight request coalescing for modular-2 LLM providers.
+Concurrent callers with the same key share one in-flight call and its result.
+"""
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """An in-flight call shared by a leader thread and its followers."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _AsyncCall:
+    """An in-flight coroutine run as its own task, awaited by every coalesced caller."""
+
+    def __init__(self):
+        self.task = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Deduplicates identical concurrent calls, for both threads and asyncio tasks.
+
+    The first caller for a key (the leader) runs the call; callers arriving while
+    it is in flight wait and receive the same result, or the same exception.
+    Async calls run in a task of their own: cancelling one caller only stops
+    its wait, and the task is cancelled when its last caller gives up.
+    """
+
+    def __init__(self):
+        """Initialize the coalescing tables and counters."""
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+        self.calls = 0
+        self.executions = 0
+        self.deduplicated = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn once for all concurrent callers with the same key.
+
+        Args:
+            key: Request identity
+            fn: Call to execute
+
+        Returns:
+            Result of fn (shared by every coalesced caller)
+
+        Raises:
+            Exception: Whatever fn raised
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self.deduplicated += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            logger.debug("🔗 Richiesta identica in corso, attendo il risultato condiviso")
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await fn once for all concurrent tasks with the same key.
+
+        Args:
+            key: Request identity
+            fn: Coroutine function to execute
+
+        Returns:
+            Result of fn (shared by every coalesced task)
+
+        Raises:
+            Exception: Whatever fn raised
+        """
+        # Tasks belong to one event loop
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+
+        with self._lock:
+            self.calls += 1
+            call = self._async_calls.get(loop_key)
+            if call is not None:
+                self.deduplicated += 1
+                logger.debug("🔗 Richiesta async identica in corso, attendo il risultato condiviso")
+            else:
+                call = _AsyncCall()
+                call.task = loop.create_task(self._run_async(loop_key, call, fn))
+                self._async_calls[loop_key] = call
+                self.executions += 1
+            call.waiters += 1
+
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            with self._lock:
+                call.waiters -= 1
+                abandoned = call.waiters == 0 and not call.task.done()
+                if abandoned and self._async_calls.get(loop_key) is call:
+                    # Later callers start a new call instead of joining a cancelled one
+                    del self._async_calls[loop_key]
+            if abandoned:
+                call.task.cancel()
+
+    async def _run_async(self, loop_key: Hashable, call: _AsyncCall, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Task body of an async call: await fn, then stop sharing the call."""
+        try:
+            return await fn()
+        finally:
+            with self._lock:
+                if self._async_calls.get(loop_key) is call:
+                    del self._async_calls[loop_key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get coalescing counters.
+
+        Returns:
+            Calls received, upstream executions and deduplicated calls
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "deduplicated": self.deduplicated,
+                "in_flight": len(self._calls) + len(self._async_calls),
+            }
@@ -4,7 +4,7 @@ Handles configuration loading, component initialization, and pipeline execution.
 """
 import logging
 import sys
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, Optional
 from config.yaml_parser import load_and_validate_config
 from core.factory import Factory
 from core.registry import registry
@@ -60,29 +60,64 @@ class ModularFramework:
         try:
             # Initialize agent manager
             self.agent_manager = AgentManager(self.config, self.factory)
+            
+            # Optionally preload the models used by agents
+            warmup_config = self.config.get("warmup") or {}
+            if warmup_config.get("enabled", False):
+                self.agent_manager.warm_up_llms(
+                    keep_alive=warmup_config.get("keep_alive"),
+                    refresh_interval=warmup_config.get("refresh_interval")
+                )
+            
             logger.info("✅ Componenti inizializzati con successo")
         except Exception as e:
             logger.error(f"❌ Errore nell'inizializzazione componenti: {e}")
             sys.exit(1)
     
-    def run_agent(self, agent_name: str, prompt: str) -> str:
+    def run_agent(self, agent_name: str, prompt: str, session_id: Optional[str] = None) -> str:
         """
         Run a specific agent with a prompt.
         
         Args:
             agent_name: Name of the agent to run
             prompt: Input prompt
+            session_id: Conversation identifier; turns with the same id reuse the
+                model's context instead of resending the whole conversation
             
         Returns:
             Agent response
         """
         try:
             input_data = {"prompt": prompt}
+            if session_id is not None:
+                input_data["session_id"] = session_id
             return self.agent_manager.run_agent(agent_name, input_data)
         except Exception as e:
             logger.error(f"❌ Errore nell'esecuzione agente '{agent_name}': {e}")
             return f"Errore: {str(e)}"
     
+    def run_agent_stream(self, agent_name: str, prompt: str, session_id: Optional[str] = None) -> Iterator[str]:
+        """
+        Run a specific agent with a prompt, streaming the response.
+        
+        Args:
+            agent_name: Name of the agent to run
+            prompt: Input prompt
+            session_id: Conversation identifier; turns with the same id reuse the
+                model's context instead of resending the whole conversation
+            
+        Yields:
+            Response fragments, in order
+        """
+        try:
+            input_data = {"prompt": prompt}
+            if session_id is not None:
+                input_data["session_id"] = session_id
+            yield from self.agent_manager.run_agent_stream(agent_name, input_data)
+        except Exception as e:
+            logger.error(f"❌ Errore nell'esecuzione agente '{agent_name}': {e}")
+            yield f"Errore: {str(e)}"
+    
     def list_agents(self) -> list:
         """Get list of available agents."""
         return self.agent_manager.list_agents()
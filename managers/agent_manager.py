@@ -2,8 +2,11 @@
 Agent Manager for modular-2 framework.
 Handles creation, registration and management of agents.
 """
+import asyncio
 import logging
-from typing import Dict, List, Any, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Iterator, Optional
 from core.factory import Factory
 
 logger = logging.getLogger(__name__)
@@ -27,6 +30,18 @@ class AgentManager:
         self.tools = {}
         self.llms = {}
         
+        # Optional central scheduler admitting every agent's LLM calls
+        self.scheduler = None
+        scheduler_config = self.config.get("scheduler") or {}
+        if scheduler_config.get("enabled", False):
+            from llm_providers.scheduler import LLMScheduler
+            self.scheduler = LLMScheduler.from_config(scheduler_config)
+            logger.info("🚦 Scheduler LLM attivo")
+        
+        # Runs the tools selected by agents (config: tool_executor, per-tool executor/timeout)
+        from tools.executor import ToolExecutor
+        self.tool_executor = ToolExecutor.from_config(self.config.get("tool_executor"))
+        
         # Load LLMs first
         self._load_llms()
         
@@ -66,16 +81,25 @@ class AgentManager:
             api_key = llm_config.get("api_key")
             config = llm_config.get("config", {})
             
-            if provider == "ollama":
+            if provider == "ollama" and llm_config.get("endpoints"):
+                # Same model served by several hosts
+                from llm_providers.routed_llm import RoutedOllamaLLM
+                llm = RoutedOllamaLLM.from_config(
+                    model=model,
+                    endpoints=llm_config["endpoints"],
+                    routing_config=llm_config.get("routing"),
+                    **config
+                )
+            elif provider == "ollama":
                 from llm_providers.ollama_llm import OllamaLLM
-                return OllamaLLM(
+                llm = OllamaLLM(
                     model=model,
                     endpoint=endpoint,
                     **config
                 )
             elif provider == "openai":
                 from llm_providers.openai_llm import OpenAILLM
-                return OpenAILLM(
+                llm = OpenAILLM(
                     model=model,
                     api_key=api_key,
                     **config
@@ -83,11 +107,52 @@ class AgentManager:
             else:
                 logger.error(f"❌ Provider LLM sconosciuto: '{provider}'")
                 return None
+            
+            return self._wrap_llm_instance(llm, llm_config)
                 
         except Exception as e:
             logger.error(f"❌ Errore nella creazione LLM: {e}")
             return None
     
+    def _wrap_llm_instance(self, llm: Any, llm_config: Dict) -> Any:
+        """Apply the optional provider wrappers configured for an LLM."""
+        cassette_config = llm_config.get("cassette")
+        if cassette_config and cassette_config.get("path"):
+            from llm_providers.cassette import ReplayLLM
+            llm = ReplayLLM.from_config(llm, cassette_config)
+        
+        cache_config = llm_config.get("cache")
+        if cache_config and cache_config.get("enabled", True):
+            from llm_providers.response_cache import CachedLLM
+            llm = CachedLLM.from_config(llm, cache_config)
+        
+        return llm
+    
+    def _schedule_llm(self, llm: Any, agent_config: Dict) -> Any:
+        """
+        Route an agent's LLM calls through the scheduler, when one is configured.
+        
+        The scheduler goes inside the response cache, so cache hits never wait
+        for (or hold) a model slot; the cache itself stays shared between agents.
+        """
+        if self.scheduler is None:
+            return llm
+        
+        from llm_providers.response_cache import CachedLLM
+        from llm_providers.scheduler import ScheduledLLM
+        scheduler_config = self.config.get("scheduler") or {}
+        cached = llm if isinstance(llm, CachedLLM) else None
+        scheduled = ScheduledLLM(
+            cached.llm if cached else llm,
+            self.scheduler,
+            agent=agent_config.get("name"),
+            priority=agent_config.get("priority", scheduler_config.get("default_priority", "interactive")),
+            weight=agent_config.get("weight", 1.0)
+        )
+        if cached:
+            return CachedLLM(scheduled, cached.cache, cache_nondeterministic=cached.cache_nondeterministic)
+        return scheduled
+    
     def _load_tools(self):
         """Load and register all tools."""
         tools_config = self.config.get("tools", [])
@@ -110,6 +175,14 @@ class AgentManager:
                 )
                 
                 if tool_instance:
+                    self.tool_executor.register(
+                        tool_instance,
+                        name=tool_name,
+                        executor=tool_config.get("executor", "thread"),
+                        timeout=tool_config.get("timeout"),
+                        class_path=class_path,
+                        config=tool_config_data
+                    )
                     self.tools[tool_name] = tool_instance
                     logger.info(f"🔧 Tool '{tool_name}' caricato con successo")
                 else:
@@ -135,6 +208,8 @@ class AgentManager:
                 agent = self._create_agent(agent_config)
                 
                 if agent:
+                    if hasattr(agent, 'tool_executor'):
+                        agent.tool_executor = self.tool_executor
                     self.agents[agent_name] = agent
                     tool_count = len(getattr(agent, 'tools', []))
                     logger.info(f"🤖 Agente '{agent_name}' creato con {tool_count} tool(s).")
@@ -159,6 +234,7 @@ class AgentManager:
             if not llm:
                 logger.error(f"❌ LLM '{llm_name}' non trovato per agente '{agent_name}'")
                 return None
+            llm = self._schedule_llm(llm, agent_config)
             
             # Get tool instances
             agent_tools = []
@@ -265,6 +341,92 @@ class AgentManager:
         """Get list of all agent names."""
         return list(self.agents.keys())
     
+    def warm_up_llms(self, keep_alive: Any = None, refresh_interval: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Preload every LLM referenced by a configured agent.
+        
+        Args:
+            keep_alive: How long Ollama keeps each model loaded
+            refresh_interval: If set, re-send a keep-alive request every N seconds
+            
+        Returns:
+            Warm-up results keyed by LLM name
+        """
+        llm_names = []
+        for agent_config in self.config.get("agents", []):
+            llm_name = agent_config.get("llm")
+            if llm_name and llm_name not in llm_names:
+                llm_names.append(llm_name)
+        
+        # Several names may point to the same instance: warm each one once
+        targets = {}
+        for llm_name in llm_names:
+            llm = self.llms.get(llm_name)
+            if llm is not None and hasattr(llm, 'warm_up') and id(llm) not in targets:
+                targets[id(llm)] = (llm_name, llm)
+        
+        if not targets:
+            return {}
+        
+        # Different models load in parallel
+        with ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix="llm-warmup") as executor:
+            futures = {name: executor.submit(llm.warm_up, keep_alive) for name, llm in targets.values()}
+            results = {name: future.result() for name, future in futures.items()}
+        
+        if refresh_interval:
+            for _, llm in targets.values():
+                llm.start_keep_alive(refresh_interval, keep_alive)
+        
+        logger.info(f"🔥 Warm-up completato per {len(results)} LLM")
+        return results
+    
+    def get_llm_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get transport statistics for every loaded LLM.
+        
+        Returns:
+            Dictionary mapping LLM name to its connection pool statistics
+            (plus request coalescing counters under 'coalescing', response
+            cache counters under 'cache', circuit breaker state under 'circuit',
+            hedging counters under 'hedging' and record/replay counters under
+            'cassette' when enabled)
+        """
+        stats = {}
+        for llm_name, llm in self.llms.items():
+            if llm and hasattr(llm, 'get_transport_stats'):
+                stats[llm_name] = llm.get_transport_stats()
+            if llm and hasattr(llm, 'get_coalescing_stats'):
+                stats.setdefault(llm_name, {})["coalescing"] = llm.get_coalescing_stats()
+            if llm and hasattr(llm, 'get_cache_stats'):
+                stats.setdefault(llm_name, {})["cache"] = llm.get_cache_stats()
+            if llm and hasattr(llm, 'get_circuit_stats') and llm.get_circuit_stats() is not None:
+                stats.setdefault(llm_name, {})["circuit"] = llm.get_circuit_stats()
+            if llm and hasattr(llm, 'get_hedging_stats'):
+                stats.setdefault(llm_name, {})["hedging"] = llm.get_hedging_stats()
+            if llm and hasattr(llm, 'get_cassette_stats'):
+                stats.setdefault(llm_name, {})["cassette"] = llm.get_cassette_stats()
+        return stats
+    
+    def get_tool_stats(self) -> Dict[str, Any]:
+        """
+        Get tool executor statistics.
+        
+        Returns:
+            Tool runs, errors, timeouts and process-pool counters
+        """
+        return self.tool_executor.get_stats()
+    
+    def get_scheduler_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Get scheduler statistics.
+        
+        Returns:
+            Slots, queue lengths and queue-wait times, or None if the scheduler is disabled
+        """
+        if self.scheduler is None:
+            return None
+        return self.scheduler.get_stats()
+    
     def run_agent(self, agent_name: str, input_data: Dict[str, Any]) -> str:
         """Run a specific agent with given input."""
         agent = self.get_agent(agent_name)
@@ -275,4 +437,67 @@ class AgentManager:
             return agent.run(input_data)
         except Exception as e:
             logger.error(f"❌ Errore nell'esecuzione agente '{agent_name}': {e}")
-            return f"Errore nell'esecuzione: {str(e)}"
\ No newline at end of file
+            return f"Errore nell'esecuzione: {str(e)}"
+    
+    def run_agent_batch(self, agent_name: str, inputs: List[Dict[str, Any]], max_concurrency: int = 4) -> List[str]:
+        """
+        Run a specific agent on many independent inputs concurrently.
+        
+        Args:
+            agent_name: Name of the agent to run
+            inputs: Input data for each run
+            max_concurrency: Maximum runs in flight at once
+            
+        Returns:
+            One response per input, in input order
+        """
+        agent = self.get_agent(agent_name)
+        if not agent:
+            return [f"Agente '{agent_name}' non trovato"] * len(inputs)
+        if not inputs:
+            return []
+        
+        # Agents keeping per-run state on the instance cannot run concurrently
+        if not getattr(agent, 'reentrant', True):
+            max_concurrency = 1
+        
+        started = time.perf_counter()
+        workers = max(1, min(max_concurrency, len(inputs)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"agent-{agent_name}") as executor:
+            results = list(executor.map(lambda data: self.run_agent(agent_name, data), inputs))
+        elapsed = time.perf_counter() - started
+        
+        rate = len(inputs) / elapsed if elapsed > 0 else 0.0
+        logger.info(f"📦 Batch agente '{agent_name}': {len(inputs)} input in {elapsed:.2f}s ({rate:.2f} input/s)")
+        return results
+    
+    async def arun_agent(self, agent_name: str, input_data: Dict[str, Any]) -> str:
+        """Run a specific agent asynchronously with given input."""
+        agent = self.get_agent(agent_name)
+        if not agent:
+            return f"Agente '{agent_name}' non trovato"
+        
+        try:
+            if hasattr(agent, 'arun'):
+                return await agent.arun(input_data)
+            # Agents without an async API run in a worker thread
+            return await asyncio.to_thread(agent.run, input_data)
+        except Exception as e:
+            logger.error(f"❌ Errore nell'esecuzione agente '{agent_name}': {e}")
+            return f"Errore nell'esecuzione: {str(e)}"
+    
+    def run_agent_stream(self, agent_name: str, input_data: Dict[str, Any]) -> Iterator[str]:
+        """Run a specific agent, yielding its response incrementally when supported."""
+        agent = self.get_agent(agent_name)
+        if not agent:
+            yield f"Agente '{agent_name}' non trovato"
+            return
+        
+        try:
+            if hasattr(agent, 'run_stream'):
+                yield from agent.run_stream(input_data)
+            else:
+                yield agent.run(input_data)
+        except Exception as e:
+            logger.error(f"❌ Errore nell'esecuzione streaming agente '{agent_name}': {e}")
+            yield f"Errore nell'esecuzione: {str(e)}"
@@ -0,0 +1,112 @@
+"""
+Shared fixtures: a local stand-in for the Ollama HTTP API.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class _FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_ndjson(self, chunks):
+        body = "".join(json.dumps(chunk) + "\n" for chunk in chunks).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": "fake-model:latest"}]})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        data = json.loads(self.rfile.read(length) or b"{}")
+        self.server.requests_seen.append((self.path, data))
+        if self.path == "/api/generate" and data.get("stream"):
+            self._send_ndjson([
+                {"response": "echo", "done": False},
+                {"response": ": ", "done": False},
+                {"response": data.get("prompt", ""), "done": False},
+                {"response": "", "done": True, "eval_count": 3, "eval_duration": 30_000_000},
+            ])
+        elif self.path == "/api/generate" and data.get("prompt") == "fail":
+            self.send_error(500)
+        elif self.path == "/api/generate" and data.get("prompt") == "bad":
+            self.send_error(400)
+        elif self.path == "/api/generate":
+            time.sleep(self.server.delay)
+            self._send_json({"response": f"echo: {data.get('prompt', '')}", "done": True,
+                             "context": (data.get("context") or []) + [len(data.get("prompt", ""))],
+                             "prompt_eval_count": len(data.get("prompt", "").split())})
+        elif self.path == "/api/chat" and data.get("stream"):
+            self._send_ndjson([
+                {"message": {"role": "assistant", "content": "echo: "}, "done": False},
+                {"message": {"role": "assistant", "content": data["messages"][-1]["content"]}, "done": False},
+                {"message": {"role": "assistant", "content": ""}, "done": True, "prompt_eval_count": 1},
+            ])
+        elif self.path == "/api/chat":
+            self._send_json({"message": {"role": "assistant", "content": f"echo: {data['messages'][-1]['content']}"},
+                             "done": True, "prompt_eval_count": len(data["messages"][-1]["content"].split())})
+        elif self.path == "/api/embed":
+            time.sleep(self.server.delay)
+            texts = data["input"] if isinstance(data["input"], list) else [data["input"]]
+            self._send_json({"model": data["model"],
+                             "embeddings": [[float(len(text)), float(len(text.split())), 1.0] for text in texts]})
+        elif self.path == "/api/show":
+            self._send_json({"modelfile": "FROM fake-model"})
+        else:
+            self.send_error(404)
+
+
+def _start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeOllamaHandler)
+    server.requests_seen = []
+    server.delay = 0.0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def _stop_server(server):
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fake_ollama():
+    server = _start_server()
+    yield server
+    _stop_server(server)
+
+
+@pytest.fixture
+def fake_ollama_hosts():
+    """Factory starting any number of stand-in servers, all stopped at teardown."""
+    servers = []
+
+    def start(count):
+        servers.extend(_start_server() for _ in range(count))
+        return servers[-count:]
+
+    yield start
+    for server in servers:
+        _stop_server(server)
@@ -0,0 +1,72 @@
+"""
+Stress test: one agent instance per type serving many concurrent runs.
+"""
+import asyncio
+import json
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.agentic_automation_agent import AgenticAutomationAgent
+from agents.multi_tool_agent import MultiToolAgent
+from agents.simple_agent import SimpleAgent
+from agents.tool_agent import ToolAgent
+from managers.agent_manager import AgentManager
+from tools.math_tool import MathTool
+
+PLAN = [
+    {"step": 1, "action": "analyze", "description": "analizza", "depends_on": []},
+    {"step": 2, "action": "tool", "tool": "mathtool", "description": "calcola 2 + 2", "depends_on": []},
+    {"step": 3, "action": "reasoning", "description": "concludi", "depends_on": [1, 2]},
+]
+
+
+class _JitteryLLM:
+    """Answers after a random delay, echoing the task id found in the prompt."""
+
+    def generate(self, prompt, **kwargs):
+        time.sleep(random.uniform(0, 0.005))
+        if "formato JSON" in prompt:
+            return json.dumps(PLAN)
+        ids = sorted(set(re.findall(r"task-\d+", prompt)))
+        return f"risposta per {' '.join(ids)}"
+
+
+def _manager():
+    llm = _JitteryLLM()
+    manager = AgentManager({})
+    manager.agents = {
+        "auto": AgenticAutomationAgent("auto", llm, tools=[MathTool()], config={"max_parallel_steps": 2}),
+        "simple": SimpleAgent("simple", llm, system_prompt="Assistente"),
+        "tool": ToolAgent("tool", llm, tools=[MathTool()]),
+        "multi": MultiToolAgent("multi", llm, tools=[MathTool()]),
+    }
+    return manager
+
+
+def _only_own_task(result, task_id):
+    return set(re.findall(r"task-\d+", result)) == {task_id}
+
+
+def test_shared_agents_serve_concurrent_threads():
+    manager = _manager()
+    jobs = [(name, f"task-{i}") for i in range(40) for name in manager.agents]
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(lambda job: manager.run_agent(job[0], {"prompt": f"{job[1]}: calcola 2 + 2"}), jobs))
+
+    for (name, task_id), result in zip(jobs, results):
+        assert _only_own_task(result, task_id), (name, result)
+    assert manager.run_agent_batch("auto", [{"prompt": f"task-{i}"} for i in range(8)], max_concurrency=8)[7].count("task-7") > 0
+
+
+def test_shared_agents_serve_concurrent_tasks():
+    manager = _manager()
+
+    async def scenario():
+        return await asyncio.gather(*(manager.arun_agent("auto", {"prompt": f"task-{i}: calcola"}) for i in range(30)))
+
+    results = asyncio.run(scenario())
+
+    assert all(_only_own_task(result, f"task-{i}") for i, result in enumerate(results))
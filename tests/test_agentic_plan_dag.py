@@ -0,0 +1,81 @@
+"""
+Tests for dependency-graph execution of AgenticAutomationAgent plans.
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+
+from agents.agentic_automation_agent import AgenticAutomationAgent
+
+PLAN = [
+    {"step": 1, "action": "analyze", "description": "leggi A", "depends_on": []},
+    {"step": 2, "action": "analyze", "description": "leggi B", "depends_on": []},
+    {"step": 3, "action": "analyze", "description": "leggi C", "depends_on": []},
+    {"step": 4, "action": "reasoning", "description": "unisci A e B", "depends_on": [1, 2]},
+]
+
+
+class _PlanningLLM:
+    """Returns a fixed plan, then answers each step after a delay."""
+
+    def __init__(self, plan, delay=0.1):
+        self.plan = plan
+        self.delay = delay
+        self.prompts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, **kwargs):
+        if "formato JSON" in prompt:
+            return json.dumps(self.plan)
+        with self._lock:
+            self.prompts.append(prompt)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return f"esito di {re.search(r'Step(?: corrente)?: (.+)', prompt).group(1)}"
+
+
+def test_independent_steps_run_concurrently_and_merge_in_plan_order():
+    llm = _PlanningLLM(PLAN)
+    agent = AgenticAutomationAgent("dag", llm, config={"max_parallel_steps": 3})
+
+    started = time.perf_counter()
+    agent.run({"prompt": "confronta i file"})
+    elapsed = time.perf_counter() - started
+
+    assert llm.max_in_flight == 3
+    assert elapsed < 0.35
+    assert [entry["step"]["step"] for entry in agent.execution_history] == [1, 2, 3, 4]
+    assert list(agent.current_context) == ["original_task", "plan", "step_1_result", "step_2_result",
+                                           "step_3_result", "step_4_result"]
+    merge_prompt = next(p for p in llm.prompts if "unisci A e B" in p)
+    assert "esito di leggi A" in merge_prompt and "esito di leggi B" in merge_prompt
+    assert "esito di leggi C" not in merge_prompt
+
+
+def test_parallelism_is_configurable_and_async_path_matches():
+    llm = _PlanningLLM(PLAN, delay=0.02)
+    agent = AgenticAutomationAgent("dag", llm, config={"max_parallel_steps": 2})
+
+    sync_result = agent.run({"prompt": "confronta i file"})
+    async_result = asyncio.run(agent.arun({"prompt": "confronta i file"}))
+
+    assert llm.max_in_flight == 2
+    assert sync_result == async_result
+
+
+def test_plans_without_depends_on_stay_sequential():
+    plan = [{k: v for k, v in step.items() if k != "depends_on"} for step in PLAN]
+    llm = _PlanningLLM(plan, delay=0.01)
+    agent = AgenticAutomationAgent("seq", llm, config={"max_parallel_steps": 4})
+
+    agent.run({"prompt": "confronta i file"})
+
+    assert llm.max_in_flight == 1
+    assert "esito di leggi C" in next(p for p in llm.prompts if "unisci A e B" in p)
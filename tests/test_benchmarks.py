@@ -0,0 +1,56 @@
+"""
+Tests for the mock Ollama server and the benchmark suite.
+"""
+import pytest
+import requests
+
+from benchmarks.load import run_load
+from benchmarks.mock_ollama import LatencyModel, MockOllamaServer
+from benchmarks.suite import compare_to_baseline, run_suite
+from llm_providers.ollama_llm import OllamaLLM
+
+
+def test_mock_server_speaks_the_ollama_api():
+    with MockOllamaServer(tokens_per_response=4, embedding_dim=8, responses={"piano": "[1, 2]"}) as server:
+        llm = OllamaLLM(model="mock-model:latest", endpoint=server.endpoint)
+
+        assert llm.generate("ciao") == "lorem ipsum dolor sit"
+        assert "".join(llm.generate_stream("ciao")) == "lorem ipsum dolor sit"
+        assert llm.generate("un piano per favore") == "[1, 2]"
+        assert llm.list_models() == ["mock-model:latest"]
+        assert llm.get_model_info()["details"]["family"] == "mock"
+        assert llm.embed(["a", "b", "a"]).shape == (3, 8)
+        assert server.get_stats()["requests"]["/api/generate"] == 3
+
+
+def test_mock_server_injects_failures_and_latency():
+    with MockOllamaServer(latency={"distribution": "uniform", "low": 0.01, "high": 0.02}, failure_rate=1.0) as server:
+        response = requests.post(f"{server.endpoint}/api/generate", json={"prompt": "x", "stream": False})
+
+        assert response.status_code == 500
+        assert response.elapsed.total_seconds() >= 0.01
+        assert server.get_stats()["failures"] == 1
+
+    with pytest.raises(ValueError):
+        LatencyModel("pareto")
+
+
+def test_run_load_reports_percentiles_and_errors():
+    result = run_load("echo", lambda index: "Errore: x" if index == 0 else "ok", requests=10, concurrency=3)
+
+    summary = result.to_dict()
+    assert summary["requests"] == 10 and summary["errors"] == 1
+    assert summary["p50_ms"] <= summary["p95_ms"] <= summary["p99_ms"]
+
+
+def test_suite_drives_agents_and_pipelines():
+    results = run_suite(concurrency_levels=(2,), requests=4, warmup=0)
+
+    summaries = {result.name: result.to_dict() for result in results}
+    assert set(summaries) == {"simple", "agentic", "tool", "pipeline"}
+    assert all(summary["errors"] == 0 for summary in summaries.values())
+    assert summaries["simple"]["llm_requests_per_call"] == 1.0
+    assert summaries["pipeline"]["llm_requests_per_call"] == 2.0
+
+    slower = [dict(summary, throughput=summary["throughput"] * 2) for summary in summaries.values()]
+    assert len(compare_to_baseline(results, slower)) == 4
@@ -0,0 +1,101 @@
+"""
+Tests for the record-and-replay LLM cassettes.
+"""
+import asyncio
+import time
+
+import pytest
+
+from llm_providers.cassette import Cassette, CassetteMissError, RecordingLLM, ReplayLLM
+from llm_providers.conversation import ConversationSession
+from llm_providers.ollama_llm import OllamaLLM
+from managers.agent_manager import AgentManager
+
+
+def _endpoint(server):
+    host, port = server.server_address
+    return f"http://{host}:{port}"
+
+
+def test_replay_serves_recorded_calls_offline(fake_ollama, tmp_path):
+    path = tmp_path / "run.jsonl"
+    recorder = RecordingLLM(OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama)), Cassette(path))
+    assert recorder.generate("ciao", temperature=0.1) == "echo: ciao"
+    assert list(recorder.generate_stream("flusso")) == ["echo", ": ", "flusso"]
+    assert recorder.generate("fail").startswith("Errore")
+    recorder.cassette.close()
+
+    replay = ReplayLLM(Cassette(path), timing_scale=0)
+
+    assert replay.generate("ciao", temperature=0.1) == "echo: ciao"
+    assert list(replay.generate_stream("flusso")) == ["echo", ": ", "flusso"]
+    assert replay.generate("fail").startswith("Errore")
+    assert asyncio.run(replay.agenerate("ciao", temperature=0.1)) == "echo: ciao"
+    with pytest.raises(CassetteMissError):
+        replay.generate_raw("ciao")
+    assert replay.get_cassette_stats()["misses"] == 1
+    assert len(path.read_text().splitlines()) == 3
+
+
+def test_batches_and_helpers_replay_without_a_fallback(fake_ollama, tmp_path):
+    path = tmp_path / "batch.jsonl"
+    llm = OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama), num_ctx=4096)
+    recorder = RecordingLLM(llm, Cassette(path))
+    assert [r.text for r in recorder.generate_many(["a", "b"])] == ["echo: a", "echo: b"]
+    recorder.cassette.close()
+
+    replay = ReplayLLM.from_config(llm, {"path": str(path), "timing_scale": 0})
+
+    assert [r.text for r in replay.generate_many(["b", "a"])] == ["echo: b", "echo: a"]
+    assert replay.get_metrics() == {} and replay.get_stream_metrics() == {}
+    assert replay.prompt_budget() == llm.prompt_budget() and replay.count_tokens("due parole") > 0
+    assert not hasattr(replay, "warm_up")
+    assert not replay.generate_many(["c"])[0].ok
+
+
+def test_streamed_conversations_replay_with_their_final_chunk(fake_ollama, tmp_path):
+    path = tmp_path / "chat.jsonl"
+    recorder = RecordingLLM(OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama)), Cassette(path))
+    for mode in ("chat", "context"):
+        session = ConversationSession(recorder, system_prompt="sys", mode=mode)
+        assert "".join(session.send_stream("primo")) and "".join(session.send_stream("secondo"))
+    recorder.cassette.close()
+    assert "<function" not in path.read_text()
+
+    replay = ReplayLLM(Cassette(path), timing_scale=0)
+    for mode in ("chat", "context"):
+        session = ConversationSession(replay, system_prompt="sys", mode=mode)
+        replies = ["".join(session.send_stream("primo")), "".join(session.send_stream("secondo"))]
+        # on_done fired on replay: turns are recorded and the second turn matched its recording
+        assert session.get_stats()["turns"] == 2 and all(reply.startswith("echo") for reply in replies)
+    assert replay.get_cassette_stats()["misses"] == 0
+
+
+def test_replay_scales_recorded_latency(fake_ollama, tmp_path):
+    fake_ollama.delay = 0.1
+    path = tmp_path / "slow.jsonl"
+    RecordingLLM(OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama)), Cassette(path)).generate("lento")
+
+    for scale, low, high in ((1.0, 0.1, 1.0), (0.2, 0.02, 0.08)):
+        started = time.perf_counter()
+        assert ReplayLLM(Cassette(path), timing_scale=scale).generate("lento") == "echo: lento"
+        assert low <= time.perf_counter() - started < high
+
+
+def test_agent_run_replays_deterministically_from_config(fake_ollama, tmp_path):
+    path = str(tmp_path / "agent.jsonl")
+
+    def manager(mode, endpoint):
+        return AgentManager({
+            "llm": {"provider": "ollama", "model": "fake-model", "endpoint": endpoint,
+                    "cassette": {"mode": mode, "path": path, "timing_scale": 0}},
+            "agents": [{"name": "auto", "type": "agentic_automation", "llm": "ollama"}],
+        })
+
+    recorded = manager("record", _endpoint(fake_ollama)).run_agent("auto", {"prompt": "Pianifica la giornata"})
+    requests_sent = len(fake_ollama.requests_seen)
+
+    offline = manager("replay", "http://127.0.0.1:9")
+    assert offline.run_agent("auto", {"prompt": "Pianifica la giornata"}) == recorded
+    assert offline.get_llm_stats()["ollama"]["cassette"]["hits"] == requests_sent
+    assert len(fake_ollama.requests_seen) == requests_sent
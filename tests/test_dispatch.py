@@ -0,0 +1,131 @@
+"""
+Tests for the compiled tool dispatch index.
+"""
+import random
+
+from agents.agentic_automation_agent import AUTO_TOOL_KEYWORDS, AgenticAutomationAgent
+from agents.multi_tool_agent import MultiToolAgent
+from agents.tool_agent import TOOL_KEYWORDS, ToolAgent
+from benchmarks.dispatch import run_dispatch_benchmark
+from tools.dispatch import CATEGORY_KEYWORDS, AhoCorasick, DispatchIndex
+from tools.math_tool import MathTool
+
+
+class WebSearchTool:
+    def run(self, input_data):
+        return "risultati"
+
+
+class FileTool:
+    def run(self, input_data):
+        return "contenuto"
+
+
+class CodeSearchTool:
+    def run(self, input_data):
+        return "snippet"
+
+
+class PickyTool:
+    def should_use(self, text):
+        return "picky" in text
+
+
+def test_automaton_finds_every_overlapping_pattern():
+    generator = random.Random(0)
+    for _ in range(200):
+        patterns = ["".join(generator.choice("abc") for _ in range(generator.randint(1, 4)))
+                    for _ in range(generator.randint(1, 8))]
+        text = "".join(generator.choice("abcd") for _ in range(generator.randint(0, 30)))
+        automaton = AhoCorasick((pattern, label) for label, pattern in enumerate(patterns))
+        expected = sum(1 << label for label, pattern in enumerate(patterns) if pattern in text)
+        assert automaton.search(text) == expected, (patterns, text)
+
+
+def test_index_combines_declared_rules_should_use_and_category_keywords():
+    math, search, picky = MathTool(), WebSearchTool(), PickyTool()
+    index = DispatchIndex([math, search, picky])
+
+    assert index.candidates("Cerca su GOOGLE quanto fa 3 * 4, picky") == [math, search, picky]
+    assert index.candidates("Moltiplica i valori") == [math]
+    assert index.candidates("versione 2 del documento") == []
+    assert index.first("trova il sito") is search
+    assert DispatchIndex([picky], use_should_use=False).candidates("picky") == []
+
+
+def test_agents_select_tools_through_the_index():
+    tools = [MathTool(), WebSearchTool()]
+    assert ToolAgent("tool", None, tools=tools)._analyze_tool_needs("cerca 2 + 2") == tools
+    multi = MultiToolAgent("multi", None, tools=tools)
+    assert multi._select_tools("websearchtool per favore") == [tools[1]]
+
+
+def test_dispatch_benchmark_with_many_tools_matches_scanning():
+    rows = run_dispatch_benchmark(tool_counts=(150,), prompts=10, repeat=1)
+    assert rows[0]["tools"] == 150 and rows[0]["same_result"]
+    assert rows[0]["index_us"] > 0
+
+
+# Per-agent selection code the index replaced, kept as the reference behaviour
+def _baseline_tool_agent(tools, prompt):
+    prompt_lower = prompt.lower()
+    selected = []
+    for tool in tools:
+        if callable(getattr(tool, 'should_use', None)):
+            if tool.should_use(prompt):
+                selected.append(tool)
+            continue
+        tool_name = tool.__class__.__name__.lower()
+        category = next((category for category in TOOL_KEYWORDS if category in tool_name), None)
+        if tool_name in prompt_lower or (category and any(k in prompt_lower for k in TOOL_KEYWORDS[category])):
+            selected.append(tool)
+    return selected
+
+
+def _baseline_multi(tools, prompt):
+    prompt_lower = prompt.lower()
+    selected = []
+    for tool in tools:
+        tool_name = tool.__class__.__name__.lower()
+        if tool_name in prompt_lower or any(category in tool_name and any(k in prompt_lower for k in keywords)
+                                            for category, keywords in CATEGORY_KEYWORDS.items()):
+            selected.append(tool)
+    return selected
+
+
+def _baseline_auto(tools, description):
+    description_lower = description.lower()
+    for tool in tools:
+        tool_name = tool.__class__.__name__.lower()
+        if any(category in tool_name and any(k in description_lower for k in keywords)
+               for category, keywords in AUTO_TOOL_KEYWORDS.items()):
+            return tool
+    return tools[0]
+
+
+def _prompts():
+    words = sorted({k for keywords in (*CATEGORY_KEYWORDS.values(), *TOOL_KEYWORDS.values()) for k in keywords}
+                   | {"somma", "add", "download", "already", "told", "you", "it", "filetool", "mathtool", "picky",
+                      "2", "a", "b", "dammi", "un", "the", "load", "read"})
+    generator = random.Random(3)
+    prompts = ["dammi un numero", "a - b", "download it", "I already told you", "Leggi il file",
+               "somma 2 e 3", "address book", "3 * 4 = ?", "MathTool please", "codesearchtool"]
+    prompts += [" ".join(generator.choice(words) for _ in range(generator.randint(1, 6))) for _ in range(300)]
+    return prompts
+
+
+def test_agent_indexes_match_the_baseline_selection():
+    tools = [MathTool(), WebSearchTool(), FileTool(), CodeSearchTool(), PickyTool()]
+    tool_agent = ToolAgent("tool", None, tools=tools)
+    multi = MultiToolAgent("multi", None, tools=tools)
+    auto = AgenticAutomationAgent("auto", None, tools=tools)
+
+    for prompt in _prompts():
+        assert tool_agent._analyze_tool_needs(prompt) == _baseline_tool_agent(tools, prompt), prompt
+        assert multi._select_tools_by_keyword(prompt) == _baseline_multi(tools, prompt), prompt
+        assert auto._auto_select_tool(prompt) is _baseline_auto(tools, prompt), prompt
+
+    assert multi._select_tools_by_keyword("dammi un numero") == [tools[0]]
+    assert multi._select_tools_by_keyword("a - b") == [tools[0]]
+    assert tool_agent._analyze_tool_needs("download it") == []
+    assert tool_agent._analyze_tool_needs("I already told you") == []
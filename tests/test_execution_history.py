@@ -0,0 +1,97 @@
+"""
+Tests for the bounded execution history of AgenticAutomationAgent runs.
+"""
+import json
+
+import pytest
+
+from agents.agentic_automation_agent import AgenticAutomationAgent
+from agents.run_context import ExecutionHistory, RunContext
+from config.yaml_parser import validate_config_structure
+from tools.executor import ToolExecutor
+from tools.math_tool import MathTool
+
+
+def _step(number, description="passo"):
+    return {"step": number, "action": "reasoning", "description": f"{description} {number}"}
+
+
+def test_history_is_a_ring_buffer_with_an_incremental_summary():
+    history = ExecutionHistory(max_entries=4, window=2, result_tokens=5, summary_tokens=12)
+    assert history.summary() == "Nessun contesto precedente"
+
+    for number in range(1, 11):
+        history.append(_step(number), "risultato " * 20 if number == 10 else f"esito {number}")
+
+    assert len(history) == 4 and history.total == 10 and history.evicted == 6
+    assert [entry["step"]["step"] for entry in history] == [7, 8, 9, 10]
+
+    summary = history.summary()
+    assert "Step 9: passo 9 -> esito 9" in summary
+    assert "Step 10: passo 10 -> risultato risultato..." in summary
+    assert "Step 8: passo 8\n" in summary and "Step 1:" not in summary
+    assert "step più vecchi omessi" in summary
+    assert history.summary() is summary
+
+
+def test_unknown_config_keys_are_ignored_with_a_warning(caplog):
+    with caplog.at_level("WARNING", logger="agents.run_context"):
+        history = ExecutionHistory.from_config({"max_entries": 5, "windw": 9})
+    assert history.max_entries == 5 and history.window == 3
+    assert "windw" in caplog.text
+
+    with pytest.raises(ValueError, match="execution_history"):
+        validate_config_structure({"agents": [{"name": "a", "config": {"execution_history": 10}}]})
+
+
+def test_context_drops_evicted_results_and_tools_get_a_copy():
+    run = RunContext("task", history=ExecutionHistory(max_entries=2, window=1))
+    for number in range(1, 4):
+        run.record(_step(number), f"esito {number}")
+
+    assert list(run.current_context) == ["original_task", "step_2_result", "step_3_result"]
+    view = run.tool_view()
+    assert view == {"original_task": "task", "step_3_result": "esito 3"}
+    view["step_1_result"] = "x"
+    assert "step_1_result" not in run.current_context and "step_1_result" not in run.tool_view()
+
+    stats = run.get_memory_stats()
+    assert stats["steps"] == 3 and stats["buffered"] == 2 and stats["context_keys"] == 3
+    assert stats["approx_bytes"] > 0
+
+
+def test_agent_memory_stays_bounded_on_long_plans():
+    class _LLM:
+        def generate(self, prompt, **kwargs):
+            if "formato JSON" in prompt:
+                return json.dumps([_step(number) for number in range(1, 31)])
+            return "x" * 2000
+
+    agent = AgenticAutomationAgent("auto", _LLM(), max_iterations=30,
+                                   config={"execution_history": {"max_entries": 5}})
+    result = agent.run({"prompt": "lungo task"})
+
+    stats = agent.get_run_memory_stats()
+    assert "Step eseguiti: 30" in result
+    assert stats["steps"] == 30 and stats["buffered"] == 5 and stats["context_keys"] == 7
+    assert stats["result_chars"] <= 5 * 2020
+
+
+def test_tool_steps_run_in_process_mode_tools():
+    class _LLM:
+        def generate(self, prompt, **kwargs):
+            if "formato JSON" in prompt:
+                return json.dumps([{"step": 1, "action": "tool", "tool": "MathTool", "description": "6 * 7"}])
+            return "fatto"
+
+    math = MathTool()
+    executor = ToolExecutor(max_processes=1)
+    executor.register(math, executor="process", class_path="tools.math_tool.MathTool")
+    agent = AgenticAutomationAgent("auto", _LLM(), tools=[math])
+    agent.tool_executor = executor
+    try:
+        agent.run({"prompt": "calcola"})
+    finally:
+        executor.shutdown()
+
+    assert agent.execution_history[0]["result"] == "Tool MathTool result: 42.0"
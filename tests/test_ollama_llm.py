@@ -0,0 +1,359 @@
+"""
+Tests for the Ollama LLM provider against a local stand-in HTTP server.
+"""
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import requests
+
+from agents.simple_agent import SimpleAgent
+from llm_providers.conversation import ConversationSession
+from llm_providers.ollama_llm import OllamaLLM
+from llm_providers.single_flight import SingleFlight
+
+
+def _endpoint(server):
+    host, port = server.server_address
+    return f"http://{host}:{port}"
+
+
+def test_generate_reuses_pooled_connection(fake_ollama):
+    llm = OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama))
+
+    for i in range(5):
+        assert llm.generate(f"prompt {i}") == f"echo: prompt {i}"
+
+    stats = llm.get_transport_stats()
+    assert stats["requests"] == 5
+    assert stats["pool_misses"] == 1
+    assert stats["pool_hits"] == 4
+    llm.close()
+
+
+def test_client_config_keys_are_not_sent_as_options(fake_ollama):
+    llm = OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama),
+                    pool_maxsize=2, http_keep_alive=True, num_ctx=4096)
+    llm.generate("hi")
+
+    _, payload = fake_ollama.requests_seen[-1]
+    assert payload["options"]["num_ctx"] == 4096
+    assert "pool_maxsize" not in payload["options"]
+    assert "http_keep_alive" not in payload["options"]
+
+
+def test_metadata_calls_share_transport(fake_ollama):
+    llm = OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama))
+
+    assert llm.is_available()
+    assert llm.list_models() == ["fake-model:latest"]
+    assert llm.get_model_info() == {"modelfile": "FROM fake-model"}
+    assert llm.get_transport_stats()["pool_misses"] == 1
+
+
+def test_generate_stream_yields_tokens_and_records_metrics(fake_ollama):
+    llm = OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama))
+
+    chunks = list(llm.generate_stream("hello"))
+
+    assert chunks == ["echo", ": ", "hello"]
+    metrics = llm.get_stream_metrics()
+    assert metrics["ttft_seconds"]["count"] == 1
+    assert metrics["tokens_per_sec"]["mean"] == pytest.approx(100.0)
+
+
+def test_generate_stream_reports_connection_errors():
+    llm = OllamaLLM(model="fake-model", endpoint="http://127.0.0.1:9", timeout=1)
+
+    assert list(llm.generate_stream("hello")) == ["Errore: impossibile connettersi al server Ollama"]
+
+
+def test_agenerate_returns_response(fake_ollama):
+    llm = OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama))
+
+    async def scenario():
+        try:
+            return await llm.agenerate("async")
+        finally:
+            await llm.aclose()
+
+    assert asyncio.run(scenario()) == "echo: async"
+
+
+def test_agenerate_respects_endpoint_concurrency_limit(fake_ollama):
+    fake_ollama.delay = 0.05
+    llm = OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama), max_concurrent_requests=2)
+
+    async def scenario():
+        try:
+            return await asyncio.gather(*(llm.agenerate(f"p{i}") for i in range(8)))
+        finally:
+            await llm.aclose()
+
+    results = asyncio.run(scenario())
+
+    assert results == [f"echo: p{i}" for i in range(8)]
+    stats = llm.get_async_transport_stats()
+    assert stats["requests"] == 8
+    assert stats["max_in_flight"] == 2
+
+
+def test_generate_many_keeps_order_and_reports_item_errors(fake_ollama):
+    llm = OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama))
+    prompts = ["a", "fail", "c", "d"]
+
+    results = llm.generate_many(prompts, max_concurrency=3)
+
+    assert [r.index for r in results] == [0, 1, 2, 3]
+    assert [r.text for r in results] == ["echo: a", None, "echo: c", "echo: d"]
+    assert not results[1].ok
+    assert isinstance(results[1].error, requests.exceptions.HTTPError)
+    assert llm.get_metrics()["batch_prompts_per_sec"]["count"] == 1
+
+
+def test_identical_concurrent_requests_are_coalesced(fake_ollama):
+    fake_ollama.delay = 0.1
+    llm = OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(llm.generate("same"))) for _ in range(5)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["echo: same"] * 5
+    assert len(fake_ollama.requests_seen) == 1
+    stats = llm.get_coalescing_stats()
+    assert stats["executions"] == 1
+    assert stats["deduplicated"] == 4
+
+
+def test_identical_concurrent_async_requests_are_coalesced(fake_ollama):
+    fake_ollama.delay = 0.05
+    llm = OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama))
+
+    async def scenario():
+        try:
+            return await asyncio.gather(*(llm.agenerate("same") for _ in range(4)), llm.agenerate("other"))
+        finally:
+            await llm.aclose()
+
+    results = asyncio.run(scenario())
+
+    assert results == ["echo: same"] * 4 + ["echo: other"]
+    assert len(fake_ollama.requests_seen) == 2
+    assert llm.get_coalescing_stats()["deduplicated"] == 3
+
+
+def test_cancelling_the_leader_does_not_cancel_followers():
+    flight = SingleFlight()
+    started = []
+
+    async def slow_call():
+        started.append(1)
+        await asyncio.sleep(0.05)
+        return "risultato"
+
+    async def scenario():
+        leader = asyncio.ensure_future(flight.ado("key", slow_call))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.ado("key", slow_call))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        result = await follower
+
+        # Once every caller has given up, the shared call is cancelled and the next caller starts a new one
+        abandoned = asyncio.ensure_future(flight.ado("other", slow_call))
+        await asyncio.sleep(0.01)
+        abandoned.cancel()
+        await asyncio.sleep(0)
+        retry = await flight.ado("other", slow_call)
+        return leader, result, abandoned, retry
+
+    leader, result, abandoned, retry = asyncio.run(scenario())
+
+    assert leader.cancelled() and abandoned.cancelled()
+    assert result == retry == "risultato"
+    assert len(started) == 3
+    assert flight.get_stats() == {"calls": 4, "executions": 3, "deduplicated": 1, "in_flight": 0}
+
+
+def test_coalescing_can_be_disabled(fake_ollama):
+    fake_ollama.delay = 0.05
+    llm = OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama), coalesce_requests=False)
+
+    llm.generate_many(["same"] * 3, max_concurrency=3)
+
+    assert len(fake_ollama.requests_seen) == 3
+    assert "coalesce_requests" not in fake_ollama.requests_seen[0][1]["options"]
+
+
+def test_warm_up_sends_zero_token_request_with_keep_alive(fake_ollama):
+    llm = OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama), keep_alive="30m")
+
+    result = llm.warm_up()
+
+    assert "error" not in result
+    assert result["cold_seconds"] >= 0 and result["warm_seconds"] >= 0
+    path, payload = fake_ollama.requests_seen[0]
+    assert path == "/api/generate"
+    assert payload["prompt"] == ""
+    assert payload["keep_alive"] == "30m"
+
+    llm.generate("hi")
+    assert fake_ollama.requests_seen[-1][1]["keep_alive"] == "30m"
+    assert "keep_alive" not in fake_ollama.requests_seen[-1][1]["options"]
+
+
+def test_chat_session_sends_history_and_records_prompt_eval(fake_ollama):
+    llm = OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama))
+    session = ConversationSession(llm, system_prompt="be brief", mode="chat")
+
+    assert session.send("first turn") == "echo: first turn"
+    session.add_observation("Tool result: 42")
+    assert session.send("second") == "echo: Tool result: 42\n\nsecond"
+
+    path, payload = fake_ollama.requests_seen[-1]
+    assert path == "/api/chat"
+    assert [m["role"] for m in payload["messages"]] == ["system", "user", "assistant", "user"]
+    assert session.get_stats()["turns"] == 2
+    assert llm.get_metrics()["prompt_eval_tokens"]["count"] == 2
+
+
+def test_context_session_sends_only_the_delta(fake_ollama):
+    llm = OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama))
+    session = ConversationSession(llm, system_prompt="sys", mode="context")
+
+    session.send("hello")
+    session.send("again")
+
+    first, second = fake_ollama.requests_seen[0][1], fake_ollama.requests_seen[1][1]
+    assert first["prompt"] == "sys\n\nhello" and "context" not in first
+    assert second["prompt"] == "again"
+    assert second["context"] == [len("sys\n\nhello")]
+    assert "context" not in second["options"]
+
+
+def test_chat_session_stream_updates_history(fake_ollama):
+    llm = OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama))
+    session = ConversationSession(llm, mode="chat")
+
+    assert "".join(session.send_stream("hi")) == "echo: hi"
+    assert session.messages[-1] == {"role": "assistant", "content": "echo: hi"}
+    assert session.get_stats()["prompt_eval_tokens"] == 1
+
+
+class _ChatStub:
+    """Chat provider counting one token per word, failing the turns listed in `fail`."""
+
+    def __init__(self, budget=None, fail=()):
+        self.budget = budget
+        self.fail = set(fail)
+        self.sent = []
+
+    def prompt_budget(self):
+        return self.budget
+
+    def count_tokens(self, text):
+        return len(text.split())
+
+    def format_error(self, error):
+        return f"Errore: {error}"
+
+    def chat_raw(self, messages, **kwargs):
+        self.sent.append(messages)
+        if len(self.sent) in self.fail:
+            raise ConnectionError("host non raggiungibile")
+        return {"message": {"content": "ok " + messages[-1]["content"]}, "prompt_eval_count": 1}
+
+
+def test_failed_turn_keeps_pending_observations():
+    llm = _ChatStub(fail={1})
+    session = ConversationSession(llm, mode="chat")
+    session.add_observation("Tool result: 42")
+
+    assert session.send("first") == "Errore: host non raggiungibile"
+    assert session.pending_observations == ["Tool result: 42"] and session.messages == []
+    assert session.send("retry") == "ok Tool result: 42\n\nretry"
+    assert session.pending_observations == []
+
+
+def test_session_errors_without_format_error_and_abandoned_streams():
+    class _BareChat:
+        def chat_raw(self, messages, **kwargs):
+            raise ConnectionError("host non raggiungibile")
+
+        def chat_stream(self, messages, on_done=None, **kwargs):
+            yield "ok"
+            yield " fine"
+            if on_done is not None:
+                on_done({"prompt_eval_count": 1})
+
+    session = ConversationSession(_BareChat(), mode="chat")
+    assert session.send("ciao") == "Errore: host non raggiungibile"
+
+    stream = session.send_stream("primo")
+    assert next(stream) == "ok"
+    # The abandoned stream does not hold the session: the next turn goes through
+    session.add_observation("Tool result: 42")
+    assert "".join(session.send_stream("secondo")) == "ok fine"
+    assert session.pending_observations == []
+    assert session.messages[-1] == {"role": "assistant", "content": "ok fine"}
+
+
+def test_chat_history_is_trimmed_to_the_budget_and_turn_cap():
+    llm = _ChatStub(budget=20)
+    session = ConversationSession(llm, system_prompt="be brief", mode="chat")
+    for turn in range(6):
+        session.send(f"turn {turn} with some words")
+
+    # Every request fits the budget and keeps the system message first
+    assert all(sum(llm.count_tokens(m["content"]) for m in sent) <= 20 for sent in llm.sent)
+    assert all(sent[0]["role"] == "system" for sent in llm.sent)
+    assert session.messages[-2]["content"] == "turn 5 with some words"
+    assert session.get_stats()["trimmed_turns"] == 5 - (len(session.messages) - 3) // 2
+
+    capped = ConversationSession(_ChatStub(), mode="chat", max_turns=1)
+    for turn in range(3):
+        capped.send(f"turn {turn}")
+    assert [m["content"] for m in capped.llm.sent[-1]] == ["turn 1", "ok turn 1", "turn 2"]
+    assert capped.get_stats()["trimmed_turns"] == 1
+
+
+def test_simple_agent_uses_session_only_with_session_id(fake_ollama):
+    llm = OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama))
+    agent = SimpleAgent("assistant", llm, system_prompt="sys", config={"max_sessions": 1})
+
+    agent.run({"prompt": "one-shot"})
+    agent.run({"prompt": "turn 1", "session_id": "a"})
+    agent.run({"prompt": "turn 2", "session_id": "a"})
+    agent.run({"prompt": "other", "session_id": "b"})
+
+    paths = [path for path, _ in fake_ollama.requests_seen]
+    assert paths == ["/api/generate", "/api/chat", "/api/chat", "/api/chat"]
+    assert len(fake_ollama.requests_seen[2][1]["messages"]) == 4
+    assert list(agent._sessions) == ["b"]
+
+
+def test_embed_batches_into_a_float32_matrix(fake_ollama):
+    fake_ollama.delay = 0.1
+    llm = OllamaLLM(model="fake-model", endpoint=_endpoint(fake_ollama),
+                    embedding_model="embed-model", embed_batch_size=2)
+    texts = ["uno", "due tre", "quattro cinque sei", "sette", "otto nove"]
+
+    start = time.perf_counter()
+    matrix = llm.embed(texts, max_concurrency=3)
+    elapsed = time.perf_counter() - start
+
+    assert matrix.dtype == np.float32 and matrix.flags["C_CONTIGUOUS"]
+    assert matrix.shape == (5, 3)
+    assert matrix[:, 1].tolist() == [1, 2, 3, 1, 2]
+    assert sorted(len(data["input"]) for _, data in fake_ollama.requests_seen) == [1, 2, 2]
+    assert all(data["model"] == "embed-model" for _, data in fake_ollama.requests_seen)
+    assert elapsed < 0.25
+    assert llm.embed([]).shape == (0, 0)
+    assert asyncio.run(llm.aembed("una frase")).shape == (1, 3)
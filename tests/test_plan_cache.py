@@ -0,0 +1,101 @@
+"""
+Tests for the plan cache and plan templates of AgenticAutomationAgent.
+"""
+import json
+
+import numpy as np
+import pytest
+
+from agents.agentic_automation_agent import AgenticAutomationAgent
+from core.plan_cache import PlanCache, PlanTemplate, validate_plan
+
+PLAN = [
+    {"step": 1, "action": "analyze", "description": "Analizza: riassumi il report", "tool": None},
+    {"step": 2, "action": "reasoning", "description": "Scrivi il riassunto", "tool": None, "depends_on": [1]},
+]
+
+
+class _CountingLLM:
+    """Answers planning prompts with a fixed plan and counts them."""
+
+    def __init__(self, plan=PLAN):
+        self.plan = plan
+        self.planning_calls = 0
+
+    def generate(self, prompt, **kwargs):
+        if "formato JSON" in prompt:
+            self.planning_calls += 1
+            return json.dumps(self.plan)
+        return "ok"
+
+
+def test_repeated_task_reuses_plan_without_planning_call():
+    llm = _CountingLLM()
+    agent = AgenticAutomationAgent("planner", llm, config={"plan_cache": {"enabled": True}})
+
+    agent.run({"prompt": "Riassumi il report"})
+    agent.run({"prompt": "riassumi  il REPORT!"})
+
+    assert llm.planning_calls == 1
+    assert agent.last_run.current_context["plan"] == PLAN
+    stats = agent.get_plan_cache_stats()
+    assert stats["exact_hits"] == 1 and stats["misses"] == 1 and stats["stores"] == 1
+    assert stats["top_plans"] == [{"task": "riassumi il report", "hits": 1}]
+
+
+def test_lru_eviction_and_invalid_plans():
+    cache = PlanCache(max_entries=2)
+    for task in ("uno", "due", "tre"):
+        assert cache.put(task, ["mathtool"], PLAN)
+    assert not cache.put("quattro", ["mathtool"], [{"step": 1, "depends_on": [7]}])
+
+    assert cache.get("uno", ["mathtool"]) is None
+    assert cache.get("tre", ["mathtool"]) == PLAN
+    assert cache.get("tre", ["filetool"]) is None
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1 and stats["rejected"] == 1 and stats["entries"] == 2
+    assert not validate_plan([]) and not validate_plan({"step": 1})
+    assert not validate_plan([{"step": 1, "action": "teletrasporta", "description": "x"}])
+    assert validate_plan([{"step": 1, "description": "x"}, {"step": 2, "action": "generic", "description": "y"}])
+
+
+def test_similar_task_reuses_plan_with_task_filled_in():
+    vectors = {"riassumi il report": [1.0, 0.0], "riassumi il report trimestrale": [0.9, 0.1],
+               "traduci il documento": [0.0, 1.0]}
+    cache = PlanCache(similarity_threshold=0.95, embed=lambda texts: np.array([vectors[t] for t in texts]))
+    plan = [{"step": 1, "action": "analyze", "description": "Analizza: riassumi il report"}]
+    cache.put("riassumi il report", [], plan)
+
+    reused = cache.get("riassumi il report trimestrale", [])
+    assert reused == [{"step": 1, "action": "analyze", "description": "Analizza: riassumi il report trimestrale"}]
+    assert cache.get("traduci il documento", []) is None
+    assert cache.get_stats()["similar_hits"] == 1
+
+
+def test_pinned_templates_from_yaml(tmp_path):
+    path = tmp_path / "templates.yaml"
+    path.write_text(
+        "plan_templates:\n"
+        "  - name: traduzione\n"
+        "    match: [traduci]\n"
+        "    plan:\n"
+        "      - {step: 1, action: reasoning, description: 'Traduci: {task}'}\n",
+        encoding="utf-8",
+    )
+    llm = _CountingLLM()
+    agent = AgenticAutomationAgent("planner", llm, config={"plan_templates": str(path)})
+
+    agent.run({"prompt": "Traduci il contratto"})
+
+    assert llm.planning_calls == 0
+    assert agent.last_run.current_context["plan"][0]["description"] == "Traduci: Traduci il contratto"
+    # Templates alone do not cache LLM plans
+    agent.run({"prompt": "Scrivi una mail"})
+    agent.run({"prompt": "Scrivi una mail"})
+    assert llm.planning_calls == 2
+    assert agent.get_plan_cache_stats()["template_hits"] == 1
+
+
+def test_template_requires_a_matcher():
+    with pytest.raises(ValueError):
+        PlanTemplate(PLAN, name="senza criteri")
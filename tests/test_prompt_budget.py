@@ -0,0 +1,78 @@
+"""
+Tests for token estimation and the budgeted prompt builder.
+"""
+from core.prompt_budget import BudgetedPromptBuilder, TRIM_MARKER
+from llm_providers.ollama_llm import OllamaLLM
+from llm_providers.tokens import TokenEstimator
+
+
+def test_estimator_calibrates_towards_measured_counts():
+    estimator = TokenEstimator("calibration-model", tokens_per_piece=1.0, alpha=0.5)
+    text = "una frase di prova " * 10
+
+    assert estimator.estimate(text) == 40
+    estimator.calibrate(text, 80)
+
+    assert estimator.tokens_per_piece == 1.5
+    assert estimator.get_stats()["samples"] == 1
+
+
+def test_builder_keeps_prompt_unchanged_within_budget():
+    builder = BudgetedPromptBuilder(budget=100)
+    builder.add("system", "Sei un assistente.", required=True)
+    builder.add("user", "Ciao", header="User: ")
+
+    assert builder.build() == "Sei un assistente.\n\nUser: Ciao"
+    assert builder.last_report["trimmed"] == {}
+
+
+def test_builder_trims_lowest_priority_sections_first():
+    history = " ".join(f"turno{i}" for i in range(200))
+    documents = " ".join(f"doc{i}" for i in range(50))
+    builder = BudgetedPromptBuilder(budget=120)
+    builder.add("system", "Sei un assistente.", priority=3, required=True)
+    builder.add("history", history, priority=0, header="Storia:\n", keep="end")
+    builder.add("documents", documents, priority=1, header="Documenti:\n")
+    builder.add("user", "Domanda finale?", priority=2, header="User: ")
+
+    prompt = builder.build()
+
+    report = builder.last_report
+    assert report["total_tokens"] <= 120
+    assert list(report["trimmed"]) == ["history"]
+    assert f"Storia:\n{TRIM_MARKER} " in prompt
+    assert "turno199" in prompt and "turno0 " not in prompt
+    assert documents in prompt
+    assert prompt.startswith("Sei un assistente.") and prompt.endswith("User: Domanda finale?")
+
+
+def test_ollama_exposes_budget_and_calibrates_from_prompt_eval(fake_ollama):
+    host, port = fake_ollama.server_address
+    llm = OllamaLLM(model="budget-model", endpoint=f"http://{host}:{port}", num_ctx=4096, max_tokens=512)
+
+    assert llm.prompt_budget() == 3584
+    assert llm.count_tokens("") == 0
+
+    llm.generate(" ".join(["parola"] * 40))
+
+    assert llm.token_estimator.get_stats()["samples"] == 1
+    assert llm.count_tokens(" ".join(["parola"] * 10)) < 13
+
+
+def test_prompt_eval_of_a_reused_prefix_does_not_calibrate():
+    llm = OllamaLLM(model="prefix-cache-model", endpoint="http://127.0.0.1:9")
+    samples = lambda: llm.token_estimator.get_stats()["samples"]
+    prefix = "Sei un assistente. " * 40
+    estimate = llm.count_tokens(prefix + "Domanda uno?")
+
+    # First render of the prefix: the whole prompt is evaluated
+    llm._record_prompt_eval({"prompt_eval_count": estimate}, {"prompt": prefix + "Domanda uno?"})
+    assert samples() == 1
+
+    # Same prefix served from the KV cache: only the suffix is counted
+    llm._record_prompt_eval({"prompt_eval_count": 4}, {"prompt": prefix + "Domanda due?"})
+    assert samples() == 1
+
+    # Count close to the estimate: the prefix was evicted and evaluated again
+    llm._record_prompt_eval({"prompt_eval_count": estimate}, {"prompt": prefix + "Domanda tre?"})
+    assert samples() == 2
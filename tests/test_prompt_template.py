@@ -0,0 +1,78 @@
+"""
+Tests for compiled prompt templates and the stable prompt prefix of the agents.
+"""
+import json
+
+import pytest
+
+from agents.agentic_automation_agent import AgenticAutomationAgent
+from agents.multi_tool_agent import MultiToolAgent
+from agents.tool_agent import ToolAgent
+from core.prompt_template import PromptTemplate
+from tools.math_tool import MathTool
+
+
+class _RecordingLLM:
+    """Records prompts; answers planning prompts with a two-step plan and selection prompts with tool 0."""
+
+    def __init__(self):
+        self.prompts = []
+
+    def generate(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        if "formato JSON" in prompt:
+            return json.dumps([{"step": 1, "action": "analyze", "description": "analizza"},
+                               {"step": 2, "action": "reasoning", "description": "ragiona"}])
+        return "0" if "Tool selezionati" in prompt else "risposta"
+
+
+def test_template_renders_slots_behind_an_identical_prefix():
+    template = PromptTemplate(["Sistema {non uno slot}", "", "Catalogo"],
+                              {"user": "User: {prompt}", "json": "{{\"x\": {value}}}"})
+
+    assert template.prefix == "Sistema {non uno slot}\n\nCatalogo\n\n"
+    assert template.slots("user") == ["prompt"]
+    assert template.render("user", prompt="{ciao}") == template.prefix + "User: {ciao}"
+    assert template.render("json", value=1).endswith('{"x": 1}')
+
+    stats = template.get_stats()
+    assert stats["renders"] == {"user": 1, "json": 1}
+    assert stats["prefix_chars"] == len(template.prefix) and stats["prefix_tokens"] > 0
+    assert stats["reusable_prefix_tokens"] == stats["prefix_tokens"]
+
+    with pytest.raises(ValueError):
+        PromptTemplate([], {"bad": "{value!r}"})
+    with pytest.raises(KeyError):
+        template.render("user")
+
+
+def test_tool_agents_prefix_every_prompt_with_system_prompt_and_catalog():
+    llm = _RecordingLLM()
+    agent = ToolAgent("tool", llm, tools=[MathTool()], system_prompt="Sei un contabile.")
+    agent.run({"prompt": "calcola 2 + 2"})
+    agent.run({"prompt": "ciao"})
+
+    prefix = agent.prompt_template.prefix
+    assert prefix.startswith("Sei un contabile.") and "MathTool" in prefix
+    # Reasoning and final prompt of the tool run, then the plain answer
+    assert len(llm.prompts) == 3 and all(prompt.startswith(prefix) for prompt in llm.prompts)
+    assert agent.get_prompt_stats()["renders"] == {"user": 2, "final": 1}
+
+    llm = _RecordingLLM()
+    multi = MultiToolAgent("multi", llm, tools=[MathTool()], dispatch_strategy="llm")
+    multi.run({"prompt": "quanto fa 3 * 3"})
+    assert len(llm.prompts) == 2
+    assert all(prompt.startswith(multi.prompt_template.prefix) for prompt in llm.prompts)
+    assert "0: MathTool" in multi.prompt_template.prefix
+
+
+def test_agentic_step_prompts_share_the_prefix():
+    llm = _RecordingLLM()
+    agent = AgenticAutomationAgent("auto", llm, tools=[MathTool()], system_prompt="Sei metodico.")
+    agent.run({"prompt": "prepara il report"})
+
+    prefix = agent.prompt_template.prefix
+    assert len(llm.prompts) == 4 and all(prompt.startswith(prefix) for prompt in llm.prompts)
+    renders = agent.get_prompt_stats()["renders"]
+    assert {kind for kind, count in renders.items() if count} == {"planning", "analysis", "reasoning", "summary"}
+    assert agent.get_prompt_stats()["reusable_prefix_tokens"] == 3 * agent.prompt_template.prefix_tokens
@@ -0,0 +1,63 @@
+"""
+Tests for the early-exit react execution mode of AgenticAutomationAgent.
+"""
+import asyncio
+import json
+
+from agents.agentic_automation_agent import AgenticAutomationAgent
+from benchmarks.react import run_react_benchmark
+from tools.math_tool import MathTool
+
+
+class _ScriptLLM:
+    """Returns the scripted responses in order, then keeps repeating the last one."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.prompts = []
+
+    def generate(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return self.responses[min(len(self.prompts), len(self.responses)) - 1]
+
+
+def _agent(llm, max_iterations=5):
+    return AgenticAutomationAgent("react", llm, tools=[MathTool()], max_iterations=max_iterations,
+                                  config={"execution_mode": "react"})
+
+
+def test_final_answer_stops_the_loop_without_planning_or_summary():
+    llm = _ScriptLLM('{"action": "final", "answer": "Ciao!"}')
+    result = _agent(llm).run({"prompt": "saluta"})
+
+    assert len(llm.prompts) == 1 and "formato JSON" not in llm.prompts[0]
+    assert "Ciao!" in result and "Nessun tool utilizzato" in result
+    assert _agent(_ScriptLLM("Risposta in testo libero")).run({"prompt": "saluta"}).count("Risposta in testo libero") == 1
+
+
+def test_tool_requests_pass_structured_arguments_and_are_observed():
+    llm = _ScriptLLM(json.dumps({"action": "tool", "tool": "MathTool", "input": {"expression": "(3 + 4) * 5"}}),
+                     '{"action": "final", "answer": "Fa 35"}')
+    agent = _agent(llm)
+    result = asyncio.run(agent.arun({"prompt": "calcola (3 + 4) * 5"}))
+
+    assert len(llm.prompts) == 2
+    assert "Tool MathTool result: 35.0" in llm.prompts[1] and "Iterazione 2 di 5" in llm.prompts[1]
+    assert "Fa 35" in result and agent.last_run.llm_calls == 2
+
+
+def test_max_iterations_ends_with_the_plan_mode_summary():
+    llm = _ScriptLLM(json.dumps({"action": "tool", "tool": "MathTool", "input": {"prompt": "2 + 2"}}))
+    agent = _agent(llm, max_iterations=3)
+    agent.run({"prompt": "continua a calcolare"})
+
+    assert len(llm.prompts) == 4
+    assert "Genera un riassunto finale" in llm.prompts[-1]
+    assert agent.execution_history.total == 3
+
+
+def test_benchmark_reports_calls_saved_over_plan_mode():
+    rows = run_react_benchmark()
+    assert all(row["react_calls"] <= row["plan_calls"] for row in rows)
+    assert sum(row["saved"] for row in rows) > 0
+    assert rows[0]["react_calls"] == 1
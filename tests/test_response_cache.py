@@ -0,0 +1,147 @@
+"""
+Tests for the two-tier LLM response cache.
+"""
+import asyncio
+import time
+
+from llm_providers.response_cache import ResponseCache, CachedLLM
+
+
+class _CountingLLM:
+    model = "fake-model"
+
+    def __init__(self, temperature=0.0):
+        self.temperature = temperature
+        self.max_tokens = 64
+        self.calls = 0
+
+    def generation_options(self, **kwargs):
+        return {"temperature": kwargs.get("temperature", self.temperature),
+                "num_predict": kwargs.get("max_tokens", self.max_tokens)}
+
+    def generate_raw(self, prompt, **kwargs):
+        self.calls += 1
+        if prompt == "boom":
+            raise RuntimeError("boom")
+        return f"answer to {prompt}"
+
+    def generate(self, prompt, **kwargs):
+        return self.generate_raw(prompt, **kwargs)
+
+    async def agenerate_raw(self, prompt, **kwargs):
+        return self.generate_raw(prompt, **kwargs)
+
+
+def test_repeated_prompt_is_served_from_memory():
+    llm = _CountingLLM()
+    cached = CachedLLM(llm, ResponseCache())
+
+    assert cached.generate("q") == "answer to q"
+    assert cached.generate("q") == "answer to q"
+
+    assert llm.calls == 1
+    stats = cached.get_cache_stats()
+    assert stats["memory_hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_options_are_part_of_the_key():
+    llm = _CountingLLM()
+    cached = CachedLLM(llm, ResponseCache())
+
+    cached.generate("q", max_tokens=10)
+    cached.generate("q", max_tokens=20)
+
+    assert llm.calls == 2
+
+
+def test_nonzero_temperature_bypasses_unless_forced():
+    llm = _CountingLLM(temperature=0.7)
+    cached = CachedLLM(llm, ResponseCache())
+
+    cached.generate("q")
+    cached.generate("q")
+    assert llm.calls == 2
+    assert cached.get_cache_stats()["bypasses"] == 2
+
+    cached.generate("q", force_cache=True)
+    cached.generate("q", force_cache=True)
+    assert llm.calls == 3
+
+
+def test_context_and_on_done_bypass_the_cache():
+    llm = _CountingLLM()
+    cached = CachedLLM(llm, ResponseCache())
+
+    cached.generate("q", context=[1, 2])
+    cached.generate("q", context=[3, 4])
+    assert llm.calls == 2
+
+    cached.generate("q")
+    cached.generate("q", on_done=lambda final: None)
+    assert llm.calls == 4
+    assert cached.get_cache_stats()["bypasses"] == 3
+
+
+def test_errors_are_not_cached():
+    llm = _CountingLLM()
+    cached = CachedLLM(llm, ResponseCache())
+
+    assert cached.generate("boom") == "Errore: boom"
+    assert cached.generate("boom") == "Errore: boom"
+    assert llm.calls == 2
+
+    class _PlainLLM:
+        model = "plain-model"
+        temperature = 0.0
+
+        def __init__(self):
+            self.calls = 0
+
+        def generate(self, prompt, **kwargs):
+            self.calls += 1
+            return "Errore: servizio non disponibile" if self.calls == 1 else f"echo: {prompt}"
+
+    plain = _PlainLLM()
+    cached = CachedLLM(plain, ResponseCache())
+    assert cached.generate("ciao") == "Errore: servizio non disponibile"
+    assert cached.generate("ciao") == "echo: ciao"
+    assert cached.generate("ciao") == "echo: ciao"
+    assert plain.calls == 2
+
+
+def test_lru_eviction_and_ttl_expiry():
+    cache = ResponseCache(ttl=0.05, max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get_stats()["evictions"] == 1
+
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    first = ResponseCache(path=path)
+    first.set("key", "value")
+    first.close()
+
+    second = ResponseCache(path=path)
+    assert second.get("key") == "value"
+    assert second.get_stats()["disk_hits"] == 1
+    second.close()
+
+
+def test_async_path_shares_the_cache():
+    llm = _CountingLLM()
+    cached = CachedLLM(llm, ResponseCache())
+
+    cached.generate("q")
+    assert asyncio.run(cached.agenerate("q")) == "answer to q"
+    assert llm.calls == 1
@@ -0,0 +1,269 @@
+"""
+Tests for multi-endpoint routing, hedging and circuit breaking of the Ollama provider.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from llm_providers.ollama_llm import OllamaLLM
+from llm_providers.routed_llm import RoutedOllamaLLM
+
+
+def _endpoint(server):
+    host, port = server.server_address
+    return f"http://{host}:{port}"
+
+
+def test_concurrent_requests_spread_over_endpoints(fake_ollama_hosts):
+    servers = fake_ollama_hosts(2)
+    for server in servers:
+        server.delay = 0.1
+    llm = RoutedOllamaLLM("fake-model", [_endpoint(s) for s in servers], health_check_interval=0)
+
+    results = llm.generate_many([f"p{i}" for i in range(4)], max_concurrency=4)
+
+    assert [r.text for r in results] == [f"echo: p{i}" for i in range(4)]
+    assert [len(s.requests_seen) for s in servers] == [2, 2]
+    assert all(e["outstanding"] == 0 for e in llm.get_routing_stats())
+
+    # Metrics cover every endpoint, not just the primary one
+    metrics = llm.get_metrics()
+    assert metrics["prompt_eval_tokens"]["count"] == 4
+    assert metrics["batch_prompts_per_sec"]["count"] == 1
+    assert "batch_prompts_per_sec" not in llm.primary.get_metrics()
+    assert llm.count_tokens("due parole") > 0
+    with pytest.raises(AttributeError):
+        llm.get_cache_stats
+    llm.close()
+
+
+def test_ewma_prefers_the_faster_endpoint(fake_ollama_hosts):
+    slow, fast = fake_ollama_hosts(2)
+    slow.delay = 0.1
+    llm = RoutedOllamaLLM("fake-model", [_endpoint(slow), _endpoint(fast)],
+                          strategy="ewma", health_check_interval=0)
+
+    for i in range(6):
+        llm.generate(f"p{i}")
+
+    assert len(slow.requests_seen) == 1
+    assert len(fast.requests_seen) == 5
+    llm.close()
+
+
+def test_dead_endpoint_fails_over_and_is_readmitted(fake_ollama_hosts):
+    (server,) = fake_ollama_hosts(1)
+    dead = "http://127.0.0.1:9"
+    llm = RoutedOllamaLLM("fake-model", [dead, _endpoint(server)], health_check_interval=0)
+
+    assert llm.generate("hello") == "echo: hello"
+    stats = {e["endpoint"]: e for e in llm.get_routing_stats()}
+    assert not stats[dead]["healthy"]
+    assert stats[dead]["errors"] == 1
+
+    # While excluded, the dead endpoint receives no traffic
+    llm.generate("again")
+    assert {e["endpoint"]: e for e in llm.get_routing_stats()}[dead]["requests"] == 1
+
+    # A successful probe puts an endpoint back in rotation
+    llm.states[0].llm.endpoint = _endpoint(server)
+    assert llm.check_health() == {dead: True, _endpoint(server): True}
+    llm.close()
+
+
+def test_timeouts_and_server_errors_feed_latency_and_health(fake_ollama_hosts):
+    slow, failing = fake_ollama_hosts(2)
+    slow.delay = 0.3
+    llm = RoutedOllamaLLM("fake-model", [_endpoint(slow)], health_check_interval=0, timeout=0.1)
+    for i in range(3):
+        assert llm.generate(f"p{i}").startswith("Errore")
+    (stats,) = llm.get_routing_stats()
+    assert stats["timeouts"] == 3 and stats["ewma_latency"] >= 0.1 and not stats["healthy"]
+    llm.close()
+
+    llm = RoutedOllamaLLM("fake-model", [_endpoint(failing)], health_check_interval=0, failure_penalty=2.0)
+    llm.generate("ok")
+    baseline = llm.get_routing_stats()[0]["ewma_latency"]
+    llm.generate("fail")
+    llm.generate("fail")
+    stats = llm.get_routing_stats()[0]
+    assert stats["healthy"] and stats["errors"] == 2 and stats["ewma_latency"] > baseline
+    llm.generate("fail")
+    assert not llm.get_routing_stats()[0]["healthy"]
+
+    # The probe readmits the endpoint with a clean failure count
+    llm.check_health()
+    llm.generate("fail")
+    assert llm.get_routing_stats()[0]["healthy"]
+    llm.close()
+
+
+def test_streams_sample_time_to_first_chunk_and_count_broken_streams(fake_ollama_hosts):
+    (server,) = fake_ollama_hosts(1)
+    llm = RoutedOllamaLLM("fake-model", [_endpoint(server)], health_check_interval=0)
+    final = {}
+    assert "".join(llm.generate_stream("ciao", on_done=final.update)) == "echo: ciao"
+    assert final["done"] and llm.get_routing_stats()[0]["ewma_latency"] is not None
+    llm.close()
+
+    # Ollama streams report failures as text: a stream without its final chunk is an endpoint failure
+    dead = RoutedOllamaLLM("fake-model", ["http://127.0.0.1:9"], health_check_interval=0)
+    for _ in range(3):
+        assert "".join(dead.generate_stream("ciao")).startswith("Errore")
+    stats = dead.get_routing_stats()[0]
+    assert stats["errors"] == 3 and not stats["healthy"] and stats["outstanding"] == 0
+    dead.close()
+
+
+def test_async_and_coalesced_requests(fake_ollama_hosts):
+    servers = fake_ollama_hosts(2)
+    for server in servers:
+        server.delay = 0.05
+    llm = RoutedOllamaLLM("fake-model", [_endpoint(s) for s in servers], health_check_interval=0)
+
+    async def scenario():
+        try:
+            return await asyncio.gather(*(llm.agenerate("same") for _ in range(3)), llm.agenerate("other"))
+        finally:
+            await llm.aclose()
+
+    assert asyncio.run(scenario()) == ["echo: same"] * 3 + ["echo: other"]
+    assert sum(len(s.requests_seen) for s in servers) == 2
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(llm.generate("sync"))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["echo: sync"] * 3
+    assert llm.get_coalescing_stats()["deduplicated"] == 4
+    llm.close()
+
+
+def test_slow_request_is_hedged_on_another_endpoint(fake_ollama_hosts):
+    slow, fast = fake_ollama_hosts(2)
+    slow.delay = 0.5
+    endpoints = [_endpoint(slow), _endpoint(fast)]
+    llm = RoutedOllamaLLM("fake-model", endpoints, health_check_interval=0, hedge_percentile=95, hedge_delay=0.05)
+
+    started = time.perf_counter()
+    assert llm.generate("hi") == "echo: hi"
+    assert time.perf_counter() - started < 0.4
+    stats = llm.get_hedging_stats()
+    assert (stats["hedges"], stats["hedge_wins"], stats["hedge_rate"]) == (1, 1, 1.0)
+    llm.close()
+
+    allm = RoutedOllamaLLM("fake-model", endpoints, health_check_interval=0, hedge_percentile=95, hedge_delay=0.05)
+
+    async def scenario():
+        try:
+            return await allm.agenerate("async hi")
+        finally:
+            await allm.aclose()
+
+    assert asyncio.run(scenario()) == "echo: async hi"
+    assert allm.get_hedging_stats()["hedge_wins"] == 1
+    allm.close()
+
+
+def test_hedge_gets_a_snapshot_of_the_endpoints_reserved_by_the_primary(fake_ollama_hosts):
+    servers = fake_ollama_hosts(3)
+    servers[0].delay = 0.3
+    llm = RoutedOllamaLLM("fake-model", [_endpoint(s) for s in servers], health_check_interval=0,
+                          hedge_percentile=95, hedge_delay=0.05)
+
+    # The primary endpoint is reserved before the request leaves the calling thread
+    tried, state = llm._reserve_primary()
+    assert tried == [state] and state.outstanding == 1
+    exclude = llm._hedge_exclude(tried)
+    tried.append(llm.states[1])
+    assert exclude == [state]
+    llm._release(state, 0.0, sample=False)
+
+    assert llm.generate("hi") == "echo: hi"
+    assert [len(s.requests_seen) for s in servers] == [1, 1, 0]
+    time.sleep(0.4)  # the losing primary finishes in the background
+    assert all(e["outstanding"] == 0 for e in llm.get_routing_stats())
+    llm.close()
+
+
+def test_circuit_breaker_fails_fast_after_repeated_errors(fake_ollama):
+    llm = OllamaLLM("fake-model", endpoint=_endpoint(fake_ollama),
+                    circuit_failure_threshold=2, circuit_reset_timeout=0.1)
+
+    llm.generate("fail")
+    llm.generate("fail")
+    assert llm.generate("fail") == "Errore: server Ollama temporaneamente escluso dopo errori ripetuti"
+    assert len(fake_ollama.requests_seen) == 2
+    assert llm.get_circuit_stats()["state"] == "open"
+
+    # After the reset timeout one trial request closes the circuit again
+    time.sleep(0.1)
+    assert llm.generate("hi") == "echo: hi"
+    stats = llm.get_circuit_stats()
+    assert stats["state"] == "closed"
+    assert stats["rejected"] == 1
+
+
+def test_client_errors_do_not_open_the_circuit(fake_ollama):
+    llm = OllamaLLM("fake-model", endpoint=_endpoint(fake_ollama),
+                    circuit_failure_threshold=2, circuit_reset_timeout=0.1)
+
+    for _ in range(3):
+        assert llm.generate("bad").startswith("Errore")
+    assert llm.get_circuit_stats()["state"] == "closed"
+    assert llm.get_circuit_stats()["failures"] == 0
+
+    # A bad request during the half-open trial frees it without reopening the circuit
+    llm.generate("fail")
+    llm.generate("fail")
+    time.sleep(0.1)
+    llm.generate("bad")
+    assert llm.get_circuit_stats()["state"] == "half_open"
+    assert llm.generate("hi") == "echo: hi"
+
+
+def test_embed_spreads_batches_over_endpoints(fake_ollama_hosts):
+    servers = fake_ollama_hosts(2)
+    for server in servers:
+        server.delay = 0.05
+    llm = RoutedOllamaLLM("fake-model", [_endpoint(s) for s in servers], health_check_interval=0,
+                          embed_batch_size=1)
+
+    matrix = llm.embed(["a", "bb", "ccc", "dddd"])
+
+    assert matrix[:, 0].tolist() == [1, 2, 3, 4]
+    assert [len(s.requests_seen) for s in servers] == [2, 2]
+    assert asyncio.run(llm.aembed(["a", "bb"]))[:, 0].tolist() == [1, 2]
+    llm.close()
+
+
+def test_conversation_turns_stay_on_their_endpoint(fake_ollama_hosts):
+    from llm_providers.conversation import ConversationSession
+
+    slow, fast = fake_ollama_hosts(2)
+    slow.delay = 0.05
+    llm = RoutedOllamaLLM("fake-model", [_endpoint(slow), _endpoint(fast)], strategy="ewma",
+                          health_check_interval=0, affinity_max_outstanding=2)
+    for i in range(4):
+        llm.generate(f"p{i}")
+    assert llm._acquire() is llm.states[1]
+    llm._release(llm.states[1], time.perf_counter(), sample=False)
+
+    # The session's endpoint wins over the faster one while it is not overloaded
+    session = ConversationSession(llm, mode="context")
+    session.endpoint = _endpoint(slow)
+    before = len(slow.requests_seen)
+    for turn in range(3):
+        assert session.send(f"turno {turn}").startswith("echo:")
+    assert len(slow.requests_seen) == before + 3
+
+    llm.states[0].outstanding += 2
+    session.send("turno 3")
+    assert session.endpoint == _endpoint(fast)
+    llm.states[0].outstanding -= 2
+    assert "".join(session.send_stream("turno 4")) and session.endpoint == _endpoint(fast)
+    llm.close()
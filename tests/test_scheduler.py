@@ -0,0 +1,176 @@
+"""
+Tests for the central LLM request scheduler.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from llm_providers.scheduler import LLMScheduler, ScheduledLLM, SchedulerRejectedError
+
+
+def _queue_behind_held_slot(scheduler, requests):
+    """Hold the only slot, queue (agent, priority) requests in order, then release and return grant order."""
+    order = []
+    scheduler.acquire("ep", "holder")
+
+    def run(agent, priority):
+        scheduler.acquire("ep", agent, priority)
+        order.append(agent)
+        scheduler.release("ep")
+
+    threads = []
+    for agent, priority in requests:
+        thread = threading.Thread(target=run, args=(agent, priority))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.02)
+
+    scheduler.release("ep")
+    for thread in threads:
+        thread.join()
+    return order
+
+
+def test_interactive_requests_overtake_background_ones():
+    scheduler = LLMScheduler(max_concurrent=1)
+
+    order = _queue_behind_held_slot(scheduler, [("auto", "background"), ("auto", "background"), ("coder", "interactive")])
+
+    assert order == ["coder", "auto", "auto"]
+    assert scheduler.get_stats()["queue_wait_seconds"]["background"]["count"] == 2
+
+
+def test_agents_in_a_class_share_fairly():
+    scheduler = LLMScheduler(max_concurrent=1)
+
+    order = _queue_behind_held_slot(scheduler, [("chatty", "batch")] * 4 + [("quiet", "batch")] * 2)
+
+    assert order == ["chatty", "quiet", "chatty", "quiet", "chatty", "chatty"]
+
+
+def test_admission_rejects_full_queue_and_long_waits():
+    scheduler = LLMScheduler(max_concurrent=1, max_queue=0, max_wait=0.05)
+    scheduler.acquire("ep", "holder")
+
+    with pytest.raises(SchedulerRejectedError):
+        scheduler.acquire("ep", "late")
+
+    scheduler.max_queue = None
+    with pytest.raises(SchedulerRejectedError):
+        scheduler.acquire("ep", "late")
+
+    stats = scheduler.get_stats()
+    assert stats["rejected"] == 1
+    assert stats["timed_out"] == 1
+    assert stats["endpoints"]["ep"]["in_flight"] == 1
+
+
+class _SlowLLM:
+    endpoint = "http://fake"
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def agenerate_raw(self, prompt, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.02)
+        self.in_flight -= 1
+        return f"echo: {prompt}"
+
+
+def test_scheduled_llm_caps_concurrency_per_endpoint():
+    scheduler = LLMScheduler(max_concurrent=2)
+    inner = _SlowLLM()
+    coder = ScheduledLLM(inner, scheduler, agent="coder")
+    auto = ScheduledLLM(inner, scheduler, agent="auto", priority="background")
+
+    async def scenario():
+        return await asyncio.gather(*(llm.agenerate(f"p{i}") for i, llm in enumerate([coder, auto] * 3)))
+
+    assert asyncio.run(scenario()) == [f"echo: p{i}" for i in range(6)]
+    assert inner.max_in_flight == 2
+    stats = scheduler.get_stats()
+    assert stats["dispatched"] == 6
+    assert stats["agents"]["auto"]["dispatched"] == 3
+
+
+def test_routed_requests_take_the_slot_of_the_chosen_endpoint(monkeypatch):
+    from llm_providers.routed_llm import RoutedOllamaLLM
+
+    routed = RoutedOllamaLLM("fake-model", ["http://a", "http://b"], health_check_interval=0)
+    in_flight = {state.endpoint: 0 for state in routed.states}
+    peak = dict(in_flight)
+    lock = threading.Lock()
+
+    def fake_post(llm):
+        def post(data, path="/api/generate"):
+            with lock:
+                in_flight[llm.endpoint] += 1
+                peak[llm.endpoint] = max(peak[llm.endpoint], in_flight[llm.endpoint])
+            time.sleep(0.05)
+            with lock:
+                in_flight[llm.endpoint] -= 1
+            return {"response": data["prompt"], "done": True}
+        return post
+
+    for state in routed.states:
+        monkeypatch.setattr(state.llm, "_post_generate", fake_post(state.llm))
+
+    scheduler = LLMScheduler(max_concurrent=1)
+    scheduled = ScheduledLLM(routed, scheduler, agent="batch")
+    results = scheduled.generate_many([f"p{i}" for i in range(6)], max_concurrency=6)
+
+    assert [result.text for result in results] == [f"p{i}" for i in range(6)]
+    # One slot per endpoint, not one for the whole routed provider
+    assert peak == {"http://a": 1, "http://b": 1}
+    assert set(scheduler.get_stats()["endpoints"]) == {"http://a", "http://b"}
+    assert routed.generate("fuori dallo scheduler") == "fuori dallo scheduler"
+
+
+def test_cache_hits_do_not_take_scheduler_slots():
+    from llm_providers.response_cache import CachedLLM, ResponseCache
+    from managers.agent_manager import AgentManager
+
+    class _EchoLLM:
+        endpoint = "http://fake"
+        temperature = 0.0
+
+        def __init__(self):
+            self.calls = 0
+
+        def generate(self, prompt, **kwargs):
+            self.calls += 1
+            return f"echo: {prompt}"
+
+    manager = AgentManager({"scheduler": {"enabled": True, "max_concurrent": 1, "max_wait": 0.05}})
+    inner = _EchoLLM()
+    llm = manager._schedule_llm(CachedLLM(inner, ResponseCache()), {"name": "coder"})
+    assert isinstance(llm, CachedLLM) and isinstance(llm.llm, ScheduledLLM)
+
+    assert llm.generate("ciao") == "echo: ciao"
+    manager.scheduler.acquire("http://fake", "holder")
+    try:
+        assert llm.generate("ciao") == "echo: ciao"
+        assert llm.generate("altro").startswith("Errore")
+    finally:
+        manager.scheduler.release("http://fake")
+    assert inner.calls == 1
+
+
+def test_scheduled_batches_keep_the_provider_throughput_report(fake_ollama):
+    from llm_providers.ollama_llm import OllamaLLM
+
+    host, port = fake_ollama.server_address
+    inner = OllamaLLM("fake-model", endpoint=f"http://{host}:{port}")
+    scheduler = LLMScheduler(max_concurrent=2)
+    scheduled = ScheduledLLM(inner, scheduler, agent="batch")
+
+    results = scheduled.generate_many([f"p{i}" for i in range(4)], max_concurrency=4)
+
+    assert [result.text for result in results] == [f"echo: p{i}" for i in range(4)]
+    assert inner.get_metrics()["batch_prompts_per_sec"]["count"] == 1
+    assert scheduler.get_stats()["dispatched"] == 4
@@ -0,0 +1,84 @@
+"""
+Tests for the overlap of reasoning and tool runs in ToolAgent.
+"""
+import asyncio
+import threading
+import time
+
+from agents.tool_agent import ToolAgent
+
+
+class _SlowLLM:
+    """Answers every prompt after a delay and records the prompts."""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, **kwargs):
+        with self._lock:
+            self.prompts.append(prompt)
+        time.sleep(self.delay)
+        return "ragionamento" if "spiega come useresti" in prompt else "risposta finale"
+
+
+class SlowTool:
+    description = "Tool lento"
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+
+    def should_use(self, prompt):
+        return True
+
+    def run(self, input_data):
+        time.sleep(self.delay)
+        return "42"
+
+
+def test_reasoning_overlaps_with_tools():
+    llm = _SlowLLM()
+    agent = ToolAgent("tool", llm, tools=[SlowTool(), SlowTool()])
+
+    started = time.perf_counter()
+    result = agent.run({"prompt": "calcola"})
+    elapsed = time.perf_counter() - started
+
+    # Reasoning and both tools (0.2s each) overlap, then the final call: ~0.4s instead of 0.8s
+    assert elapsed < 0.6
+    assert "risposta finale" in result and "Ragionamento: ragionamento" in result
+    assert result.count("**SlowTool**: 42") == 2
+    assert "Ragionamento iniziale: ragionamento" in llm.prompts[-1]
+
+
+def test_low_latency_mode_skips_reasoning_call():
+    llm = _SlowLLM()
+    agent = ToolAgent("tool", llm, tools=[SlowTool()], config={"low_latency": True})
+
+    result = asyncio.run(agent.arun({"prompt": "calcola"}))
+
+    assert len(llm.prompts) == 1
+    assert "Ragionamento" not in llm.prompts[0] and "**SlowTool**: 42" in llm.prompts[0]
+    assert "risposta finale" in result and "Ragionamento:" not in result
+
+
+def test_reasoning_threads_are_reused_across_requests():
+    class _ThreadLLM(_SlowLLM):
+        def __init__(self):
+            super().__init__(delay=0.0)
+            self.threads = set()
+
+        def generate(self, prompt, **kwargs):
+            self.threads.add(threading.current_thread().name)
+            return super().generate(prompt, **kwargs)
+
+    llm = _ThreadLLM()
+    agent = ToolAgent("tool", llm, tools=[SlowTool(delay=0.0)])
+    for _ in range(5):
+        agent.run({"prompt": "calcola"})
+
+    pool = agent._get_reasoning_pool()
+    assert agent._get_reasoning_pool() is pool
+    reasoning_threads = {name for name in llm.threads if name.startswith("reasoning-tool")}
+    assert len(reasoning_threads) == 1
@@ -0,0 +1,100 @@
+"""
+Tests for concurrent tool execution with timeouts.
+"""
+import time
+
+from agents.multi_tool_agent import MultiToolAgent
+from managers.agent_manager import AgentManager
+from tools.executor import ToolExecutor
+from tools.math_tool import MathTool
+
+
+class SleepTool:
+    """Sleeps for `delay` seconds, then answers."""
+
+    def __init__(self, config=None):
+        self.delay = (config or {}).get("delay", 0.2)
+
+    def run(self, input_data):
+        time.sleep(self.delay)
+        return f"dormito {self.delay}s"
+
+
+class BrokenTool:
+    def run(self, input_data):
+        raise RuntimeError("rotto")
+
+
+class _EchoLLM:
+    def generate(self, prompt, **kwargs):
+        return "risposta"
+
+
+def test_tools_run_concurrently_and_return_partial_results():
+    executor = ToolExecutor(max_workers=4)
+    slow = SleepTool({"delay": 2.0})
+    executor.register(slow, name="lento", timeout=0.3)
+    agent = MultiToolAgent("multi", _EchoLLM(), tools=[SleepTool(), SleepTool(), slow, BrokenTool()],
+                           dispatch_strategy="sequential")
+    agent.tool_executor = executor
+
+    started = time.perf_counter()
+    result = agent.run({"prompt": "usa tutto"})
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.6
+    assert result.count("SleepTool: dormito 0.2s") == 2
+    assert "SleepTool: Errore - Timeout dopo 0.3s" in result
+    assert "BrokenTool: Errore - rotto" in result
+    stats = executor.get_stats()
+    assert stats["timeouts"] == 1 and stats["errors"] == 1 and stats["abandoned_threads"] == 1
+
+
+def test_process_tools_are_terminated_on_timeout():
+    executor = ToolExecutor(max_processes=1)
+    sleeper, math = SleepTool(), MathTool()
+    executor.register(sleeper, executor="process", timeout=3.0,
+                      class_path=f"{__name__}.SleepTool", config={"delay": 30})
+    executor.register(math, executor="process", class_path="tools.math_tool.MathTool")
+    try:
+        timed_out = executor.run_tool(sleeper, {})
+        result = executor.run_tool(math, {"expression": "6 * 7"})
+    finally:
+        executor.shutdown()
+
+    assert timed_out.timed_out
+    assert result.ok and result.output == "42.0"
+    assert executor.get_stats()["process_pool_restarts"] == 1
+
+
+def test_agent_manager_applies_per_tool_settings():
+    manager = AgentManager({
+        "tool_executor": {"max_workers": 2},
+        "tools": [{"name": "math", "class_path": "tools.math_tool.MathTool", "config": {}, "timeout": 5}],
+        "agents": [],
+    })
+
+    assert manager.tool_executor.max_workers == 2
+    assert manager.tool_executor._options_for(manager.tools["math"])["timeout"] == 5
+    assert manager.tool_executor.run_tool(manager.tools["math"], {"expression": "2 + 2"}).output == "4.0"
+    assert manager.get_tool_stats()["calls"] == 1
+
+
+def test_timeout_of_one_process_tool_spares_the_others():
+    executor = ToolExecutor(max_processes=2)
+    stuck, slow = SleepTool(), SleepTool()
+    executor.register(stuck, executor="process", timeout=1.5,
+                      class_path=f"{__name__}.SleepTool", config={"delay": 30})
+    executor.register(slow, executor="process", timeout=10.0,
+                      class_path=f"{__name__}.SleepTool", config={"delay": 2.5})
+    try:
+        timed_out, finished = executor.run_tools([stuck, slow], {})
+        later = executor.run_tool(slow, {})
+    finally:
+        executor.shutdown()
+
+    assert timed_out.timed_out
+    # Still running when the other tool expired: its worker is not terminated
+    assert finished.ok and finished.output == "dormito 2.5s"
+    assert later.ok
+    assert executor.get_stats()["process_pool_restarts"] == 1
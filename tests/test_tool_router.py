@@ -0,0 +1,102 @@
+"""
+Tests for embedding-based tool dispatch in MultiToolAgent.
+"""
+import asyncio
+
+import numpy as np
+
+from agents.multi_tool_agent import MultiToolAgent
+from tools.math_tool import MathTool
+
+
+class WebSearchTool:
+    description = "Ricerca sul web"
+
+    def run(self, input_data):
+        return "risultati"
+
+
+class _EmbeddingLLM:
+    """Embeds texts on three axes (math, web, other) and answers selection prompts with tool 1."""
+
+    def __init__(self):
+        self.embedded = []
+        self.generated = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        rows = []
+        for text in texts:
+            lowered = text.lower()
+            rows.append([float("mathematical" in lowered or "calcola" in lowered),
+                         float("web" in lowered or "cerca" in lowered) * 0.9,
+                         0.3])
+        return np.array(rows, dtype=np.float32)
+
+    def generate(self, prompt, **kwargs):
+        self.generated.append(prompt)
+        return "1" if "Tool selezionati" in prompt else "risposta"
+
+
+def _agent(llm):
+    return MultiToolAgent("router", llm, tools=[MathTool(), WebSearchTool()], dispatch_strategy="embedding",
+                          config={"embedding_router": {"top_k": 2, "threshold": 0.8}})
+
+
+def test_descriptions_are_embedded_once_and_prompts_routed_by_similarity():
+    llm = _EmbeddingLLM()
+    agent = _agent(llm)
+    assert len(llm.embedded) == 2
+
+    assert agent._select_tools("Calcola 2 + 2") == [agent.tools[0]]
+    assert agent._select_tools("cerca sul web") == [agent.tools[1]]
+    assert agent._select_tools("calcola  2 + 2!") == [agent.tools[0]]
+
+    assert len(llm.embedded) == 4
+    assert llm.generated == []
+    stats = agent.get_dispatch_stats()
+    assert stats["routed"] == 2 and stats["cache_hits"] == 1
+
+
+def test_low_confidence_falls_back_to_llm_selection_and_is_cached():
+    llm = _EmbeddingLLM()
+    agent = _agent(llm)
+
+    first = asyncio.run(agent._aselect_tools_by_embedding("scrivi una poesia"))
+    second = agent._select_tools("Scrivi una poesia")
+
+    assert first == second == [agent.tools[1]]
+    assert len([p for p in llm.generated if "Tool selezionati" in p]) == 1
+    assert agent.get_dispatch_stats()["declined"] == 1
+
+
+def test_providers_without_embed_use_llm_selection():
+    class _PlainLLM:
+        def generate(self, prompt, **kwargs):
+            return "0"
+
+    agent = MultiToolAgent("router", _PlainLLM(), tools=[MathTool()], dispatch_strategy="embedding")
+    assert agent.tool_router is None
+    assert agent._select_tools("qualsiasi cosa") == agent.tools
+
+
+def test_error_and_unparsable_llm_replies_are_not_cached():
+    class _FailingLLM(_EmbeddingLLM):
+        def __init__(self, replies):
+            super().__init__()
+            self.replies = list(replies)
+
+        def generate(self, prompt, **kwargs):
+            self.generated.append(prompt)
+            return self.replies.pop(0) if "Tool selezionati" in prompt else "risposta"
+
+    llm = _FailingLLM(["Errore: Ollama non raggiungibile (porta 1)", "nessuno", "1"])
+    agent = _agent(llm)
+
+    # Keyword fallback on the error reply and on the reply without indices, neither remembered
+    assert agent._select_tools("scrivi una poesia") == []
+    assert asyncio.run(agent._aselect_tools_by_embedding("scrivi una poesia")) == []
+    assert agent._select_tools("scrivi una poesia") == [agent.tools[1]]
+    assert agent._select_tools("scrivi una poesia") == [agent.tools[1]]
+    assert len([p for p in llm.generated if "Tool selezionati" in p]) == 3
+    assert agent.get_dispatch_stats()["cache_hits"] == 1
@@ -0,0 +1,249 @@
+"""
+Tool dispatch index for modular-2 framework.
+Compiles the keywords of every tool into one Aho-Corasick automaton, so the
+candidate tools for a prompt are found in a single pass over the text
+instead of one substring scan per keyword per tool.
+"""
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Keywords of the tool categories, matched against tools whose class name contains the category
+# (MultiToolAgent's map; other agents pass their own)
+CATEGORY_KEYWORDS: Dict[str, Sequence[str]] = {
+    "math": ("calcola", "calculate", "math", "matematica", "+", "-", "*", "/", "=", "numero", "number"),
+    "search": ("cerca", "search", "google", "web", "internet", "trova", "find"),
+    "file": ("file", "documento", "document", "leggi", "read", "carica", "load"),
+    "code": ("codice", "code", "programma", "program", "script", "python", "javascript"),
+}
+
+
+class AhoCorasick:
+    """
+    Multi-pattern substring matcher.
+
+    Patterns are compiled into a deterministic automaton whose states carry
+    the bitmask of the labels of every pattern ending there (including the
+    ones reached through failure links), so one scan of the text yields the
+    labels of all patterns it contains.
+    """
+
+    def __init__(self, patterns: Iterable[tuple]):
+        """
+        Build the automaton.
+
+        Args:
+            patterns: (pattern, label) pairs; labels are small non-negative ints
+        """
+        goto: List[Dict[str, int]] = [{}]
+        output: List[int] = [0]
+        for pattern, label in patterns:
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    output.append(0)
+                state = next_state
+            output[state] |= 1 << label
+
+        # Breadth-first: fill failure links, merge outputs and precompute the full
+        # transition table, so scanning never follows failure links.
+        # Missing transitions lead back to the root state.
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [None] * (len(goto) - 1)
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        position = 0
+        while position < len(queue):
+            state = queue[position]
+            position += 1
+            output[state] |= output[fail[state]]
+            transitions = dict(delta[fail[state]])
+            transitions.update(goto[state])
+            delta[state] = transitions
+            for char, child in goto[state].items():
+                fail[child] = delta[fail[state]].get(char, 0)
+                queue.append(child)
+
+        self._delta = delta
+        self._output = output
+        self.states = len(goto)
+
+    def search(self, text: str) -> int:
+        """
+        Scan a text once.
+
+        Args:
+            text: Text to scan
+
+        Returns:
+            Bitmask of the labels of the patterns found in the text
+        """
+        delta, output = self._delta, self._output
+        found = 0
+        state = 0
+        for char in text:
+            state = delta[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+
+class DispatchIndex:
+    """
+    Finds the candidate tools for a text, compiled once per agent.
+
+    Rules of each tool:
+        - its `dispatch_keywords` and `dispatch_patterns` (regexes) when it
+          declares them; these must be equivalent to its should_use().
+          `declared_rules` decides whether they replace the rules below
+          ("replace") or are not used ("ignore")
+        - otherwise should_use(text) when it has one and `use_should_use` is set
+        - otherwise its lowercased class name (when `match_names` is set) and
+          the keywords of the categories in `category_keywords` contained in
+          the class name: all of them, or only the first one in map order
+          when `first_category_only` is set
+
+    Keywords are matched case-insensitively as substrings in one
+    Aho-Corasick pass; regexes are only tried for tools the keywords did not
+    already select, and should_use() is only called for tools without
+    declared rules.
+    """
+
+    def __init__(self, tools: Sequence[Any], category_keywords: Optional[Dict[str, Sequence[str]]] = None,
+                 use_should_use: bool = True, declared_rules: str = "replace", match_names: bool = True,
+                 first_category_only: bool = False):
+        """
+        Compile the index.
+
+        Args:
+            tools: Tool instances, in selection order
+            category_keywords: Category -> keywords (default CATEGORY_KEYWORDS)
+            use_should_use: Ask tools without declared rules through their should_use()
+            declared_rules: "replace" or "ignore" (see the class docstring)
+            match_names: Select a tool whose class name appears in the text
+            first_category_only: Use only the first category contained in the class name
+        """
+        if declared_rules not in ("replace", "ignore"):
+            raise ValueError(f"declared_rules non valido: {declared_rules}")
+        self.tools = list(tools)
+        category_keywords = CATEGORY_KEYWORDS if category_keywords is None else category_keywords
+
+        keywords: Dict[str, int] = {}
+        self._patterns: List[tuple] = []
+        self._predicates: List[int] = []
+        for index, tool in enumerate(self.tools):
+            tool_keywords = getattr(tool, 'dispatch_keywords', None)
+            tool_patterns = getattr(tool, 'dispatch_patterns', None)
+            declared = declared_rules != "ignore" and (tool_keywords is not None or tool_patterns is not None)
+            if not declared and use_should_use and callable(getattr(tool, 'should_use', None)):
+                self._predicates.append(index)
+                continue
+
+            words = list(tool_keywords or ()) if declared else []
+            patterns = list(tool_patterns or ()) if declared else []
+            if not declared:
+                words.extend(self._name_keywords(tool, category_keywords, match_names, first_category_only))
+            for keyword in words:
+                keywords[keyword.lower()] = keywords.get(keyword.lower(), 0) | (1 << index)
+            for pattern in patterns:
+                self._patterns.append((index, re.compile(pattern)))
+
+        # One automaton label per distinct tool set, mapped back to the tool bitmask
+        masks = sorted(set(keywords.values()))
+        label_of = {mask: label for label, mask in enumerate(masks)}
+        self._label_masks = masks
+        self._automaton = AhoCorasick((keyword, label_of[mask]) for keyword, mask in keywords.items())
+        self.keyword_count = len(keywords)
+        logger.debug(f"🗂️ Indice di dispatch: {len(self.tools)} tool, {self.keyword_count} keyword, "
+                     f"{self._automaton.states} stati")
+
+    @staticmethod
+    def _name_keywords(tool: Any, category_keywords: Dict[str, Sequence[str]], match_names: bool,
+                       first_category_only: bool) -> List[str]:
+        """Class name and category keywords of a tool."""
+        tool_name = tool.__class__.__name__.lower()
+        words = [tool_name] if match_names else []
+        for category, category_words in category_keywords.items():
+            if category in tool_name:
+                words.extend(category_words)
+                if first_category_only:
+                    break
+        return words
+
+    def match_mask(self, text: str) -> int:
+        """
+        Bitmask of the tools matching a text (bit i = tools[i]).
+
+        Args:
+            text: Prompt or LLM response
+
+        Returns:
+            Tool bitmask
+        """
+        labels = self._automaton.search(text.lower())
+        selected = 0
+        while labels:
+            lowest = labels & -labels
+            selected |= self._label_masks[lowest.bit_length() - 1]
+            labels ^= lowest
+
+        for index, pattern in self._patterns:
+            if not selected >> index & 1 and pattern.search(text):
+                selected |= 1 << index
+
+        for index in self._predicates:
+            tool = self.tools[index]
+            try:
+                if tool.should_use(text):
+                    selected |= 1 << index
+            except Exception as e:
+                logger.warning(f"⚠️ Errore nel controllo should_use per {tool.__class__.__name__}: {e}")
+        return selected
+
+    def candidates(self, text: str) -> List[Any]:
+        """
+        Tools matching a text.
+
+        Args:
+            text: Prompt or LLM response
+
+        Returns:
+            Matching tools, in the order they were given
+        """
+        selected = self.match_mask(text)
+        return [tool for index, tool in enumerate(self.tools) if selected >> index & 1]
+
+    def first(self, text: str) -> Optional[Any]:
+        """
+        First tool matching a text.
+
+        Args:
+            text: Prompt or LLM response
+
+        Returns:
+            The first matching tool in tool order, or None
+        """
+        selected = self.match_mask(text)
+        if not selected:
+            return None
+        return self.tools[(selected & -selected).bit_length() - 1]
+
+
+def compile_keywords(keywords: Iterable[str]) -> AhoCorasick:
+    """
+    Compile a plain keyword list for yes/no checks (label 0).
+
+    Args:
+        keywords: Lowercase keywords
+
+    Returns:
+        Automaton whose search() is non-zero when any keyword is present
+    """
+    return AhoCorasick((keyword, 0) for keyword in keywords)
@@ -0,0 +1,392 @@
+"""
+Tool executor for modular-2 framework.
+Runs the tools selected by an agent concurrently, in a thread pool (I/O-bound
+tools) or a process pool (CPU-bound tools), with per-tool timeouts.
+"""
+import asyncio
+import importlib
+import json
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_MODES = ("thread", "process")
+
+# Tool instances created inside process-pool workers, keyed by class path and config
+_PROCESS_TOOLS: Dict[str, Any] = {}
+
+
+def _call_tool(tool: Any, input_data: Dict[str, Any]) -> tuple:
+    """Run a tool and return its output with the elapsed seconds."""
+    started = time.perf_counter()
+    output = tool.run(input_data)
+    return output, time.perf_counter() - started
+
+
+def _call_tool_in_process(class_path: str, config: Dict[str, Any], input_data: Dict[str, Any]) -> tuple:
+    """Process-pool entry point: build the tool once per worker, then run it."""
+    key = json.dumps([class_path, config], sort_keys=True, default=str)
+    tool = _PROCESS_TOOLS.get(key)
+    if tool is None:
+        module_path, class_name = class_path.rsplit(".", 1)
+        tool = getattr(importlib.import_module(module_path), class_name)(config)
+        _PROCESS_TOOLS[key] = tool
+    return _call_tool(tool, input_data)
+
+
+class ToolCallResult:
+    """
+    Outcome of one tool run.
+    """
+
+    def __init__(self, tool_name: str, output: Any = None, error: Optional[str] = None,
+                 timed_out: bool = False, elapsed: float = 0.0):
+        """
+        Initialize the result.
+
+        Args:
+            tool_name: Class name of the tool
+            output: Value returned by the tool (None on error or timeout)
+            error: Error message, if the tool failed or timed out
+            timed_out: Whether the tool was cancelled for exceeding its timeout
+            elapsed: Seconds spent running the tool
+        """
+        self.tool_name = tool_name
+        self.output = output
+        self.error = error
+        self.timed_out = timed_out
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        """Whether the tool completed without errors."""
+        return self.error is None
+
+    def __repr__(self) -> str:
+        status = "ok" if self.ok else ("timeout" if self.timed_out else "errore")
+        return f"ToolCallResult({self.tool_name!r}, {status}, {self.elapsed:.3f}s)"
+
+
+class ToolExecutor:
+    """
+    Runs tools concurrently with per-tool isolation and timeouts.
+
+    Tools run in a shared thread pool unless registered with
+    executor="process", in which case a worker process builds its own
+    instance from the tool's class path and config (the tool must be
+    importable and its output picklable). A tool that exceeds its timeout is
+    reported as timed out while the others' results are still returned:
+    pending runs are cancelled, and a process pool running an expired tool is
+    replaced for new runs and its workers terminated once the runs still in
+    it (of other tools or other agents) have finished. Threads cannot be
+    interrupted and are left to finish in the background with their result
+    discarded.
+    """
+
+    def __init__(self, max_workers: int = 8, max_processes: Optional[int] = None,
+                 default_timeout: Optional[float] = None):
+        """
+        Initialize the executor.
+
+        Args:
+            max_workers: Threads shared by all thread-mode tool runs
+            max_processes: Worker processes for process-mode tools (None = CPU count)
+            default_timeout: Seconds allowed to tools without their own timeout (None = no limit)
+        """
+        self.max_workers = max(1, int(max_workers))
+        self.max_processes = max_processes
+        self.default_timeout = default_timeout
+        self._thread_pool = None
+        self._process_pool = None
+        # In-flight runs of each process pool, and of those the ones that have expired
+        self._process_futures: Dict[ProcessPoolExecutor, set] = {}
+        self._expired_futures: set = set()
+        self._retired_pools: set = set()
+        self._options: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "errors": 0, "timeouts": 0, "process_calls": 0,
+                       "abandoned_threads": 0, "process_pool_restarts": 0}
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> "ToolExecutor":
+        """
+        Build an executor from the `tool_executor` config block.
+
+        Args:
+            config: Dict with max_workers, max_processes and default_timeout, or None
+
+        Returns:
+            Tool executor
+        """
+        config = config or {}
+        return cls(
+            max_workers=config.get("max_workers", 8),
+            max_processes=config.get("max_processes"),
+            default_timeout=config.get("default_timeout"),
+        )
+
+    def register(self, tool: Any, name: Optional[str] = None, executor: str = "thread",
+                 timeout: Optional[float] = None, class_path: Optional[str] = None,
+                 config: Optional[Dict[str, Any]] = None):
+        """
+        Set how a tool instance is executed.
+
+        Args:
+            tool: Tool instance
+            name: Name used in logs (results carry the class name, as agent prompts do)
+            executor: "thread" or "process"
+            timeout: Seconds allowed to each run (None = executor default)
+            class_path: Import path of the tool class, required for process mode
+            config: Tool config passed to the instance built in worker processes
+        """
+        if executor not in EXECUTOR_MODES:
+            raise ValueError(f"Executor '{executor}' non valido per il tool '{name}' "
+                             f"(disponibili: {', '.join(EXECUTOR_MODES)})")
+        if executor == "process" and not class_path:
+            raise ValueError(f"Il tool '{name}' in modalità process richiede 'class_path'")
+        self._options[id(tool)] = {
+            "tool": tool,
+            "name": name or tool.__class__.__name__,
+            "class_name": tool.__class__.__name__,
+            "executor": executor,
+            "timeout": timeout,
+            "class_path": class_path,
+            "config": config or {},
+        }
+
+    def _options_for(self, tool: Any) -> Dict[str, Any]:
+        options = self._options.get(id(tool))
+        if options is None or options["tool"] is not tool:
+            name = tool.__class__.__name__
+            return {"tool": tool, "name": name, "class_name": name, "executor": "thread", "timeout": None}
+        return options
+
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+            return self._thread_pool
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._process_pool is None:
+                # spawn: forking a process that runs threads can deadlock the child
+                self._process_pool = ProcessPoolExecutor(max_workers=self.max_processes,
+                                                         mp_context=multiprocessing.get_context("spawn"))
+            return self._process_pool
+
+    def _submit(self, options: Dict[str, Any], input_data: Dict[str, Any]) -> tuple:
+        """Start a tool run, returning its future and the pool running it."""
+        if options["executor"] == "process":
+            with self._lock:
+                self._stats["process_calls"] += 1
+            pool = self._get_process_pool()
+            future = pool.submit(_call_tool_in_process, options["class_path"], options["config"], input_data)
+            with self._lock:
+                self._process_futures.setdefault(pool, set()).add(future)
+            future.add_done_callback(lambda done, pool=pool: self._process_run_done(pool, done))
+            return future, pool
+        pool = self._get_thread_pool()
+        return pool.submit(_call_tool, options["tool"], input_data), pool
+
+    def _retire_process_pool(self, pool: ProcessPoolExecutor, future):
+        """
+        Replace a process pool running an expired tool.
+
+        ProcessPoolExecutor cannot cancel a running call, so the pool's workers
+        are terminated, but only once no other run is left in it: the runs of
+        other tools (and other agents sharing the executor) finish normally.
+        """
+        with self._lock:
+            self._expired_futures.add(future)
+            if self._process_pool is pool:
+                self._process_pool = None
+                self._stats["process_pool_restarts"] += 1
+                logger.warning("⚠️ Pool di processi dei tool sostituito dopo un timeout")
+            self._retired_pools.add(pool)
+            drained = self._pop_if_drained(pool)
+        if drained:
+            self._terminate_process_pool(pool)
+
+    def _process_run_done(self, pool: ProcessPoolExecutor, future):
+        """Forget a finished process run, terminating its pool if it was retired and is now drained."""
+        with self._lock:
+            self._process_futures.get(pool, set()).discard(future)
+            self._expired_futures.discard(future)
+            drained = self._pop_if_drained(pool)
+        if drained:
+            self._terminate_process_pool(pool)
+
+    def _pop_if_drained(self, pool: ProcessPoolExecutor) -> bool:
+        """Whether a retired pool only runs expired tools anymore (call with the lock held)."""
+        if pool not in self._retired_pools:
+            return False
+        running = self._process_futures.get(pool, set())
+        if any(future not in self._expired_futures for future in running):
+            return False
+        self._retired_pools.discard(pool)
+        self._process_futures.pop(pool, None)
+        self._expired_futures.difference_update(running)
+        return True
+
+    @staticmethod
+    def _terminate_process_pool(pool: ProcessPoolExecutor):
+        """Stop the workers of a pool, interrupting the expired tools still running in it."""
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def run_tool(self, tool: Any, input_data: Dict[str, Any], timeout: Optional[float] = None) -> ToolCallResult:
+        """
+        Run a single tool.
+
+        Args:
+            tool: Tool instance
+            input_data: Input passed to tool.run()
+            timeout: Seconds allowed (None = the tool's or the default timeout)
+
+        Returns:
+            Tool result
+        """
+        return self.run_tools([tool], input_data, timeout=timeout)[0]
+
+    def run_tools(self, tools: Sequence[Any], input_data: Dict[str, Any],
+                  timeout: Optional[float] = None) -> List[ToolCallResult]:
+        """
+        Run tools concurrently and wait for all of them or their timeouts.
+
+        Args:
+            tools: Tool instances
+            input_data: Input passed to every tool.run()
+            timeout: Seconds allowed to each tool, overriding the registered timeouts
+
+        Returns:
+            One result per tool, in the order of `tools`; timed-out tools have
+            timed_out=True and the completed ones keep their output
+        """
+        if not tools:
+            return []
+        options = [self._options_for(tool) for tool in tools]
+        limits = [timeout if timeout is not None else (option["timeout"] or self.default_timeout)
+                  for option in options]
+
+        # Nothing to overlap or enforce: run in the caller's thread
+        if len(tools) == 1 and options[0]["executor"] == "thread" and limits[0] is None:
+            return [self._inline(options[0], input_data)]
+
+        started = time.perf_counter()
+        futures, pools = {}, {}
+        for index, option in enumerate(options):
+            future, pools[index] = self._submit(option, input_data)
+            futures[future] = index
+        deadlines = {future: started + limits[index] if limits[index] else None
+                     for future, index in futures.items()}
+
+        results: List[Optional[ToolCallResult]] = [None] * len(tools)
+        pending = set(futures)
+        while pending:
+            now = time.perf_counter()
+            for future in [f for f in pending if deadlines[f] is not None and deadlines[f] <= now]:
+                pending.discard(future)
+                index = futures[future]
+                results[index] = self._expire(future, pools[index], options[index], limits[index])
+            if not pending:
+                break
+            upcoming = [deadlines[f] for f in pending if deadlines[f] is not None]
+            wait_timeout = max(0.0, min(upcoming) - now) if upcoming else None
+            done, pending = wait(pending, timeout=wait_timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures[future]
+                results[index] = self._collect(future, options[index], time.perf_counter() - started)
+
+        with self._lock:
+            self._stats["calls"] += len(results)
+            self._stats["errors"] += sum(1 for result in results if not result.ok and not result.timed_out)
+            self._stats["timeouts"] += sum(1 for result in results if result.timed_out)
+        return results
+
+    async def arun_tools(self, tools: Sequence[Any], input_data: Dict[str, Any],
+                         timeout: Optional[float] = None) -> List[ToolCallResult]:
+        """
+        Asynchronous version of run_tools.
+
+        Args:
+            tools: Tool instances
+            input_data: Input passed to every tool.run()
+            timeout: Seconds allowed to each tool, overriding the registered timeouts
+
+        Returns:
+            One result per tool, in the order of `tools`
+        """
+        return await asyncio.to_thread(self.run_tools, tools, input_data, timeout)
+
+    def _inline(self, option: Dict[str, Any], input_data: Dict[str, Any]) -> ToolCallResult:
+        started = time.perf_counter()
+        try:
+            output, elapsed = _call_tool(option["tool"], input_data)
+            result = ToolCallResult(option["class_name"], output=output, elapsed=elapsed)
+        except Exception as e:
+            result = ToolCallResult(option["class_name"], error=str(e), elapsed=time.perf_counter() - started)
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["errors"] += 0 if result.ok else 1
+        return result
+
+    def _collect(self, future, option: Dict[str, Any], elapsed: float) -> ToolCallResult:
+        try:
+            output, tool_elapsed = future.result()
+            return ToolCallResult(option["class_name"], output=output, elapsed=tool_elapsed)
+        except Exception as e:
+            return ToolCallResult(option["class_name"], error=str(e) or e.__class__.__name__, elapsed=elapsed)
+
+    def _expire(self, future, pool, option: Dict[str, Any], limit: float) -> ToolCallResult:
+        if not future.cancel():
+            if option["executor"] == "process":
+                self._retire_process_pool(pool, future)
+            else:
+                with self._lock:
+                    self._stats["abandoned_threads"] += 1
+        logger.warning(f"⏱️ Tool '{option['name']}' interrotto dopo {limit}s di timeout")
+        return ToolCallResult(option["class_name"], error=f"Timeout dopo {limit}s", timed_out=True, elapsed=limit)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get executor counters.
+
+        Returns:
+            Tool runs, errors, timeouts, process-mode runs, abandoned threads and pool restarts
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def shutdown(self, wait: bool = True):
+        """Stop the thread and process pools."""
+        with self._lock:
+            thread_pool, self._thread_pool = self._thread_pool, None
+            process_pool, self._process_pool = self._process_pool, None
+            retired = list(self._retired_pools)
+            self._retired_pools.clear()
+        if thread_pool is not None:
+            thread_pool.shutdown(wait=wait, cancel_futures=True)
+        if process_pool is not None:
+            process_pool.shutdown(wait=wait, cancel_futures=True)
+        for pool in retired:
+            self._terminate_process_pool(pool)
+
+
+_default_executor: Optional[ToolExecutor] = None
+_default_lock = threading.Lock()
+
+
+def get_default_executor() -> ToolExecutor:
+    """Executor shared by agents that were not given one by AgentManager."""
+    global _default_executor
+    with _default_lock:
+        if _default_executor is None:
+            _default_executor = ToolExecutor()
+        return _default_executor
@@ -6,13 +6,30 @@ import logging
 import re
 from typing import Dict, Any
 
+from tools.dispatch import compile_keywords
+
 logger = logging.getLogger(__name__)
 
+MATH_KEYWORDS = (
+    "calcola", "calculate", "math", "matematica", "somma", "sottrai",
+    "moltiplica", "dividi", "add", "subtract", "multiply", "divide"
+)
+
+# An operator and a digit anywhere in the text (covers expressions like "2 + 3")
+MATH_PATTERN = r'(?s)\A(?=.*[+\-*/=])(?=.*\d)'
+
+_MATH_KEYWORDS = compile_keywords(MATH_KEYWORDS)
+_MATH_REGEX = re.compile(MATH_PATTERN)
+
 class MathTool:
     """
     Tool for performing mathematical calculations.
     """
     
+    # Rules used by agents' dispatch indexes, equivalent to should_use()
+    dispatch_keywords = MATH_KEYWORDS
+    dispatch_patterns = (MATH_PATTERN,)
+    
     def __init__(self, config: Dict = None):
         """
         Initialize the math tool.
@@ -156,24 +173,9 @@ class MathTool:
         Returns:
             True if the tool should be used
         """
-        # Check for mathematical keywords and patterns
-        math_keywords = [
-            "calcola", "calculate", "math", "matematica", "somma", "sottrai", 
-            "moltiplica", "dividi", "add", "subtract", "multiply", "divide"
-        ]
-        
-        text_lower = text.lower()
-        
-        # Check for keywords
-        if any(keyword in text_lower for keyword in math_keywords):
-            return True
-        
-        # Check for mathematical expressions
-        if re.search(r'\d+\s*[+\-*/]\s*\d+', text):
-            return True
-        
-        # Check for numbers with operators
-        if re.search(r'[+\-*/=]', text) and re.search(r'\d', text):
+        # Mathematical keywords, in one pass over the text
+        if _MATH_KEYWORDS.search(text.lower()):
             return True
         
-        return False
\ No newline at end of file
+        # Numbers with operators
+        return bool(_MATH_REGEX.search(text))
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""
+Embedding-based tool router for modular-2 framework.
+Picks tools by cosine similarity between the prompt and the tool
+descriptions, so selection costs one embedding instead of a generation.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from core.plan_cache import normalize_task
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency, required by the router
+    np = None
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingToolRouter:
+    """
+    Routes prompts to tools with a vectorized top-k similarity.
+
+    Tool descriptions are embedded once into a row-normalized float32
+    matrix; each prompt costs one embedding and one matrix-vector product.
+    When the best score is below `threshold` the router declines and the
+    caller falls back to another strategy. Final selections are cached per
+    normalized prompt.
+    """
+
+    def __init__(self, tools: Sequence[Any], embed: Callable[[List[str]], Any], top_k: int = 3,
+                 threshold: float = 0.35, cache_size: int = 256):
+        """
+        Initialize the router and embed the tool descriptions.
+
+        Args:
+            tools: Tool instances (their `description`, or class name, is embedded)
+            embed: Function returning one embedding row per text (e.g. llm.embed)
+            top_k: Maximum tools selected per prompt
+            threshold: Minimum cosine similarity for a tool to be selected
+            cache_size: Normalized prompts whose selection is remembered (0 disables)
+        """
+        if np is None:
+            raise ImportError("numpy è richiesto dal router dei tool basato su embedding")
+        self.tools = list(tools)
+        self.embed = embed
+        self.top_k = max(1, int(top_k))
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"routed": 0, "declined": 0, "cache_hits": 0, "route_seconds": 0.0}
+
+        descriptions = [getattr(tool, 'description', None) or tool.__class__.__name__ for tool in self.tools]
+        self.matrix = self._normalize(np.asarray(embed(descriptions), dtype=np.float32)) if self.tools else None
+        logger.info(f"🧭 Router dei tool: {len(self.tools)} descrizioni indicizzate")
+
+    @classmethod
+    def from_config(cls, tools: Sequence[Any], llm: Any,
+                    config: Optional[Dict[str, Any]] = None) -> Optional["EmbeddingToolRouter"]:
+        """
+        Build a router for an agent.
+
+        Args:
+            tools: Tool instances
+            llm: Provider whose embed() is used
+            config: The agent's `embedding_router` block (top_k, threshold, cache_size)
+
+        Returns:
+            Router, or None when the provider cannot embed or the descriptions could not be embedded
+        """
+        embed = getattr(llm, 'embed', None)
+        if embed is None:
+            logger.warning("⚠️ Router a embedding non disponibile: l'LLM non supporta embed()")
+            return None
+        try:
+            return cls(tools, embed, **(config or {}))
+        except Exception as e:
+            logger.warning(f"⚠️ Router a embedding non disponibile: {e}")
+            return None
+
+    @staticmethod
+    def _normalize(matrix):
+        matrix = np.atleast_2d(matrix)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def cached(self, prompt: str) -> Optional[List[Any]]:
+        """
+        Selection remembered for a prompt.
+
+        Args:
+            prompt: User prompt
+
+        Returns:
+            Tools, or None when the prompt was not seen
+        """
+        key = normalize_task(prompt)
+        with self._lock:
+            indices = self._cache.get(key)
+            if indices is None:
+                return None
+            self._cache.move_to_end(key)
+            self._stats["cache_hits"] += 1
+        return [self.tools[index] for index in indices]
+
+    def remember(self, prompt: str, selected: Sequence[Any]):
+        """
+        Cache the final selection for a prompt (whichever strategy made it).
+
+        Args:
+            prompt: User prompt
+            selected: Selected tools
+        """
+        if self.cache_size <= 0:
+            return
+        chosen = {id(tool) for tool in selected}
+        indices = tuple(index for index, tool in enumerate(self.tools) if id(tool) in chosen)
+        key = normalize_task(prompt)
+        with self._lock:
+            self._cache[key] = indices
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def scores(self, prompt: str):
+        """
+        Cosine similarity between a prompt and every tool description.
+
+        Args:
+            prompt: User prompt
+
+        Returns:
+            float32 vector, one score per tool
+        """
+        vector = self._normalize(np.asarray(self.embed([prompt]), dtype=np.float32))[0]
+        return self.matrix @ vector
+
+    def route(self, prompt: str) -> Optional[List[Any]]:
+        """
+        Select tools for a prompt.
+
+        Args:
+            prompt: User prompt
+
+        Returns:
+            Up to top_k tools scoring at least `threshold`, best first, or None
+            when no tool is similar enough (the caller should fall back)
+        """
+        if self.matrix is None:
+            return None
+        started = time.perf_counter()
+        scores = self.scores(prompt)
+        count = min(self.top_k, len(scores))
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top])]
+        picked = [index for index in top if scores[index] >= self.threshold]
+
+        with self._lock:
+            self._stats["route_seconds"] += time.perf_counter() - started
+            self._stats["routed" if picked else "declined"] += 1
+        if not picked:
+            logger.info(f"🧭 Nessun tool sopra la soglia {self.threshold} (migliore {float(scores[top[0]]):.3f})")
+            return None
+        summary = ", ".join(f"{self.tools[index].__class__.__name__} {float(scores[index]):.2f}" for index in picked)
+        logger.info(f"🧭 Tool instradati per embedding: {summary}")
+        return [self.tools[index] for index in picked]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get routing counters.
+
+        Returns:
+            Routed and declined prompts, cache hits and mean routing time in ms
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached_prompts"] = len(self._cache)
+        routes = stats["routed"] + stats["declined"]
+        stats["mean_route_ms"] = round(stats.pop("route_seconds") / routes * 1000, 3) if routes else 0.0
+        return stats